@@ -0,0 +1,149 @@
+"""
+Benchmarks of the drizzle (``cdriz.tdriz``) and blot (``cdriz.tblot``)
+resampling code for `airspeed velocity <https://asv.readthedocs.io>`_.
+
+Each configuration reports its run time (``time_*``), throughput in
+millions of input (drizzle) or output (blot) pixels per second
+(``track_*``) and peak memory (``peakmem_*``).
+
+"""
+import time
+
+import numpy as np
+
+from drizzlepac import cdriz, wcs_functions
+
+from .synthetic import affine_matrix, make_chip, make_wcs_pair
+
+KERNELS = ['square', 'point', 'turbo', 'tophat', 'gaussian', 'lanczos2',
+           'lanczos3']
+INTERPOLATIONS = ['nearest', 'linear', 'poly3', 'poly5', 'sinc', 'lan3',
+                  'lan5']
+MAPPINGS = ['affine', 'wcs-step10', 'wcs-step1', 'wcs-auto', 'python']
+SIZES = [512, 2048]
+
+# Number of runs used to measure the throughput (the best one is kept)
+_TRACK_REPEAT = 3
+
+
+def _mapping(kind, wcs_in, wcs_out):
+    """ Return the ``(mapping, affine)`` arguments of tdriz/tblot. """
+    size = wcs_in.pixel_shape[0]
+    if kind == 'affine':
+        return None, affine_matrix(size)
+    if kind == 'python':
+        return wcs_functions.WCSMap(wcs_in, wcs_out).forward, False
+    if kind == 'wcs-auto':
+        return wcs_functions.default_wcs_mapping(wcs_in, wcs_out, 'auto'), False
+    stepsize = int(kind[len('wcs-step'):])
+    return wcs_functions.default_wcs_mapping(wcs_in, wcs_out, stepsize), False
+
+
+def _best_time(func, repeat=_TRACK_REPEAT):
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+class _Drizzle:
+    """ Drizzle a synthetic chip onto an output frame of the same size. """
+    timeout = 300
+
+    def _setup(self, size, kernel='square', pixfrac=1.0, mapping='affine'):
+        self.size = size
+        self.kernel = kernel
+        self.pixfrac = pixfrac
+        wcs_in, wcs_out = make_wcs_pair(size, distortion=mapping != 'affine')
+        self.mapping, self.affine = _mapping(mapping, wcs_in, wcs_out)
+        self.insci = make_chip(size)
+        self.inwht = np.ones((size, size), dtype=np.float32)
+
+    def drizzle(self):
+        shape = (self.size, self.size)
+        outsci = np.zeros(shape, dtype=np.float32)
+        outwht = np.zeros(shape, dtype=np.float32)
+        outctx = np.zeros(shape, dtype=np.int32)
+        cdriz.tdriz(self.insci, self.inwht, outsci, outwht, outctx,
+                    1, 0, 1, 1, self.size, 1.1, 1.0, 1.0, 'center',
+                    self.pixfrac, self.kernel, 'cps', 1.0, 1.0, 'INDEF', 0, 0,
+                    1, self.mapping, affine=self.affine)
+
+    def _track_throughput(self):
+        return self.size**2 / _best_time(self.drizzle) / 1e6
+
+
+class DrizzleKernels(_Drizzle):
+    """ Drizzle kernels with an affine transformation (no WCS evaluation).
+    """
+    params = [KERNELS, [1.0, 0.5], SIZES]
+    param_names = ['kernel', 'pixfrac', 'size']
+
+    def setup(self, kernel, pixfrac, size):
+        self._setup(size, kernel=kernel, pixfrac=pixfrac)
+
+    def time_tdriz(self, kernel, pixfrac, size):
+        self.drizzle()
+
+    def peakmem_tdriz(self, kernel, pixfrac, size):
+        self.drizzle()
+
+    def track_throughput(self, kernel, pixfrac, size):
+        return self._track_throughput()
+
+    track_throughput.unit = 'Mpix/s'
+
+
+class DrizzleMappings(_Drizzle):
+    """ Coordinate transformations of distorted inputs (square kernel). """
+    params = [MAPPINGS, SIZES]
+    param_names = ['mapping', 'size']
+
+    def setup(self, mapping, size):
+        if mapping == 'python' and size > 512:
+            raise NotImplementedError  # skipped: far too slow
+        self._setup(size, mapping=mapping)
+
+    def time_tdriz(self, mapping, size):
+        self.drizzle()
+
+    def peakmem_tdriz(self, mapping, size):
+        self.drizzle()
+
+    def track_throughput(self, mapping, size):
+        return self._track_throughput()
+
+    track_throughput.unit = 'Mpix/s'
+
+
+class Blot:
+    """ Blot interpolation methods with an affine transformation. """
+    params = [INTERPOLATIONS, SIZES]
+    param_names = ['interp', 'size']
+    timeout = 300
+
+    def setup(self, interp, size):
+        self.size = size
+        self.interp = interp
+        wcs_in, wcs_out = make_wcs_pair(size, distortion=False)
+        self.mapping, self.affine = _mapping('affine', wcs_in, wcs_out)
+        self.source = make_chip(size)
+
+    def blot(self):
+        out = np.zeros((self.size, self.size), dtype=np.float32)
+        cdriz.tblot(self.source, out, 1, self.size, 1, self.size, 1.1, 1.0,
+                    1.0, 1.0, 'center', self.interp, 1.0, 0.0, 1.0, 1,
+                    self.mapping, affine=self.affine)
+
+    def time_tblot(self, interp, size):
+        self.blot()
+
+    def peakmem_tblot(self, interp, size):
+        self.blot()
+
+    def track_throughput(self, interp, size):
+        return self.size**2 / _best_time(self.blot) / 1e6
+
+    track_throughput.unit = 'Mpix/s'
@@ -0,0 +1,68 @@
+"""
+Benchmarks of the source matching used by TweakReg
+(``imgclasses.Image.match``) for `airspeed velocity
+<https://asv.readthedocs.io>`_.
+
+The ``xyxymatch`` and ``kdtree`` matchers are timed against catalog size,
+starting from an initial offset rounded to the nearest pixel (as obtained
+from the 2D histogram of offsets).
+
+"""
+from stsci.stimage import xyxymatch
+
+from drizzlepac import imgclasses
+
+from .synthetic import make_catalogs
+
+SHIFT = (3.2, -1.4)
+
+MATCHERS = ['xyxymatch', 'kdtree']
+NSOURCES = [1000, 10000, 100000, 1000000]
+TOLERANCE = 1.0
+SEPARATION = 0.5
+
+
+class Match:
+    """ Match image sources to a reference catalog of the same density. """
+    params = [MATCHERS, NSOURCES]
+    param_names = ['matcher', 'nsrc']
+    timeout = 300
+
+    def setup(self, matcher, nsrc):
+        self.imgxy, self.refxy = make_catalogs(nsrc, shift=SHIFT)
+        self.origin = (round(SHIFT[0]), round(SHIFT[1]))
+        if matcher == 'kdtree':
+            self.match = imgclasses._kdtree_match
+        else:
+            self.match = xyxymatch
+
+    def _match(self):
+        return self.match(self.imgxy, self.refxy, origin=self.origin,
+                          tolerance=TOLERANCE, separation=SEPARATION)
+
+    def time_match(self, matcher, nsrc):
+        self._match()
+
+    def peakmem_match(self, matcher, nsrc):
+        self._match()
+
+    def track_matched_fraction(self, matcher, nsrc):
+        return len(self._match()) / self.refxy.shape[0]
+
+    track_matched_fraction.unit = 'fraction'
+
+
+class OffsetHistogram:
+    """ 2D histogram of offsets used to estimate the initial offset. """
+    params = [NSOURCES]
+    param_names = ['nsrc']
+    timeout = 300
+
+    def setup(self, nsrc):
+        self.imgxy, self.refxy = make_catalogs(nsrc, shift=SHIFT)
+
+    def time_xy_2dhist(self, nsrc):
+        imgclasses._xy_2dhist(self.imgxy, self.refxy, 5.0)
+
+    def peakmem_xy_2dhist(self, nsrc):
+        imgclasses._xy_2dhist(self.imgxy, self.refxy, 5.0)
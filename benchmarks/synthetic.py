@@ -0,0 +1,87 @@
+"""
+Synthetic inputs for the drizzle benchmarks.
+
+Input chips and pairs of WCS (a distorted input WCS with SIP coefficients
+and an undistorted, rotated output WCS) are generated on the fly so that
+benchmarks need neither network access nor reference files.
+
+"""
+import numpy as np
+from astropy import wcs
+
+PSCALE = 0.05  # arcsec/pixel
+
+
+def make_wcs(shape, pscale=PSCALE, rot=0.0, crval=(150.0, 2.0), sip=False):
+    """ Return a TAN (optionally TAN-SIP) WCS for an image of a given shape.
+    """
+    w = wcs.WCS(naxis=2)
+    ctype = ['RA---TAN', 'DEC--TAN']
+    crpix = [shape[1] / 2.0 + 0.5, shape[0] / 2.0 + 0.5]
+    if sip:
+        ctype = [c + '-SIP' for c in ctype]
+        # About 1 pixel of distortion at the corners of a 2k x 2k chip
+        a = np.zeros((4, 4))
+        b = np.zeros((4, 4))
+        a[2, 0], a[1, 1], a[0, 2] = 2e-7, -1e-7, 1.5e-7
+        b[2, 0], b[1, 1], b[0, 2] = -1e-7, 2e-7, 1e-7
+        a[3, 0], b[0, 3] = 3e-11, -2e-11
+        w.sip = wcs.Sip(a, b, None, None, crpix)
+    w.wcs.ctype = ctype
+    w.wcs.crpix = crpix
+    w.wcs.crval = list(crval)
+    theta = np.deg2rad(rot)
+    w.wcs.cd = pscale / 3600.0 * np.array(
+        [[-np.cos(theta), np.sin(theta)], [np.sin(theta), np.cos(theta)]]
+    )
+    w.wcs.set()
+    w.pixel_shape = shape[::-1]
+    return w
+
+
+def make_wcs_pair(size, scale=1.1, rot=7.0, distortion=True):
+    """ Distorted input and rotated output WCS of ``size x size`` images.
+
+    The output pixels are ``scale`` times larger than the input pixels.
+    """
+    wcs_in = make_wcs((size, size), sip=distortion)
+    wcs_out = make_wcs((size, size), pscale=PSCALE * scale, rot=rot)
+    return wcs_in, wcs_out
+
+
+def affine_matrix(size, scale=1.1, rot=7.0):
+    """ Affine transformation (as used by ``tdriz``/``tblot``) equivalent to
+    an undistorted `make_wcs_pair`.
+    """
+    theta = np.deg2rad(rot)
+    c, s = np.cos(theta) / scale, np.sin(theta) / scale
+    center = 0.5 * (size + 1)
+    return np.array([
+        [c, -s, center - c * center + s * center],
+        [s, c, center - s * center - c * center],
+    ])
+
+
+def make_chip(size, seed=0):
+    """ Sky background with noise and a few hundred point sources. """
+    rng = np.random.default_rng(seed)
+    chip = rng.normal(10.0, 1.0, (size, size)).astype(np.float32)
+    nsrc = max(size * size // 10000, 10)
+    y, x = rng.integers(2, size - 2, (2, nsrc))
+    chip[y, x] += rng.uniform(100.0, 1e4, nsrc).astype(np.float32)
+    return chip
+
+
+def make_catalogs(nsrc, shift=(3.2, -1.4), noise=0.05, overlap=0.8, seed=0):
+    """ Reference and image source positions (``(N, 2)`` arrays) with a
+    constant density of one source per 40x40 pixels.
+
+    Image sources are reference sources shifted by ``shift`` with Gaussian
+    noise. Only a fraction ``overlap`` of the image sources is present in
+    the reference catalog.
+    """
+    rng = np.random.default_rng(seed)
+    side = 40.0 * np.sqrt(nsrc)
+    xy = rng.uniform(0.0, side, (nsrc, 2))
+    imgxy = xy + shift + rng.normal(0.0, noise, xy.shape)
+    return imgxy, xy[:int(overlap * nsrc)]
@@ -14,63 +14,60 @@ supported by this package include:
 cosmic-ray cleaned, and combined image as a FITS file.
 
 """
-import os
-import re
-import sys
-import contextlib
+import importlib
 
 from .version import __version__
 
-with contextlib.redirect_stdout(None):  
-  import stsci.skypac
-
-from . import ablot
-from . import adrizzle
-from . import astrodrizzle
-from . import buildmask
-from . import createMedian
-from . import drizCR
-from . import imageObject
-from . import mapreg
-from . import mdzhandler
-from . import outputimage
-from . import photeq
-from . import processInput
-from . import resetbits
-from . import sky
-from . import staticMask
-from . import util
-from . import wcs_functions
-
-
-# These modules provide the user-interfaces to coordinate transformation tasks
-from . import pixtosky
-from . import skytopix
-from . import pixtopix
-
-# The following modules are for 'tweakreg' and are included here to make
-# it easier to get to this code interactively
-try:
-    from . import tweakreg, catalogs, imgclasses, tweakutils, mapreg, photeq, \
-                  imagefindpars, refimagefindpars
-except ImportError as e :
-    print('The libraries needed for "tweakreg" were not available!')
-    print('None of the code related to that task can be used at this time.')
-    print('   (If you want to report this error, the details are "%s")'%(str(e)))
-
-# Add updatenpol to the list of tasks imported automatically here
-from . import updatenpol
-from . import buildwcs
-
-# This module supports applying WCS from _drz to _flt files
-from . import tweakback
-
-# This module enables users to replace NaNs in images with another value easily
-from . import pixreplace
-
-from . import haputils
-from . import align
-from . import runastrodriz
+# Task and support modules are imported on first attribute access
+# (PEP 562) rather than when the package itself is imported. Importing
+# them all up front pulls in scipy, matplotlib, photutils, stwcs and the
+# HAP pipeline code, which dominates the start-up time of every
+# ``runastrodriz``/``runsinglehap`` process.
+_SUBMODULES = frozenset([
+    'ablot',
+    'adrizzle',
+    'align',
+    'astrodrizzle',
+    'buildmask',
+    'buildwcs',
+    'catalogs',
+    'createMedian',
+    'drizCR',
+    'haputils',
+    'imagefindpars',
+    'imageObject',
+    'imgclasses',
+    'mapreg',
+    'mdzhandler',
+    'outputimage',
+    'photeq',
+    'pixreplace',
+    'pixtopix',
+    'pixtosky',
+    'processInput',
+    'refimagefindpars',
+    'resetbits',
+    'runastrodriz',
+    'sky',
+    'skytopix',
+    'staticMask',
+    'tweakback',
+    'tweakreg',
+    'tweakutils',
+    'updatenpol',
+    'util',
+    'wcs_functions',
+])
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
 
 
 def help():
@@ -9,11 +9,16 @@ cosmic-rays.
 
 """
 import os
+import mmap
+import multiprocessing
+
 import numpy as np
 from stsci.tools import fileutil, logutil
 from . import outputimage
+from . import profiling
 from . import wcs_functions
 from . import util
+from .scheduler import MemoryScheduler
 import stwcs
 from stwcs import distortion
 
@@ -128,7 +133,8 @@ def run(configObj,wcsmap=None):
     # perform blotting operation now
     _outsci = do_blot(_insci, source_wcs, out_wcs, _expin, coeffs=configObj['coeffs'],
                     interp=configObj['interpol'], sinscl=configObj['sinscl'],
-            stepsize=configObj['stepsize'], wcsmap=wcsmap)
+            stepsize=configObj['stepsize'], wcsmap=wcsmap,
+            wcs_tolerance=configObj['wcs_tolerance'])
     # create output with proper units and exptime-scaling
     if scale_pars['out_units'] == 'counts':
         if scale_pars['expout'] == 'input':
@@ -159,10 +165,10 @@ def run(configObj,wcsmap=None):
 #### Top-level interface from inside AstroDrizzle
 #
 def runBlot(imageObjectList, output_wcs, configObj={},
-            wcsmap=wcs_functions.WCSMap, procSteps=None):
+            wcsmap=wcs_functions.WCSMap, procSteps=None, scheduler=None):
     """
     runBlot(imageObjectList, output_wcs, configObj={},
-            wcsmap=wcs_functions.WCSMap, procSteps=None)
+            wcsmap=wcs_functions.WCSMap, procSteps=None, scheduler=None)
     """
     if procSteps is not None:
         procSteps.addStep(PROCSTEPS_NAME)
@@ -180,7 +186,7 @@ def runBlot(imageObjectList, output_wcs, configObj={},
         util.printParams(paramDict, log=log)
 
         run_blot(imageObjectList, output_wcs.single_wcs, paramDict,
-                 wcsmap=wcsmap)
+                 wcsmap=wcsmap, scheduler=scheduler)
     else:
         log.info('Blot step not performed.')
         return
@@ -198,7 +204,9 @@ def buildBlotParamDict(configObj):
                 'blot_sinscl':configObj[blot_name]['blot_sinscl'],
                 'blot_addsky':configObj[blot_name]['blot_addsky'],
                 'blot_skyval':configObj[blot_name]['blot_skyval'],
-                'coeffs':configObj['coeffs']}
+                'coeffs':configObj['coeffs'],
+                'num_cores':configObj.get('num_cores'),
+                'max_memory':configObj.get('max_memory')}
     return paramDict
 
 def _setDefaults(configObj={}):
@@ -232,11 +240,21 @@ def _setDefaults(configObj={}):
 
     return paramDict
 
-def run_blot(imageObjectList,output_wcs,paramDict,wcsmap=wcs_functions.WCSMap):
+def run_blot(imageObjectList, output_wcs, paramDict,
+             wcsmap=wcs_functions.WCSMap, scheduler=None):
     """
-    run_blot(imageObjectList, output_wcs, paramDict, wcsmap=wcs_functions.WCSMap)
+    run_blot(imageObjectList, output_wcs, paramDict, wcsmap=wcs_functions.WCSMap,
+             scheduler=None)
 
     Perform the blot operation on the list of images.
+
+    Each median image is read only once. When the chips are blotted in
+    parallel, the median is copied to a read-only shared memory map so that
+    all worker processes use the same copy of the data. The number of
+    parallel workers is controlled by ``scheduler`` (a
+    `~drizzlepac.scheduler.MemoryScheduler`, created from
+    ``paramDict['num_cores']`` and ``paramDict['max_memory']`` when not
+    provided). In-memory processing is always done serially.
     """
     # Insure that input imageObject is a list
     if not isinstance(imageObjectList, list):
@@ -249,83 +267,139 @@ def run_blot(imageObjectList,output_wcs,paramDict,wcsmap=wcs_functions.WCSMap):
                  'PyFITS':util.__fits_version__,
                  'Numpy':util.__numpy_version__}
 
-    _hdrlist = []
-
-    for img in imageObjectList:
-
-        for chip in img.returnAllChips(extname=img.scienceExt):
-
-            print('    Blot: creating blotted image: ',chip.outputNames['data'])
-
-            #### Check to see what names need to be included here for use in _hdrlist
-            chip.outputNames['driz_version'] = _versions['AstroDrizzle']
-            outputvals = chip.outputNames.copy()
-            outputvals.update(img.outputValues)
-            outputvals['blotnx'] = chip.wcs.naxis1
-            outputvals['blotny'] = chip.wcs.naxis2
-            _hdrlist.append(outputvals)
-
-            plist = outputvals.copy()
-            plist.update(paramDict)
-
-            # PyFITS can be used here as it will always operate on
-            # output from PyDrizzle (which will always be a FITS file)
-            # Open the input science file
-            medianPar = 'outMedian'
-            outMedianObj = img.getOutputName(medianPar)
-            if img.inmemory:
-                outMedian = img.outputNames[medianPar]
-                _fname,_sciextn = fileutil.parseFilename(outMedian)
-                _inimg = outMedianObj
-            else:
-                outMedian = outMedianObj
-                _fname,_sciextn = fileutil.parseFilename(outMedian)
-                _inimg = fileutil.openImage(_fname, memmap=False)
-
-            # Return the PyFITS HDU corresponding to the named extension
-            _scihdu = fileutil.getExtn(_inimg,_sciextn)
-            _insci = _scihdu.data.copy()
-            _inimg.close()
-            del _inimg, _scihdu
-
-            _outsci = do_blot(_insci, output_wcs,
-                   chip.wcs, chip._exptime, coeffs=paramDict['coeffs'],
-                   interp=paramDict['blot_interp'], sinscl=paramDict['blot_sinscl'],
-                   wcsmap=wcsmap)
-            # Apply sky subtraction and unit conversion to blotted array to
-            # match un-modified input array
-            if paramDict['blot_addsky']:
-                skyval = chip.computedSky
-            else:
-                skyval = paramDict['blot_skyval']
-            _outsci /= chip._conversionFactor
-            if skyval is not None:
-                _outsci += skyval
-                log.info('Applying sky value of %0.6f to blotted image %s'%
-                            (skyval,chip.outputNames['data']))
-
-            # Write output Numpy objects to a PyFITS file
-            # Blotting only occurs from a drizzled SCI extension
-            # to a blotted SCI extension...
-
-            _outimg = outputimage.OutputImage(_hdrlist, paramDict, build=False, wcs=chip.wcs, blot=True)
-            _outimg.outweight = None
-            _outimg.outcontext = None
-            outimgs = _outimg.writeFITS(plist['data'],_outsci,None,
-                                versions=_versions,blend=False,
-                                virtual=img.inmemory)
-
-            img.saveVirtualOutputs(outimgs)
-            #_buildOutputFits(_outsci,None,plist['outblot'])
-            _hdrlist = []
-
-            del _outsci
-
-        del _outimg
+    tasks = [(img, chip) for img in imageObjectList
+             for chip in img.returnAllChips(extname=img.scienceExt)]
+    if not tasks:
+        return
+
+    if scheduler is None:
+        scheduler = MemoryScheduler(imageObjectList, output_wcs,
+                                    num_cores=paramDict.get('num_cores'),
+                                    max_memory=paramDict.get('max_memory'))
+    task_memory = [scheduler.blot_chip_memory(chip) for _, chip in tasks]
+    pool_size = scheduler.pool_size(PROCSTEPS_NAME, len(tasks),
+                                    task_memory=task_memory)
+    if imageObjectList[0].inmemory:
+        pool_size = 1  # virtual outputs of workers would be lost
+    run_parallel = pool_size > 1
+
+    # Read each median image (usually shared by all inputs) only once:
+    medians = {}
+    for img, _ in tasks:
+        median_name = img.outputNames['outMedian']
+        if median_name not in medians:
+            medians[median_name] = _read_median(img, shared=run_parallel)
+
+    if run_parallel:
+        log.info(f'Executing {pool_size:d} parallel workers')
+        mp_ctx = multiprocessing.get_context('fork')
+        subprocs = [
+            mp_ctx.Process(
+                target=_blot_chip,
+                name='ablot._blot_chip()',  # for err msgs
+                args=(img, chip, medians[img.outputNames['outMedian']],
+                      output_wcs, paramDict, _versions, wcsmap)
+            )
+            for img, chip in tasks
+        ]
+        scheduler.launch_and_wait(  # blocks till all done
+            subprocs, task_memory, pool_size
+        )
+    else:
+        log.info('Executing serially')
+        for img, chip in tasks:
+            _blot_chip(img, chip, medians[img.outputNames['outMedian']],
+                       output_wcs, paramDict, _versions, wcsmap)
+
+
+def _read_median(img, shared=False):
+    """ Read the SCI array of the median image used to blot ``img``.
+
+    The array is returned as read-only native ``float32`` data. When
+    ``shared`` is `True`, it is stored in an anonymous shared memory map
+    which is inherited (not copied) by forked worker processes.
+    """
+    # PyFITS can be used here as it will always operate on
+    # output from PyDrizzle (which will always be a FITS file)
+    # Open the input science file
+    medianPar = 'outMedian'
+    outMedianObj = img.getOutputName(medianPar)
+    if img.inmemory:
+        outMedian = img.outputNames[medianPar]
+        _fname,_sciextn = fileutil.parseFilename(outMedian)
+        _inimg = outMedianObj
+    else:
+        outMedian = outMedianObj
+        _fname,_sciextn = fileutil.parseFilename(outMedian)
+        _inimg = fileutil.openImage(_fname, memmap=False)
+
+    # Return the PyFITS HDU corresponding to the named extension
+    _scihdu = fileutil.getExtn(_inimg,_sciextn)
+    if shared:
+        shape = _scihdu.data.shape
+        buf = mmap.mmap(-1, max(int(np.prod(shape)) * 4, 1))
+        _insci = np.ndarray(shape, dtype=np.float32, buffer=buf)
+        _insci[...] = _scihdu.data
+    else:
+        _insci = _scihdu.data.astype(np.float32)
+    _inimg.close()
+    del _inimg, _scihdu
+
+    _insci.flags.writeable = False
+    return _insci
+
+
+def _blot_chip(img, chip, median, output_wcs, paramDict, versions, wcsmap):
+    """ Blot the median image to a single chip and write the result. """
+    print('    Blot: creating blotted image: ',chip.outputNames['data'])
+
+    #### Check to see what names need to be included here for use in _hdrlist
+    chip.outputNames['driz_version'] = versions['AstroDrizzle']
+    outputvals = chip.outputNames.copy()
+    outputvals.update(img.outputValues)
+    outputvals['blotnx'] = chip.wcs.naxis1
+    outputvals['blotny'] = chip.wcs.naxis2
+    _hdrlist = [outputvals]
+
+    plist = outputvals.copy()
+    plist.update(paramDict)
+
+    with profiling.span('blot chip', image=img._filename,
+                        chip=chip._chip):
+        _outsci = do_blot(median, output_wcs,
+               chip.wcs, chip._exptime, coeffs=paramDict['coeffs'],
+               interp=paramDict['blot_interp'], sinscl=paramDict['blot_sinscl'],
+               wcsmap=wcsmap)
+    # Apply sky subtraction and unit conversion to blotted array to
+    # match un-modified input array
+    if paramDict['blot_addsky']:
+        skyval = chip.computedSky
+    else:
+        skyval = paramDict['blot_skyval']
+    _outsci /= chip._conversionFactor
+    if skyval is not None:
+        _outsci += skyval
+        log.info('Applying sky value of %0.6f to blotted image %s'%
+                    (skyval,chip.outputNames['data']))
+
+    # Write output Numpy objects to a PyFITS file
+    # Blotting only occurs from a drizzled SCI extension
+    # to a blotted SCI extension...
+
+    _outimg = outputimage.OutputImage(_hdrlist, paramDict, build=False, wcs=chip.wcs, blot=True)
+    _outimg.outweight = None
+    _outimg.outcontext = None
+    outimgs = _outimg.writeFITS(plist['data'],_outsci,None,
+                        versions=versions,blend=False,
+                        virtual=img.inmemory)
+
+    img.saveVirtualOutputs(outimgs)
+    #_buildOutputFits(_outsci,None,plist['outblot'])
 
 
 def do_blot(source, source_wcs, blot_wcs, exptime, coeffs = True,
-            interp='poly5', sinscl=1.0, stepsize=10, wcsmap=None):
+            interp='poly5', sinscl=1.0, stepsize=10, wcsmap=None,
+            wcs_tolerance=None):
     """ Core functionality of performing the 'blot' operation to create a single
         blotted image from a single source image.
         All distortion information is assumed to be included in the WCS specification
@@ -356,11 +430,16 @@ def do_blot(source, source_wcs, blot_wcs, exptime, coeffs = True,
         sinscl
             Scale for sinc interpolation kernel (in output, blotted pixels)
         stepsize
-            Number of pixels for WCS interpolation
+            Number of pixels for WCS interpolation, or ``'auto'`` to
+            interpolate adaptively within ``wcs_tolerance``
         wcsmap
             Custom mapping class to use to provide transformation from
             drizzled to blotted WCS.  Default will be to use
             `~drizzlepac.wcs_functions.WCSMap`.
+        wcs_tolerance
+            Maximum error (in pixels) of the WCS interpolation when
+            ``stepsize`` is ``'auto'``. Default will be to use
+            `~drizzlepac.wcs_functions.DEFAULT_WCS_TOLERANCE`.
 
     """
     _outsci = np.zeros(blot_wcs.array_shape, dtype=np.float32)
@@ -389,10 +468,8 @@ def do_blot(source, source_wcs, blot_wcs, exptime, coeffs = True,
         Use default C mapping function.
         """
         print('Using default C-based coordinate transformation...')
-        mapping = cdriz.DefaultWCSMapping(
-            blot_wcs, source_wcs,
-            blot_wcs.pixel_shape[0], blot_wcs.pixel_shape[1],
-            stepsize
+        mapping = wcs_functions.default_wcs_mapping(
+            blot_wcs, source_wcs, stepsize, wcs_tolerance
         )
         pix_ratio = source_wcs.pscale/wcslin.pscale
     else:
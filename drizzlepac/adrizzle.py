@@ -8,12 +8,14 @@ Interfaces to main drizzle functions.
 """
 import os
 import copy
+import json
 import time
 from . import util
 import numpy as np
 from astropy.io import fits
-from stsci.tools import fileutil, logutil, mputil
-from . import outputimage, wcs_functions
+from stsci.tools import fileutil, logutil
+from . import outputimage, profiling, wcs_functions
+from .scheduler import MemoryScheduler
 import stwcs
 from stwcs import distortion
 
@@ -33,6 +35,7 @@ if util.can_parallel:
 __all__ = ['drizzle', 'run', 'drizSeparate', 'drizFinal', 'mergeDQarray',
            'updateInputDQArray', 'buildDrizParamDict', 'interpret_maskval',
            'run_driz', 'run_driz_img', 'run_driz_chip', 'do_driz',
+           'IncrementalDrizzle', 'incremental_state_name',
            'get_data', 'create_output']
 
 
@@ -43,6 +46,11 @@ STEP_NUM_FINAL = 7
 PROCSTEPS_NAME_SINGLE = "Separate Drizzle"
 PROCSTEPS_NAME_FINAL = "Final Drizzle"
 
+# Suffix (replacing '.fits') and version of the accumulation state files
+# of products created by IncrementalDrizzle:
+INCREMENTAL_STATE_SUFFIX = '_drzstate.json'
+INCREMENTAL_STATE_VERSION = 1
+
 log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
 
 time_pre_all = []
@@ -241,7 +249,7 @@ def run(configObj, wcsmap=None):
             wt_scl, wcslin_pscale=wcslin.pscale, uniqid=uniqid,
             pixfrac=configObj['pixfrac'], kernel=configObj['kernel'],
             fillval=scale_pars['fillval'], stepsize=configObj['stepsize'],
-            wcsmap=None)
+            wcsmap=None, wcs_tolerance=configObj['wcs_tolerance'])
 
     out_sci_handle, outextn = create_output(configObj['outdata'], outsci)
     if not output_exists:
@@ -328,7 +336,7 @@ def run(configObj, wcsmap=None):
 # ### Top-level interface from inside MultiDrizzle
 #
 def drizSeparate(imageObjectList, output_wcs, configObj,
-                 logfile=None, wcsmap=None, procSteps=None):
+                 logfile=None, wcsmap=None, procSteps=None, scheduler=None):
     if procSteps is not None:
         procSteps.addStep(PROCSTEPS_NAME_SINGLE)
 
@@ -337,17 +345,7 @@ def drizSeparate(imageObjectList, output_wcs, configObj,
     # This can be called directly from MultiDrizle, so only execute if
     # switch has been turned on (no guarantee MD will check before calling).
     if configObj[single_step]['driz_separate']:
-        paramDict = buildDrizParamDict(configObj)
-        paramDict['crbit'] = None
-        paramDict['proc_unit'] = 'electrons'
-        paramDict['wht_type'] = None
-        # Force 'build' to always be False, so that this step always generates
-        # simple FITS files as output for compatibility with 'createMedian'
-        paramDict['build'] = False
-        # Record whether or not intermediate files should be deleted when finished
-        paramDict['clean'] = configObj['STATE OF INPUT FILES']['clean']
-        paramDict['num_cores'] = configObj.get('num_cores')
-        paramDict['rules_file'] = configObj['rules_file'] if configObj['rules_file'] != "" else None
+        paramDict = buildSeparateParamDict(configObj)
 
         log.info(f"USER INPUT PARAMETERS for {PROCSTEPS_NAME_SINGLE} Step:")
         util.printParams(paramDict, log=log)
@@ -358,7 +356,7 @@ def drizSeparate(imageObjectList, output_wcs, configObj,
         # this is necessary in order for AstroDrizzle to always have build=False
         # for single-drizzle step when called from the top-level.
         run_driz(imageObjectList, output_wcs.single_wcs, paramDict, single=True,
-                 build=False, wcsmap=wcsmap)
+                 build=False, wcsmap=wcsmap, scheduler=scheduler)
     else:
         log.info('Single drizzle step not performed.')
 
@@ -366,8 +364,27 @@ def drizSeparate(imageObjectList, output_wcs, configObj,
         procSteps.endStep(PROCSTEPS_NAME_SINGLE)
 
 
+def buildSeparateParamDict(configObj):
+    """ Build the drizzle parameters used to create separate drizzle products.
+    """
+    paramDict = buildDrizParamDict(configObj)
+    paramDict['crbit'] = None
+    paramDict['proc_unit'] = 'electrons'
+    paramDict['wht_type'] = None
+    # Force 'build' to always be False, so that this step always generates
+    # simple FITS files as output for compatibility with 'createMedian'
+    paramDict['build'] = False
+    # Record whether or not intermediate files should be deleted when finished
+    paramDict['clean'] = configObj['STATE OF INPUT FILES']['clean']
+    paramDict['num_cores'] = configObj.get('num_cores')
+    paramDict['max_memory'] = configObj.get('max_memory')
+    paramDict['rules_file'] = configObj['rules_file'] if configObj['rules_file'] != "" else None
+    return paramDict
+
+
 def drizFinal(imageObjectList, output_wcs, configObj,
-              build=None, wcsmap=None, logfile=None, procSteps=None):
+              build=None, wcsmap=None, logfile=None, procSteps=None,
+              wait_for=None):
 
     if procSteps is not None:
         procSteps.addStep(PROCSTEPS_NAME_FINAL)
@@ -397,7 +414,7 @@ def drizFinal(imageObjectList, output_wcs, configObj,
         util.printParams(paramDict, log=log)
 
         run_driz(imageObjectList, output_wcs.final_wcs, paramDict, single=False,
-                 build=build, wcsmap=wcsmap)
+                 build=build, wcsmap=wcsmap, wait_for=wait_for)
     else:
         log.info('Final drizzle step not performed.')
 
@@ -415,18 +432,19 @@ def mergeDQarray(maskname, dqarr):
             # working with file on disk (default case)
             if os.path.exists(maskname):
                 mask = fileutil.openImage(maskname, memmap=False)
-                maskarr = mask[0].data.astype(bool)
+                maskarr = mask[0].data
                 mask.close()
         else:
             if isinstance(maskname, fits.HDUList):
                 # working with a virtual input file
-                maskarr = maskname[0].data.astype(bool)
+                maskarr = maskname[0].data
             else:
-                maskarr = maskname.data.astype(bool)
+                maskarr = maskname.data
 
         if maskarr is not None:
-            # merge array with dqarr now
-            np.bitwise_and(dqarr, maskarr, dqarr)
+            # merge array with dqarr (of 0s and 1s) now, without
+            # converting the mask to a boolean array first
+            np.logical_and(dqarr, maskarr, out=dqarr, casting='unsafe')
 
 def updateInputDQArray(dqfile, dq_extn, chip, crmaskname, cr_bits_value):
     if not isinstance(crmaskname, fits.HDUList) and not os.path.exists(crmaskname):
@@ -455,6 +473,7 @@ def buildDrizParamDict(configObj, single=True):
 
     # Initialize paramDict with global parameter(s)
     paramDict = {'build': configObj['build'], 'stepsize': configObj['stepsize'],
+                'wcs_tolerance': configObj.get('wcs_tolerance'),
                 'coeffs': configObj['coeffs'], 'wcskey': configObj['wcskey']}
 
     # build appro
@@ -534,7 +553,8 @@ def interpret_maskval(paramDict):
         maskval = float(maskval)  # just to be clear and absolutely sure...
     return maskval
 
-def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None):
+def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None,
+             scheduler=None, wait_for=None):
     """ Perform drizzle operation on input to create output.
     The input parameters originally was a list
     of dictionaries, one for each input, that matches the
@@ -546,6 +566,16 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
     Parameters required for input in paramDict:
         build,single,units,wt_scl,pixfrac,kernel,fillval,
         rot,scale,xsh,ysh,blotnx,blotny,outnx,outny,data
+
+    When separate drizzle products are run in parallel, the number of
+    parallel workers and the rate at which they are started are controlled
+    by ``scheduler`` (a `~drizzlepac.scheduler.MemoryScheduler`, created
+    from ``paramDict['num_cores']`` and ``paramDict['max_memory']`` when
+    not provided) so that the predicted memory usage stays within budget.
+
+    When running serially, ``wait_for`` (if provided) is called with each
+    input image before it gets drizzled. This allows images to be added to
+    the output as soon as their inputs (e.g., cosmic-ray masks) are ready.
     """
     # Insure that input imageObject is a list
     if not isinstance(imageObjectList, list):
@@ -579,7 +609,18 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
     output_wcs.printwcs()
 
     # Will we be running in parallel?
-    pool_size = util.get_pool_size(paramDict.get('num_cores'), len(imageObjectList))
+    if single:
+        if scheduler is None:
+            scheduler = MemoryScheduler(
+                imageObjectList, output_wcs,
+                num_cores=paramDict.get('num_cores'),
+                max_memory=paramDict.get('max_memory')
+            )
+        pool_size = scheduler.pool_size(PROCSTEPS_NAME_SINGLE,
+                                        len(imageObjectList))
+    else:
+        pool_size = util.get_pool_size(paramDict.get('num_cores'),
+                                       len(imageObjectList))
     run_parallel = single and pool_size > 1
     if run_parallel:
         log.info(f'Executing {pool_size:d} parallel workers')
@@ -628,6 +669,10 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
         _outctx = np.zeros((_nplanes,) + output_wcs.array_shape, dtype=np.int32)
         _hdrlist = []
 
+    # Input (converted) arrays are reused for all chips drizzled serially;
+    # parallel workers allocate their own.
+    inbuffers = InputBuffers()
+
     # Keep track of how many chips have been processed
     # For single case, this will determine when to close
     # one product and open the next.
@@ -682,9 +727,12 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
             subprocs.append(p)
         else:
             # serial run_driz_img run (either separate drizzle or final drizzle)
+            if wait_for is not None:
+                wait_for(img)
             run_driz_img(img, chiplist, output_wcs, outwcs, template, paramDict,
                          single, num_in_prod, build, _versions, _numctx, _nplanes,
-                         _chipIdx, _outsci, _outwht, _outctx, _hdrlist, wcsmap)
+                         _chipIdx, _outsci, _outwht, _outctx, _hdrlist, wcsmap,
+                         buffers=inbuffers)
 
         # Increment/reset master chip counter
         _chipIdx += len(chiplist)
@@ -693,9 +741,11 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
 
     # do the join if we spawned tasks
     if run_parallel:
-        mputil.launch_and_wait(subprocs, pool_size)  # blocks till all done
+        scheduler.launch_and_wait(  # blocks till all done
+            subprocs, scheduler.task_memory(PROCSTEPS_NAME_SINGLE), pool_size
+        )
 
-    del _outsci, _outwht, _outctx, _hdrlist
+    del _outsci, _outwht, _outctx, _hdrlist, inbuffers
     # have looped over each img/chip
 
 
@@ -705,13 +755,15 @@ def run_driz(imageObjectList, output_wcs, paramDict, single, build, wcsmap=None)
 
 def run_driz_img(img, chiplist, output_wcs, outwcs, template, paramDict, single,
                  num_in_prod, build, _versions, _numctx, _nplanes, chipIdxCopy,
-                 _outsci, _outwht, _outctx, _hdrlist, wcsmap):
+                 _outsci, _outwht, _outctx, _hdrlist, wcsmap, buffers=None):
     """ Perform the drizzle operation on a single image.
     This is separated out from :py:func:`run_driz` so as to keep together
     the entirety of the code which is inside the loop over
     images.  See the :py:func:`run_driz` code for more documentation.
     """
     maskval = interpret_maskval(paramDict)
+    if buffers is None:
+        buffers = InputBuffers()
 
 
     # Check for unintialized inputs
@@ -739,9 +791,12 @@ def run_driz_img(img, chiplist, output_wcs, outwcs, template, paramDict, single,
 #                 str(doWrite)+', here='+str(here))
 
         # run_driz_chip
-        run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict,
-                      single, doWrite, build, _versions, _numctx, _nplanes,
-                      chipIdxCopy, _outsci, _outwht, _outctx, _hdrlist, wcsmap)
+        with profiling.span('drizzle chip', image=img._filename,
+                            chip=chip._chip):
+            run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict,
+                          single, doWrite, build, _versions, _numctx, _nplanes,
+                          chipIdxCopy, _outsci, _outwht, _outctx, _hdrlist,
+                          wcsmap, buffers=buffers)
 
         # Increment chip counter (also done outside of this function)
         chipIdxCopy += 1
@@ -765,15 +820,21 @@ def run_driz_img(img, chiplist, output_wcs, outwcs, template, paramDict, single,
 
 def run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict, single,
                   doWrite, build, _versions, _numctx, _nplanes, _numchips,
-                  _outsci, _outwht, _outctx, _hdrlist, wcsmap):
+                  _outsci, _outwht, _outctx, _hdrlist, wcsmap, buffers=None):
     """ Perform the drizzle operation on a single chip.
     This is separated out from ``run_driz_img`` so as to keep together
     the entirety of the code which is inside the loop over
     chips.  See the ``run_driz`` code for more documentation.
+
+    The native ``float32`` input science and weight arrays passed to
+    ``tdriz`` are stored in ``buffers`` (an `InputBuffers` instance),
+    which can be reused for successive chips of the same size.
     """
     global time_pre_all, time_driz_all, time_post_all, time_write_all
 
     epoch = time.time()
+    if buffers is None:
+        buffers = InputBuffers()
 
     # Look for sky-subtracted product
     if os.path.exists(chip.outputNames['outSky']):
@@ -788,17 +849,16 @@ def run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict, single,
     _handle = fileutil.openImage(_expname, mode='readonly', memmap=False)
     _sciext = _handle[chip.header['extname'], chip.header['extver']]
 
-    # Apply sky subtraction and unit conversion to input array
+    # Apply sky subtraction and unit conversion to input array while
+    # converting it (including integer RAW data) to native float32.
+    _insci = buffers.get('sci', _sciext.data.shape)
     if chip.computedSky is None:
-        _insci = _sciext.data
+        np.copyto(_insci, _sciext.data, casting='unsafe')
     else:
         log.info("Applying sky value of %0.6f to %s" % (chip.computedSky, _expname))
-        _insci = _sciext.data - chip.computedSky
-    # If input SCI image is still integer format (RAW files)
-    # transform it to float32 for all subsequent operations
-    # needed for numpy >=1.12.x
-    if np.issubdtype(_insci[0, 0], np.int16):
-        _insci = _insci.astype(np.float32)
+        np.subtract(_sciext.data, chip.computedSky, out=_insci, casting='unsafe')
+    _handle.close()
+    del _sciext
 
     _insci *= chip._effGain
 
@@ -895,14 +955,16 @@ def run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict, single,
     # Also, base weight mask on ERR or IVM file as requested by user
     wht_type = paramDict['wht_type']
 
+    _inwht = buffers.get('wht', dqarr.shape)
     if wht_type == 'ERR':
-        _inwht = img.buildERRmask(chip._chip, dqarr, pix_ratio)
+        _inwht = img.buildERRmask(chip._chip, dqarr, pix_ratio, out=_inwht)
     elif wht_type == 'IVM':
-        _inwht = img.buildIVMmask(chip._chip, dqarr, pix_ratio)
+        _inwht = img.buildIVMmask(chip._chip, dqarr, pix_ratio, out=_inwht)
     elif wht_type == 'EXP':
-        _inwht = img.buildEXPmask(chip._chip, dqarr)
+        _inwht = img.buildEXPmask(chip._chip, dqarr, out=_inwht)
     else:  # wht_type == None, used for single drizzle images
-        _inwht = chip._exptime * dqarr.astype(np.float32)
+        np.multiply(dqarr, chip._exptime, out=_inwht, dtype=np.float32,
+                    casting='unsafe')
 
     if not(paramDict['clean']):
         # Write out mask file if 'clean' has been turned off
@@ -913,7 +975,8 @@ def run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict, single,
 
         _outmaskname = chip.outputNames[step_mask]
         if os.path.exists(_outmaskname): os.remove(_outmaskname)
-        pimg = fits.PrimaryHDU(data=_inwht)
+        # in-memory masks must not share the buffer reused by the next chip
+        pimg = fits.PrimaryHDU(data=_inwht.copy() if img.inmemory else _inwht)
         img.saveVirtualOutputs({step_mask: pimg})
         # Only write out mask files if in_memory=False
         if not img.inmemory:
@@ -929,7 +992,7 @@ def run_driz_chip(img, chip, output_wcs, outwcs, template, paramDict, single,
                 wcslin_pscale=chip.wcslin_pscale, uniqid=_uniqid,
                 pixfrac=paramDict['pixfrac'], kernel=paramDict['kernel'],
                 fillval=paramDict['fillval'], stepsize=paramDict['stepsize'],
-                wcsmap=wcsmap)
+                wcsmap=wcsmap, wcs_tolerance=paramDict.get('wcs_tolerance'))
     time_driz = time.time() - epoch
     epoch = time.time()
 
@@ -1034,13 +1097,17 @@ def do_driz(insci, input_wcs, inwht,
             output_wcs, outsci, outwht, outcon,
             expin, in_units, wt_scl,
             wcslin_pscale=1.0, uniqid=1, pixfrac=1.0, kernel='square',
-            fillval="INDEF", stepsize=10, wcsmap=None):
+            fillval="INDEF", stepsize=10, wcsmap=None, wcs_tolerance=None):
     """
     Core routine for performing 'drizzle' operation on a single input image
     All input values will be Python objects such as ndarrays, instead
     of filenames.
     File handling (input and output) will be performed by calling routine.
 
+    A ``stepsize`` of ``'auto'`` interpolates the WCS transformation
+    adaptively with a maximum error of ``wcs_tolerance`` pixels (see
+    `~drizzlepac.wcs_functions.default_wcs_mapping`).
+
     """
     # Insure that the fillval parameter gets properly interpreted for use with tdriz
     if util.is_blank(fillval):
@@ -1079,10 +1146,8 @@ def do_driz(insci, input_wcs, inwht,
     if wcsmap is None and cdriz is not None:
         log.info('Using WCSLIB-based coordinate transformation...')
         log.info('stepsize = %s' % stepsize)
-        mapping = cdriz.DefaultWCSMapping(
-            input_wcs, output_wcs,
-            input_wcs.pixel_shape[0], input_wcs.pixel_shape[1],
-            stepsize
+        mapping = wcs_functions.default_wcs_mapping(
+            input_wcs, output_wcs, stepsize, wcs_tolerance
         )
     else:
         #
@@ -1104,10 +1169,11 @@ def do_driz(insci, input_wcs, inwht,
     # This call to 'cdriz.tdriz' uses the new C syntax
     #
     _dny = insci.shape[0]
-    # Call 'drizzle' to perform image combination
-    if insci.dtype > np.float32:
-        # WARNING: Input array recast as a float32 array
-        insci = insci.astype(np.float32)
+    # Call 'drizzle' to perform image combination. 'tdriz' works on
+    # native float32 arrays: convert inputs (with a single copy) only
+    # when needed, e.g. for FITS (big-endian) or float64 data.
+    insci = _as_native_float32(insci)
+    inwht = _as_native_float32(inwht)
 
     _vers, nmiss, nskip = cdriz.tdriz(insci, inwht, outsci, outwht,
         outctx, uniqid, ystart, 1, 1, _dny,
@@ -1123,6 +1189,194 @@ def do_driz(insci, input_wcs, inwht,
     return _vers
 
 
+class IncrementalDrizzle:
+    """ Append-only drizzling of inputs onto an existing output product.
+
+    The output science, weight and context arrays are accumulated by
+    successive calls to :py:meth:`add` (using :py:func:`do_driz`) and can be
+    saved with :py:meth:`save` together with a JSON sidecar file (named
+    after the product with the suffix ``INCREMENTAL_STATE_SUFFIX``) holding
+    the accumulation state: drizzle parameters and the list of inputs
+    added so far. A saved product can be re-opened with :py:meth:`load` to
+    add new inputs (for instance, new exposures of a sky cell) without
+    drizzling the previous inputs again.
+
+    Since drizzle computes the output as a running weighted mean, adding
+    inputs to a re-opened product gives the same result as drizzling all
+    inputs (in the same order) in a single pass.
+
+    Parameters
+    ----------
+    output_wcs : `~stwcs.wcsutil.HSTWCS`
+        WCS of the output product.
+
+    kernel, pixfrac, fillval, stepsize, wcs_tolerance
+        Drizzle parameters (see :py:func:`do_driz`). ``fillval`` is only
+        applied to the science array written by :py:meth:`save`.
+
+    """
+    def __init__(self, output_wcs, kernel='square', pixfrac=1.0,
+                 fillval='INDEF', stepsize=10, wcs_tolerance=None):
+        self.output_wcs = output_wcs
+        self.kernel = kernel
+        self.pixfrac = pixfrac
+        self.fillval = fillval
+        self.stepsize = stepsize
+        self.wcs_tolerance = wcs_tolerance
+        self.inputs = []
+
+        shape = output_wcs.array_shape
+        self.outsci = np.zeros(shape, dtype=np.float32)
+        self.outwht = np.zeros(shape, dtype=np.float32)
+        self.outctx = np.zeros((1,) + tuple(shape), dtype=np.int32)
+
+    @property
+    def nimages(self):
+        """ Number of inputs drizzled so far. """
+        return len(self.inputs)
+
+    def _state(self):
+        return {
+            'state_version': INCREMENTAL_STATE_VERSION,
+            'drizzlepac_version': __version__,
+            'kernel': self.kernel,
+            'pixfrac': self.pixfrac,
+            'fillval': self.fillval,
+            'stepsize': self.stepsize,
+            'wcs_tolerance': self.wcs_tolerance,
+            'inputs': self.inputs,
+        }
+
+    def add(self, insci, input_wcs, inwht, expin=1.0, in_units='cps',
+            wt_scl=1.0, wcslin_pscale=1.0, name=None, wcsmap=None):
+        """ Drizzle one more input onto the output arrays.
+
+        The parameters are those of :py:func:`do_driz`. ``name`` identifies
+        the input in the accumulation state.
+        """
+        uniqid = self.nimages + 1
+        planeid = (uniqid - 1) // 32
+        if planeid >= self.outctx.shape[0]:
+            # start a new context plane
+            newplane = np.zeros((1,) + self.outctx.shape[1:], dtype=np.int32)
+            self.outctx = np.concatenate([self.outctx, newplane])
+
+        # Fill values would be taken as data by subsequent additions: only
+        # apply them to the saved product.
+        vers = do_driz(insci, input_wcs, inwht, self.output_wcs,
+                       self.outsci, self.outwht, self.outctx,
+                       expin, in_units, wt_scl, wcslin_pscale=wcslin_pscale,
+                       uniqid=uniqid, pixfrac=self.pixfrac,
+                       kernel=self.kernel, fillval='INDEF',
+                       stepsize=self.stepsize, wcsmap=wcsmap,
+                       wcs_tolerance=self.wcs_tolerance)
+        self.inputs.append(name if name is not None else f'input{uniqid:d}')
+        return vers
+
+    def save(self, filename, overwrite=True):
+        """ Write the product (SCI, WHT and CTX extensions) and its
+        accumulation state.
+        """
+        outsci = self.outsci
+        if not util.is_blank(self.fillval):
+            outsci = outsci.copy()
+            outsci[self.outwht == 0] = float(self.fillval)
+
+        header = self.output_wcs.to_header(relax=True)
+        outctx = self.outctx[0] if self.outctx.shape[0] == 1 else self.outctx
+        phdu = fits.PrimaryHDU()
+        phdu.header['NDRIZIM'] = (self.nimages, 'Drizzle, No. images drizzled onto output')
+        phdu.header['D001KERN'] = (self.kernel, 'Drizzle, form of weight distribution kernel')
+        phdu.header['D001PIXF'] = (self.pixfrac, 'Drizzle, linear size of drop')
+        hdulist = fits.HDUList([
+            phdu,
+            fits.ImageHDU(outsci, header=header, name='SCI', ver=1),
+            fits.ImageHDU(self.outwht, header=header, name='WHT', ver=1),
+            fits.ImageHDU(outctx, header=header, name='CTX', ver=1),
+        ])
+        hdulist.writeto(filename, overwrite=overwrite)
+
+        state_name = incremental_state_name(filename)
+        with open(state_name + '.tmp', 'w') as f:
+            json.dump(self._state(), f, indent=1)
+        os.replace(state_name + '.tmp', state_name)
+        log.info(f"Wrote incremental drizzle product '{filename}' with "
+                 f"{self.nimages:d} input(s).")
+
+    @classmethod
+    def load(cls, filename):
+        """ Re-open a product written by :py:meth:`save` to add inputs.
+
+        Raises
+        ------
+        ValueError
+            When the accumulation state of the product cannot be found or
+            was written by an incompatible version.
+        """
+        state_name = incremental_state_name(filename)
+        if not os.path.isfile(state_name):
+            raise ValueError(f"No incremental drizzle state '{state_name}' "
+                             f"found for product '{filename}'.")
+        with open(state_name) as f:
+            state = json.load(f)
+        if state.get('state_version') != INCREMENTAL_STATE_VERSION:
+            raise ValueError(f"Unsupported incremental drizzle state in "
+                             f"'{state_name}'.")
+
+        with fits.open(filename, memmap=False) as hdulist:
+            output_wcs = stwcs.wcsutil.HSTWCS(hdulist, ext=('SCI', 1))
+            outsci = hdulist['SCI', 1].data.astype(np.float32)
+            outwht = hdulist['WHT', 1].data.astype(np.float32)
+            outctx = hdulist['CTX', 1].data.astype(np.int32)
+
+        driz = cls(output_wcs, kernel=state['kernel'],
+                   pixfrac=state['pixfrac'], fillval=state['fillval'],
+                   stepsize=state['stepsize'],
+                   wcs_tolerance=state['wcs_tolerance'])
+        # undo the fill values applied when saving
+        outsci[outwht == 0] = 0.0
+        driz.outsci = outsci
+        driz.outwht = outwht
+        driz.outctx = outctx.reshape((-1,) + outsci.shape)
+        driz.inputs = list(state['inputs'])
+        return driz
+
+
+def incremental_state_name(filename):
+    """ Name of the accumulation state file of an incremental product. """
+    root = filename[:-len('.fits')] if filename.endswith('.fits') else filename
+    return root + INCREMENTAL_STATE_SUFFIX
+
+
+class InputBuffers:
+    """ Native ``float32`` arrays reused for the inputs of successive chips.
+
+    Converting each input chip (and its weight mask) from the FITS data type
+    and byte order into a preallocated array avoids allocating new arrays
+    for every chip processed by a (worker) process.
+
+    """
+    def __init__(self):
+        self._arrays = {}
+
+    def get(self, name, shape):
+        """ Return the (uninitialized) buffer ``name`` with the given shape.
+        """
+        shape = tuple(shape)
+        arr = self._arrays.get(name)
+        if arr is None or arr.shape != shape:
+            arr = np.empty(shape, dtype=np.float32)
+            self._arrays[name] = arr
+        return arr
+
+
+def _as_native_float32(arr):
+    """ Return ``arr`` as a C-contiguous native float32 array, without copying
+    it if it already is one.
+    """
+    return np.ascontiguousarray(arr, dtype=np.float32)
+
+
 def get_data(filename):
     fileroot, extn = fileutil.parseFilename(filename)
     extname = fileutil.parseExtn(extn)
@@ -7,6 +7,7 @@ import datetime
 import sys
 import glob
 import math
+import multiprocessing
 import os
 import pickle
 from collections import OrderedDict
@@ -23,6 +24,7 @@ from .haputils import astroquery_utils as aqutils
 from .haputils import get_git_rev_info
 from .haputils import align_utils
 from .haputils import config_utils
+from . import util
 from . import __version__
 
 __taskname__ = "align"
@@ -228,6 +230,9 @@ def perform_align(
     headerlet_filenames=None,
     fit_label=None,
     product_type=None,
+    catalog_cache=None,
+    num_cores=1,
+    cancel_fits=True,
     **alignment_pars,
 ):
     """Actual Main calling function.
@@ -290,6 +295,24 @@ def perform_align(
         inserted between the ``-FIT`` and the catalog name in the ``WCSNAME` keyword value; for example,
         ``fit_label="User"`` will result in fits to GAIAedr3 with names ending in ``-FIT_User_GAIAedr3``.
 
+    catalog_cache : str, optional
+        Name of a directory in which the sources found in each chip of the input images are cached
+        (see `~drizzlepac.catalogcache.CatalogCache`).  Repeated alignments of the same images with the
+        same source finding parameters then re-use the cached catalogs instead of extracting the sources
+        again.  If None (default), no cache is used.
+
+    num_cores : int, None, optional
+        Number of processes used to compute the fits of the input images to each combination of
+        reference catalog and fitting method concurrently.  If None, use all available CPUs.  The
+        default of 1 computes each fit only when it is reached in the priority order of catalogs and
+        fitting methods.  The selected fit does not depend on ``num_cores``.
+
+    cancel_fits : bool, optional
+        When fits are computed concurrently, cancel all remaining fits as soon as the selected fit
+        has been identified (for instance, once a valid fit with an RMS below ``MAX_FIT_RMS`` has
+        been found).  If False, all fits are completed and stored in the ``fit_dict`` of the
+        returned alignment table.
+
     alignment_pars : dictionary or keyword args
         keyword-arg parameters containing user-specified values for the parameters used in source
         identification and alignment which should replace the default values found in the JSON parameter
@@ -348,6 +371,7 @@ def perform_align(
 
     # Initialize key variables
     filtered_table = None
+    fit_grid = None
 
     # 1: Interpret input data and optional parameters
     log.info("{} STEP 1: Get data {}".format("-" * 20, "-" * 66))
@@ -420,14 +444,16 @@ def perform_align(
                     )
                 )
             else:
-                alignment_table.find_alignment_sources(output=True)
+                alignment_table.find_alignment_sources(output=True,
+                                                       catalog_cache=catalog_cache)
 
                 pickle_out = open(pickle_filename, "wb")
                 pickle.dump(alignment_table.extracted_sources, pickle_out)
                 pickle_out.close()
                 log.info("Wrote {}".format(pickle_filename))
         else:
-            alignment_table.find_alignment_sources(output=output)
+            alignment_table.find_alignment_sources(output=output,
+                                                   catalog_cache=catalog_cache)
 
         for imgname in alignment_table.extracted_sources.keys():
             table = alignment_table.extracted_sources[imgname]
@@ -498,6 +524,28 @@ def perform_align(
         best_num_matches = -1
         best_fit_label = [None, None]
         fit_info_dict = OrderedDict()
+
+        # Fits are evaluated in the order of this grid.  When they are computed
+        # concurrently, all reference catalogs have to be retrieved beforehand.
+        grid = [
+            (catalog_name, algorithm_name)
+            for algorithm_name in fit_algorithm_list
+            for catalog_name in catalog_list
+        ]
+        pool_size = util.get_pool_size(num_cores, len(grid))
+        if pool_size > 1:
+            for catalog_name in catalog_list:
+                _get_reference_catalog(
+                    alignment_table, catalog_name, process_list, output
+                )
+            grid = [
+                (catalog_name, algorithm_name)
+                for catalog_name, algorithm_name in grid
+                if len(alignment_table.reference_catalogs[catalog_name])
+                >= apars["determine_fit_quality"]["MIN_CATALOG_THRESHOLD"]
+            ]
+        fit_grid = _FitGrid(alignment_table, grid, num_cores=pool_size)
+
         for algorithm_name in fit_algorithm_list:  # loop over fit algorithm type
             log.info("Applying {} fit method".format(algorithm_name))
             for catalog_index, catalog_name in enumerate(
@@ -509,26 +557,9 @@ def perform_align(
                     )
                 )
                 log.info("Astrometric Catalog: {}".format(catalog_name))
-                # store reference catalogs in a dictionary so that generate_astrometric_catalog() doesn't
-                #  execute unnecessarily after it's been run once for a given astrometric catalog.
-                if catalog_name in alignment_table.reference_catalogs:
-                    log.info(
-                        "Using {} reference catalog from earlier this run.".format(
-                            catalog_name
-                        )
-                    )
-                    reference_catalog = alignment_table.reference_catalogs[catalog_name]
-                else:
-                    log.info(
-                        "Generating new reference catalog for {};"
-                        " Storing it for potential re-use later this run.".format(
-                            catalog_name
-                        )
-                    )
-                    reference_catalog = generate_astrometric_catalog(
-                        process_list, catalog=catalog_name, output=output
-                    )
-                    alignment_table.reference_catalogs[catalog_name] = reference_catalog
+                reference_catalog = _get_reference_catalog(
+                    alignment_table, catalog_name, process_list, output
+                )
                 log.info(make_label("Processing time of [STEP 5]", starting_dt))
                 starting_dt = datetime.datetime.now()
 
@@ -565,19 +596,8 @@ def perform_align(
                         )
                     )
                     try:
-                        alignment_table.configure_fit()
-                        log.debug(
-                            "####\n# Running configure fit for AlignmentTable to use: \n"
-                        )
-                        log.debug([img.wcs for img in alignment_table.imglist])
-                        log.debug("####\n")
-
-                        # restore group IDs to their pristine state prior to each run.
-                        alignment_table.reset_group_id(len(reference_catalog))
-
-                        # execute the correct fitting/matching algorithm
-                        alignment_table.imglist = alignment_table.perform_fit(
-                            algorithm_name, catalog_name, reference_catalog
+                        alignment_table.imglist = fit_grid.result(
+                            catalog_name, algorithm_name
                         )
 
                         # determine the quality of the fit
@@ -676,6 +696,7 @@ def perform_align(
                 best_fit_qual in [2, 3, 4] and "relative" in algorithm_name
             ):
                 break
+        fit_grid.finish(cancel=cancel_fits)
         log.info("best_fit found to be: {}".format(best_fit_label))
         log.info("FIT_DICT: {}".format(alignment_table.fit_dict.keys()))
         # Reset imglist to point to best solution...
@@ -766,6 +787,8 @@ def perform_align(
     finally:
         # Always make sure that all file handles are closed
         alignment_table.close()
+        if fit_grid is not None:
+            fit_grid.finish()
 
         # Now update the result with the filtered_table contents
         if result:
@@ -780,6 +803,124 @@ def perform_align(
 # ----------------------------------------------------------------------------------------------------------
 
 
+def _get_reference_catalog(alignment_table, catalog_name, process_list, output):
+    """Return the reference catalog ``catalog_name`` for the images being aligned"""
+    # store reference catalogs in a dictionary so that generate_astrometric_catalog() doesn't
+    #  execute unnecessarily after it's been run once for a given astrometric catalog.
+    if catalog_name in alignment_table.reference_catalogs:
+        log.info(
+            "Using {} reference catalog from earlier this run.".format(catalog_name)
+        )
+    else:
+        log.info(
+            "Generating new reference catalog for {};"
+            " Storing it for potential re-use later this run.".format(catalog_name)
+        )
+        alignment_table.reference_catalogs[catalog_name] = generate_astrometric_catalog(
+            process_list, catalog=catalog_name, output=output
+        )
+    return alignment_table.reference_catalogs[catalog_name]
+
+
+def _fit_grid_cell(catalog_name, algorithm_name, alignment_table=None):
+    """Fit the images of ``alignment_table`` to a reference catalog with one fitting method
+
+    Returns the fitted images and the copy of them stored in the ``fit_dict`` of the table.
+    """
+    if alignment_table is None:
+        # Running in a worker process forked by _FitGrid
+        alignment_table = _FitGrid.forked_table
+    reference_catalog = alignment_table.reference_catalogs[catalog_name]
+
+    alignment_table.configure_fit()
+    log.debug("####\n# Running configure fit for AlignmentTable to use: \n")
+    log.debug([img.wcs for img in alignment_table.imglist])
+    log.debug("####\n")
+
+    # restore group IDs to their pristine state prior to each run.
+    alignment_table.reset_group_id(len(reference_catalog))
+
+    # execute the correct fitting/matching algorithm
+    imglist = alignment_table.perform_fit(
+        algorithm_name, catalog_name, reference_catalog
+    )
+    return imglist, alignment_table.fit_dict[(catalog_name, algorithm_name)]
+
+
+class _FitGrid:
+    """Fits of the images of an ``AlignmentTable`` to a grid of (catalog_name, algorithm_name)
+
+    With ``num_cores`` > 1, all fits of the ``grid`` are started in a pool of worker processes
+    when the grid is created, and their results are collected in whatever order ``perform_align``
+    evaluates them.  Otherwise, each fit is only computed when its result is requested.
+    The reference catalogs of the grid must be stored in the ``reference_catalogs`` of the table.
+    """
+
+    # Alignment table inherited by the worker processes when they are forked
+    forked_table = None
+
+    def __init__(self, alignment_table, grid, num_cores=1):
+        self.alignment_table = alignment_table
+        self._pool = None
+        self._pending = {}
+        if num_cores > 1 and len(grid) > 1:
+            log.info(
+                "Computing {} fits using {} processes".format(len(grid), num_cores)
+            )
+            _FitGrid.forked_table = alignment_table
+            try:
+                self._pool = multiprocessing.get_context("fork").Pool(num_cores)
+            finally:
+                _FitGrid.forked_table = None
+            for cell in grid:
+                self._pending[cell] = self._pool.apply_async(_fit_grid_cell, cell)
+            self._pool.close()
+
+    def result(self, catalog_name, algorithm_name):
+        """Return the images fit to ``catalog_name`` with ``algorithm_name``
+
+        Exceptions raised by the fit are raised here.
+        """
+        pending = self._pending.pop((catalog_name, algorithm_name), None)
+        if pending is None:
+            imglist, fit = _fit_grid_cell(
+                catalog_name, algorithm_name, self.alignment_table
+            )
+        else:
+            imglist, fit = pending.get()
+            self.alignment_table.fit_dict[(catalog_name, algorithm_name)] = fit
+        return imglist
+
+    def finish(self, cancel=True):
+        """Cancel the fits whose result has not been requested or, if ``cancel`` is False,
+        wait for them and store them in the ``fit_dict`` of the alignment table.
+        """
+        if self._pool is None:
+            return
+        if cancel:
+            if self._pending:
+                log.info("Cancelling {} remaining fits".format(len(self._pending)))
+            self._pool.terminate()
+        else:
+            for (catalog_name, algorithm_name), pending in self._pending.items():
+                try:
+                    fit = pending.get()[1]
+                except Exception as e:
+                    log.warning(
+                        "Fit to catalog {} with matching algorithm {} failed: {}".format(
+                            catalog_name, algorithm_name, e
+                        )
+                    )
+                    continue
+                self.alignment_table.fit_dict[(catalog_name, algorithm_name)] = fit
+        self._pool.join()
+        self._pool = None
+        self._pending = {}
+
+
+# ----------------------------------------------------------------------------------------------------------
+
+
 def make_label(label, starting_dt):
     """Create a time-stamped label for use in log messages"""
     current_dt = datetime.datetime.now()
@@ -32,7 +32,10 @@ aspects of each of the processing steps.
 """
 import os
 import sys
+import queue
 import logging
+import traceback
+import multiprocessing
 
 from stsci.tools import teal, logutil, textutil
 
@@ -40,9 +43,13 @@ from . import adrizzle
 from . import ablot
 from . import createMedian
 from . import drizCR
+from . import imageObject
 from . import processInput
+from . import profiling
+from . import scheduler
 from . import sky
 from . import staticMask
+from . import stepcache
 from . import util
 from . import wcs_functions
 from . import __version__
@@ -178,6 +185,15 @@ def run(configobj, wcsmap=None, input_dict=None):
     log.debug('')
     util.print_cfg(configobj, log.debug)
 
+    # Record resource usage of each step when requested (or when run as
+    # part of a profiled pipeline)
+    procSteps.profiler = profiling.open_session(
+        configobj.get('profile_output')
+    )
+    if procSteps.profiler is not None:
+        procSteps.profiler.begin_run(configobj['output'] or
+                                     str(configobj['input']))
+
     try:
         # Define list of imageObject instances and output WCSObject instance
         # based on input paramters
@@ -268,35 +284,81 @@ def run(configobj, wcsmap=None, input_dict=None):
                 do_median = False
                 skip_median = True
 
+        # Plan the number of parallel workers for each step within the
+        # memory budget and measure the peak memory usage of each step
+        procSteps.scheduler = scheduler.MemoryScheduler.from_config(
+            imgObjList, outwcs, configobj
+        )
+
+        # Set up re-use of products of previous runs, if requested
+        step_cache = None
+        if configobj.get('step_cache', False):
+            if imgObjList[0].inmemory or clean:
+                log.warning("Step caching is not available when 'in_memory' "
+                            "or 'clean' are turned on.")
+            else:
+                step_cache = stepcache.StepCache(imgObjList, outwcs, configobj)
+
+        def _restore(step_name):
+            return (step_cache is not None and
+                    step_cache.restore(step_name, procSteps=procSteps))
+
+        def _record(step_name):
+            if step_cache is not None:
+                step_cache.record(step_name, procSteps=procSteps)
+
         # Call rest of MD steps...
         # create static masks for each image
-        staticMask.createStaticMask(imgObjList, configobj,
-                                    procSteps=procSteps)
+        if not _restore(staticMask.PROCSTEPS_NAME):
+            staticMask.createStaticMask(imgObjList, configobj,
+                                        procSteps=procSteps)
+            _record(staticMask.PROCSTEPS_NAME)
+
+        # When requested, process each image through the sky subtraction and
+        # separate drizzle steps (and, once the median image is available,
+        # through the blot, cosmic-ray identification and final drizzle
+        # steps) independently of the other images, instead of waiting for
+        # each step to finish for all images before starting the next one.
+        stream = (configobj.get('stream_steps', False) and do_single and
+                  _can_stream(imgObjList, configobj, step_cache))
+
+        if stream:
+            # subtract the sky and drizzle to separate images
+            _stream_separate(imgObjList, outwcs, configobj, wcsmap, logfile,
+                             procSteps)
 
-        # subtract the sky
-        sky.subtractSky(imgObjList, configobj, procSteps=procSteps)
+        else:
+            # subtract the sky
+            if not _restore(sky.PROCSTEPS_NAME):
+                sky.subtractSky(imgObjList, configobj, procSteps=procSteps)
+                _record(sky.PROCSTEPS_NAME)
 
-        #       _dbg_dump_virtual_outputs(imgObjList)
+            #       _dbg_dump_virtual_outputs(imgObjList)
 
-        # drizzle to separate images
-        adrizzle.drizSeparate(imgObjList, outwcs, configobj, wcsmap=wcsmap,
-                              logfile=logfile,
-                              procSteps=procSteps)
+            # drizzle to separate images
+            if not _restore(adrizzle.PROCSTEPS_NAME_SINGLE):
+                adrizzle.drizSeparate(imgObjList, outwcs, configobj,
+                                      wcsmap=wcsmap, logfile=logfile,
+                                      procSteps=procSteps,
+                                      scheduler=procSteps.scheduler)
+                _record(adrizzle.PROCSTEPS_NAME_SINGLE)
 
         #       _dbg_dump_virtual_outputs(imgObjList)
 
         # create the median images from the driz sep images
         try:
-            createMedian.createMedian(
-                imgObjList,
-                configobj,
-                procSteps=procSteps
-            )
+            if not _restore(createMedian.PROCSTEPS_NAME):
+                createMedian.createMedian(
+                    imgObjList,
+                    configobj,
+                    procSteps=procSteps
+                )
 
-            if skip_median:
-                procSteps.endStep(createMedian.PROCSTEPS_NAME, reason="skipped")
-            elif not do_median:
-                procSteps.endStep(createMedian.PROCSTEPS_NAME, reason="off")
+                if skip_median:
+                    procSteps.endStep(createMedian.PROCSTEPS_NAME, reason="skipped")
+                elif not do_median:
+                    procSteps.endStep(createMedian.PROCSTEPS_NAME, reason="off")
+                _record(createMedian.PROCSTEPS_NAME)
 
         except util.StepAbortedError as e:
             if str(e).startswith("Rejecting all pixels"):
@@ -326,25 +388,37 @@ def run(configobj, wcsmap=None, input_dict=None):
             else:
                 raise e
 
-        # blot the images back to the original reference frame
-        ablot.runBlot(imgObjList, outwcs, configobj, wcsmap=wcsmap,
-                      procSteps=procSteps)
-        if skip_blot:
-            procSteps.endStep(ablot.PROCSTEPS_NAME, reason="skipped")
-        elif not do_blot:
-            procSteps.endStep(ablot.PROCSTEPS_NAME, reason="off")
-
-        # look for cosmic rays
-        drizCR.rundrizCR(imgObjList, configobj, procSteps=procSteps)
-        if skip_crrej:
-            procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="skipped")
-        elif not do_crrej:
-            procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="off")
-
-        # Make your final drizzled image
-        adrizzle.drizFinal(imgObjList, outwcs, configobj, wcsmap=wcsmap,
-                           logfile=logfile,
-                           procSteps=procSteps)
+        if stream and do_blot and do_crrej:
+            # blot, look for cosmic rays and make the final drizzled image
+            _stream_final(imgObjList, outwcs, configobj, wcsmap, logfile,
+                          procSteps)
+
+        else:
+            # blot the images back to the original reference frame
+            if not _restore(ablot.PROCSTEPS_NAME):
+                ablot.runBlot(imgObjList, outwcs, configobj, wcsmap=wcsmap,
+                              procSteps=procSteps,
+                              scheduler=procSteps.scheduler)
+                if skip_blot:
+                    procSteps.endStep(ablot.PROCSTEPS_NAME, reason="skipped")
+                elif not do_blot:
+                    procSteps.endStep(ablot.PROCSTEPS_NAME, reason="off")
+                _record(ablot.PROCSTEPS_NAME)
+
+            # look for cosmic rays
+            if not _restore(drizCR.PROCSTEPS_NAME):
+                drizCR.rundrizCR(imgObjList, configobj, procSteps=procSteps,
+                                 scheduler=procSteps.scheduler)
+                if skip_crrej:
+                    procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="skipped")
+                elif not do_crrej:
+                    procSteps.endStep(drizCR.PROCSTEPS_NAME, reason="off")
+                _record(drizCR.PROCSTEPS_NAME)
+
+            # Make your final drizzled image
+            adrizzle.drizFinal(imgObjList, outwcs, configobj, wcsmap=wcsmap,
+                               logfile=logfile,
+                               procSteps=procSteps)
 
         print("\nAstroDrizzle Version {:s} is finished processing at {:s}.\n\n"
               .format(__version__, util._ptime()[0]))
@@ -360,6 +434,9 @@ def run(configobj, wcsmap=None, input_dict=None):
 
     finally:
         procSteps.reportTimes()
+        if procSteps.scheduler is not None:
+            procSteps.scheduler.report(order=procSteps.order)
+        profiling.close_session(procSteps.profiler)
         if imgObjList:
             for image in imgObjList:
                 if clean:
@@ -367,6 +444,189 @@ def run(configobj, wcsmap=None, input_dict=None):
                 image.close()
             del imgObjList
             del outwcs
+        # release the flat fields cached by the final drizzle
+        imageObject._clear_caches()
+
+
+class _ImageTaskRunner:
+    """ Dependency-driven execution of per-image tasks in worker processes.
+
+    ``func(img, *args)`` is run for each input image in a forked worker
+    process as soon as a worker is free and the memory budget of the
+    scheduler allows it. The main process can consume the results of
+    each image (in any order) as soon as they are ready with
+    :py:meth:`wait`, while tasks for other images are still running.
+    ``func`` returns a dictionary of chip attributes (keyed by chip number)
+    to be updated in the main process image object.
+
+    Worker processes are started from the main thread (some libraries keep
+    thread-local state set up at import time) whenever the main process
+    waits for a result.
+
+    """
+    def __init__(self, name, images, func, args, sched, step_name,
+                 task_memory):
+        self.name = name
+        self._images = images
+        self._results = {}
+
+        pool_size = sched.pool_size(step_name, len(images),
+                                    task_memory=task_memory)
+        log.info(f"Executing {pool_size:d} parallel workers for "
+                 f"'{step_name}'")
+
+        mp_ctx = multiprocessing.get_context('fork')
+        self._queue = mp_ctx.Queue()
+        procs = [
+            mp_ctx.Process(target=self._run_task, name=name,
+                           args=(k, img, func, args))
+            for k, img in enumerate(images)
+        ]
+        self._launcher = sched.launch(procs, task_memory, pool_size)
+        self._launcher.poll()
+
+    def _run_task(self, index, img, func, args):
+        try:
+            state = func(img, *args)
+        except BaseException:
+            self._queue.put((index, None, traceback.format_exc()))
+            raise
+        self._queue.put((index, state, None))
+
+    def _get_result(self, timeout):
+        try:
+            index, state, error = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        if error is not None:
+            log.error(error)
+            raise RuntimeError(f"Problem during: {self.name} of "
+                               f"{self._images[index]._filename}")
+        self._results[index] = state
+        return True
+
+    def wait(self, img):
+        """ Wait for the task of an image and update the image object. """
+        index = self._images.index(img)
+        while index not in self._results:
+            done = self._launcher.poll()
+            if not self._get_result(timeout=0.05) and done:
+                # All workers finished: collect any results still in transit
+                if self._get_result(timeout=1.0):
+                    continue
+                self._launcher.join()  # raises on bad exit codes
+                raise RuntimeError(f"Problem during: {self.name}, no result "
+                                   f"for {img._filename}")
+
+        state = self._results[index]
+        for chip in img.returnAllChips(extname=img.scienceExt):
+            for attr, value in state.get(chip._chip, {}).items():
+                setattr(chip, attr, value)
+
+    def wait_all(self):
+        """ Wait for the tasks of all images. """
+        for img in self._images:
+            self.wait(img)
+        self._launcher.join()
+
+
+def _can_stream(imgObjList, configobj, step_cache):
+    """ Whether the streaming per-image executor can be used for this run. """
+    if (step_cache is not None or imgObjList[0].inmemory or
+            len(imgObjList) < 2 or
+            util.get_pool_size(configobj.get('num_cores'), len(imgObjList)) < 2):
+        return False
+
+    # Sky values must be computable independently for each image:
+    sky_pars = configobj[util.getSectionName(configobj, sky.STEP_NUM)]
+    if not util.is_blank(sky_pars.get('skyfile')):
+        return False
+    if util.getConfigObjPar(configobj, 'skysub'):
+        return sky_pars['skymethod'] == 'localmin'
+    return not str(sky_pars.get('skyuser', '')).strip().startswith('@')
+
+
+def _sky_separate_task(img, configobj, single_wcs, paramDict, wcsmap):
+    sky.subtractSky([img], configobj)
+    adrizzle.run_driz([img], single_wcs, paramDict, single=True, build=False,
+                      wcsmap=wcsmap)
+    return {
+        chip._chip: {'subtractedSky': chip.subtractedSky,
+                     'computedSky': chip.computedSky}
+        for chip in img.returnAllChips(extname=img.scienceExt)
+    }
+
+
+def _blot_cr_task(img, single_wcs, blot_pars, cr_pars, wcsmap):
+    ablot.run_blot([img], single_wcs, blot_pars, wcsmap=wcsmap)
+    drizCR._profiled_driz_cr(img, img.virtualOutputs, cr_pars)
+    return {}
+
+
+def _stream_separate(imgObjList, outwcs, configobj, wcsmap, logfile, procSteps):
+    """ Subtract the sky and drizzle each image as soon as a worker is free.
+    """
+    # The sky subtraction is timed together with the separate drizzle step
+    log.info(f"Running '{sky.PROCSTEPS_NAME}' step for each image together "
+             f"with '{adrizzle.PROCSTEPS_NAME_SINGLE}' step.")
+    procSteps.addStep(adrizzle.PROCSTEPS_NAME_SINGLE)
+    sky_pars = configobj[util.getSectionName(configobj, sky.STEP_NUM)]
+    log.info('USER INPUT PARAMETERS for Sky Subtraction Step:')
+    util.printParams(sky_pars, log=log)
+
+    paramDict = adrizzle.buildSeparateParamDict(configobj)
+    log.info(f"USER INPUT PARAMETERS for {adrizzle.PROCSTEPS_NAME_SINGLE} "
+             "Step:")
+    util.printParams(paramDict, log=log)
+    paramDict['logfile'] = logfile
+    paramDict['num_cores'] = 1
+
+    sched = procSteps.scheduler
+    runner = _ImageTaskRunner(
+        'astrodrizzle._sky_separate_task()', imgObjList, _sky_separate_task,
+        (configobj, outwcs.single_wcs, paramDict, wcsmap),
+        sched, adrizzle.PROCSTEPS_NAME_SINGLE,
+        sched.task_memory(adrizzle.PROCSTEPS_NAME_SINGLE)
+    )
+    runner.wait_all()
+    procSteps.endStep(adrizzle.PROCSTEPS_NAME_SINGLE)
+
+
+def _stream_final(imgObjList, outwcs, configobj, wcsmap, logfile, procSteps):
+    """ Blot and identify cosmic rays in each image in worker processes,
+    adding each image to the final drizzle product as soon as its
+    cosmic-ray mask is ready.
+    """
+    # The blot and cosmic-ray identification steps are timed together with
+    # the final drizzle step
+    log.info(f"Running '{ablot.PROCSTEPS_NAME}' and '{drizCR.PROCSTEPS_NAME}' "
+             f"steps for each image together with "
+             f"'{adrizzle.PROCSTEPS_NAME_FINAL}' step.")
+    procSteps.addStep(adrizzle.PROCSTEPS_NAME_FINAL)
+    blot_pars = ablot.buildBlotParamDict(configobj)
+    log.info(f"USER INPUT PARAMETERS for {ablot.PROCSTEPS_NAME} Step:")
+    util.printParams(blot_pars, log=log)
+    blot_pars['num_cores'] = 1
+
+    cr_pars = drizCR.buildDrizCRParamDict(configobj)
+    log.info(f"USER INPUT PARAMETERS for {drizCR.PROCSTEPS_NAME} Step:")
+    util.printParams(cr_pars, log=log)
+
+    sched = procSteps.scheduler
+    blot_mem = sched.task_memory(ablot.PROCSTEPS_NAME)[0]
+    task_memory = [max(blot_mem, m)
+                   for m in sched.task_memory(drizCR.PROCSTEPS_NAME)]
+    runner = _ImageTaskRunner(
+        'astrodrizzle._blot_cr_task()', imgObjList, _blot_cr_task,
+        (outwcs.single_wcs, blot_pars, cr_pars.dict(), wcsmap),
+        sched, adrizzle.PROCSTEPS_NAME_FINAL, task_memory
+    )
+    # Images are added to the final product in input order (so that the
+    # result does not depend on the order in which workers finish):
+    adrizzle.drizFinal(imgObjList, outwcs, configobj, wcsmap=wcsmap,
+                       logfile=logfile, wait_for=runner.wait)
+    runner.wait_all()
+    procSteps.endStep(adrizzle.PROCSTEPS_NAME_FINAL)
 
 
 AstroDrizzle.__doc__ = util._def_help_functions(
@@ -0,0 +1,178 @@
+"""
+On-disk cache of source catalogs found in images.
+
+Source finding is often the most expensive part of aligning images with
+``TweakReg`` or with the HAP alignment code
+(:py:func:`drizzlepac.align.perform_align`). When the alignment of the same
+images is repeated with a different fit geometry or reference catalog, the
+sources found in each chip do not change. A `CatalogCache` stores them in a
+directory as ``<key>.npz`` files, where the key is computed from:
+
+  *  the pixel data of the chip and of the mask used for source finding,
+  *  the extension of the chip,
+  *  all parameters that control source finding, and
+  *  the ``drizzlepac`` version.
+
+The key depends only on content, not on file names or modification times,
+so cached catalogs remain valid for copies of the images and are never used
+once the pixel data change.
+
+:License: :doc:`/LICENSE`
+
+"""
+import os
+import json
+import hashlib
+import tempfile
+import zipfile
+
+import numpy as np
+from astropy import units as u
+from astropy.table import QTable, Table
+from stsci.tools import logutil
+
+from . import __version__
+
+
+__all__ = ['CatalogCache', 'catalog_key', 'table_to_arrays',
+           'arrays_to_table']
+
+CACHE_VERSION = 1
+
+# Name of the array holding the column names and units of a cached table:
+_TABLE_META = '__table__'
+
+log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
+
+
+def catalog_key(extname, pars, *arrays):
+    """ Compute the cache key of the catalog of sources found in a chip.
+
+    Parameters
+    ----------
+    extname : str, int, tuple
+        Extension of the chip in the image file.
+
+    pars : dict
+        JSON-serializable parameters controlling source finding.
+
+    arrays : ndarray or None
+        Arrays (science data, source finding mask, detection threshold,
+        etc.) used for source finding. `None` is allowed for missing arrays.
+
+    Returns
+    -------
+    key : str
+        SHA-256 hex digest.
+
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([CACHE_VERSION, __version__, extname, pars],
+                        sort_keys=True, default=str).encode())
+    for arr in arrays:
+        if arr is None:
+            h.update(b'None')
+            continue
+        arr = np.ascontiguousarray(arr)
+        h.update(f"{arr.dtype.str}{arr.shape}".encode())
+        h.update(arr.data)
+    return h.hexdigest()
+
+
+def table_to_arrays(table):
+    """ Convert a table of sources into arrays that can be cached.
+
+    Columns of ``object`` type (such as sky coordinates) are not stored.
+    A ``table`` of `None` (no sources found) is supported.
+
+    """
+    if table is None:
+        return {_TABLE_META: np.array(json.dumps(None))}
+
+    arrays = {}
+    columns = []
+    for name in table.colnames:
+        col = table[name]
+        value = np.asarray(getattr(col, 'value', col))
+        if value.dtype.kind == 'O':
+            log.debug(f"Column '{name}' is not stored in the catalog cache.")
+            continue
+        arrays[name] = value
+        unit = getattr(col, 'unit', None)
+        columns.append([name, None if unit is None else unit.to_string()])
+
+    meta = {'columns': columns, 'qtable': isinstance(table, QTable)}
+    arrays[_TABLE_META] = np.array(json.dumps(meta))
+    return arrays
+
+
+def arrays_to_table(arrays):
+    """ Rebuild a table of sources stored with `table_to_arrays`. """
+    meta = json.loads(str(arrays[_TABLE_META]))
+    if meta is None:
+        return None
+
+    table = QTable() if meta['qtable'] else Table()
+    for name, unit in meta['columns']:
+        if unit is None:
+            table[name] = arrays[name]
+        elif meta['qtable']:
+            table[name] = arrays[name] * u.Unit(unit)
+        else:
+            table[name] = arrays[name]
+            table[name].unit = unit
+    return table
+
+
+class CatalogCache:
+    """ Store and retrieve source catalogs in a cache directory.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cached catalogs. It is created when the first
+        catalog is stored.
+
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def filename(self, key):
+        """ Name of the file storing the catalog with a given key. """
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def load(self, key):
+        """ Retrieve the arrays of a cached catalog.
+
+        Returns
+        -------
+        arrays : dict, None
+            Arrays stored with :py:meth:`save` or `None` when the catalog is
+            not in the cache.
+
+        """
+        fname = self.filename(key)
+        if not os.path.isfile(fname):
+            return None
+        try:
+            with np.load(fname, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            log.warning(f"Ignoring unreadable cached catalog '{fname}'.")
+            return None
+        log.info(f"Using cached source catalog '{fname}'.")
+        return arrays
+
+    def save(self, key, **arrays):
+        """ Store the arrays of a catalog in the cache. """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a unique temporary file first, since catalogs may be
+        # stored concurrently by several processes:
+        fd, tmpname = tempfile.mkstemp(suffix='.npz.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmpname, self.filename(key))
+        except BaseException:
+            os.remove(tmpname)
+            raise
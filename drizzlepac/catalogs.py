@@ -18,7 +18,7 @@ import stsci.imagestats as imagestats
 import stregion as pyregion
 
 #import idlphot
-from . import tweakutils, util
+from . import catalogcache, tweakutils, util
 from .mapreg import _AuxSTWCS
 
 
@@ -30,6 +30,13 @@ REFCAT_ARGS = ['rmaxflux','rminflux','rfluxunits','refnbright']+REFCOL_PARS
 
 sortKeys = ['minflux','maxflux','nbright','fluxunits']
 
+# Parameters of ImageCatalog that control source finding (used as part of the
+# key of cached catalogs):
+_FIND_PARS = ['computesig', 'skysigma', 'threshold', 'conv_width', 'peakmin',
+              'peakmax', 'fluxmin', 'fluxmax', 'nsigma', 'ratio', 'theta',
+              'sharplo', 'sharphi', 'roundlo', 'roundhi']
+_SOURCE_COLUMNS = ['x', 'y', 'flux', 'src_id', 'sharp', 'round1', 'round2']
+
 
 log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
 
@@ -440,6 +447,7 @@ class ImageCatalog(Catalog):
             self.wcs.extname = (0)
         self.source = fits.getdata(self.wcs.filename,ext=self.wcs.extname, memmap=False)
         self.nbright = None # No GUI parameter defined yet for this filtering
+        self.found_sources = None
 
     def _combine_exclude_mask(self, mask):
         # create masks from exclude/include regions and combine it with the
@@ -532,13 +540,45 @@ class ImageCatalog(Catalog):
 
         return mask
 
-    def generateXY(self, **kwargs):
-        """ Generate source catalog from input image using DAOFIND-style algorithm
+    def find_sources(self, **kwargs):
+        """ Find sources in the input image using DAOFIND-style algorithm.
+
+        Returns the ``(x, y, flux, src_id, sharp, round1, round2)`` output of
+        `~drizzlepac.tweakutils.ndfind` (0-based positions and IDs). The
+        result can be computed in another process and passed to
+        :py:meth:`generateXY` through its ``sources`` argument.
+
+        When the ``catalog_cache`` parameter names a directory, the result
+        is retrieved from (or stored in) a `~drizzlepac.catalogcache.CatalogCache`
+        keyed by the image data, the source finding mask and the source
+        finding parameters.
+
         """
         #x,y,flux,sharp,round = idlphot.find(array,self.pars['hmin'],self.pars['fwhm'],
         #                    roundlim=self.pars['roundlim'], sharplim=self.pars['sharplim'])
         print("  #  Source finding for '{}', EXT={} started at: {}"
               .format(self.fnamenoext, self.wcs.extname, util._ptime()[0]))
+
+        if 'mask' in kwargs and kwargs['mask'] is not None:
+            dqmask = np.asarray(kwargs['mask'], dtype=bool)
+        else:
+            dqmask = None
+
+        # get the mask for source finding:
+        mask = self._combine_exclude_mask(dqmask)
+
+        cache = None
+        if self.pars.get('catalog_cache'):
+            cache = catalogcache.CatalogCache(self.pars['catalog_cache'])
+            find_pars = {par: self.pars.get(par) for par in _FIND_PARS}
+            find_pars['use_sharp_round'] = self.use_sharp_round
+            find_pars['nbright'] = self.nbright
+            key = catalogcache.catalog_key(self.wcs.extname, find_pars,
+                                           self.source, mask)
+            cached = cache.load(key)
+            if cached is not None:
+                return tuple(cached.get(name) for name in _SOURCE_COLUMNS)
+
         if self.pars['computesig']:
             # compute sigma for this image
             sigma = self._compute_sigma()
@@ -551,14 +591,6 @@ class ImageCatalog(Catalog):
         else:
             hmin = sigma*self.pars['threshold']
 
-        if 'mask' in kwargs and kwargs['mask'] is not None:
-            dqmask = np.asarray(kwargs['mask'], dtype=bool)
-        else:
-            dqmask = None
-
-        # get the mask for source finding:
-        mask = self._combine_exclude_mask(dqmask)
-
         x, y, flux, src_id, sharp, round1, round2 = tweakutils.ndfind(
             self.source,
             hmin,
@@ -601,6 +633,28 @@ class ImageCatalog(Catalog):
                     use_sharp_round = self.use_sharp_round,
                     nbright=self.nbright
                 )
+
+        log.info('###Source finding finished at: %s'%(util._ptime()[0]))
+
+        sources = (x, y, flux, src_id, sharp, round1, round2)
+        if cache is not None:
+            cache.save(key, **{name: np.asarray(value) for name, value in
+                               zip(_SOURCE_COLUMNS, sources)
+                               if value is not None})
+        return sources
+
+    def generateXY(self, sources=None, **kwargs):
+        """ Generate source catalog from input image using DAOFIND-style algorithm
+
+        ``sources`` is the output of :py:meth:`find_sources`. When it is not
+        provided, sources are found in the image using ``kwargs``.
+
+        """
+        if sources is None:
+            sources = self.find_sources(**kwargs)
+        self.found_sources = sources
+        x, y, flux, src_id, sharp, round1, round2 = sources
+
         if len(x) == 0:
             xypostypes = 3*[float]+[int]+(3 if self.use_sharp_round else 0)*[float]
             self.xypos = [np.empty(0, dtype=i) for i in xypostypes]
@@ -616,8 +670,6 @@ class ImageCatalog(Catalog):
             else:
                 self.xypos = [x+1, y+1, flux, src_id+self.start_id]
 
-        log.info('###Source finding finished at: %s'%(util._ptime()[0]))
-
         self.in_units = 'pixels' # Not strictly necessary, but documents units when determined
         self.sharp = sharp
         self.round1 = round1
@@ -13,12 +13,14 @@ import re
 import numpy as np
 from scipy import signal
 from astropy.io import fits
-from stsci.tools import fileutil, logutil, mputil
+from stsci.tools import fileutil, logutil
 
 
 from . import quickDeriv
 from . import util
 from . import processInput
+from . import profiling
+from .scheduler import MemoryScheduler
 from . import __version__
 
 if util.can_parallel:
@@ -56,7 +58,7 @@ def run(configObj):
     rundrizCR(imgObjList, configObj)
 
 
-def rundrizCR(imgObjList, configObj, procSteps=None):
+def rundrizCR(imgObjList, configObj, procSteps=None, scheduler=None):
     if procSteps is not None:
         procSteps.addStep(PROCSTEPS_NAME)
 
@@ -67,15 +69,18 @@ def rundrizCR(imgObjList, configObj, procSteps=None):
             procSteps.endStep(PROCSTEPS_NAME, reason="off", delay_msg=True)
         return
 
-    paramDict = configObj[step_name]
-    paramDict['crbit'] = configObj['crbit']
-    paramDict['inmemory'] = imgObjList[0].inmemory
+    paramDict = buildDrizCRParamDict(configObj, imgObjList[0].inmemory)
 
     log.info(f"USER INPUT PARAMETERS for {PROCSTEPS_NAME} Step:")
     util.printParams(paramDict, log=log)
 
     # if we have the cpus and s/w, ok, but still allow user to set pool size
-    pool_size = util.get_pool_size(configObj.get('num_cores'), len(imgObjList))
+    # (reduced as needed to stay within the memory budget)
+    if scheduler is None:
+        scheduler = MemoryScheduler(imgObjList, None,
+                                    num_cores=configObj.get('num_cores'),
+                                    max_memory=configObj.get('max_memory'))
+    pool_size = scheduler.pool_size(PROCSTEPS_NAME, len(imgObjList))
     if imgObjList[0].inmemory:
         pool_size = 1  # reason why is output in drizzle step
 
@@ -88,23 +93,40 @@ def rundrizCR(imgObjList, configObj, procSteps=None):
             mgr = manager.dict({})
 
             p = mp_ctx.Process(
-                target=_driz_cr,
+                target=_profiled_driz_cr,
                 name='drizCR._driz_cr()',  # for err msgs
                 args=(image, mgr, paramDict.dict())
             )
             subprocs.append(p)
             image.virtualOutputs.update(mgr)
-        mputil.launch_and_wait(subprocs, pool_size)  # blocks till all done
+        scheduler.launch_and_wait(  # blocks till all done
+            subprocs, scheduler.task_memory(PROCSTEPS_NAME), pool_size
+        )
 
     else:
         log.info('Executing serially')
         for image in imgObjList:
-            _driz_cr(image, image.virtualOutputs, paramDict)
+            _profiled_driz_cr(image, image.virtualOutputs, paramDict)
 
     if procSteps is not None:
         procSteps.endStep(PROCSTEPS_NAME)
 
 
+def buildDrizCRParamDict(configObj, inmemory=False):
+    """ Build the parameters used by `_driz_cr` from the configuration. """
+    step_name = util.getSectionName(configObj, STEP_NUM)
+    paramDict = configObj[step_name]
+    paramDict['crbit'] = configObj['crbit']
+    paramDict['inmemory'] = inmemory
+    return paramDict
+
+
+def _profiled_driz_cr(sciImage, virtual_outputs, paramDict):
+    """ Run `_driz_cr` within a profiling span (when profiling is active). """
+    with profiling.span('driz_cr image', image=sciImage._filename):
+        _driz_cr(sciImage, virtual_outputs, paramDict)
+
+
 def _driz_cr(sciImage, virtual_outputs, paramDict):
     """mask blemishes in dithered data by comparison of an image
     with a model image and the derivative of the model image.
@@ -19,7 +19,7 @@ __all__ = ['gaussian1', 'gausspars', 'gaussian', 'moments', 'errfunc',
            'findstars', 'apply_nsigma_separation', 'xy_round',
            'precompute_sharp_round', 'sharp_round', 'roundness', 'immoments',
            'nmoment', 'centroid', 'cmoment', 'central_moments', 'covmat',
-           'help']
+           'batch_centroid', 'batch_xy_round', 'batch_sharp_round', 'help']
 
 
 #def gaussian(amplitude, xcen, ycen, xsigma, ysigma):
@@ -27,6 +27,9 @@ __all__ = ['gaussian1', 'gausspars', 'gaussian', 'moments', 'errfunc',
 
 FWHM2SIG = 2*np.sqrt(2*np.log(2))
 
+# Maximum number of pixels in a stack of source cutouts measured at once
+MAX_CUTOUT_PIXELS = 4194304
+
 #def gaussian1(height, x0, y0, fwhm, nsigma=1.5, ratio=1., theta=0.0):
 def gaussian1(height, x0, y0, a, b, c):
     """
@@ -199,93 +202,80 @@ def findstars(jdata, fwhm, threshold, skymode,
         return fitind,fluxes
 
     # determine center of each source, while removing spurious sources or
-    # applying limits defined by the user
-    ninit  = 0
-    ninit2 = 0
+    # applying limits defined by the user. All sources are measured at once
+    # from stacks of cutouts of shape (nsrc, ny, nx).
 
     s2m, s4m = precompute_sharp_round(nx, ny, xc, yc)
 
-    satur  = False # Default assumption if use_sharp_round=False
-    sharp  = None
-    round1 = None
-    round2 = None
-
-    for ss,n in zip(fobjects,range(len(fobjects))):
-        ssx = ss[1].stop - ss[1].start
-        ssy = ss[0].stop - ss[0].start
-        if ssx >= tdata.shape[1]-1 or ssy >= tdata.shape[0]-1:
-            continue
-
-        yr0 = ss[0].start - gry
-        yr1 = ss[0].stop  + gry + 1
-        if yr0 <= 0 or yr1 >= img_ny: continue # ignore sources within ny//2 of edge
-
-        xr0 = ss[1].start - grx
-        xr1 = ss[1].stop  + grx + 1
-        if xr0 <= 0 or xr1 >= img_nx: continue # ignore sources within nx//2 of edge
-
-        ssnew = (slice(yr0,yr1),slice(xr0,xr1))
-        region = tdata[ssnew]
-
-        cntr = centroid(region)
-
-        # Define region centered on max value in object (slice)
-        # This region will be bounds-checked to insure that it only accesses
-        # a valid section of the image (not off the edge)
-        maxpos = (int(cntr[1]+0.5)+ssnew[0].start,int(cntr[0]+0.5)+ssnew[1].start)
-        yr0 = maxpos[0] - gry
-        yr1 = maxpos[0] + gry + 1
-        if yr0 < 0 or yr1 > img_ny:
-            continue
-        xr0 = maxpos[1] - grx
-        xr1 = maxpos[1] + grx + 1
-        if xr0 < 0 or xr1 > img_nx:
-            continue
-
-        # Simple Centroid on the region from the input image
-        jregion = jdata[yr0:yr1,xr0:xr1]
-        src_flux = jregion.sum()
-        src_peak = jregion.max()
-
-        if (peakmax is not None and src_peak >= peakmax):
-            continue
-        if (peakmin is not None and src_peak <= peakmin):
-            continue
-
-        if fluxmin and src_flux <= fluxmin:
-            continue
-        if fluxmax and src_flux >= fluxmax:
-            continue
-
-        datamin = jregion.min()
-        datamax = jregion.max()
+    # Select segmented objects whose extraction box is not too close to the
+    # edge of the image:
+    starts = np.array([[ss[0].start, ss[1].start] for ss in fobjects])
+    stops = np.array([[ss[0].stop, ss[1].stop] for ss in fobjects])
+    size = stops - starts
+    box0 = starts - [gry, grx]
+    box1 = stops + [gry + 1, grx + 1]
+    good = ((size[:, 0] < tdata.shape[0] - 1) &
+            (size[:, 1] < tdata.shape[1] - 1) &
+            (box0[:, 0] > 0) & (box1[:, 0] < img_ny) &
+            (box0[:, 1] > 0) & (box1[:, 1] < img_nx))
+    box0 = box0[good]
+    box1 = box1[good]
+    if box0.shape[0] == 0:
+        return fitind, fluxes
+
+    # Define region centered on max value in object (slice) and make sure
+    # that it only accesses a valid section of the image (not off the edge):
+    cx, cy = batch_centroid(tdata, box0, box1 - box0)
+    with np.errstate(invalid='ignore'):
+        good = np.isfinite(cx) & np.isfinite(cy)
+        y0 = np.trunc(cy + 0.5).astype(np.intp) + box0[:, 0] - gry
+        x0 = np.trunc(cx + 0.5).astype(np.intp) + box0[:, 1] - grx
+    good &= (y0 >= 0) & (y0 + ny <= img_ny) & (x0 >= 0) & (x0 + nx <= img_nx)
+    y0 = y0[good]
+    x0 = x0[good]
+
+    for chunk in _cutout_chunks(y0.size, nx * ny):
+        yr0 = y0[chunk]
+        xr0 = x0[chunk]
+        jregion = _cutouts(jdata, yr0, xr0, ny, nx)
+        src_flux = jregion.sum(axis=(1, 2))
+        datamin = jregion.min(axis=(1, 2))
+        datamax = jregion.max(axis=(1, 2))
+
+        keep = np.ones(yr0.size, dtype=bool)
+        if peakmax is not None:
+            keep &= datamax < peakmax
+        if peakmin is not None:
+            keep &= datamax > peakmin
+        if fluxmin:
+            keep &= src_flux > fluxmin
+        if fluxmax:
+            keep &= src_flux < fluxmax
 
         if use_sharp_round:
             # Compute sharpness and first estimate of roundness:
-            dregion = convdata[yr0:yr1,xr0:xr1]
-            satur, round1, sharp = \
-                sharp_round(jregion, dregion, xyrmask, xc, yc,
-                            s2m, s4m, nx, ny, datamin, datamax)
-            # Filter sources:
-            if sharp is None or (sharp < sharplo or sharp > sharphi):
-                continue
-            if round1 is None or (round1 < roundlo or round1 > roundhi):
-                continue
-
-        px, py, round2 = xy_round(jregion, grx, gry, skymode,
-                                  kernel, xsigsq, ysigsq, datamin, datamax)
-
-        # Filter sources:
-        if px is None:
-            continue
-
-        if use_sharp_round and not satur and \
-           (round2 is None or round2 < roundlo or round2 > roundhi):
-            continue
-
-        fitind.append((px + xr0, py + yr0, sharp, round1, round2))
-        # compute a source flux value
-        fluxes.append(src_flux)
+            dregion = _cutouts(convdata, yr0, xr0, ny, nx)
+            satur, round1, sharp = batch_sharp_round(
+                jregion, dregion, xyrmask, xc, yc, s2m, s4m, datamin, datamax
+            )
+            # Filter sources (invalid values are NaN and fail both tests):
+            keep &= (sharp >= sharplo) & (sharp <= sharphi)
+            keep &= (round1 >= roundlo) & (round1 <= roundhi)
+
+        px, py, round2 = batch_xy_round(jregion, grx, gry, skymode, kernel,
+                                        xsigsq, ysigsq, datamin, datamax)
+        keep &= np.isfinite(px)
+
+        if use_sharp_round:
+            keep &= satur | ((round2 >= roundlo) & (round2 <= roundhi))
+
+        for k in np.flatnonzero(keep):
+            fitind.append((float(px[k] + xr0[k]), float(py[k] + yr0[k]),
+                           float(sharp[k]) if use_sharp_round else None,
+                           float(round1[k]) if use_sharp_round else None,
+                           float(round2[k])))
+            # compute a source flux value
+            fluxes.append(src_flux[k])
 
     fitindc, fluxesc = apply_nsigma_separation(fitind, fluxes, fwhm*nsigma / 2)
 
@@ -349,6 +339,91 @@ def xy_round(data,x0,y0,skymode,ker2d,xsigsq,ysigsq,datamin=None,datamax=None):
     return x,y,round
 
 
+def batch_xy_round(data, x0, y0, skymode, ker2d, xsigsq, ysigsq,
+                   datamin, datamax):
+    """ Compute centers of many sources at once.
+
+    Vectorized version of `xy_round` for a stack of cutouts ``data`` of
+    shape ``(nsrc, nyk, nxk)``, where ``nyk, nxk`` is the shape of the
+    kernel ``ker2d`` and ``datamin``, ``datamax`` are arrays with one value
+    per source. Returns arrays ``x``, ``y`` and ``round`` which are NaN for
+    the sources rejected by `xy_round`.
+    """
+    nyk, nxk = ker2d.shape
+    xmiddle = nxk // 2
+    ymiddle = nyk // 2
+    # same precision as in cdriz.arrxyround:
+    img = np.asarray(data, dtype=np.float32)
+    ker2d = np.asarray(ker2d, dtype=np.float64)
+    datamin = np.asarray(datamin, dtype=np.float64)[:, None, None]
+    datamax = np.asarray(datamax, dtype=np.float64)[:, None, None]
+
+    bad = ((img < datamin) | (img > datamax)).any(axis=(1, 2))
+    img = img.astype(np.float64) - skymode
+
+    wx = (xmiddle + 1.0 - np.abs(np.arange(nxk) - xmiddle))
+    wy = (ymiddle + 1.0 - np.abs(np.arange(nyk) - ymiddle))
+
+    hx, dx = _fit_marginal(np.dot(img.transpose(0, 2, 1), wy),
+                           np.dot(ker2d.T, wy), wx,
+                           xmiddle - np.arange(nxk), xsigsq, nxk / 2.0 - 0.5)
+    hy, dy = _fit_marginal(np.dot(img, wx), np.dot(ker2d, wx), wy,
+                           ymiddle - np.arange(nyk), ysigsq, nyk / 2.0 - 0.5)
+
+    bad |= np.isnan(hx) | np.isnan(hy)
+    x = np.where(bad, np.nan, np.floor(x0) + dx)
+    y = np.where(bad, np.nan, np.floor(y0) + dy)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        round = np.where(bad, np.nan, 2.0 * (hx - hy) / (hx + hy))
+
+    return x, y, round
+
+
+def _fit_marginal(sd, sg, wt, dxk, sigsq, half):
+    """
+    Fit a gaussian to the weighted marginals ``sd`` (of shape ``(nsrc, n)``)
+    of the data using the marginal ``sg`` of the kernel. Returns the heights
+    of the gaussians and the shifts of the centers (NaN for rejected
+    sources).
+    """
+    nsrc, n = sd.shape
+    p = wt.sum()
+    if n <= 2 or p <= 0.0:
+        # Need at least three points to estimate the height, position
+        # and local sky brightness of the star.
+        return np.full(nsrc, np.nan), np.full(nsrc, np.nan)
+
+    dgdx = sg * dxk
+    sumgsq = np.sum(wt * sg**2)
+    sumg = np.sum(wt * sg)
+    sdgdx = np.sum(wt * dgdx)
+    sdgdxsq = np.sum(wt * dgdx**2)
+    sgdgdx = np.sum(wt * sg * dgdx)
+    sumgd = np.dot(sd, wt * sg)
+    sumd = np.dot(sd, wt)
+    sumdx = np.dot(sd, wt * dxk)
+    sddgdx = np.dot(sd, wt * dgdx)
+
+    # Solve for the height of the best-fitting gaussian to the marginal.
+    # Reject the star if the height is non-positive.
+    h1 = sumgsq - sumg**2 / p
+    if h1 <= 0.0:
+        return np.full(nsrc, np.nan), np.full(nsrc, np.nan)
+    h = (sumgd - sumg * sumd / p) / h1
+    h[h <= 0.0] = np.nan
+
+    # Solve for the new centroid.
+    skylvl = (sumd - h * sumg) / p
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dx = (sgdgdx - (sddgdx - sdgdx * (h * sumg + skylvl * p))) / \
+            (h * sdgdxsq / sigsq)
+        far = np.abs(dx) > half
+        dx[far] = np.where(sumd[far] == 0.0, 0.0, sumdx[far] / sumd[far])
+    dx[np.abs(dx) > half] = 0.0
+
+    return h, dx
+
+
 def precompute_sharp_round(nxk, nyk, xc, yc):
     """
     Pre-computes mask arrays to be used by the 'sharp_round' function
@@ -416,6 +491,53 @@ def sharp_round(data, density, kskip, xc, yc, s2m, s4m, nxk, nyk,
     return satur, round, sharp
 
 
+def batch_sharp_round(data, density, kskip, xc, yc, s2m, s4m,
+                      datamin, datamax):
+    """
+    Vectorized version of `sharp_round` for stacks of cutouts ``data`` and
+    ``density`` of shape ``(nsrc, nyk, nxk)``. ``datamin`` and ``datamax``
+    are arrays with one value per source.
+
+    Returns arrays ``satur``, ``round`` and ``sharp``. Values of ``round`` and
+    ``sharp`` for which `sharp_round` returns `None` are set to NaN.
+    """
+    datamin = np.asarray(datamin)
+    datamax = np.asarray(datamax)
+
+    # Compute the first estimate of roundness:
+    sum2 = np.sum(s2m * density, axis=(1, 2))
+    sum4 = np.sum(s4m * np.abs(density), axis=(1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        round = np.where(sum2 == 0.0, 0.0,
+                         np.where(sum4 <= 0.0, np.nan, 2.0 * sum2 / sum4))
+
+    ########################
+    # Sharpness statistics:
+    mid_data_pix = data[:, yc, xc]
+    mid_dens_pix = density[:, yc, xc]
+
+    satur = np.max(kskip * data, axis=(1, 2)) > datamax
+    # Eliminate the sharpness test if the central pixel is bad:
+    high = mid_data_pix > datamax
+    low = mid_data_pix < datamin
+    satur[high] = True
+    satur[low] = False
+
+    # Exclude pixels (create a mask) outside the [datamin, datamax] range,
+    # the "skipped" values from the convolution kernel and the central pixel:
+    uskip = ((data >= datamin[:, None, None]) &
+             (data <= datamax[:, None, None]) & (kskip != 0))
+    uskip[:, yc, xc] = False
+
+    npixels = np.sum(uskip, axis=(1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharp = ((mid_data_pix - np.sum(uskip * data, axis=(1, 2)) / npixels) /
+                 mid_dens_pix)
+    sharp[high | low | (npixels < 1) | (mid_dens_pix <= 0.0)] = np.nan
+
+    return satur, round, sharp
+
+
 def roundness(im):
     """
     from astropy.io import fits as pyfits
@@ -475,6 +597,57 @@ def centroid(im):
     return xcen, ycen
 
 
+def batch_centroid(im, corners, shapes):
+    """
+    Computes the centroids of many rectangular regions of an image at once.
+
+    ``corners`` and ``shapes`` are ``(nsrc, 2)`` arrays with the ``(y, x)``
+    position of the first pixel and the shape of each region. Returns arrays
+    ``xcen`` and ``ycen`` with the same values as `centroid` computed on
+    each region (positions relative to the corner of the region).
+    """
+    corners = np.asarray(corners, dtype=np.intp)
+    shapes = np.asarray(shapes, dtype=np.intp)
+    xcen = np.empty(corners.shape[0])
+    ycen = np.empty(corners.shape[0])
+    # same precision as in cdriz.arrmoments:
+    im = np.asarray(im, dtype=np.float32)
+
+    # Regions of equal shape are stacked and measured together:
+    unique_shapes, inverse = np.unique(shapes, axis=0, return_inverse=True)
+    for k, (ny, nx) in enumerate(unique_shapes):
+        idx = np.flatnonzero(inverse.ravel() == k)
+        for chunk in _cutout_chunks(idx.size, nx * ny):
+            sel = idx[chunk]
+            cutouts = _cutouts(im, corners[sel, 0], corners[sel, 1], ny, nx)
+            rows = cutouts.sum(axis=2, dtype=np.float64)
+            m00 = rows.sum(axis=1)
+            m10 = np.dot(rows, np.arange(ny, dtype=np.float64))
+            m01 = np.dot(cutouts.sum(axis=1, dtype=np.float64),
+                         np.arange(nx, dtype=np.float64))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ycen[sel] = m10 / m00
+                xcen[sel] = m01 / m00
+
+    return xcen, ycen
+
+
+def _cutouts(data, y0, x0, ny, nx):
+    """ Stack of ``(ny, nx)`` cutouts starting at pixels ``(y0, x0)``. """
+    windows = np.lib.stride_tricks.sliding_window_view(data, (ny, nx))
+    return windows[y0, x0]
+
+
+def _cutout_chunks(nsrc, npix, max_pixels=MAX_CUTOUT_PIXELS):
+    """
+    Slices splitting ``nsrc`` cutouts of ``npix`` pixels each into stacks
+    of at most ``max_pixels`` pixels.
+    """
+    step = max(1, max_pixels // npix)
+    for start in range(0, nsrc, step):
+        yield slice(start, start + step)
+
+
 def cmoment(im,p,q):
     xcen,ycen = centroid(im)
     #x,y=np.meshgrid(range(403,412),range(423,432))
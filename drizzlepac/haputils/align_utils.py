@@ -33,6 +33,7 @@ import stsci.tools
 from stsci.tools import logutil
 from stsci.tools import fileutil
 
+from .. import catalogcache
 from .. import updatehdr
 from . import astrometric_utils as amutils
 from . import analyze
@@ -235,8 +236,14 @@ class AlignmentTable:
         for img in self.haplist:
             img.close()
 
-    def find_alignment_sources(self, output=True, crclean=None):
-        """Find observable sources in each input exposure."""
+    def find_alignment_sources(self, output=True, crclean=None,
+                               catalog_cache=None):
+        """Find observable sources in each input exposure.
+
+        ``catalog_cache`` is the name of a directory of cached source
+        catalogs (see `~drizzlepac.catalogcache.CatalogCache`). If None,
+        sources are always extracted from the images.
+        """
         if crclean is None:
             crclean = [False] * len(self.haplist)
 
@@ -246,6 +253,7 @@ class AlignmentTable:
             if img.imghdu is not None:
                 img.find_alignment_sources(output=output, dqname=self.dqname,
                                            crclean=clean,
+                                           catalog_cache=catalog_cache,
                                            **self.alignment_pars)
                 self.extracted_sources[img.imgname] = img.catalog_table
 
@@ -688,11 +696,23 @@ class HAPImage:
         return dqmask
 
     def find_alignment_sources(self, output=True, dqname='DQ', crclean=False,
-                               **alignment_pars):
-        """Find sources in all chips for this exposure."""
+                               catalog_cache=None, **alignment_pars):
+        """Find sources in all chips for this exposure.
+
+        When ``catalog_cache`` names a directory, the catalog of each chip is
+        retrieved from (or stored in) a `~drizzlepac.catalogcache.CatalogCache`
+        keyed by the science and DQ mask arrays, the kernel, the detection
+        threshold and the source extraction parameters. The cache is not used
+        when ``crclean`` is True, since the DQ arrays are then updated with
+        the cosmic rays found during source extraction.
+        """
         if crclean:
             self.imghdu = fits.open(self.imgname, mode='update')
 
+        cache = None
+        if catalog_cache and not crclean:
+            cache = catalogcache.CatalogCache(catalog_cache)
+
         for chip in range(self.num_sci):
             chip += 1
             # find sources in image
@@ -709,6 +729,19 @@ class HAPImage:
                             'nlargest': alignment_pars['MAX_SOURCES_PER_CHIP'],
                             'deblend': alignment_pars['deblend']}
 
+            if cache is not None:
+                key = catalogcache.catalog_key(
+                    ('SCI', chip), dict(extract_pars, fwhm=self.kernel_fwhm),
+                    sciarr, dqmask, self.kernel, self.threshold[chip]
+                )
+                cached = cache.load(key)
+                if cached is not None:
+                    seg_tab = catalogcache.arrays_to_table(cached)
+                    if outroot and seg_tab is not None:
+                        _write_source_catalog(seg_tab, outroot)
+                    self.catalog_table[chip] = seg_tab
+                    continue
+
             with warnings.catch_warnings():
                 warnings.simplefilter('ignore', NoDetectionsWarning)
                 seg_tab, segmap, crmap = amutils.extract_sources(sciarr, dqmask=dqmask,
@@ -717,6 +750,8 @@ class HAPImage:
                                                                  segment_threshold=self.threshold[chip],
                                                                  fwhm=self.kernel_fwhm,
                                                                  **extract_pars)
+            if cache is not None:
+                cache.save(key, **catalogcache.table_to_arrays(seg_tab))
             if crclean and crmap is not None:
                 i = self.imgname.replace('.fits', '')
                 if log.level < logutil.logging.INFO:
@@ -742,8 +777,13 @@ class SBCHAPImage(HAPImage):
         self.exptime = max(self.imghdu[0].header['exptime'], 1.0)
 
     def find_alignment_sources(self, output=True, dqname='DQ', crclean=False,
-                               **alignment_pars):
-        """Find sources in all chips for this exposure."""
+                               catalog_cache=None, **alignment_pars):
+        """Find sources in all chips for this exposure.
+
+        When ``catalog_cache`` names a directory, the catalog is retrieved
+        from (or stored in) a `~drizzlepac.catalogcache.CatalogCache` keyed
+        by the science array, the kernel FWHM and the photometric keywords.
+        """
         # Only 1 chip, no need to loop
         chip = 1
 
@@ -755,6 +795,29 @@ class SBCHAPImage(HAPImage):
 
         sciarr = self.imghdu[("SCI", chip)].data.copy()
 
+        photvals = {}
+        photvals['photmode'] = self.imghdu[('sci', 1)].header['PHOTMODE']
+        photvals['photflam'] = self.imghdu[('sci', 1)].header['PHOTFLAM']
+        photvals['photplam'] = self.imghdu[('sci', 1)].header['PHOTPLAM']
+
+        cache = None
+        if catalog_cache:
+            cache = catalogcache.CatalogCache(catalog_cache)
+            key = catalogcache.catalog_key(
+                ('SCI', chip), dict(photvals, detector='SBC', fwhm=self.kernel_fwhm),
+                sciarr
+            )
+            cached = cache.load(key)
+            if cached is not None:
+                tbl = catalogcache.arrays_to_table(cached)
+                if outroot and tbl is not None:
+                    _write_source_catalog(tbl, outroot)
+                self.catalog_table[chip] = tbl
+                if self.imghdu is not None:
+                    self.imghdu.close()
+                    self.imghdu = None
+                return
+
         # Remove all background noise
         # This background noise is effectively integerized by the SBC detector
         sci_gauss = ndimage.gaussian_filter(sciarr, sigma=3.0)
@@ -786,17 +849,14 @@ class SBCHAPImage(HAPImage):
             log.info("Total Number of detected sources: {}".format(len(src_table)))
         else:
             log.info("No detected sources!")
+            if cache is not None:
+                cache.save(key, **catalogcache.table_to_arrays(None))
             self.catalog_table[chip] = None
             if self.imghdu is not None:
                 self.imghdu.close()
                 self.imghdu = None
             return
 
-        photvals = {}
-        photvals['photmode'] = self.imghdu[('sci', 1)].header['PHOTMODE']
-        photvals['photflam'] = self.imghdu[('sci', 1)].header['PHOTFLAM']
-        photvals['photplam'] = self.imghdu[('sci', 1)].header['PHOTPLAM']
-
         # Include magnitudes for each source for use in verification of alignment through
         # comparison with GAIA magnitudes
         tbl = amutils.compute_photometry(src_table, photvals)
@@ -804,14 +864,10 @@ class SBCHAPImage(HAPImage):
         # Insure all IDs are sequential and unique (at least in this catalog)
         tbl['cat_id'] = np.arange(1, len(tbl) + 1)
 
+        if cache is not None:
+            cache.save(key, **catalogcache.table_to_arrays(tbl))
         if outroot:
-            tbl['xcentroid'].info.format = '.10f'  # optional format
-            tbl['ycentroid'].info.format = '.10f'
-            tbl['flux'].info.format = '.10f'
-            if not outroot.endswith('.cat'):
-                outroot += '.cat'
-            tbl.write(outroot, format='ascii.commented_header', overwrite=True)
-            log.info("Wrote source catalog: {}".format(outroot))
+            _write_source_catalog(tbl, outroot)
 
         self.catalog_table[chip] = tbl
 
@@ -820,6 +876,18 @@ class SBCHAPImage(HAPImage):
             self.imghdu = None
 
 
+def _write_source_catalog(tbl, outroot):
+    """Write a table of sources to ``<outroot>.cat``, as
+    :py:func:`~drizzlepac.haputils.astrometric_utils.extract_sources` does."""
+    tbl['xcentroid'].info.format = '.10f'  # optional format
+    tbl['ycentroid'].info.format = '.10f'
+    tbl['flux'].info.format = '.10f'
+    if not outroot.endswith('.cat'):
+        outroot += '.cat'
+    tbl.write(outroot, format='ascii.commented_header', overwrite=True)
+    log.info("Wrote source catalog: {}".format(outroot))
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 
 
@@ -7,6 +7,7 @@ A class which makes image objects for each input filename.
 
 """
 import copy, os, re, sys
+import collections
 
 import numpy as np
 from stwcs import distortion
@@ -31,6 +32,104 @@ _IRAF_DTYPES_TO_NUMPY = {-64: 'float64', -32: 'float32', 8: 'uint8',
                          16: 'int16', 32: 'int32', 64: 'int64'}
 
 
+# Flat field reference files are shared by all chips of a detector (and by
+# all exposures taken with the same filter): keep the most recently used
+# ones in memory, up to this total size (in bytes). The cache is emptied at
+# the end of each AstroDrizzle run (see `_clear_caches`).
+FLAT_CACHE_SIZE = 256 * 1024**2
+
+
+class _ArrayCache:
+    """ Least-recently-used cache of (dictionaries of) read-only arrays
+    bounded by their total size in bytes.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+
+    def get(self, key, compute):
+        """ Return the value cached for ``key``, calling ``compute()`` to
+        create it when it is not in the cache.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        value = compute()
+        arrays = value.values() if isinstance(value, dict) else [value]
+        for arr in arrays:
+            arr.flags.writeable = False
+        nbytes = sum(arr.nbytes for arr in arrays)
+        if nbytes <= self.max_bytes:
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, n) = self._entries.popitem(last=False)
+                self._nbytes -= n
+        return value
+
+    def clear(self):
+        """ Remove all entries from the cache. """
+        self._entries.clear()
+        self._nbytes = 0
+
+
+_flat_cache = _ArrayCache(FLAT_CACHE_SIZE)
+
+
+def _clear_caches():
+    """ Release the flat fields cached by image objects. """
+    _flat_cache.clear()
+
+
+def _cache_memory(npix):
+    """ Largest memory (in bytes) used by the flat field cache for ``npix``
+    (``float32``) input pixels.
+    """
+    return min(4 * npix, _flat_cache.max_bytes)
+
+
+def _file_signature(filename):
+    """ Identify the current version of a file (raises `FileNotFoundError`).
+    """
+    st = os.stat(filename)
+    return (os.path.realpath(filename), st.st_size, st.st_mtime_ns)
+
+
+def _get_flat_data(flat_file, flat_ext, chip):
+    """ Return the (read-only) data of extension ``(flat_ext, chip)`` of a
+    flat field file. All ``flat_ext`` extensions of the file are read at
+    once and cached, so that each file is only read once for all chips.
+    """
+    flat_ext = flat_ext.upper()
+
+    def read_flats():
+        hdulist = fileutil.openImage(flat_file, mode='readonly', memmap=False)
+        try:
+            return {hdu.ver: hdu.data for hdu in hdulist
+                    if hdu.name.upper() == flat_ext and hdu.data is not None}
+        finally:
+            hdulist.close()
+
+    flats = _flat_cache.get(_file_signature(flat_file) + (flat_ext,),
+                            read_flats)
+    if chip not in flats:
+        raise KeyError(f"Extension ('{flat_ext}', {chip}) not found in "
+                       f"flat field file '{flat_file}'.")
+    return flats[chip]
+
+
+def _multiply_mask(weight, dqarr, out=None):
+    """ Multiply a weight (array or scalar) by a DQ mask into a ``float32``
+    array, using ``out`` when provided instead of allocating a new array.
+    """
+    if out is None:
+        out = np.empty(dqarr.shape, dtype=np.float32)
+    np.multiply(weight, dqarr, out=out, casting='unsafe')
+    return out
+
+
 class baseImageObject:
     """ Base ImageObject which defines the primary set of methods. """
     def __init__(self,filename):
@@ -532,7 +631,8 @@ class baseImageObject:
         -------
         flat: array
             This method will return an array the same shape as the image in
-            **units of electrons**.
+            **units of electrons**. The array is read-only: flat field files
+            are read once and cached for all chips and images using them.
 
         """
         if flat_ext is None:
@@ -546,10 +646,8 @@ class baseImageObject:
         # jref$, used in the specification of the reference filename
         if flat_file is None:
             flat_file = fileutil.osfn(self._image["PRIMARY"].header[self.flatkey])
-        hdulist = None
         try:
-            hdulist = fileutil.openImage(flat_file, mode='readonly', memmap=False)
-            data = hdulist[(flat_ext, chip)].data
+            data = _get_flat_data(flat_file, flat_ext, chip)
 
             if data.shape[0] != sci_chip.image_shape[0]:
                 ltv2 = int(np.round(sci_chip.ltv2))
@@ -570,10 +668,6 @@ class baseImageObject:
             log.warning("Cannot find flat field file '{}'".format(flat_file))
             log.warning("Treating flatfield as a constant value of '1'.")
 
-        finally:
-            if hdulist is not None:
-                hdulist.close()
-
         return flat
 
     def getReadNoiseImage(self, chip):
@@ -734,22 +828,24 @@ class baseImageObject:
         del dqarr
         return dqmask
 
-    def buildEXPmask(self, chip, dqarr):
+    def buildEXPmask(self, chip, dqarr, out=None):
         """ Builds a weight mask from an input DQ array and the exposure time
         per pixel for this chip.
+
+        The ``float32`` weight mask is written to ``out`` when provided.
         """
         log.info("Applying EXPTIME weighting to DQ mask for chip %s" %
                  chip)
         #exparr = self.getexptimeimg(chip)
         exparr = self._image[self.scienceExt,chip]._exptime
-        expmask = exparr*dqarr
+        return _multiply_mask(exparr, dqarr, out)
 
-        return expmask.astype(np.float32)
-
-    def buildIVMmask(self ,chip, dqarr, scale):
+    def buildIVMmask(self ,chip, dqarr, scale, out=None):
         """ Builds a weight mask from an input DQ array and either an IVM array
         provided by the user or a self-generated IVM array derived from the
         flat-field reference file associated with the input image.
+
+        The ``float32`` weight mask is written to ``out`` when provided.
         """
         sci_chip = self._image[self.scienceExt,chip]
         ivmname = self.outputNames['ivmFile']
@@ -762,11 +858,11 @@ class baseImageObject:
             #Open the mask image for updating and the IVM image
             ivm =  fileutil.openImage(ivmname, mode='readonly', memmap=False)
             ivmfile = fileutil.getExtn(ivm, extn)
+            ivmdata = ivmfile.data
+            ivm.close()
 
             # Multiply the IVM file by the input mask in place.
-            ivmarr = ivmfile.data * dqarr
-
-            ivm.close()
+            ivmarr = _multiply_mask(ivmdata, dqarr, out)
 
         else:
             log.info("Automatically creating IVM files for chip %s" % chip)
@@ -782,21 +878,29 @@ class baseImageObject:
             #exptime = self.getexptimeimg(chip)
             #exptime = sci_chip._exptime
             #ivm = (flat*exptime)**2/(darkimg+(skyimg*flat)+RN**2)
-            ivm = (flat)**2/(darkimg+(skyimg*flat)+RN**2)
+            #ivm = (flat)**2/(darkimg+(skyimg*flat)+RN**2)
+            # (computed in place to limit the number of temporary arrays)
+            dtype = np.result_type(flat, darkimg, skyimg, RN)
+            ivm = np.multiply(skyimg, flat, dtype=dtype)
+            ivm += darkimg
+            ivm += np.square(RN, dtype=dtype)
+            np.divide(np.square(flat, dtype=dtype), ivm, out=ivm)
 
            # Multiply the IVM file by the input mask in place.
-            ivmarr = ivm * dqarr
+            ivmarr = _multiply_mask(ivm, dqarr, out)
 
         # Update 'wt_scl' parameter to match use of IVM file
         sci_chip._wtscl = pow(sci_chip._exptime,2)/pow(scale,4)
         #sci_chip._wtscl = 1.0/pow(scale,4)
 
-        return ivmarr.astype(np.float32)
+        return ivmarr
 
-    def buildERRmask(self,chip,dqarr,scale):
+    def buildERRmask(self,chip,dqarr,scale,out=None):
         """
         Builds a weight mask from an input DQ array and an ERR array
         associated with the input image.
+
+        The ``float32`` weight mask is written to ``out`` when provided.
         """
         sci_chip = self._image[self.scienceExt,chip]
 
@@ -808,20 +912,21 @@ class baseImageObject:
                 # Attempt to open the ERR image.
                 err = self.getData(exten=self.errExt+','+str(chip))
 
+                #exptime = self.getexptimeimg(chip)
+                exptime = sci_chip._exptime
+                errwht = np.divide(exptime, err)
+                np.square(errwht, out=errwht)
+
                 log.info("Applying ERR weighting to DQ mask for chip %s" %
                          chip)
 
                 # Multiply the scaled ERR file by the input mask in place.
-                #exptime = self.getexptimeimg(chip)
-                exptime = sci_chip._exptime
-                errmask = (exptime/err)**2 * dqarr
+                errmask = _multiply_mask(errwht, dqarr, out)
 
                 # Update 'wt_scl' parameter to match use of IVM file
                 #sci_chip._wtscl = pow(sci_chip._exptime,2)/pow(scale,4)
                 sci_chip._wtscl = 1.0/pow(scale,4)
 
-                del err
-
             except:
                 # We cannot find an 'ERR' extension and the data isn't WFPC2.
                 # Print a generic warning message and continue on with the
@@ -851,7 +956,9 @@ class baseImageObject:
                 file=sys.stderr)
             print("\n Continue with final drizzle step...", file=sys.stderr)
 
-        return errmask.astype(np.float32)
+        if errmask is dqarr:
+            errmask = _multiply_mask(1.0, dqarr, out)
+        return errmask
 
     def updateIVMName(self,ivmname):
         """ Update outputNames for image with user-supplied IVM filename.
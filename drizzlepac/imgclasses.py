@@ -11,6 +11,7 @@ import os
 import sys
 import copy
 import numpy as np
+from scipy.spatial import cKDTree
 
 from astropy import wcs as pywcs
 from astropy.io import fits
@@ -42,6 +43,12 @@ IMGCLASSES_DEBUG = False
 # use convex hull for images? (this is tighter than chip's bounding box)
 IMAGE_USE_CONVEX_HULL = True
 
+# Maximum number of source pairs processed at once by _xy_2dhist
+XY_2DHIST_MAX_PAIRS = 1048576
+
+# Maximum number of shift refinements performed by _kdtree_match
+KDTREE_MATCH_NITER = 5
+
 log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
 
 sortKeys = ['minflux', 'maxflux', 'nbright', 'fluxunits']
@@ -50,7 +57,8 @@ class Image:
     """ Primary class to keep track of all WCS and catalog information for
         a single input image. This class also performs all matching and fitting.
     """
-    def __init__(self,filename,input_catalogs=None,exclusions=None,**kwargs):
+    def __init__(self,filename,input_catalogs=None,exclusions=None,
+                 found_sources=None,**kwargs):
         """
         Parameters
         ----------
@@ -60,6 +68,12 @@ class Image:
         input_catalogs : list of str or None
             Filename of catalog files for each chip, if specified by user.
 
+        found_sources : dict or None
+            Sources already found in each chip (keyed by SCI extension
+            version) by :py:meth:`~drizzlepac.catalogs.ImageCatalog.find_sources`
+            (see `find_image_sources`). Source finding is performed for the
+            chips not in this dictionary.
+
         kwargs : dict
             Parameters necessary for processing derived from input configObj object.
 
@@ -213,7 +227,9 @@ class Image:
                             indent = 5), file=sys.stderr)
 
             # read in and convert all catalog positions to RA/Dec
-            catalog.buildCatalogs(exclusions=None, mask=mask)
+            sources = None if found_sources is None else \
+                found_sources.get(sci_extn)
+            catalog.buildCatalogs(exclusions=None, mask=mask, sources=sources)
 
             self.num_sources += catalog.num_objects
             self.chip_catalogs[sci_extn] = {'catalog':catalog,'wcs':wcs}
@@ -516,7 +532,8 @@ class Image:
                 xsh, ysh, maxval, flux, zpmat, qual = _estimate_2dhist_shift(
                     self.outxy,
                     ref_outxy,
-                    searchrad=radius
+                    searchrad=radius,
+                    ref_xorder=refimage.xorder
                 )
                 xyoff = (xsh, ysh)
 
@@ -576,9 +593,14 @@ class Image:
                     yoff = matchpars['yoffset']
                 xyoff = (xoff, yoff)
 
-            matches = xyxymatch(self.outxy, ref_outxy, origin=xyoff,
-                                tolerance=matchpars['tolerance'],
-                                separation=matchpars['separation'])
+            if matchpars.get('matcher', 'xyxymatch') == 'kdtree':
+                matches = _kdtree_match(self.outxy, ref_outxy, origin=xyoff,
+                                        tolerance=matchpars['tolerance'],
+                                        separation=matchpars['separation'])
+            else:
+                matches = xyxymatch(self.outxy, ref_outxy, origin=xyoff,
+                                    tolerance=matchpars['tolerance'],
+                                    separation=matchpars['separation'])
 
             if len(matches) >= minobj:
                 self.matches['image'] = np.column_stack([matches['input_x'][:,
@@ -1027,6 +1049,47 @@ class Image:
                         os.remove(extn)
 
 
+class _AppendOnlyColumns:
+    """ Columns of a catalog that only grows by appending rows.
+
+    Storage is over-allocated geometrically so that appending rows does not
+    copy the whole catalog each time. ``columns`` returns views of the rows
+    filled so far. Columns may be multi-dimensional (rows along the first
+    axis) and are promoted to a common type with the appended values, as
+    with ``numpy.append``.
+
+    """
+    def __init__(self, columns):
+        self._buffers = [np.asarray(col) for col in columns]
+        self.nrows = self._buffers[0].shape[0]
+        if any(buf.shape[0] != self.nrows for buf in self._buffers):
+            raise ValueError("All columns must have the same length.")
+
+    @property
+    def columns(self):
+        return [buf[:self.nrows] for buf in self._buffers]
+
+    def append(self, columns):
+        """ Append rows given as a list of arrays (one per column). """
+        columns = [np.asarray(col) for col in columns]
+        n = columns[0].shape[0]
+        if len(columns) != len(self._buffers) or \
+           any(col.shape[0] != n for col in columns):
+            raise ValueError("Appended columns must match catalog columns.")
+        nrows = self.nrows + n
+
+        for k, (buf, col) in enumerate(zip(self._buffers, columns)):
+            dtype = np.result_type(buf, col)
+            if nrows > buf.shape[0] or dtype != buf.dtype:
+                capacity = max(nrows, 2 * buf.shape[0])
+                new_buf = np.empty((capacity,) + buf.shape[1:], dtype=dtype)
+                new_buf[:self.nrows] = buf[:self.nrows]
+                self._buffers[k] = buf = new_buf
+            buf[self.nrows:nrows] = col
+
+        self.nrows = nrows
+
+
 class RefImage:
     """ This class provides all the information needed by to define a reference
     tangent plane and list of source positions on the sky.
@@ -1225,7 +1288,7 @@ class RefImage:
                     orig_len = len(cat_origin)
                     if orig_len < nobj:
                         self.xy_catalog[-1] = np.append(self.xy_catalog[-1],
-                            np.asarray(nobj*[''], dtype=object))
+                            np.asarray((nobj - orig_len)*[''], dtype=object))
                 else:
                     raise TypeError("Parameter 'cat_origin' must be "
                         "a string, a list, or a numpy.ndarray")
@@ -1237,10 +1300,11 @@ class RefImage:
             self.transformToRef()
 
         # Compute bounding convex hull for the reference catalog:
+        self._hull = None
         if (find_bounding_polygon or IMAGE_USE_CONVEX_HULL) and \
            self.outxy is not None:
-            xy_vertices = np.asarray(convex_hull(list(map(tuple,self.outxy))),
-                                     dtype=np.float64)
+            self._hull = convex_hull(list(map(tuple,self.outxy)))
+            xy_vertices = np.asarray(self._hull, dtype=np.float64)
             if xy_vertices.shape[0] > 2:
                 rdv = self.wcs.wcs_pix2world(xy_vertices, 1)
                 self.skyline = SphericalPolygon.from_radec(rdv[:,0], rdv[:,1])
@@ -1254,6 +1318,19 @@ class RefImage:
         else:
             self.skyline = SphericalPolygon([])
 
+        # Store the reference catalog in append-only columns, so that it can
+        # be expanded with sources from aligned images without copying it
+        # (see append_not_matched_sources):
+        self._refcat = None
+        self.xorder = None
+        if self.outxy is not None:
+            self._refcat = [_AppendOnlyColumns([self.outxy]),
+                            _AppendOnlyColumns(self.all_radec),
+                            _AppendOnlyColumns(self.xy_catalog)]
+            # Index of the reference sources sorted by their X position
+            # in the reference tangent plane:
+            self.xorder = np.argsort(self.outxy[:, 0], kind='stable')
+
     def clear_dirty_flag(self):
         self.dirty = False
 
@@ -1345,31 +1422,46 @@ class RefImage:
         # convert to RA & DEC:
         new_radec = self.wcs.wcs_pix2world(new_outxy, 1)
 
-        self.outxy = np.append(self.outxy, new_outxy, 0)
         id1 = self.all_radec[3][-1] + 1
-        id2 = id1 + len(self.all_radec[3])
-        self.all_radec = [np.append(self.all_radec[0], new_radec[:,0], 0),
-                          np.append(self.all_radec[1], new_radec[:,1], 0),
-                          np.append(self.all_radec[2], image.all_radec[2][not_matched_mask], 0),
-                          np.append(self.all_radec[3], np.arange(id1,id2), 0)]
-
-        # Append original image coordinates:
-        self.xy_catalog[0] = np.append(self.xy_catalog[0],
-            np.asarray(image.xy_catalog[0])[not_matched_mask], 0)
-        self.xy_catalog[1] = np.append(self.xy_catalog[1],
-            np.asarray(image.xy_catalog[1])[not_matched_mask], 0)
+        new_all_radec = [new_radec[:,0], new_radec[:,1],
+                         image.all_radec[2][not_matched_mask],
+                         np.arange(id1, id1 + adding_nsources)]
+
+        # Append original image coordinates and other columns:
+        new_xy_catalog = []
         ncol = len(self.xy_catalog)
-        self.use_sharp_round
-        for i,col in enumerate(image.xy_catalog[2:-1]):
-            i2 = i + 2
-            if i2 < ncol-1:
-                self.xy_catalog[i2] = np.append(self.xy_catalog[i2], col, 0)
-        self.xy_catalog[-1] = np.append(self.xy_catalog[-1],
-                                        np.asarray(image.xy_catalog[-1])[not_matched_mask], 0)
+        for i in range(ncol - 1):
+            if i < len(image.xy_catalog) - 1:
+                col = np.asarray(image.xy_catalog[i])[not_matched_mask]
+            else:
+                col = np.zeros(adding_nsources, dtype=self.xy_catalog[i].dtype)
+            new_xy_catalog.append(col)
+        new_xy_catalog.append(
+            np.asarray(image.xy_catalog[-1])[not_matched_mask]
+        )
+
+        # update the index of sources sorted by X and the convex hull
+        # without re-processing the sources already in the catalog:
+        new_xorder = old_ref_nsources + np.argsort(new_outxy[:, 0], kind='stable')
+        pos = np.searchsorted(self.outxy[self.xorder, 0],
+                              new_outxy[new_xorder - old_ref_nsources, 0],
+                              side='right')
+        self.xorder = np.insert(self.xorder, pos, new_xorder)
+
+        if self._hull is None:
+            self._hull = convex_hull(list(map(tuple, self.outxy)))
+        self._hull = convex_hull(self._hull + list(map(tuple, new_outxy)))
+
+        outxy_cols, radec_cols, xycat_cols = self._refcat
+        outxy_cols.append([new_outxy])
+        radec_cols.append(new_all_radec)
+        xycat_cols.append(new_xy_catalog)
+        self.outxy = outxy_cols.columns[0]
+        self.all_radec = radec_cols.columns
+        self.xy_catalog = xycat_cols.columns
 
         #self.skyline = self.skyline.union(skyline)
-        xy_vertices = np.asarray(convex_hull(list(map(tuple,self.outxy))),
-                                 dtype=np.float64)
+        xy_vertices = np.asarray(self._hull, dtype=np.float64)
         rdv = self.wcs.wcs_pix2world(xy_vertices, 1)
         self.skyline = SphericalPolygon.from_radec(rdv[:,0], rdv[:,1])
         if IMGCLASSES_DEBUG:
@@ -1397,6 +1489,27 @@ class RefImage:
         pass
 
 
+def find_image_sources(filename, exclusions=None, **kwargs):
+    """ Find sources in all chips of an image.
+
+    This runs the source finding of `Image` for ``filename`` without
+    updating the image header or writing out catalogs and returns the
+    sources found in each chip as a dictionary keyed by SCI extension
+    version. This dictionary can be passed to `Image` through its
+    ``found_sources`` argument, so that source finding for several images
+    can be run in worker processes.
+
+    """
+    pars = dict(kwargs, updatehdr=False, writecat=False)
+    img = Image(filename, input_catalogs=None, exclusions=copy.copy(exclusions),
+                **pars)
+    try:
+        return {extn: chip['catalog'].found_sources
+                for extn, chip in img.chip_catalogs.items()}
+    finally:
+        img.close()
+
+
 def build_referenceWCS(catalog_list):
     """ Compute default reference WCS from list of Catalog objects.
     """
@@ -1545,21 +1658,153 @@ def _is_cd_unitary(wcs):
     return (cd_unitary_err < maxerr)
 
 
-def _xy_2dhist(imgxy, refxy, r):
+def _xy_2dhist(imgxy, refxy, r, max_pairs=XY_2DHIST_MAX_PAIRS,
+               ref_xorder=None):
+    """ Compute a 2D histogram of the offsets between all pairs of image and
+    reference sources that are within ``r`` pixels of each other.
+
+    The reference catalog is sorted in X and, for each image source, only
+    reference sources inside a window of ``2 * r + 1`` pixels in X are
+    considered. Candidate pairs are histogrammed in chunks of at most
+    ``max_pairs`` pairs so that memory usage does not grow with the
+    product of the catalog sizes. ``ref_xorder``, when provided, are the
+    indices that sort ``refxy`` in X.
+
+    """
     # This code replaces the C version (arrxyzero) from carrutils.c
-    # It is about 5-8 times slower than the C version.
-    dx = np.subtract.outer(imgxy[:, 0], refxy[:, 0]).ravel()
-    dy = np.subtract.outer(imgxy[:, 1], refxy[:, 1]).ravel()
     r = int(np.ceil(r))
-    idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
-                   (dy < r + 0.5) & (dy >= -r - 0.5))
-    r = int(np.ceil(r))
-    h = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
-                       [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]])
-    return h[0].T
+    edges = [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]]
+    h = np.zeros((2 * r + 1, 2 * r + 1))
+
+    imgxy = np.asarray(imgxy)
+    refxy = np.asarray(refxy)
+    if imgxy.shape[0] == 0 or refxy.shape[0] == 0:
+        return h.T
+
+    if ref_xorder is None:
+        ref_xorder = np.argsort(refxy[:, 0], kind='stable')
+    refxy = refxy[ref_xorder]
+    # Windows are one pixel wider than needed and the exact offset limits
+    # are applied to the candidate pairs:
+    lo = np.searchsorted(refxy[:, 0], imgxy[:, 0] - (r + 1.5), side='left')
+    hi = np.searchsorted(refxy[:, 0], imgxy[:, 0] + (r + 1.5), side='right')
+    counts = hi - lo
+    cumcounts = np.cumsum(counts)
+
+    start = 0
+    nimg = imgxy.shape[0]
+    while start < nimg:
+        offset = cumcounts[start] - counts[start]
+        stop = max(start + 1, np.searchsorted(cumcounts, offset + max_pairs,
+                                              side='right'))
+        npairs = cumcounts[stop - 1] - offset
+        if npairs > 0:
+            ccounts = counts[start:stop]
+            iimg = np.repeat(np.arange(start, stop), ccounts)
+            iref = (np.arange(npairs) - np.repeat(cumcounts[start:stop] -
+                                                  ccounts - offset, ccounts) +
+                    np.repeat(lo[start:stop], ccounts))
+            dx = imgxy[iimg, 0] - refxy[iref, 0]
+            dy = imgxy[iimg, 1] - refxy[iref, 1]
+            idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
+                           (dy < r + 0.5) & (dy >= -r - 0.5))
+            h += np.histogram2d(dx[idx], dy[idx], 2 * r + 1, edges)[0]
+        start = stop
+
+    return h.T
+
+
+def _remove_close_sources(xy, separation, tree=None):
+    """ Return a mask of the sources in ``xy`` left after removing, from
+    each group of sources closer together than ``separation``, all but the
+    first source.
+
+    """
+    keep = np.ones(xy.shape[0], dtype=bool)
+    if separation > 0 and xy.shape[0] > 1:
+        if tree is None:
+            tree = cKDTree(xy)
+        pairs = tree.query_pairs(separation, output_type='ndarray')
+        if pairs.shape[0] > 0:
+            keep[pairs.max(axis=1)] = False
+    return keep
+
+
+def _kdtree_match(imgxy, refxy, origin=(0.0, 0.0), tolerance=1.0,
+                  separation=0.0, niter=KDTREE_MATCH_NITER):
+    """ Cross-match sources in ``imgxy`` with reference sources ``refxy``
+    using a KD-tree built on the reference catalog.
+
+    Input positions are shifted by ``origin`` (``ref = input - origin``) and
+    each one is matched to the nearest reference source within
+    ``tolerance`` pixels. Matches are one-to-one: when several input sources
+    share the same nearest reference source, only the closest one is kept.
+    The shift is then re-estimated from the matched pairs and matching is
+    repeated until the list of matches no longer changes or ``niter``
+    iterations have been performed. As in ``xyxymatch``, sources closer
+    together than ``separation`` are removed from both lists beforehand.
+
+    Returns a structured array with the same columns as ``xyxymatch``.
+
+    """
+    imgxy = np.asarray(imgxy, dtype=np.float64)
+    refxy = np.asarray(refxy, dtype=np.float64)
+    dtype = [('input_x', float), ('input_y', float), ('input_idx', np.uint64),
+             ('ref_x', float), ('ref_y', float), ('ref_idx', np.uint64)]
+    imatch = rmatch = np.zeros(0, dtype=np.intp)
+
+    if imgxy.shape[0] > 0 and refxy.shape[0] > 0:
+        img_idx = np.flatnonzero(_remove_close_sources(imgxy, separation))
+        tree = cKDTree(refxy)
+        ref_keep = _remove_close_sources(refxy, separation, tree=tree)
+        ref_idx = np.flatnonzero(ref_keep)
+        if ref_idx.size < refxy.shape[0]:
+            tree = cKDTree(refxy[ref_idx])
+
+        # Query sources in horizontal stripes for better memory locality:
+        stripe = 64.0 * max(tolerance, 1.0)
+        img_idx = img_idx[np.lexsort((imgxy[img_idx, 0],
+                                      np.floor(imgxy[img_idx, 1] / stripe)))]
+        ref_of = np.empty(imgxy.shape[0], dtype=np.intp)
+        shift = np.asarray(origin, dtype=np.float64)
+
+        for k in range(max(1, niter)):
+            dist, nearest = tree.query(imgxy[img_idx] - shift, workers=-1,
+                                       distance_upper_bound=tolerance)
+            found = np.flatnonzero(np.isfinite(dist))
+            # keep only the closest input source for each reference source:
+            nmatch = np.bincount(nearest[found], minlength=ref_idx.size)
+            shared = nmatch[nearest[found]] > 1
+            if np.any(shared):
+                dup = found[shared]
+                dup = dup[np.argsort(dist[dup], kind='stable')]
+                _, first = np.unique(nearest[dup], return_index=True)
+                found = np.concatenate([found[~shared], dup[first]])
+
+            matched = np.zeros(imgxy.shape[0], dtype=bool)
+            matched[img_idx[found]] = True
+            ref_of[img_idx[found]] = ref_idx[nearest[found]]
+            new_imatch = np.flatnonzero(matched)
+            new_rmatch = ref_of[new_imatch]
+
+            converged = (k > 0 and np.array_equal(new_imatch, imatch) and
+                         np.array_equal(new_rmatch, rmatch))
+            imatch, rmatch = new_imatch, new_rmatch
+            if converged or imatch.size == 0:
+                break
+            shift = np.mean(imgxy[imatch] - refxy[rmatch], axis=0)
+
+    matches = np.zeros(imatch.size, dtype=dtype)
+    matches['input_x'] = imgxy[imatch, 0]
+    matches['input_y'] = imgxy[imatch, 1]
+    matches['input_idx'] = imatch
+    matches['ref_x'] = refxy[rmatch, 0]
+    matches['ref_y'] = refxy[rmatch, 1]
+    matches['ref_idx'] = rmatch
+    return matches
 
 
-def _estimate_2dhist_shift(imgxy, refxy, searchrad=3.0):
+def _estimate_2dhist_shift(imgxy, refxy, searchrad=3.0, ref_xorder=None):
     """ Create a 2D matrix-histogram which contains the delta between each
         XY position and each UV position. Then estimate initial offset
         between catalogs.
@@ -1567,7 +1812,7 @@ def _estimate_2dhist_shift(imgxy, refxy, searchrad=3.0):
     print("Computing initial guess for X and Y shifts...")
 
     # create ZP matrix
-    zpmat = _xy_2dhist(imgxy, refxy, r=searchrad)
+    zpmat = _xy_2dhist(imgxy, refxy, r=searchrad, ref_xorder=ref_xorder)
 
     nonzeros = np.count_nonzero(zpmat)
     if nonzeros == 0:
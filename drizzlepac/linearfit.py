@@ -18,6 +18,11 @@ from stsci.tools import logutil
 
 log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
 
+
+class SingularMatrixError(ArithmeticError):
+    """ Raised when the normal equations of a fit cannot be solved. """
+    pass
+
 if hasattr(np, 'float128'):
     ndfloat128 = np.float128
 elif hasattr(np, 'float96'):
@@ -74,7 +79,9 @@ def iter_fit_all(xy,uv,xyindx,uvindx,
                     xyorig=None,uvorig=None,
                     mode='rscale',nclip=3,sigma=3.0,minobj=3,
                     center=None,verbose=False):
-
+    """ Perform a fit with 'nclip' sigma-clipping iterations between
+        matched lists of positions 'xy' and 'uv' (see `fit_batch`).
+    """
     if not isinstance(xy,np.ndarray):
         # cast input list as numpy ndarray for fitting
         xy = np.array(xy)
@@ -82,63 +89,298 @@ def iter_fit_all(xy,uv,xyindx,uvindx,
         # cast input list as numpy ndarray for fitting
         uv = np.array(uv)
 
-    if xy.shape[0] < nclip:
-        log.warning('The number of sources for the fit < number of clipping iterations.',
-            '    Resetting number of clipping iterations to 0.')
-        nclip=0
-
     if center is None:
         xcen = uv[:,0].mean()
         ycen = uv[:,1].mean()
         center = [xcen,ycen]
-    xy -= center
-    uv -= center
 
-    fit = fit_all(xy, uv, mode=mode, center=center, verbose=verbose)
-    npts = xy.shape[0]
-    npts0 = 0
-    if nclip is None: nclip = 0
-    # define index to initially include all points
+    fit = fit_batch([xy], [uv], mode=mode, nclip=nclip, sigma=sigma,
+                    center=[center], verbose=verbose)[0]
+    if fit is None:
+        raise SingularMatrixError(
+            "Singular matrix: suspected colinear points."
+        )
+    goodpix = fit['goodpix']
+
+    fit['img_indx'] = np.asarray(xyindx)[goodpix]
+    fit['ref_indx'] = np.asarray(uvindx)[goodpix]
+    fit['img_orig_xy'] = None if xyorig is None else xyorig[goodpix]
+    fit['ref_orig_xy'] = None if uvorig is None else uvorig[goodpix]
+
+    return fit
+
+
+def fit_batch(xy, uv, mode='rscale', nclip=3, sigma=3.0, center=None,
+              verbose=False):
+    """ Fit linear transformations between several sets of matched positions
+        at once, with 'nclip' sigma-clipping iterations.
+
+        All sets are stacked (padded to the size of the largest set) and
+        fitted together: the normal equations of all sets are built and
+        solved in a single set of array operations and clipping is applied
+        to all sets simultaneously. Clipping of a set stops when fewer than
+        3 points would be left after clipping.
+
+        A set whose fit cannot be computed (for instance an empty set or a
+        set of colinear points) does not prevent the fit of the other sets:
+        it is reported as failed (`None`) in the output.
+
+        Parameters
+        ----------
+        xy, uv : list of ndarray
+            Image and reference positions, arrays of shape ``(N_k, 2)``,
+            for each set of matched sources.
+
+        mode : {'rscale', 'general', 'shift'}
+            Fit geometry.
+
+        nclip : int, None
+            Number of clipping iterations. No clipping is done for sets with
+            fewer than ``nclip`` sources.
+
+        sigma : float
+            Clipping limit in units of the fit RMS.
+
+        center : list, None
+            Position of the origin of the coordinate system of the fit for
+            each set. By default, the mean of the reference positions of
+            each set is used.
+
+        Returns
+        -------
+        fits : list of dict
+            Fit for each set (see `build_fit`) with additional keys
+            ``'resids'``, ``'rms'``, ``'rmse'``, ``'mae'``, ``'img_coords'``,
+            ``'ref_coords'`` (positions used in the final fit, relative to
+            ``center``), ``'fit_xy'`` and ``'goodpix'`` (mask of the input
+            positions used in the final fit). `None` for the sets that
+            could not be fitted.
+
+    """
+    if mode not in ['general', 'shift', 'rscale']:
+        mode = 'rscale'
+    logstr = 'Performing "{:s}" fit'.format(mode)
+    if verbose:
+        print(logstr)
+    else:
+        log.info(logstr)
+
+    nsets = len(xy)
+    npts = np.array([len(x) for x in xy])
+    if center is None:
+        center = [np.asarray(u, dtype=np.float64).reshape((-1, 2)).mean(axis=0)
+                  if len(u) else np.zeros(2) for u in uv]
+    center = np.broadcast_to(np.asarray(center, dtype=np.float64), (nsets, 2))
+
+    # stack all sets of points:
+    nmax = npts.max()
+    sxy = np.zeros((nsets, nmax, 2), dtype=np.float64)
+    suv = np.zeros((nsets, nmax, 2), dtype=np.float64)
+    w = np.zeros((nsets, nmax), dtype=bool)
+    for k in range(nsets):
+        if npts[k] == 0:
+            continue
+        sxy[k, :npts[k]] = np.asarray(xy[k], dtype=np.float64) - center[k]
+        suv[k, :npts[k]] = np.asarray(uv[k], dtype=np.float64) - center[k]
+        w[k, :npts[k]] = True
+
+    if nclip is None:
+        nclip = 0
+    niter = np.where(npts < nclip, 0, nclip)
+    if np.any(niter < nclip):
+        log.warning('The number of sources for the fit < number of clipping '
+                    'iterations. Resetting number of clipping iterations '
+                    'to 0.')
+
+    P, Q, ok = _solve_batch(sxy, suv, w, mode)
+    resids, rms = _batch_resids(sxy, suv, w, P, Q)
+
+    npts0 = np.zeros(nsets)
+    active = ok.copy()
     for n in range(nclip):
-        if 'resids' in fit:
-            resids = fit['resids']
-        else:
-            resids = compute_resids(xy, uv, fit)
+        active &= n < niter
+        if not np.any(active):
+            break
 
-        # redefine what pixels will be included in next iteration
-        whtfrac = npts/(npts-npts0-1.0)
-        cutx = sigma*(fit['rms'][0]*whtfrac)
-        cuty = sigma*(fit['rms'][1]*whtfrac)
-
-        goodx = (np.abs(resids[:,0]) < cutx)
-        goody = (np.abs(resids[:,1]) < cuty)
-        goodpix = np.bitwise_and(goodx,goody)
-
-        if np.where(goodpix == True)[0].shape[0] > 2:
-            npts0 = npts - goodpix.shape[0]
-            xy = xy[goodpix]
-            uv = uv[goodpix]
-            xyindx = xyindx[goodpix]
-            uvindx = uvindx[goodpix]
-            if xyorig is not None:
-                xyorig = xyorig[goodpix]
-            if uvorig is not None:
-                uvorig = uvorig[goodpix]
-            fit = fit_all(xy, uv, mode=mode, center=center, verbose=False)
-            del goodpix,goodx,goody
-        else:
+        # redefine what points will be included in next iteration
+        nfit = w.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            whtfrac = npts / (npts - npts0 - 1.0)
+        cut = sigma * rms * whtfrac[:, np.newaxis]
+        good = w & np.all(np.abs(resids) < cut[:, np.newaxis, :], axis=2)
+        active &= good.sum(axis=1) > 2
+        if not np.any(active):
             break
 
-    fit['img_coords'] = xy
-    fit['ref_coords'] = uv
-    fit['img_indx'] = xyindx
-    fit['ref_indx'] = uvindx
-    fit['img_orig_xy'] = xyorig
-    fit['ref_orig_xy'] = uvorig
-    fit['fit_xy'] = np.dot(xy - fit['offset'],
-                           np.linalg.inv(fit['fit_matrix'])) + center
+        idx = np.flatnonzero(active)
+        npts0[idx] = npts[idx] - nfit[idx]
+        w[idx] = good[idx]
+        P[idx], Q[idx], ok[idx] = _solve_batch(sxy[idx], suv[idx], w[idx],
+                                               mode)
+        active &= ok
+        resids[idx], rms[idx] = _batch_resids(sxy[idx], suv[idx], w[idx],
+                                              P[idx], Q[idx])
+
+    fits = []
+    for k in range(nsets):
+        if not ok[k]:
+            log.warning('Fit of set {:d} of {:d} sources failed: singular '
+                        'matrix or too few sources.'.format(k, npts[k]))
+            fits.append(None)
+            continue
+        goodpix = w[k, :npts[k]]
+        fit = build_fit(P[k], Q[k], mode)
+        r = resids[k, :npts[k]][goodpix]
+        fit['resids'] = r
+        fit['rms'] = rms[k]
+        fit['rmse'] = float(np.sqrt(np.mean(2 * r**2)))
+        fit['mae'] = float(np.mean(np.linalg.norm(r, axis=1)))
+        fit['img_coords'] = sxy[k, :npts[k]][goodpix]
+        fit['ref_coords'] = suv[k, :npts[k]][goodpix]
+        fit['fit_xy'] = np.dot(fit['img_coords'] - fit['offset'],
+                               np.linalg.inv(fit['fit_matrix'])) + center[k]
+        fit['goodpix'] = goodpix
+        fits.append(fit)
+
+    return fits
+
+
+def _batch_resids(xy, uv, w, P, Q):
+    """ Residuals and their RMS (per axis) of fits computed with
+        `_solve_batch`. Residuals of excluded points are set to 0.
+    """
+    model = np.stack(
+        [P[:, 2, np.newaxis] + P[:, 0, np.newaxis] * uv[..., 0] +
+         P[:, 1, np.newaxis] * uv[..., 1],
+         Q[:, 2, np.newaxis] + Q[:, 0, np.newaxis] * uv[..., 0] +
+         Q[:, 1, np.newaxis] * uv[..., 1]],
+        axis=-1
+    )
+    resids = np.where(w[..., np.newaxis], xy - model, 0.0)
+    n = w.sum(axis=1)[:, np.newaxis]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = resids.sum(axis=1) / n
+        dev = np.where(w[..., np.newaxis], resids - mean[:, np.newaxis, :],
+                       0.0)
+        rms = np.sqrt((dev**2).sum(axis=1) / n)
+    return resids, rms
+
+
+def _solve_batch(xy, uv, w, mode):
+    """ Solve for the coefficients of the transformations ``xy = f(uv)``
+        of several stacked sets of points (using only points for which
+        ``w`` is `True`). Returns arrays of ``P`` and ``Q`` coefficients
+        (see `build_fit`) and a mask of the sets that could be fitted.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        P, Q = _solve_batch_coeffs(xy, uv, w, mode)
+    ok = np.all(np.isfinite(P), axis=1) & np.all(np.isfinite(Q), axis=1)
+    return P, Q, ok
 
-    return fit
+
+def _solve_batch_coeffs(xy, uv, w, mode):
+    """ Coefficients computed by `_solve_batch`. The coefficients of the
+        sets that cannot be fitted are not finite.
+    """
+    wf = w.astype(ndfloat128)
+    n = wf.sum(axis=1)
+
+    if mode == 'shift':
+        d = np.where(w[..., np.newaxis], xy - uv, 0.0)
+        offset = d.sum(axis=1, dtype=np.float64) / n[:, np.newaxis].astype(np.float64)
+        P = np.zeros((xy.shape[0], 3))
+        Q = np.zeros((xy.shape[0], 3))
+        P[:, 0] = 1.0
+        Q[:, 1] = 1.0
+        P[:, 2] = offset[:, 0]
+        Q[:, 2] = offset[:, 1]
+        return P, Q
+
+    x = uv[..., 0].astype(ndfloat128)
+    y = uv[..., 1].astype(ndfloat128)
+    u = xy[..., 0].astype(ndfloat128)
+    v = xy[..., 1].astype(ndfloat128)
+    Sx = (wf * x).sum(axis=1)
+    Sy = (wf * y).sum(axis=1)
+    Su = (wf * u).sum(axis=1)
+    Sv = (wf * v).sum(axis=1)
+
+    if mode == 'general':
+        # Normal equations for
+        #   u = P0 + P1*x + P2*y
+        #   v = Q0 + Q1*x + Q2*y
+        Sux = (wf * u * x).sum(axis=1)
+        Svx = (wf * v * x).sum(axis=1)
+        Suy = (wf * u * y).sum(axis=1)
+        Svy = (wf * v * y).sum(axis=1)
+        Sxx = (wf * x * x).sum(axis=1)
+        Syy = (wf * y * y).sum(axis=1)
+        Sxy = (wf * x * y).sum(axis=1)
+
+        M = np.array([[Sx, Sy, n], [Sxx, Sxy, Sx], [Sxy, Syy, Sy]])
+        M = np.moveaxis(M, -1, 0)
+        U = np.stack([Su, Sux, Suy], axis=-1)
+        V = np.stack([Sv, Svx, Svy], axis=-1)
+        M = M.astype(np.float64)
+        try:
+            invM = np.linalg.inv(M)
+        except np.linalg.LinAlgError:
+            # invert the matrices one by one so that a singular matrix
+            # only fails the fit of its own set:
+            invM = np.full_like(M, np.nan)
+            for k in range(M.shape[0]):
+                try:
+                    invM[k] = np.linalg.inv(M[k])
+                except np.linalg.LinAlgError:
+                    pass
+        P = np.einsum('kij,kj->ki', invM, U).astype(np.float64)
+        Q = np.einsum('kij,kj->ki', invM, V).astype(np.float64)
+        return P, Q
+
+    # 'rscale' fit (see geomap_rscale):
+    xr0 = Sx / n
+    yr0 = Sy / n
+    xi0 = Su / n
+    yi0 = Sv / n
+    dx = x - xr0[:, np.newaxis]
+    dy = y - yr0[:, np.newaxis]
+    du = u - xi0[:, np.newaxis]
+    dv = v - yi0[:, np.newaxis]
+    Sxrxr = (wf * dx * dx).sum(axis=1)
+    Syryr = (wf * dy * dy).sum(axis=1)
+    Syrxi = (wf * dy * du).sum(axis=1)
+    Sxryi = (wf * dx * dv).sum(axis=1)
+    Sxrxi = (wf * dx * du).sum(axis=1)
+    Syryi = (wf * dy * dv).sum(axis=1)
+
+    det = Sxrxi * Syryi - Syrxi * Sxryi
+    flip = det < 0
+    rot_num = np.where(flip, Syrxi + Sxryi, Syrxi - Sxryi)
+    rot_denom = np.where(flip, Sxrxi - Syryi, Sxrxi + Syryi)
+    theta = np.rad2deg(np.arctan2(rot_num, rot_denom))
+    theta = np.where(theta < 0, theta + 360.0, theta)
+    theta = np.where(rot_num == rot_denom, 0.0, theta)
+
+    ctheta = np.cos(np.deg2rad(theta))
+    stheta = np.sin(np.deg2rad(theta))
+    s_num = rot_denom * ctheta + rot_num * stheta
+    s_denom = Sxrxr + Syryr
+    mag = np.where(s_denom < 0, 1.0, s_num / s_denom)
+
+    # "flip" y-axis (reflection about x-axis *after* rotation) for
+    # improper transformations:
+    sthetax = np.where(flip, -mag * stheta, mag * stheta)
+    cthetay = np.where(flip, -mag * ctheta, mag * ctheta)
+    cthetax = mag * ctheta
+    sthetay = mag * stheta
+
+    sdet = np.sign(det)
+    xshift = xi0 - (xr0 * cthetax + sdet * yr0 * sthetax)
+    yshift = yi0 - (-sdet * xr0 * sthetay + yr0 * cthetay)
+
+    P = np.stack([cthetax, sthetay, xshift], axis=-1).astype(np.float64)
+    Q = np.stack([-sthetax, cthetay, yshift], axis=-1).astype(np.float64)
+    return P, Q
 
 
 def fit_all(xy,uv,mode='rscale',center=None,verbose=True):
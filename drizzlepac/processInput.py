@@ -253,7 +253,8 @@ def setCommonInput(configObj, createOutwcs=True, overwrite_dict={}):
         # raises ValueError Exception in interactive mode and user quits
         num_cores = configObj.get('num_cores') if use_parallel else 1
 
-        reportResourceUsage(imageObjectList, outwcs, num_cores)
+        reportResourceUsage(imageObjectList, outwcs, num_cores,
+                            max_memory=configObj.get('max_memory'))
     except ValueError:
         imageObjectList = None
 
@@ -261,47 +262,31 @@ def setCommonInput(configObj, createOutwcs=True, overwrite_dict={}):
 
 
 def reportResourceUsage(imageObjectList, outwcs, num_cores,
-                        interactive=False):
+                        interactive=False, max_memory=None):
     """ Provide some information to the user on the estimated resource
     usage (primarily memory) for this run.
+
+    The estimates are computed by a
+    `~drizzlepac.scheduler.MemoryScheduler` for each processing step,
+    with the number of parallel workers reduced as needed to fit
+    within ``max_memory`` gigabytes (or the memory available to this
+    process when ``max_memory`` is `None`).
     """
+    from .scheduler import MemoryScheduler
 
-    from . import imageObject
-    if outwcs is None:
-        output_mem = 0
-    else:
-        if isinstance(outwcs,imageObject.WCSObject):
+    sched = MemoryScheduler(imageObjectList, outwcs, num_cores=num_cores,
+                            max_memory=max_memory)
+    print('*'*80)
+    print('*')
+    if outwcs is not None:
+        if hasattr(outwcs, 'final_wcs'):
             owcs = outwcs.final_wcs
         else:
             owcs = outwcs
         output_mem = np.prod(owcs.pixel_shape) * 4 * 3  # bytes used for output arrays
-    img1 = imageObjectList[0]
-    numchips = 0
-    input_mem = 0
-    for img in imageObjectList:
-        numchips += img._nmembers # account for group parameter set by user
-
-    # if we have the cpus and s/w, ok, but still allow user to set pool size
-    pool_size = util.get_pool_size(num_cores, numchips)
-
-    inimg = 0
-    chip_mem = 0
-    for img in imageObjectList:
-        for chip in range(1,img._numchips+1):
-            cmem = img[chip].shape[0]*img[chip].shape[1]*4
-            inimg += 1
-            if inimg < pool_size:
-                input_mem += cmem*2
-            if chip_mem == 0:
-                chip_mem = cmem
-    max_mem = (input_mem + output_mem*pool_size + chip_mem*2)//(1024*1024)
-
-    print('*'*80)
-    print('*')
-    print('*  Estimated memory usage:  up to %d Mb.'%(max_mem))
-    print('*  Output image size:       {:d} X {:d} pixels. '.format(*owcs.pixel_shape))
-    print('*  Output image file:       ~ %d Mb. '%(output_mem//(1024*1024)))
-    print('*  Cores available:         %d'%(pool_size))
+        print('*  Output image size:       {:d} X {:d} pixels. '.format(*owcs.pixel_shape))
+        print('*  Output image file:       ~ %d Mb. '%(output_mem//(1024*1024)))
+    sched.report_plan()
     print('*')
     print('*'*80)
 
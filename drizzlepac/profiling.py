@@ -0,0 +1,354 @@
+"""
+Structured profiling of processing steps.
+
+A `StepProfiler` attached to a `~drizzlepac.util.ProcSteps` instance
+records, for each processing step:
+
+  *  wall-clock start/end times and the final status of the step,
+  *  CPU (user and system) time of this process and of child processes
+     that finished during the step,
+  *  peak resident memory of this process and of its child processes,
+  *  number of bytes read and written (Linux only) and number of files
+     opened, and
+  *  optional sub-spans (for instance, one per input chip) created with
+     :py:func:`span`, including those created in worker processes.
+
+Profiles are written as JSON or, when the output file name ends in
+``.trace.json``, in the Chrome trace event format which can be loaded in
+``chrome://tracing`` or `Perfetto <https://ui.perfetto.dev>`_.
+
+Profiling sessions can be nested across tasks: when a session is active
+(see :py:func:`session`), tasks that are run within it (for instance, each
+``AstroDrizzle`` run performed by ``runastrodriz`` or ``runsinglehap``)
+record their steps into that session instead of starting a new one.
+
+:License: :doc:`/LICENSE`
+
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import tempfile
+import resource
+import functools
+import contextlib
+
+from stsci.tools import logutil
+
+from .scheduler import PeakMemoryMonitor
+from . import __version__
+
+__all__ = ['StepProfiler', 'session', 'profile_session', 'span',
+           'get_active', 'CHROME_TRACE_SUFFIX']
+
+CHROME_TRACE_SUFFIX = '.trace.json'
+PROFILE_VERSION = 1
+
+log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
+
+# Stack of active profiling sessions
+_sessions = []
+
+# Number of files opened by this process (counted once any profiler exists)
+_files_opened = 0
+_audit_hook_installed = False
+
+
+def _audit_hook(event, args):
+    global _files_opened
+    if event == 'open':
+        _files_opened += 1
+
+
+def _install_audit_hook():
+    global _audit_hook_installed
+    if not _audit_hook_installed:
+        sys.addaudithook(_audit_hook)
+        _audit_hook_installed = True
+
+
+def _io_counters():
+    """ Bytes read and written by this process (and its reaped children). """
+    try:
+        with open('/proc/self/io') as f:
+            io = dict(line.split(':') for line in f if ':' in line)
+        return int(io['rchar']), int(io['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _snapshot():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    nread, nwritten = _io_counters()
+    return {
+        'time': time.time(),
+        'cpu_user': usage.ru_utime,
+        'cpu_system': usage.ru_stime,
+        'children_cpu_user': child_usage.ru_utime,
+        'children_cpu_system': child_usage.ru_stime,
+        'bytes_read': nread,
+        'bytes_written': nwritten,
+        'files_opened': _files_opened,
+    }
+
+
+def _delta(end, start, key):
+    if end[key] is None or start[key] is None:
+        return None
+    return end[key] - start[key]
+
+
+class StepProfiler:
+    """ Collect resource usage of processing steps and their sub-spans.
+
+    Parameters
+    ----------
+    filename : str, None, optional
+        Name of the file to which :py:meth:`write` saves the profile
+        by default.
+
+    """
+    def __init__(self, filename=None):
+        _install_audit_hook()
+        # Tasks may change the working directory (e.g. runastrodriz):
+        self.filename = os.path.abspath(filename) if filename else None
+        self.start = time.time()
+        self.steps = []
+        self.spans = []
+        self.run = None
+        self._pid = os.getpid()
+        self._current = None
+        self._start_snapshot = None
+        self._monitor = None
+
+        # Worker processes append their spans to this file:
+        fd, self._spool = tempfile.mkstemp(prefix='drizzlepac_profile_',
+                                           suffix='.jsonl')
+        os.close(fd)
+
+    def __del__(self):
+        if os.getpid() == getattr(self, '_pid', None):
+            with contextlib.suppress(OSError, AttributeError):
+                os.remove(self._spool)
+
+    def begin_run(self, label):
+        """ Label steps recorded from now on (e.g. with the task output). """
+        self.run = label
+
+    def step_started(self, step_name):
+        """ Start recording a processing step. """
+        self.step_ended(self._current, None)
+        self._current = {'id': len(self.steps), 'name': step_name,
+                         'run': self.run, 'status': 'started'}
+        self.steps.append(self._current)
+        self._monitor = PeakMemoryMonitor()
+        self._monitor.start()
+        self._start_snapshot = _snapshot()
+
+    def step_ended(self, step_name, status='ended'):
+        """ Finish recording a processing step.
+
+        Calling this method for a step that has already ended only
+        updates its status.
+
+        """
+        if step_name is None:
+            return
+        step = self._current
+        if step is None or step['name'] != step_name:
+            # Step already ended: update its status
+            for step in reversed(self.steps):
+                if step['name'] == step_name:
+                    if status is not None:
+                        step['status'] = status
+                    break
+            return
+
+        end = _snapshot()
+        start = self._start_snapshot
+        self._monitor.stop()
+        step.update({
+            'status': status or 'ended',
+            'start': start['time'],
+            'end': end['time'],
+            'elapsed': end['time'] - start['time'],
+            'cpu_user': _delta(end, start, 'cpu_user'),
+            'cpu_system': _delta(end, start, 'cpu_system'),
+            'peak_rss': self._monitor.peak_self,
+            'bytes_read': _delta(end, start, 'bytes_read'),
+            'bytes_written': _delta(end, start, 'bytes_written'),
+            'files_opened': _delta(end, start, 'files_opened'),
+            'children': {
+                'cpu_user': _delta(end, start, 'children_cpu_user'),
+                'cpu_system': _delta(end, start, 'children_cpu_system'),
+                'peak_rss': self._monitor.peak_children,
+            },
+        })
+        self._current = None
+        self._monitor = None
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """ Record a sub-span of the current step (e.g. a single chip). """
+        start = time.time()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                'name': name,
+                'step_id': None if self._current is None else self._current['id'],
+                'pid': os.getpid(),
+                'start': start,
+                'end': time.time(),
+                'cpu': time.process_time() - cpu_start,
+                'args': {k: str(v) for k, v in args.items()},
+            }
+            if os.getpid() == self._pid:
+                self.spans.append(record)
+            else:
+                # Worker process: a single small write with O_APPEND is atomic
+                with open(self._spool, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+
+    def _collect_spans(self):
+        spans = list(self.spans)
+        with contextlib.suppress(OSError):
+            with open(self._spool) as f:
+                spans.extend(json.loads(line) for line in f if line.strip())
+        return sorted(spans, key=lambda s: s['start'])
+
+    def to_dict(self):
+        """ Return the profile as a JSON-serializable dictionary. """
+        steps = [dict(step, spans=[]) for step in self.steps]
+        for s in self._collect_spans():
+            if s['step_id'] is not None and s['step_id'] < len(steps):
+                steps[s['step_id']]['spans'].append(s)
+        return {
+            'profile_version': PROFILE_VERSION,
+            'drizzlepac_version': __version__,
+            'pid': self._pid,
+            'start': self.start,
+            'end': time.time(),
+            'steps': steps,
+        }
+
+    def to_chrome_trace(self):
+        """ Return the profile in the Chrome trace event format. """
+        events = []
+        for step in self.steps:
+            if 'start' not in step:
+                continue
+            args = {k: v for k, v in step.items()
+                    if k not in ['name', 'start', 'end', 'elapsed']}
+            events.append({
+                'name': step['name'], 'cat': 'step', 'ph': 'X',
+                'ts': step['start'] * 1e6, 'dur': step['elapsed'] * 1e6,
+                'pid': self._pid, 'tid': 0, 'args': args,
+            })
+        for s in self._collect_spans():
+            events.append({
+                'name': s['name'], 'cat': 'span', 'ph': 'X',
+                'ts': s['start'] * 1e6, 'dur': (s['end'] - s['start']) * 1e6,
+                'pid': self._pid, 'tid': s['pid'] if s['pid'] != self._pid else 1,
+                'args': dict(s['args'], cpu=s['cpu']),
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, filename=None):
+        """ Save the profile as JSON or as a Chrome trace.
+
+        The Chrome trace event format is used when ``filename`` ends with
+        ``'.trace.json'``.
+
+        """
+        if filename is None:
+            filename = self.filename
+        if filename.endswith(CHROME_TRACE_SUFFIX):
+            profile = self.to_chrome_trace()
+        else:
+            profile = self.to_dict()
+        with open(filename, 'w') as f:
+            json.dump(profile, f, indent=1)
+        log.info(f"Wrote processing profile to '{filename}'.")
+
+
+def get_active():
+    """ Return the profiler of the innermost active session, if any. """
+    return _sessions[-1] if _sessions else None
+
+
+def open_session(filename=None):
+    """ Start a profiling session writing to ``filename``.
+
+    When ``filename`` is empty, no new session is started and the
+    profiler of the active session (or `None`) is returned.
+
+    """
+    if not filename:
+        return get_active()
+    profiler = StepProfiler(filename)
+    _sessions.append(profiler)
+    return profiler
+
+
+def close_session(profiler):
+    """ End a session started by :py:func:`open_session` and save it.
+
+    Nothing is done if ``profiler`` does not belong to the innermost
+    session started with a file name.
+
+    """
+    if profiler is None or not _sessions or _sessions[-1] is not profiler:
+        return
+    _sessions.pop()
+    profiler.write()
+
+
+@contextlib.contextmanager
+def session(filename=None):
+    """ Context manager for a profiling session (see `open_session`). """
+    profiler = open_session(filename)
+    try:
+        yield profiler
+    finally:
+        close_session(profiler)
+
+
+def profile_session(par_name='profile_output'):
+    """ Decorator running a function within a profiling session.
+
+    The name of the profile file is given by the argument ``par_name``
+    of the decorated function.
+
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            with session(bound.arguments.get(par_name)):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextlib.contextmanager
+def span(name, **args):
+    """ Record a sub-span of the current step of the active session.
+
+    Does nothing when no profiling session is active.
+
+    """
+    profiler = get_active()
+    if profiler is None:
+        yield
+    else:
+        with profiler.span(name, **args):
+            yield
@@ -5,7 +5,7 @@
 
 :License: :doc:`/LICENSE`
 
-USAGE: runastrodriz.py [-bdahfginv] inputFilename [newpath]
+USAGE: runastrodriz.py [-bdahfginpv] inputFilename [newpath]
 
 Alternative USAGE:
     python
@@ -27,6 +27,11 @@ for each input image.
 The '-n' option allows the user to specify the number of cores to be used in
 running AstroDrizzle.
 
+The '-p' option allows the user to specify the name of a file to which the
+resource usage (time, CPU, memory and I/O) of each processing step of all
+AstroDrizzle runs gets written (see the 'profile_output' parameter of
+AstroDrizzle).
+
 The '-g' option allows the user to TURN OFF alignment of the images to an external
 astrometric catalog, such as GAIA, as accessible through the MAST interface.
 
@@ -128,6 +133,7 @@ from drizzlepac import wcs_functions
 from drizzlepac.haputils import config_utils
 from drizzlepac import wfpc2Data
 from drizzlepac import photeq
+from drizzlepac import profiling
 
 from drizzlepac import __version__
 
@@ -200,9 +206,11 @@ wcs_preference = ['IDC_?????????-FIT_REL_GAIA*3', 'IDC_?????????-FIT_IMG_GAIA*3'
 
 
 # Primary user interface
+@profiling.profile_session('profile_output')
 def process(inFile, force=False, newpath=None, num_cores=None, inmemory=True,
             headerlets=True, align_to_gaia=True, force_alignment=False,
-            do_verify_guiding=False, debug=False, make_manifest=False):
+            do_verify_guiding=False, debug=False, make_manifest=False,
+            profile_output=None):
     """
     Run astrodrizzle on input file/ASN table using default values for astrodrizzle parameters.
 
@@ -231,6 +239,10 @@ def process(inFile, force=False, newpath=None, num_cores=None, inmemory=True,
         Debug logging on/off. Additional debug logging is saved in a json file.
     make_manifest : bool
         Whether to generate a MANIFEST file.
+    profile_output : str
+        If provided, name of the file to which the resource usage of the
+        processing steps of all AstroDrizzle runs gets written as JSON
+        (or as a Chrome trace if the name ends in ``.trace.json``).
 
     """
     init_time = time.time()
@@ -2253,7 +2265,7 @@ def main():
     import getopt
 
     try:
-        optlist, args = getopt.getopt(sys.argv[1:], 'bdahfgimn:v:')
+        optlist, args = getopt.getopt(sys.argv[1:], 'bdahfgimn:p:v:')
     except getopt.error as e:
         print(str(e))
         print(__doc__)
@@ -2271,6 +2283,7 @@ def main():
     force_alignment = False
     do_verify_guiding = False
     make_manifest = False
+    profile_output = None
 
     # read options
     for opt, value in optlist:
@@ -2296,11 +2309,13 @@ def main():
                 print('ERROR: num_cores value must be an integer!')
                 raise ValueError
             num_cores = int(value)
+        if opt == '-p':
+            profile_output = value
         if opt == '-b':
             # turn off writing headerlets
             headerlets = False
     if len(args) < 1:
-        print("syntax: runastrodriz.py [-bdahfginv] inputFilename [newpath]")
+        print("syntax: runastrodriz.py [-bdahfginpv] inputFilename [newpath]")
         sys.exit()
     if len(args) > 1:
         newdir = args[-1]
@@ -2313,7 +2328,7 @@ def main():
                     inmemory=inmemory, headerlets=headerlets,
                     align_to_gaia=align_to_gaia, force_alignment=force_alignment,
                     do_verify_guiding=do_verify_guiding, debug=debug,
-                    make_manifest=make_manifest)
+                    make_manifest=make_manifest, profile_output=profile_output)
 
         except Exception as errorobj:
             print(str(errorobj))
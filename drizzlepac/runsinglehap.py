@@ -32,6 +32,7 @@ import sys
 from stsci.tools import logutil
 
 from drizzlepac import hapsequencer
+from drizzlepac import profiling
 
 __taskname__ = "runsinglehap"
 
@@ -68,6 +69,11 @@ def perform(input_filename, **kwargs):
         .log file. Valid inputs: 'critical', 'error', 'warning', 'info', or 'debug'. If not specified, the
         default value is 'info'.
 
+    profile_output : str, optional
+        Name of the file to which the resource usage of the processing steps of all AstroDrizzle runs
+        gets written as JSON (or as a Chrome trace if the name ends in '.trace.json'). If not specified,
+        no profile is written.
+
     Updates
     -------
     return_value : list
@@ -93,7 +99,8 @@ def perform(input_filename, **kwargs):
         kwargs['log_level'] = logutil.logging.INFO
 
     # execute hapsequencer.run_hap_processing()
-    return_value = hapsequencer.run_hap_processing(input_filename, **kwargs)
+    with profiling.session(kwargs.pop('profile_output', None)):
+        return_value = hapsequencer.run_hap_processing(input_filename, **kwargs)
 
     return return_value
 
@@ -118,11 +125,15 @@ def main():
                         'statements with a log_level left of the specified level. Specifying "critical" will '
                         'only record/display "critical" log statements, and specifying "error" will '
                         'record/display both "error" and "critical" log statements, and so on.')
+    parser.add_argument('-p', '--profile_output', required=False, default=None, help='Name of the file to '
+                        'which the resource usage of the processing steps of all AstroDrizzle runs gets '
+                        'written. If the name ends in ".trace.json", the Chrome trace format is used.')
     user_args = parser.parse_args()
 
     print("Single-visit processing started for: {}".format(user_args.input_filename))
     rv = perform(user_args.input_filename, input_custom_pars_file=user_args.input_custom_pars_file,
-                 diagnostic_mode=user_args.diagnostic_mode, log_level=user_args.log_level)
+                 diagnostic_mode=user_args.diagnostic_mode, log_level=user_args.log_level,
+                 profile_output=user_args.profile_output)
     print("Return Value: ", rv)
     return rv
 
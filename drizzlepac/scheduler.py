@@ -0,0 +1,532 @@
+"""
+Memory-aware scheduling of the parallel ``AstroDrizzle`` processing steps.
+
+A `MemoryScheduler` models the memory needed by each processing step
+(output frames, input chip arrays and the temporary arrays used by each
+algorithm) and uses a memory budget -- specified by the user through the
+``max_memory`` parameter or, by default, the memory limit of the control
+group (container) or machine running the process -- to:
+
+  *  pick the number of parallel workers used by each step, and
+  *  throttle the start of new worker processes so that the predicted memory
+     of all running workers stays within the budget.
+
+It also samples the resident memory of the main process and of its worker
+processes while each step runs, so that the predicted and actual peak memory
+usage of each step can be reported at the end of processing.
+
+:License: :doc:`/LICENSE`
+
+"""
+import os
+import sys
+import time
+import threading
+import multiprocessing
+import resource
+
+import numpy as np
+from stsci.tools import logutil
+
+from . import util
+
+__all__ = ['MemoryScheduler', 'PeakMemoryMonitor', 'ProcessLauncher',
+           'get_memory_limit', 'get_rss']
+
+MB = 1024 * 1024
+GB = 1024 * MB
+
+# Bytes of memory used per pixel of the output frame and per pixel of the
+# (largest) input chip by each step. These were derived by accounting for
+# the arrays allocated by each step:
+#
+# - driz_separate/final: SCI and WHT (float32) plus one int32 context plane
+#   for each output pixel; for each input pixel: the input SCI and sky
+#   subtracted copy, DQ mask, weight array and temporaries (float32).
+# - median: sections of all single drizzle SCI, WHT and mask arrays
+#   (controlled by 'combine_bufsize') with minmed temporaries, plus the
+#   output median frame and one input frame read for the image size.
+# - blot: median frame plus its copy, and the output chip with the
+#   coordinate mapping arrays.
+# - driz_cr: about 14 chip-sized float32/float64/bool arrays.
+#
+# The final drizzle step also keeps the flat fields of the input images in
+# memory (see `imageObject._cache_memory`).
+_DRIZ_OUT_BYTES = 8
+_DRIZ_CTX_BYTES = 4
+_DRIZ_CHIP_BYTES = 24
+_MEDIAN_OUT_BYTES = 8
+_MEDIAN_SECTION_FACTOR = 9
+_BLOT_OUT_BYTES = 8
+_BLOT_CHIP_BYTES = 16
+_DRIZCR_CHIP_BYTES = 56
+
+_SAMPLING_INTERVAL = 0.05  # seconds
+
+log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
+
+
+def _read_int(filename):
+    try:
+        with open(filename) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    try:
+        return int(value)
+    except ValueError:  # for instance, 'max' in cgroup v2
+        return None
+
+
+def get_memory_limit():
+    """ Return the amount of memory (in bytes) available to this process.
+
+    This is the smallest of the physical memory of the machine and
+    the limit imposed by the memory control group (v1 or v2), if any.
+    `None` is returned when neither can be determined.
+
+    """
+    limits = []
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        pass
+
+    for cgroup_file in ['/sys/fs/cgroup/memory.max',
+                        '/sys/fs/cgroup/memory/memory.limit_in_bytes']:
+        limit = _read_int(cgroup_file)
+        # cgroup v1 reports "unlimited" as a very large number:
+        if limit is not None and limit < 2**60:
+            limits.append(limit)
+
+    return min(limits) if limits else None
+
+
+def get_rss(pid=None):
+    """ Return the current resident set size (in bytes) of a process.
+
+    Parameters
+    ----------
+    pid : int, None, optional
+        Process ID. Defaults to the current process.
+
+    Returns
+    -------
+    rss : int, None
+        Resident memory in bytes or `None` when it cannot be determined
+        (on platforms without ``/proc``).
+
+    """
+    if pid is None:
+        pid = 'self'
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _peak_rss(who=resource.RUSAGE_SELF):
+    """ High-water mark of resident memory in bytes, as reported by the OS. """
+    maxrss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS:
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def _npix(shape):
+    return int(np.prod(shape)) if shape is not None else 0
+
+
+class PeakMemoryMonitor:
+    """ Measure the peak resident memory of this process and its children.
+
+    Between calls to :py:meth:`start` and :py:meth:`stop`, a background
+    thread periodically samples the resident memory of this process and
+    of all of its active child processes. Since sampling may miss short
+    peaks (and cannot run while C code holds the GIL), the high-water
+    marks reported by the OS are also used when they increased while the
+    monitor was running.
+
+    Attributes
+    ----------
+    peak_self : int
+        Peak resident memory (in bytes) of this process.
+
+    peak_children : int
+        Peak combined resident memory (in bytes) of the child processes.
+
+    peak : int
+        Peak combined resident memory (in bytes) of this process and its
+        children.
+
+    """
+    def __init__(self, interval=_SAMPLING_INTERVAL):
+        self.interval = interval
+        self.peak_self = 0
+        self.peak_children = 0
+        self.peak = 0
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            rss = get_rss()
+            if rss is None:
+                return
+            children = sum(get_rss(child.pid) or 0
+                           for child in multiprocessing.active_children())
+            self.peak_self = max(self.peak_self, rss)
+            self.peak_children = max(self.peak_children, children)
+            self.peak = max(self.peak, rss + children)
+            if self._stop_event.wait(self.interval):
+                return
+
+    def start(self):
+        """ Start monitoring memory usage. """
+        self._maxrss_self = _peak_rss()
+        self._maxrss_children = _peak_rss(resource.RUSAGE_CHILDREN)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ Stop monitoring memory usage and update the peak values. """
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+        maxrss = _peak_rss()
+        if maxrss > self._maxrss_self:
+            self.peak_self = max(self.peak_self, maxrss)
+            self.peak = max(self.peak, maxrss)
+        maxrss = _peak_rss(resource.RUSAGE_CHILDREN)
+        if maxrss > self._maxrss_children:
+            self.peak_children = max(self.peak_children, maxrss)
+            self.peak = max(self.peak, maxrss + (get_rss() or 0))
+
+
+class ProcessLauncher:
+    """ Start worker processes as allowed by a pool size and memory budget.
+
+    Use `MemoryScheduler.launch` to create instances of this class. Processes
+    are started by (and must be polled from) the thread that calls
+    :py:meth:`poll`.
+
+    """
+    def __init__(self, procs, task_memory, pool_size, budget):
+        self.procs = list(procs)
+        self._pending = list(zip(self.procs, task_memory))
+        self._running = []
+        self._pool_size = max(pool_size, 1)
+        self._budget = budget
+        self._base = get_rss() or 0
+
+    def poll(self):
+        """ Start processes that can be started now.
+
+        Returns
+        -------
+        done : bool
+            `True` when all processes have been started and have finished.
+
+        """
+        self._running = [(p, m) for p, m in self._running if p.is_alive()]
+        committed = self._base + sum(m for _, m in self._running)
+        while self._pending and len(self._running) < self._pool_size:
+            p, m = self._pending[0]
+            if (self._running and self._budget is not None and
+                    committed + m > self._budget):
+                break
+            p.start()
+            self._running.append(self._pending.pop(0))
+            committed += m
+        return not (self._pending or self._running)
+
+    def join(self):
+        """ Wait for all processes and check their exit codes. """
+        while not self.poll():
+            time.sleep(_SAMPLING_INTERVAL)
+        for p in self.procs:
+            p.join()
+            if p.exitcode != 0:
+                raise RuntimeError(f"Problem during: {p.name}, exitcode: "
+                                   f"{p.exitcode}. Check log.")
+
+
+class MemoryScheduler:
+    """ Plan pool sizes and throttle parallel workers within a memory budget.
+
+    Parameters
+    ----------
+    imageObjectList : list of `~drizzlepac.imageObject.imageObject`
+        Input images.
+
+    output_wcs : `~drizzlepac.imageObject.WCSObject`, `~stwcs.wcsutil.HSTWCS`, None
+        Output WCS. When a WCS object (rather than a ``WCSObject``) is given,
+        it is used for both single and final drizzle products.
+
+    num_cores : int, None, optional
+        Maximum number of parallel workers requested by the user
+        (see :py:func:`~drizzlepac.util.get_pool_size`).
+
+    max_memory : float, None, optional
+        Memory budget in gigabytes. When `None`, the memory limit of the
+        machine or control group is used (see `get_memory_limit`).
+
+    bufsize : float, None, optional
+        Size of the buffer (in MB) used for each image by the median step
+        (``combine_bufsize`` parameter).
+
+    context : bool, optional
+        Whether a context image is created by the final drizzle step.
+
+    """
+    def __init__(self, imageObjectList, output_wcs, num_cores=None,
+                 max_memory=None, bufsize=None, context=True):
+        self.num_cores = num_cores
+        if max_memory is None:
+            self.budget = get_memory_limit()
+        else:
+            self.budget = int(float(max_memory) * GB)
+
+        self.bufsize = MB * (1 if bufsize is None else float(bufsize))
+        self.nimages = len(imageObjectList)
+
+        if output_wcs is None:
+            single_wcs = final_wcs = None
+        elif hasattr(output_wcs, 'final_wcs'):
+            single_wcs = output_wcs.single_wcs
+            final_wcs = output_wcs.final_wcs
+        else:
+            single_wcs = final_wcs = output_wcs
+
+        self.single_npix = 0 if single_wcs is None else _npix(single_wcs.array_shape)
+        self.final_npix = 0 if final_wcs is None else _npix(final_wcs.array_shape)
+
+        # Largest chip (in pixels) and total size of each input image:
+        self.chip_npix = []
+        self.image_npix = []
+        nchips = 0
+        for img in imageObjectList:
+            chips = img.returnAllChips(extname=img.scienceExt)
+            nchips += len(chips)
+            self.chip_npix.append(
+                max([_npix(chip.image_shape) for chip in chips], default=0)
+            )
+            self.image_npix.append(
+                sum(_npix(chip.image_shape) for chip in chips)
+            )
+        self.nplanes = (nchips - 1) // 32 + 1 if context else 1
+
+        self._steps = {}
+        self._current = None
+        self._monitor = None
+
+    @classmethod
+    def from_config(cls, imageObjectList, output_wcs, configObj):
+        """ Create a scheduler from an ``AstroDrizzle`` configuration. """
+        median_step = util.getSectionName(configObj, 4)
+        bufsize = None
+        if median_step is not None:
+            bufsize = configObj[median_step].get('combine_bufsize')
+        return cls(imageObjectList, output_wcs,
+                   num_cores=configObj.get('num_cores'),
+                   max_memory=configObj.get('max_memory'),
+                   bufsize=bufsize, context=configObj.get('context', True))
+
+    def task_memory(self, step_name):
+        """ Predicted memory (in bytes) of each task run by a step.
+
+        Steps which process each image in a separate worker (``driz_sep``
+        and ``driz_cr``) return one value per input image; the remaining
+        steps run in the main process and return a single value.
+
+        """
+        from . import ablot, adrizzle, createMedian, drizCR, imageObject
+
+        max_chip = max(self.chip_npix, default=0)
+        if step_name == adrizzle.PROCSTEPS_NAME_SINGLE:
+            out_mem = (_DRIZ_OUT_BYTES + _DRIZ_CTX_BYTES) * self.single_npix
+            return [out_mem + _DRIZ_CHIP_BYTES * c for c in self.chip_npix]
+
+        elif step_name == drizCR.PROCSTEPS_NAME:
+            return [_DRIZCR_CHIP_BYTES * c for c in self.chip_npix]
+
+        elif step_name == createMedian.PROCSTEPS_NAME:
+            return [_MEDIAN_OUT_BYTES * self.single_npix +
+                    _MEDIAN_SECTION_FACTOR * self.nimages * self.bufsize]
+
+        elif step_name == ablot.PROCSTEPS_NAME:
+            return [_BLOT_OUT_BYTES * self.single_npix +
+                    _BLOT_CHIP_BYTES * max_chip]
+
+        elif step_name == adrizzle.PROCSTEPS_NAME_FINAL:
+            out_mem = (_DRIZ_OUT_BYTES + _DRIZ_CTX_BYTES * self.nplanes) * \
+                self.final_npix
+            cache_mem = imageObject._cache_memory(sum(self.image_npix))
+            return [out_mem + _DRIZ_CHIP_BYTES * max_chip + cache_mem]
+
+        return [0]
+
+    def blot_chip_memory(self, chip):
+        """ Predicted memory (in bytes) of a worker blotting a single chip.
+
+        The median image is read once and shared by all blot workers, so
+        it is not included.
+
+        """
+        return _BLOT_CHIP_BYTES * _npix(chip.image_shape)
+
+    def pool_size(self, step_name, num_tasks=None, task_memory=None):
+        """ Number of parallel workers to use for a step.
+
+        This is the pool size returned by
+        :py:func:`~drizzlepac.util.get_pool_size` reduced, as needed, so that
+        that many of the largest tasks of the step fit in the memory left
+        by the main process.
+
+        ``task_memory`` can be used to provide the memory of each task for
+        steps (such as groups of steps run together) not known to
+        :py:meth:`task_memory`.
+
+        """
+        if task_memory is None:
+            task_mem = self.task_memory(step_name)
+        else:
+            task_mem = list(task_memory)
+            self._plan(step_name)['task_memory'] = task_mem
+        if num_tasks is None:
+            num_tasks = len(task_mem)
+        pool_size = util.get_pool_size(self.num_cores, num_tasks)
+
+        if pool_size > 1 and self.budget is not None and max(task_mem) > 0:
+            base = get_rss()
+            if base is None:
+                base = _peak_rss()
+            fit = int((self.budget - base) // max(task_mem))
+            if fit < pool_size:
+                log.info(f"Reducing number of parallel workers for step "
+                         f"'{step_name}' from {pool_size:d} to "
+                         f"{max(fit, 1):d} to stay within memory budget of "
+                         f"{self.budget / MB:.0f} MB.")
+                pool_size = max(fit, 1)
+
+        self._plan(step_name)['pool_size'] = pool_size
+        return pool_size
+
+    def predicted_peak(self, step_name, pool_size=1):
+        """ Predicted peak memory (in bytes) of all workers of a step. """
+        task_mem = self._steps.get(step_name, {}).get('task_memory')
+        if task_mem is None:
+            task_mem = self.task_memory(step_name)
+        task_mem = sorted(task_mem, reverse=True)
+        return int(sum(task_mem[:max(pool_size, 1)]))
+
+    def launch(self, procs, task_memory, pool_size):
+        """ Prepare worker processes to be started within the memory budget.
+
+        At most ``pool_size`` of the (not yet started)
+        ``multiprocessing.Process`` objects in ``procs`` run at any time
+        and a process is only started when its predicted memory fits in
+        the budget together with the processes already running (or when no
+        other process is running).
+
+        Parameters
+        ----------
+        procs : list of multiprocessing.Process
+            Processes to run.
+
+        task_memory : list of int
+            Predicted memory (in bytes) of each process.
+
+        pool_size : int
+            Maximum number of processes running at the same time.
+
+        Returns
+        -------
+        launcher : ProcessLauncher
+            Object which starts processes when :py:meth:`ProcessLauncher.poll`
+            is called.
+
+        """
+        return ProcessLauncher(procs, task_memory, pool_size, self.budget)
+
+    def launch_and_wait(self, procs, task_memory, pool_size):
+        """ Run worker processes within the memory budget.
+
+        This is a memory-aware equivalent of
+        `stsci.tools.mputil.launch_and_wait` which blocks until all
+        processes have finished. See :py:meth:`launch` for a description
+        of the parameters.
+
+        """
+        launcher = self.launch(procs, task_memory, pool_size)
+        while not launcher.poll():
+            time.sleep(_SAMPLING_INTERVAL)
+        launcher.join()
+
+    def _plan(self, step_name):
+        return self._steps.setdefault(
+            step_name, {'pool_size': 1, 'actual': None}
+        )
+
+    def step_started(self, step_name):
+        """ Start measuring the memory used by a step. """
+        self.step_ended(self._current)
+        self._current = step_name
+        self._monitor = PeakMemoryMonitor()
+        self._monitor.start()
+        self._plan(step_name)
+
+    def step_ended(self, step_name):
+        """ Stop measuring the memory used by a step and record its peak. """
+        if step_name is None or step_name != self._current:
+            return
+        self._monitor.stop()
+        self._plan(step_name)['actual'] = self._monitor.peak
+        self._monitor = None
+        self._current = None
+
+    def report(self, order=None):
+        """ Print a summary of predicted and actual peak memory per step. """
+        steps = order if order is not None else list(self._steps)
+        budget = 'unknown' if self.budget is None else \
+            f'{self.budget / MB:.0f} Mb'
+
+        print('\n   {:20s}   {:>7s}   {:>14s}   {:>14s}'.format(
+            'Step', 'Workers', 'Predicted peak', 'Actual peak'))
+        print('   {:20s}   {:7s}   {:14s}   {:14s}'.format(
+            '-' * 20, '-' * 7, '-' * 14, '-' * 14))
+        for step_name in steps:
+            if step_name not in self._steps:
+                continue
+            plan = self._steps[step_name]
+            predicted = self.predicted_peak(step_name, plan['pool_size'])
+            actual = plan['actual']
+            actual = 'n/a' if not actual else f'{actual / MB:.0f} Mb'
+            print('   {:20s}   {:7d}   {:>14s}   {:>14s}'.format(
+                step_name, plan['pool_size'],
+                f'{predicted / MB:.0f} Mb', actual))
+        print(f'   Memory budget: {budget}\n', flush=True)
+
+    def report_plan(self):
+        """ Print the predicted memory usage and pool size of each step. """
+        from . import ablot, adrizzle, createMedian, drizCR
+
+        if self.budget is not None:
+            print('*  Memory budget:           %d Mb' % (self.budget // MB))
+        for step_name in [adrizzle.PROCSTEPS_NAME_SINGLE,
+                          createMedian.PROCSTEPS_NAME,
+                          ablot.PROCSTEPS_NAME,
+                          drizCR.PROCSTEPS_NAME,
+                          adrizzle.PROCSTEPS_NAME_FINAL]:
+            task_mem = self.task_memory(step_name)
+            if len(task_mem) > 1:
+                pool_size = self.pool_size(step_name)
+                peak = self.predicted_peak(step_name, pool_size)
+                print('*  {:24s} up to {:d} Mb ({:d} workers)'.format(
+                    step_name + ':', peak // MB, pool_size))
+            else:
+                print('*  {:24s} up to {:d} Mb'.format(
+                    step_name + ':', task_mem[0] // MB))
@@ -0,0 +1,367 @@
+"""
+Content-hash based caching of ``AstroDrizzle`` processing steps.
+
+Each cacheable step (static mask, sky subtraction, separate drizzle, median,
+blot and cosmic-ray identification) is assigned a key computed from:
+
+  *  a fingerprint of the input images (pixel data of all image extensions
+     and the WCS/detector attributes of every chip, taken *after* the
+     ``resetbits`` reset performed during initialization),
+  *  the subset of the configuration that affects the step,
+  *  the key of the preceding step, and
+  *  the ``drizzlepac`` version.
+
+Keys, the names/state of each step's products and the size/modification
+time of each product file are recorded in a JSON manifest written next to
+the output products (``<output>_stepcache.json``). On a subsequent run,
+a step whose key matches the manifest and whose product files are unchanged
+is not executed; instead, its products are re-attached to the image objects
+and the step is reported as "cached" by `~drizzlepac.util.ProcSteps`.
+
+The final drizzle step is never cached.
+
+:License: :doc:`/LICENSE`
+
+"""
+import os
+import json
+import hashlib
+
+import numpy as np
+from astropy.io import fits
+from stsci.tools import logutil
+
+from . import ablot
+from . import adrizzle
+from . import createMedian
+from . import drizCR
+from . import sky
+from . import staticMask
+from . import util
+from . import __version__
+
+
+__all__ = ['StepCache', 'MANIFEST_SUFFIX']
+
+MANIFEST_SUFFIX = '_stepcache.json'
+MANIFEST_VERSION = 1
+
+# Top-level parameters that have no effect on the products of cached steps.
+_IGNORED_PARS = ['input', 'output', 'runfile', 'num_cores', 'max_memory',
+                 'in_memory', 'rules_file', 'build', 'context', 'mdriztab',
+                 'step_cache', 'profile_output', 'stream_steps']
+
+# For each cacheable step (in processing order): the configObj sections
+# controlling it, the chip attributes and 'outputNames' entries it produces,
+# and the image-level 'outputNames' entries it produces.
+_STEP_SPECS = [
+    (staticMask.PROCSTEPS_NAME, {
+        'sections': [staticMask.STEP_NUM],
+        'chip_attrs': [],
+        'chip_outputs': ['staticMask'],
+        'image_outputs': [],
+    }),
+    (sky.PROCSTEPS_NAME, {
+        'sections': [sky.STEP_NUM],
+        'chip_attrs': ['subtractedSky', 'computedSky'],
+        'chip_outputs': [],
+        'image_outputs': [],
+    }),
+    (adrizzle.PROCSTEPS_NAME_SINGLE, {
+        'sections': [adrizzle.STEP_NUM_SINGLE, '3a'],
+        'chip_attrs': [],
+        'chip_outputs': ['outSingle', 'outSWeight'],
+        'image_outputs': [],
+    }),
+    (createMedian.PROCSTEPS_NAME, {
+        'sections': [createMedian.STEP_NUM],
+        'chip_attrs': [],
+        'chip_outputs': [],
+        'image_outputs': ['outMedian'],
+    }),
+    (ablot.PROCSTEPS_NAME, {
+        'sections': [ablot.STEP_NUM],
+        'chip_attrs': [],
+        'chip_outputs': ['blotImage'],
+        'image_outputs': [],
+    }),
+    (drizCR.PROCSTEPS_NAME, {
+        'sections': [drizCR.STEP_NUM],
+        'chip_attrs': [],
+        'chip_outputs': ['crmaskImage'],
+        'image_outputs': ['crcorImage'],
+    }),
+]
+STEP_SPECS = dict(_STEP_SPECS)
+
+log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
+
+
+def _digest(*items):
+    """ Return a SHA-256 hex digest of JSON-serializable items. """
+    h = hashlib.sha256()
+    for item in items:
+        h.update(json.dumps(item, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def _file_digest(filename, blocksize=1 << 20):
+    """ Return a SHA-256 hex digest of the contents of a file. """
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(blocksize), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _file_stat(filename):
+    st = os.stat(filename)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def image_fingerprint(img):
+    """ Compute a content hash of an input image.
+
+    The hash covers the raw (unscaled) pixel data of every image extension
+    in the file together with the WCS and detector parameters of each
+    chip being processed. Header keywords are not hashed directly since
+    ``AstroDrizzle`` itself updates some of them (for instance
+    ``MDRIZSKY``) in the input files.
+
+    Parameters
+    ----------
+    img : `~drizzlepac.imageObject.imageObject`
+        Input image.
+
+    Returns
+    -------
+    digest : str
+        SHA-256 hex digest.
+
+    """
+    h = hashlib.sha256()
+    h.update(os.path.basename(img._filename).encode())
+
+    with fits.open(img._filename, memmap=True,
+                   do_not_scale_image_data=True) as hdulist:
+        for hdu in hdulist:
+            if not isinstance(hdu, (fits.PrimaryHDU, fits.ImageHDU)):
+                continue
+            if hdu.data is None:
+                continue
+            h.update(f"{hdu.name},{hdu.ver}".encode())
+            h.update(np.ascontiguousarray(hdu.data).data)
+
+    for chip in img.returnAllChips(extname=img.scienceExt):
+        h.update(chip.wcs.to_header_string(relax=True).encode())
+        h.update(_digest([chip._chip, chip._effGain, chip._rdnoise,
+                          chip._exptime, chip._conversionFactor,
+                          chip.signature]).encode())
+
+    return h.hexdigest()
+
+
+class StepCache:
+    """ Manage cached products of ``AstroDrizzle`` processing steps.
+
+    Steps must be looked up in processing order with :py:meth:`restore`;
+    steps that were actually run must be recorded with :py:meth:`record`.
+    Once any step misses the cache, all following steps are re-run as well.
+
+    Parameters
+    ----------
+    imageObjectList : list of `~drizzlepac.imageObject.imageObject`
+        Input images, as returned by
+        :py:func:`~drizzlepac.processInput.setCommonInput`.
+
+    output_wcs : `~drizzlepac.imageObject.WCSObject`
+        Output WCS object.
+
+    configobj : `~stsci.tools.configobj.ConfigObj`
+        Full ``AstroDrizzle`` configuration.
+
+    """
+    def __init__(self, imageObjectList, output_wcs, configobj):
+        self.imageObjectList = imageObjectList
+        self.output_wcs = output_wcs
+        self.configobj = configobj
+
+        median_name = imageObjectList[0].outputNames['outMedian']
+        self.manifest_name = (median_name[:-len('_med.fits')] +
+                              MANIFEST_SUFFIX)
+
+        self._previous = self._load_manifest()
+        self._steps = {}
+        self._chain_key = None
+        self._valid = True
+
+    def _load_manifest(self):
+        if not os.path.isfile(self.manifest_name):
+            return {}
+        try:
+            with open(self.manifest_name) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            log.warning(f"Ignoring unreadable step cache manifest "
+                        f"'{self.manifest_name}'.")
+            return {}
+        if manifest.get('manifest_version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('steps', {})
+
+    def save(self):
+        """ Write the manifest of all recorded steps to disk. """
+        manifest = {
+            'manifest_version': MANIFEST_VERSION,
+            'drizzlepac_version': __version__,
+            'steps': self._steps,
+        }
+        tmpname = self.manifest_name + '.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmpname, self.manifest_name)
+
+    def _input_key(self):
+        global_pars = {
+            k: v for k, v in self.configobj.items()
+            if not isinstance(v, dict) and k not in _IGNORED_PARS
+        }
+        global_pars.update(self.configobj.get('INSTRUMENT PARAMETERS', {}))
+        fingerprints = [image_fingerprint(img)
+                        for img in self.imageObjectList]
+        return _digest(__version__, global_pars, fingerprints)
+
+    def _step_config(self, step_name):
+        config = {}
+        for stepnum in STEP_SPECS[step_name]['sections']:
+            section = util.getSectionName(self.configobj, stepnum)
+            if section is not None:
+                config[section] = dict(self.configobj[section])
+
+        # Include the content of any auxiliary input files:
+        extra = {}
+        if step_name == sky.PROCSTEPS_NAME:
+            pars = config[util.getSectionName(self.configobj, sky.STEP_NUM)]
+            for par in ['skyfile', 'skymask_cat', 'skyuser']:
+                fname = str(pars.get(par, '')).strip().lstrip('@')
+                if fname and os.path.isfile(fname):
+                    extra[par] = _file_digest(fname)
+
+        elif step_name == adrizzle.PROCSTEPS_NAME_SINGLE:
+            extra['single_wcs'] = self.output_wcs.single_wcs.to_header_string(
+                relax=True
+            )
+
+        return config, extra
+
+    def _step_key(self, step_name):
+        if self._chain_key is None:
+            self._chain_key = self._input_key()
+        config, extra = self._step_config(step_name)
+        return _digest(self._chain_key, step_name, config, extra)
+
+    def _collect_state(self, step_name):
+        spec = STEP_SPECS[step_name]
+        state = []
+        products = set()
+        for img in self.imageObjectList:
+            img_state = {'image_outputs': {}, 'chips': {}}
+            for name in spec['image_outputs']:
+                value = img.outputNames.get(name)
+                if value and os.path.isfile(value):
+                    img_state['image_outputs'][name] = value
+                    products.add(value)
+
+            for chip in img.returnAllChips(extname=img.scienceExt):
+                chip_state = {}
+                for attr in spec['chip_attrs']:
+                    value = getattr(chip, attr)
+                    if isinstance(value, np.generic):
+                        value = value.item()
+                    chip_state[attr] = value
+                for name in spec['chip_outputs']:
+                    value = chip.outputNames.get(name)
+                    if value and os.path.isfile(value):
+                        chip_state[name] = value
+                        products.add(value)
+                img_state['chips'][str(chip._chip)] = chip_state
+
+            state.append(img_state)
+
+        return state, {p: _file_stat(p) for p in sorted(products)}
+
+    def _apply_state(self, step_name, state):
+        spec = STEP_SPECS[step_name]
+        for img, img_state in zip(self.imageObjectList, state):
+            img.outputNames.update(img_state['image_outputs'])
+            for chip in img.returnAllChips(extname=img.scienceExt):
+                chip_state = img_state['chips'][str(chip._chip)]
+                for attr in spec['chip_attrs']:
+                    setattr(chip, attr, chip_state[attr])
+                for name in spec['chip_outputs']:
+                    if name in chip_state:
+                        chip.outputNames[name] = chip_state[name]
+
+    def restore(self, step_name, procSteps=None):
+        """ Attempt to restore the products of a step from the cache.
+
+        Parameters
+        ----------
+        step_name : str
+            ``PROCSTEPS_NAME`` of the step.
+
+        procSteps : `~drizzlepac.util.ProcSteps`, None, optional
+            When provided and the step is restored, the step is reported
+            with a "cached" status.
+
+        Returns
+        -------
+        restored : bool
+            `True` when the step does not need to be run.
+
+        """
+        key = self._step_key(step_name)
+        self._chain_key = key
+        entry = self._previous.get(step_name)
+
+        hit = (
+            self._valid and entry is not None and entry.get('key') == key and
+            len(entry.get('state', [])) == len(self.imageObjectList) and
+            all(os.path.isfile(p) and _file_stat(p) == stat
+                for p, stat in entry.get('products', {}).items())
+        )
+
+        if not hit:
+            self._valid = False
+            return False
+
+        self._apply_state(step_name, entry['state'])
+        self._steps[step_name] = entry
+        log.info(f"Restored products of step '{step_name}' from "
+                 f"'{self.manifest_name}'.")
+
+        if procSteps is not None:
+            procSteps.addStep(step_name)
+            procSteps.endStep(step_name, reason="cached")
+        return True
+
+    def record(self, step_name, procSteps=None):
+        """ Record the products of a step that has just been run.
+
+        Nothing is recorded if ``procSteps`` indicates that the step did not
+        finish normally.
+
+        """
+        if procSteps is not None:
+            status = procSteps.steps.get(step_name, {}).get('status')
+            if status is not util.StepStatus.STEP_ENDED:
+                self._valid = False
+                return
+
+        state, products = self._collect_state(step_name)
+        self._steps[step_name] = {
+            'key': self._chain_key,
+            'state': state,
+            'products': products,
+        }
+        self.save()
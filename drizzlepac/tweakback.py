@@ -265,9 +265,95 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
     print(f"\n*** 'apply_tweak' version {__version__:s} started "
           f"at {util._ptime()[0]:s}: ***\n")
 
+    product = _load_drizzled_wcs(drz_file, orig_wcs_name, kwargs)
+    _apply_products([product], output_wcs_name=output_wcs_name,
+                    input_files=[input_files], default_extname=default_extname)
+
+
+def apply_tweak_batch(drz_files, orig_wcs_name, output_wcs_name=None,
+                      input_files=None, default_extname='SCI', **kwargs):
+    """
+    Apply WCS solutions recorded in several drizzled files to the distorted
+    input images used to create them.
+
+    This is equivalent to running :py:func:`apply_tweak` on each of the
+    drizzled files in ``drz_files`` except that each input image is opened
+    only once to read the WCS of its extensions and once to write
+    all of its updated WCS, and that the corrections of all the extensions
+    drizzled into the same drizzled file are computed together.
+
+    Parameters
+    ----------
+    drz_files : list of str
+        File names of the drizzled images that contain both the "original"
+        and "tweaked" WCS. See ``drz_file`` in :py:func:`apply_tweak`.
+
+    orig_wcs_name : str
+        Name of the "original" WCS in **all** drizzled images. See
+        :py:func:`apply_tweak`.
+
+    output_wcs_name : str, None
+        Value of ``WCSNAME`` to be used to label the updated solution in the
+        input files. If `None`, the name of the "tweaked" WCS of the drizzled
+        image of each input file is used.
+
+    input_files : list of str, None
+        Filenames (see :py:func:`apply_tweak`) of the distorted images of each
+        of the drizzled images in ``drz_files``. Default value of `None`
+        indicates that the input images of all drizzled images are derived
+        from their ``D*DATA`` keywords. `None` can also be used for
+        individual drizzled images.
+
+    default_extname : str
+        Extension name of extensions in input images whose primary WCS
+        should be updated. This value is used only when file names of input
+        images do not contain extension specifications.
+
+    Other Parameters
+    ----------------
+    tweaked_wcs_name : str
+        Name of the "tweaked" WCS in all drizzled images.
+
+    tweaked_wcs_key : {' ', 'A'-'Z'}
+        Key of the "tweaked" WCS in all drizzled images.
+
+    orig_wcs_key : {' ', 'A'-'Z'}
+        Key of the "original" WCS in all drizzled images.
+
+    Raises
+    ------
+    ValueError
+        When an extension of an input image was drizzled into more than one
+        of the drizzled images, since it could not be aligned with all of
+        them.
+
+    Examples
+    --------
+    >>> from drizzlepac import tweakback
+    >>> tweakback.apply_tweak_batch(
+    ...     ['skycell-p1234x05y06_drz.fits', 'skycell-p1234x05y07_drz.fits'],
+    ...     orig_wcs_key='O'
+    ... )
+
+    """
+    print(f"\n*** 'apply_tweak_batch' version {__version__:s} started "
+          f"at {util._ptime()[0]:s}: ***\n")
+
+    if input_files is None:
+        input_files = [None] * len(drz_files)
+    elif len(input_files) != len(drz_files):
+        raise ValueError("'input_files' must provide the input images of "
+                         "each drizzled file in 'drz_files'.")
+
+    products = [_load_drizzled_wcs(f, orig_wcs_name, kwargs)
+                for f in drz_files]
+    _apply_products(products, output_wcs_name=output_wcs_name,
+                    input_files=input_files, default_extname=default_extname)
+
+
+def _load_drizzled_wcs(drz_file, orig_wcs_name, kwargs):
+    """ Load the "original" and "tweaked" WCS of a drizzled image. """
     tweaked_wcs_name = kwargs.get('tweaked_wcs_name', None)
-    tweaked_wcs_key = kwargs.get('tweaked_wcs_key', None)
-    orig_wcs_key = kwargs.get('orig_wcs_key', None)
 
     tweaked_wcs_key = _process_wcs_key_par('tweaked_wcs_key', kwargs)
     orig_wcs_key = _process_wcs_key_par('orig_wcs_key', kwargs)
@@ -348,8 +434,28 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
     crderr1 = fi.image.hdu[drz_sciext].header.get('CRDER1' + orig_wcs_key, 0.0)
     crderr2 = fi.image.hdu[drz_sciext].header.get('CRDER2' + orig_wcs_key, 0.0)
 
+    # get input (FLT) file names from the drizzled image. This information
+    # is recorded in the primary header of the drizzled image.
+    drz_input_files = ",".join(hdul[0].header["D???DATA"].values())
+
     fi.release_all_images()  # done with the resampled image
 
+    return {
+        'drz_file': drz_file,
+        'tweaked_wcs': tweaked_wcs,
+        'tweaked_wcs_name': tweaked_wcs_name,
+        'orig_wcs': orig_wcs,
+        'crderr': (crderr1, crderr2),
+        'input_files': drz_input_files
+    }
+
+
+def _apply_products(products, output_wcs_name, input_files, default_extname):
+    """
+    Apply the WCS corrections of drizzled images loaded with
+    ``_load_drizzled_wcs`` to their input images. ``input_files`` lists
+    the input images of each drizzled image.
+    """
     # Process the list of input files:
     if not isinstance(default_extname, str):
         raise TypeError("Argument 'default_extname' must be a string")
@@ -359,32 +465,34 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
     else:
         ext2get = (default_extname, '*')
 
-    if input_files is None:
-        # get input (FLT) file names from the drizzled image. This information
-        # is recorded in the primary header of the drizzled image.
-        input_files = ",".join(hdul[0].header["D???DATA"].values())
-
-    # Build a list of input files and extensions
+    # Build a list of input files and extensions, each extension being
+    # labeled with the index of the drizzled image it belongs to:
     fnames_ext = {}
-    fis = parse_cs_line(
-        input_files, default_ext=ext2get, fnamesOnly=False,
-        doNotOpenDQ=True, im_fmode="readonly"
-    )
-    for f in fis:
-        f.release_all_images()
-        if f.image in fnames_ext:
-            fnames_ext[f.image] |= set(f.fext)
-        else:
-            fnames_ext[f.image] = set(f.fext)
-
-    if output_wcs_name is None:
-        output_wcs_name = tweaked_wcs_name
-        print(f"\n* Setting 'output_wcs_name' to '{output_wcs_name}'")
-        auto_output_name = True
-    else:
-        auto_output_name = False
+    for k, (product, files) in enumerate(zip(products, input_files)):
+        if files is None:
+            files = product['input_files']
+        fis = parse_cs_line(
+            files, default_ext=ext2get, fnamesOnly=False,
+            doNotOpenDQ=True, im_fmode="readonly"
+        )
+        for f in fis:
+            f.release_all_images()
+            if f.image not in fnames_ext:
+                fnames_ext[f.image] = []
+            fnames_ext[f.image].extend(
+                (ext, k) for ext in f.fext if (ext, k) not in fnames_ext[f.image]
+            )
 
-    output_wcs_name_u = output_wcs_name.strip().upper()
+    for product in products:
+        if output_wcs_name is None:
+            product['output_wcs_name'] = product['tweaked_wcs_name']
+            print(f"\n* Setting 'output_wcs_name' to "
+                  f"'{product['output_wcs_name']}'" +
+                  (f" for '{product['drz_file']}'" if len(products) > 1 else ""))
+            product['auto_output_name'] = True
+        else:
+            product['output_wcs_name'] = output_wcs_name
+            product['auto_output_name'] = False
 
     # Compute tweakback transformation to each extension of each input file.
     # This is the main part of this function.
@@ -393,6 +501,8 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
     # Also, this gives us opportunity to remove duplicate extensions, if any.
 
     final_wcs_info = []
+    # extensions (and their WCS) of the input images of each drizzled image:
+    product_chips = [[] for _ in products]
 
     for fname, extlist in fnames_ext.items():
         print(f"\n* Working on input image {fname:s} ...")
@@ -403,7 +513,8 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
             doNotOpenDQ=True, im_fmode="readonly"
         )
         if len(fis) != 1:
-            fi.release_all_images()
+            for f in fis:
+                f.release_all_images()
             raise AssertionError("The algorithm should not open more than one file.")
         fi = fis[0]
 
@@ -416,21 +527,37 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
             'fname': fname,
             'extlist': [],
             'archived_wcs_name': [],
-            'updated_primary_wcs': []
+            'updated_primary_wcs': [],
+            'output_wcs_name': []
         }
         final_wcs_info.append(current_wcs_info)
 
         # Process extensions
         hdu_list = []  # to avoid processing duplicate hdus
+        hdu_products = []
         try:
-            for ext in extlist:
+            for ext, k in extlist:
                 imhdulist = fi.image.hdu
                 hdu = imhdulist[ext]
                 if hdu in hdu_list:
+                    j = hdu_products[hdu_list.index(hdu)]
+                    if j != k:
+                        raise ValueError(
+                            f"{fname:s}[{ext2str(ext)}] is an input image of "
+                            f"both '{products[j]['drz_file']}' and "
+                            f"'{products[k]['drz_file']}'. It can only be "
+                            "aligned with one drizzled image at a time."
+                        )
                     continue
                 hdu_list.append(hdu)
+                hdu_products.append(k)
 
+                product = products[k]
+                output_wcs_name_u = product['output_wcs_name'].strip().upper()
                 current_wcs_info['extlist'].append(ext)
+                current_wcs_info['output_wcs_name'].append(
+                    product['output_wcs_name']
+                )
 
                 # Find the name under which to archive current WCS:
                 all_wcs_names = [
@@ -439,10 +566,10 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
                 ]
 
                 if output_wcs_name_u in all_wcs_names:
-                    if auto_output_name:
+                    if product['auto_output_name']:
                         raise ValueError(
                             "Current value of 'output_wcs_name' was set to "
-                            f"'{tweaked_wcs_name}' by default. However, this "
+                            f"'{product['tweaked_wcs_name']}' by default. However, this "
                             f"WCS name value was already used in {fname:s}[{ext2str(ext)}]. "
                             "Please re-run 'apply_tweak' again and explicitly "
                             "provide a unique value for the output WCS name."
@@ -462,26 +589,31 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
 
                 # add current output WCS name to the list so that archived
                 # primary WCS will be archived under a different name:
-                all_wcs_names.append(output_wcs_name)
+                all_wcs_names.append(product['output_wcs_name'])
 
                 archived_name = altwcs._auto_increment_wcsname(pri_wcs_name, all_wcs_names)
                 current_wcs_info['archived_wcs_name'].append(archived_name)
 
-                # compute updated WCS:
+                # WCS to be updated:
                 new_wcs = wcsutil.HSTWCS(imhdulist, ext=ext)
-
-                update_chip_wcs(new_wcs, orig_wcs, tweaked_wcs,
-                                xrms=crderr1, yrms=crderr2)
-                new_wcs.setOrient()
                 current_wcs_info['updated_primary_wcs'].append(new_wcs)
-
-                print(f"  - Computed new WCS solution for {fname:s}[{ext2str(ext)}]:")
-                repr_wcs = repr(new_wcs)
-                print('\n'.join(['      ' + l.strip() for l in repr_wcs.split('\n')]))
+                product_chips[k].append((fname, ext, new_wcs))
 
         finally:
             fi.release_all_images()
 
+    # compute updated WCS of all extensions drizzled into each image:
+    for product, chips in zip(products, product_chips):
+        update_chips_wcs([new_wcs for _, _, new_wcs in chips],
+                         product['orig_wcs'], product['tweaked_wcs'],
+                         xrms=product['crderr'][0], yrms=product['crderr'][1])
+
+        for fname, ext, new_wcs in chips:
+            new_wcs.setOrient()
+            print(f"  - Computed new WCS solution for {fname:s}[{ext2str(ext)}]:")
+            repr_wcs = repr(new_wcs)
+            print('\n'.join(['      ' + l.strip() for l in repr_wcs.split('\n')]))
+
     print("\n* Saving updated WCS to image headers:")
 
     for fwi in final_wcs_info:
@@ -499,9 +631,9 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
 
         # Process extensions
         try:
-            for ext, archived_name, new_wcs in zip(fwi['extlist'],
-                                                   fwi['archived_wcs_name'],
-                                                   fwi['updated_primary_wcs']):
+            for ext, archived_name, new_wcs, output_name in zip(
+                    fwi['extlist'], fwi['archived_wcs_name'],
+                    fwi['updated_primary_wcs'], fwi['output_wcs_name']):
                 imhdulist = fi.image.hdu
                 hdu = imhdulist[ext]
 
@@ -524,10 +656,10 @@ def apply_tweak(drz_file, orig_wcs_name, output_wcs_name=None, input_files=None,
 
                 # Update primary WCS of this extension:
                 wcs_hdr = new_wcs.wcs2header(idc2hdr=new_wcs.idcscale is not None, relax=True)
-                wcs_hdr.set('WCSNAME', output_wcs_name, before=0)
+                wcs_hdr.set('WCSNAME', output_name, before=0)
                 wcs_hdr.set(
                     'WCSTYPE',
-                    updatehdr.interpret_wcsname_type(output_wcs_name),
+                    updatehdr.interpret_wcsname_type(output_name),
                     after=0
                 )
                 wcs_hdr.set('ORIENTAT', new_wcs.orientat, after=len(wcs_hdr))
@@ -750,67 +882,103 @@ def tweakback(drzfile, input=None,  origwcs = None,
 
 def linearize(wcsim, wcsima, wcs_olddrz, wcs_newdrz, imcrpix, hx=1.0, hy=1.0):
     # linearization using 5-point formula for first order derivative
-    x0 = imcrpix[0]
-    y0 = imcrpix[1]
-    p = np.asarray([[x0, y0],
-                    [x0 - hx, y0],
-                    [x0 - hx * 0.5, y0],
-                    [x0 + hx * 0.5, y0],
-                    [x0 + hx, y0],
-                    [x0, y0 - hy],
-                    [x0, y0 - hy * 0.5],
-                    [x0, y0 + hy * 0.5],
-                    [x0, y0 + hy]],
-                   dtype=np.float64)
+    U, u = _linearize_chips([wcsim], [wcsima], wcs_olddrz, wcs_newdrz,
+                            np.asarray([imcrpix], dtype=np.float64),
+                            np.asarray([hx]), np.asarray([hy]))
+    return (U[0], u[0])
+
+
+# Offsets (in units of hx, hy) of the points used for the linearization:
+_LINEARIZE_DX = np.array([0.0, -1.0, -0.5, 0.5, 1.0, 0.0, 0.0, 0.0, 0.0])
+_LINEARIZE_DY = np.array([0.0, 0.0, 0.0, 0.0, 0.0, -1.0, -0.5, 0.5, 1.0])
+
+
+def _linearize_chips(wcsims, wcsimas, wcs_olddrz, wcs_newdrz, imcrpix, hx, hy):
+    """ Same as ``linearize`` for several chips drizzled into the same image.
+    ``imcrpix`` is a (nchips, 2) array, ``hx`` and ``hy`` are arrays of steps
+    for each chip. Returns (nchips, 2, 2) and (nchips, 2) arrays.
+    """
+    nchips = len(wcsims)
+    npts = _LINEARIZE_DX.size
+    p = np.empty((nchips, npts, 2), dtype=np.float64)
+    p[:, :, 0] = imcrpix[:, :1] + np.multiply.outer(hx, _LINEARIZE_DX)
+    p[:, :, 1] = imcrpix[:, 1:] + np.multiply.outer(hy, _LINEARIZE_DY)
+
     # convert image coordinates to old drizzled image coordinates:
-    p = wcs_olddrz.wcs_world2pix(wcsim.wcs_pix2world(p, 1), 1)
+    world = np.concatenate([w.wcs_pix2world(pk, 1) for w, pk in zip(wcsims, p)])
+    p = wcs_olddrz.wcs_world2pix(world, 1)
     # convert to sky coordinates using the new drizzled image's WCS:
-    p = wcs_newdrz.wcs_pix2world(p, 1)
+    p = wcs_newdrz.wcs_pix2world(p, 1).reshape((nchips, npts, 2))
     # convert back to image coordinate system using partially (CRVAL only)
     # aligned image's WCS:
-    p = wcsima.wcs_world2pix(p, 1).astype(ndfloat128)
+    p = np.array([w.wcs_world2pix(pk, 1) for w, pk in zip(wcsimas, p)])
+    p = p.astype(ndfloat128)
 
     # derivative with regard to x:
-    u1 = ((p[1] - p[4]) + 8 * (p[3] - p[2])) / (6*hx)
+    u1 = ((p[:, 1] - p[:, 4]) + 8 * (p[:, 3] - p[:, 2])) / (6 * hx[:, None])
     # derivative with regard to y:
-    u2 = ((p[5] - p[8]) + 8 * (p[7] - p[6])) / (6*hy)
+    u2 = ((p[:, 5] - p[:, 8]) + 8 * (p[:, 7] - p[:, 6])) / (6 * hy[:, None])
 
-    return (np.asarray([u1, u2]).T, p[0])
+    return (np.stack([u1, u2], axis=1).transpose(0, 2, 1), p[:, 0])
 
 
 def update_chip_wcs(chip_wcs, drz_old_wcs, drz_new_wcs,
                     xrms=None, yrms=None):
-    cd_eye = np.eye(chip_wcs.wcs.cd.shape[0])
+    update_chips_wcs([chip_wcs], drz_old_wcs, drz_new_wcs, xrms=xrms, yrms=yrms)
+
+
+def update_chips_wcs(chip_wcs_list, drz_old_wcs, drz_new_wcs,
+                     xrms=None, yrms=None):
+    """ Update the WCS of all chips drizzled into the same image in place.
+
+    The result is the same as calling ``update_chip_wcs`` for each chip
+    but the coordinate transformations with the drizzled image WCS are
+    computed for all chips at once.
+    """
+    nchips = len(chip_wcs_list)
+    if nchips == 0:
+        return
+    cd_eye = np.eye(chip_wcs_list[0].wcs.cd.shape[0])
 
     # estimate precision necessary for iterative processes:
-    naxis1, naxis2 = chip_wcs.pixel_shape
     maxiter = 100
-    crpix2corners = np.dstack([i.flatten() for i in np.meshgrid(
-        [1, naxis1], [1, naxis2])])[0] - chip_wcs.wcs.crpix
-    maxUerr = 1.0e-5 / np.amax(np.linalg.norm(crpix2corners, axis=1))
-
-    # estimate step for numerical differentiation. We need a step
-    # large enough to avoid rounding errors and small enough to get a
-    # better precision for numerical differentiation.
-    # TODO: The logic below should be revised at a later time so that it
-    # better takes into account the two competing requirements.
-    hx = max(1.0, min(20.0, (chip_wcs.wcs.crpix[0] - 1.0)/100.0,
-                      (naxis1 - chip_wcs.wcs.crpix[0])/100.0))
-    hy = max(1.0, min(20.0, (chip_wcs.wcs.crpix[1] - 1.0)/100.0,
-                      (naxis2 - chip_wcs.wcs.crpix[1])/100.0))
+    maxUerr = np.empty(nchips)
+    hx = np.empty(nchips)
+    hy = np.empty(nchips)
+    for k, chip_wcs in enumerate(chip_wcs_list):
+        naxis1, naxis2 = chip_wcs.pixel_shape
+        crpix2corners = np.dstack([i.flatten() for i in np.meshgrid(
+            [1, naxis1], [1, naxis2])])[0] - chip_wcs.wcs.crpix
+        maxUerr[k] = 1.0e-5 / np.amax(np.linalg.norm(crpix2corners, axis=1))
+
+        # estimate step for numerical differentiation. We need a step
+        # large enough to avoid rounding errors and small enough to get a
+        # better precision for numerical differentiation.
+        # TODO: The logic below should be revised at a later time so that it
+        # better takes into account the two competing requirements.
+        hx[k] = max(1.0, min(20.0, (chip_wcs.wcs.crpix[0] - 1.0)/100.0,
+                             (naxis1 - chip_wcs.wcs.crpix[0])/100.0))
+        hy[k] = max(1.0, min(20.0, (chip_wcs.wcs.crpix[1] - 1.0)/100.0,
+                             (naxis2 - chip_wcs.wcs.crpix[1])/100.0))
 
     # compute new CRVAL for the image WCS:
-    chip_wcs_orig = chip_wcs.deepcopy()
-    crpix_in_old_drz = drz_old_wcs.wcs_world2pix([chip_wcs.wcs.crval], 1)
-    chip_wcs.wcs.crval = drz_new_wcs.wcs_pix2world(crpix_in_old_drz, 1)[0]
-    chip_wcs.wcs.set()
+    chip_wcs_orig = [chip_wcs.deepcopy() for chip_wcs in chip_wcs_list]
+    imcrpix = np.array([chip_wcs.wcs.crpix for chip_wcs in chip_wcs_orig])
+    crpix_in_old_drz = drz_old_wcs.wcs_world2pix(
+        [chip_wcs.wcs.crval for chip_wcs in chip_wcs_list], 1
+    )
+    crval = drz_new_wcs.wcs_pix2world(crpix_in_old_drz, 1)
+    for k, chip_wcs in enumerate(chip_wcs_list):
+        chip_wcs.wcs.crval = crval[k]
+        chip_wcs.wcs.set()
 
     # initial approximation for CD matrix of the image WCS:
-    (U, u) = linearize(chip_wcs_orig, chip_wcs, drz_old_wcs, drz_new_wcs,
-                       chip_wcs_orig.wcs.crpix, hx=hx, hy=hy)
-    err0 = np.amax(np.abs(U-cd_eye)).astype(np.float64)
-    chip_wcs.wcs.cd = np.dot(chip_wcs.wcs.cd.astype(ndfloat128), U).astype(np.float64)
-    chip_wcs.wcs.set()
+    (U, u) = _linearize_chips(chip_wcs_orig, chip_wcs_list, drz_old_wcs,
+                              drz_new_wcs, imcrpix, hx, hy)
+    err0 = np.amax(np.abs(U-cd_eye), axis=(1, 2)).astype(np.float64)
+    for k, chip_wcs in enumerate(chip_wcs_list):
+        chip_wcs.wcs.cd = np.dot(chip_wcs.wcs.cd.astype(ndfloat128), U[k]).astype(np.float64)
+        chip_wcs.wcs.set()
 
     # NOTE: initial solution is the exact mathematical solution (modulo numeric
     # differentiation). However, e.g., due to rounding errors, approximate
@@ -821,20 +989,33 @@ def update_chip_wcs(chip_wcs, drz_old_wcs, drz_new_wcs,
 
     # Perform fixed-point iterations to improve the approximation
     # for CD matrix of the image WCS (actually for the U matrix).
+    # Chips are iterated until each of them has converged:
+    active = np.arange(nchips)
     for i in range(maxiter):
-        (U, u) = linearize(chip_wcs_orig, chip_wcs, drz_old_wcs, drz_new_wcs,
-                           chip_wcs_orig.wcs.crpix, hx=hx, hy=hy)
-        err = np.amax(np.abs(U-cd_eye)).astype(np.float64)
-        if err > err0:
+        if active.size == 0:
             break
-        chip_wcs.wcs.cd = np.dot(chip_wcs.wcs.cd, U).astype(np.float64)
-        chip_wcs.wcs.set()
-        if err < maxUerr:
-            break
-        err0 = err
+        (U, u) = _linearize_chips(
+            [chip_wcs_orig[k] for k in active],
+            [chip_wcs_list[k] for k in active],
+            drz_old_wcs, drz_new_wcs, imcrpix[active], hx[active], hy[active]
+        )
+        err = np.amax(np.abs(U-cd_eye), axis=(1, 2)).astype(np.float64)
+        not_converged = []
+        for j, k in enumerate(active):
+            if err[j] > err0[k]:
+                continue
+            chip_wcs = chip_wcs_list[k]
+            chip_wcs.wcs.cd = np.dot(chip_wcs.wcs.cd, U[j]).astype(np.float64)
+            chip_wcs.wcs.set()
+            if err[j] < maxUerr[k]:
+                continue
+            err0[k] = err[j]
+            not_converged.append(k)
+        active = np.array(not_converged, dtype=int)
 
     if xrms is not None:
-        chip_wcs.wcs.crder = np.array([xrms,yrms])
+        for chip_wcs in chip_wcs_list:
+            chip_wcs.wcs.crder = np.array([xrms,yrms])
 
 
 #--------------------------------
@@ -6,8 +6,10 @@
 
 """
 import os
+import multiprocessing
 import numpy as np
 from copy import copy
+from scipy.spatial import cKDTree
 
 from stsci.tools import teal
 from stsci.tools import logutil, textutil
@@ -69,6 +71,37 @@ def _managePsets(configobj, section_name, task_name, iparsobj=None, input_dict=N
     # merge these parameters into full set
     configobj[section_name].merge(iparsobj_cfg)
 
+
+def _find_sources(filenames, catdict, exclusion_dict, num_cores, kwargs):
+    """ Find sources in all input images without user-supplied catalogs
+    using a pool of ``num_cores`` worker processes.
+
+    Returns a dictionary, keyed by filename, of the sources found in each
+    chip of each image (see `imgclasses.find_image_sources`). The dictionary
+    is empty when parallel processing is not used, in which case sources
+    are found when the `imgclasses.Image` objects are created.
+
+    """
+    tasks = [f for f in filenames if catdict.get(f) is None]
+    pool_size = util.get_pool_size(num_cores, len(tasks))
+    if pool_size < 2:
+        return {}
+
+    log.info('Executing {:d} parallel workers for source finding'
+             .format(pool_size))
+    args = [(f, exclusion_dict.get(os.path.basename(f)), kwargs)
+            for f in tasks]
+    mp_ctx = multiprocessing.get_context('fork')
+    with mp_ctx.Pool(pool_size) as pool:
+        results = pool.starmap(_find_image_sources, args)
+    return dict(zip(tasks, results))
+
+
+def _find_image_sources(filename, exclusions, kwargs):
+    return imgclasses.find_image_sources(filename, exclusions=exclusions,
+                                         **kwargs)
+
+
 @util.with_logging
 def run(configobj):
     """ Primary Python interface for image registration code
@@ -272,6 +305,9 @@ def run(configobj):
         minsources = max(1, catfit_pars['minobj'])
         omitted_images = []
         all_input_images = []
+        found_sources = _find_sources(filenames, catdict, exclusion_dict,
+                                      configobj.get('num_cores'),
+                                      catfile_kwargs)
         for imgnum in range(len(filenames)):
             # Create Image instances for all input images
             try:
@@ -283,6 +319,7 @@ def run(configobj):
             img = imgclasses.Image(filenames[imgnum],
                                    input_catalogs=catdict[filenames[imgnum]],
                                    exclusions=regexcl,
+                                   found_sources=found_sources.get(filenames[imgnum]),
                                    **catfile_kwargs)
 
             all_input_images.append(img)
@@ -316,6 +353,9 @@ def run(configobj):
     input_images_orig_copy = copy(input_images)
     do_match_refimg = False
 
+    # overlap areas of image footprints (re-used as images get aligned):
+    overlaps = _OverlapIndex()
+
     # otherwise, extract the catalog from the first input image source list
     if configobj['refimage'] not in [None, '',' ','INDEF']: # User specified an image to use
         # A hack to allow different source finding parameters for
@@ -381,7 +421,7 @@ def run(configobj):
             return
 
         image = _max_overlap_image(refimage, input_images, expand_refcat,
-                                   enforce_user_order)
+                                   enforce_user_order, overlaps)
 
     elif refcat_par['refcat'] not in [None,'',' ','INDEF']:
         # a reference catalog is provided but not the reference image/wcs
@@ -397,7 +437,7 @@ def run(configobj):
             image = input_images.pop(0)
         else:
             image, image2 = _max_overlap_pair(input_images, expand_refcat,
-                                              enforce_user_order)
+                                              enforce_user_order, overlaps)
             input_images.insert(0, image2)
 
         # Workaround the defect described in ticket:
@@ -456,7 +496,7 @@ def run(configobj):
         cat_src = None
 
         refimg, image = _max_overlap_pair(input_images, expand_refcat,
-                                          enforce_user_order)
+                                          enforce_user_order, overlaps)
 
         refwcs = []
         #refwcs.extend(refimg.get_wcs())
@@ -576,7 +616,7 @@ def run(configobj):
                     # Clear retry flags and get next image:
                     image = _max_overlap_image(
                         refimage, input_images, expand_refcat,
-                        enforce_user_order
+                        enforce_user_order, overlaps
                     )
                     retry_flags = len(input_images)*[0]
                     refimage.clear_dirty_flag()
@@ -664,19 +704,129 @@ def run(configobj):
         return
 
 
-def _overlap_matrix(images):
-    nimg = len(images)
-    m = np.zeros((nimg,nimg), dtype=float)
-    for i in range(nimg):
-        for j in range(i+1,nimg):
-            p = images[i].skyline.intersection(images[j].skyline)
-            area = np.fabs(p.area())
-            m[j,i] = area
-            m[i,j] = area
-    return m
+class _OverlapIndex:
+    """ Compute and cache overlap areas of image footprints (``skyline``).
+
+    Footprints are indexed by their bounding caps on the sphere (unit
+    vector of the center and angular radius). Polygon intersections are
+    computed only for pairs of footprints whose bounding caps intersect
+    and the resulting areas are cached for each pair of polygons.
+
+    """
+    # Tolerances (relative, and absolute in steradians) used to decide that
+    # a footprint is entirely contained in the reference footprint:
+    CONTAINED_RTOL = 1e-9
+    CONTAINED_ATOL = 1e-14
+
+    def __init__(self):
+        self._caps = {}
+        self._areas = {}
+        self._ref_areas = {}
+
+    def cap(self, polygon):
+        """ Bounding cap ``(center, radius)`` of a polygon or `None` for
+        empty polygons.
+
+        """
+        key = id(polygon)
+        if key not in self._caps:
+            points = list(polygon.points)
+            if len(points) == 0:
+                cap = None
+            else:
+                points = np.vstack(points)
+                center = points.mean(axis=0)
+                center /= np.linalg.norm(center)
+                radius = np.arccos(np.clip(np.dot(points, center), -1, 1)).max()
+                cap = (center, radius)
+            # keep a reference to the polygon so that its id is not reused:
+            self._caps[key] = (polygon, cap)
+        return self._caps[key][1]
+
+    def may_overlap(self, polygon1, polygon2):
+        """ Return `False` when two polygons certainly do not overlap. """
+        cap1 = self.cap(polygon1)
+        cap2 = self.cap(polygon2)
+        if cap1 is None or cap2 is None:
+            return False
+        sep = np.arccos(np.clip(np.dot(cap1[0], cap2[0]), -1, 1))
+        return sep <= cap1[1] + cap2[1]
+
+    def area(self, polygon1, polygon2):
+        """ Area of the intersection of two polygons. """
+        key = tuple(sorted([id(polygon1), id(polygon2)]))
+        if key not in self._areas:
+            if self.may_overlap(polygon1, polygon2):
+                area = np.fabs(polygon1.intersection(polygon2).area())
+            else:
+                area = 0.0
+            self._areas[key] = area
+        return self._areas[key]
+
+    def candidate_pairs(self, polygons):
+        """ Pairs of indices ``(i, j)``, ``i < j``, of polygons whose
+        bounding caps intersect.
+
+        """
+        idx = [k for k, p in enumerate(polygons) if self.cap(p) is not None]
+        if len(idx) < 2:
+            return []
+        centers = np.array([self.cap(polygons[k])[0] for k in idx])
+        radii = np.array([self.cap(polygons[k])[1] for k in idx])
+
+        # chord length corresponding to the largest possible separation
+        # of the centers of intersecting caps:
+        max_sep = min(2.0 * radii.max(), np.pi)
+        tree = cKDTree(centers)
+        pairs = tree.query_pairs(2.0 * np.sin(max_sep / 2.0) * (1 + 1e-12),
+                                 output_type='ndarray')
+        pairs.sort(axis=1)
+        sep = np.arccos(np.clip(
+            np.einsum('ij,ij->i', centers[pairs[:, 0]], centers[pairs[:, 1]]),
+            -1, 1
+        ))
+        pairs = pairs[sep <= radii[pairs[:, 0]] + radii[pairs[:, 1]]]
+        return [(idx[i], idx[j]) for i, j in pairs]
+
+    def matrix(self, polygons):
+        """ Symmetric matrix of overlap areas of all pairs of polygons. """
+        nimg = len(polygons)
+        m = np.zeros((nimg, nimg), dtype=float)
+        for i, j in self.candidate_pairs(polygons):
+            m[i, j] = m[j, i] = self.area(polygons[i], polygons[j])
+        return m
+
+    def ref_overlaps(self, ref_polygon, polygons):
+        """ Overlap areas of a reference footprint with each of ``polygons``.
+
+        The reference footprint is assumed to only grow between calls (as
+        is the case when the reference catalog is expanded with sources
+        from aligned images). Therefore the overlap of footprints found to
+        be entirely inside the reference footprint is not computed again.
+
+        """
+        area = np.zeros(len(polygons), dtype=float)
+        for k, p in enumerate(polygons):
+            contained_area = self._ref_areas.get(id(p))
+            if contained_area is not None:
+                area[k] = contained_area
+                continue
+            area[k] = self.area(ref_polygon, p)
+            if area[k] > 0 and np.isclose(area[k], np.fabs(p.area()),
+                                          rtol=self.CONTAINED_RTOL,
+                                          atol=self.CONTAINED_ATOL):
+                self._ref_areas[id(p)] = area[k]
+        return area
+
+
+def _overlap_matrix(images, overlaps=None):
+    if overlaps is None:
+        overlaps = _OverlapIndex()
+    return overlaps.matrix([img.skyline for img in images])
 
 
-def _max_overlap_pair(images, expand_refcat, enforce_user_order):
+def _max_overlap_pair(images, expand_refcat, enforce_user_order,
+                      overlaps=None):
     assert(len(images) > 1)
     if len(images) == 2 or not expand_refcat or enforce_user_order:
         # for the special case when only two images are provided
@@ -686,7 +836,7 @@ def _max_overlap_pair(images, expand_refcat, enforce_user_order):
         im2 = images.pop(0)
         return (im1, im2)
 
-    m = _overlap_matrix(images)
+    m = _overlap_matrix(images, overlaps)
     imgs = [f.name for f in images]
     n = m.shape[0]
     index = m.argmax()
@@ -721,18 +871,18 @@ def _max_overlap_pair(images, expand_refcat, enforce_user_order):
     return (im1, im2)
 
 
-def _max_overlap_image(refimage, images, expand_refcat, enforce_user_order):
+def _max_overlap_image(refimage, images, expand_refcat, enforce_user_order,
+                       overlaps=None):
     nimg = len(images)
     assert(nimg > 0)
     if not expand_refcat or enforce_user_order:
         # revert to old tweakreg behavior
         return images.pop(0)
 
-    area = np.zeros(nimg, dtype=float)
-    for i in range(nimg):
-        area[i] = np.fabs(
-            refimage.skyline.intersection(images[i].skyline).area()
-        )
+    if overlaps is None:
+        overlaps = _OverlapIndex()
+    area = overlaps.ref_overlaps(refimage.skyline,
+                                 [img.skyline for img in images])
 
     # Sort the remaining of the input list of images by overlap area
     # with the reference image (in decreasing order):
@@ -58,6 +58,7 @@ class StepStatus(Enum):
     STEP_ABORTED = 3
     STEP_SKIPPED = 4
     STEP_OFF = 5
+    STEP_CACHED = 6
 
 
 class StepAbortedError(RuntimeError):
@@ -312,6 +313,12 @@ class ProcSteps:
 
         The 'reportTimes()' method can then be used to provide a summary
         of all the elapsed times and total run time.
+
+        When a `~drizzlepac.scheduler.MemoryScheduler` is assigned to the
+        'scheduler' attribute, it is notified of the start and end of each
+        step so that the peak memory usage of each step can be measured.
+        Similarly, a `~drizzlepac.profiling.StepProfiler` assigned to the
+        'profiler' attribute records the resource usage of each step.
     """
     __report_header = '\n   %20s          %s\n' % ('-' * 20, '-' * 20)
     __report_header += '   %20s          %s\n' % ('Step', 'Elapsed time')
@@ -322,6 +329,7 @@ class ProcSteps:
         "aborted": (StepStatus.STEP_ABORTED, "aborted"),
         "skipped": (StepStatus.STEP_SKIPPED, "skipped"),
         "ended": (StepStatus.STEP_ENDED, "finished"),
+        "cached": (StepStatus.STEP_CACHED, "restored from cache"),
     }
 
     def __init__(self):
@@ -330,6 +338,8 @@ class ProcSteps:
         self.start = _ptime()
         self.end = None
         self.delayed_msg = None
+        self.scheduler = None
+        self.profiler = None
 
     def addStep(self, key):
         """
@@ -347,6 +357,10 @@ class ProcSteps:
             'status': StepStatus.STEP_STARTED,
         }
         self.order.append(key)
+        if self.scheduler is not None:
+            self.scheduler.step_started(key)
+        if self.profiler is not None:
+            self.profiler.step_started(key)
 
     def endStep(self, key, reason="ended", delay_msg=False):
         """
@@ -362,6 +376,11 @@ class ProcSteps:
         else:
             key = self.order[-1]
 
+        if self.scheduler is not None:
+            self.scheduler.step_ended(key)
+        if self.profiler is not None:
+            self.profiler.step_ended(key, reason)
+
         status, msg = self._status_map[reason]
         self.steps[key]["status"] = status
         self.end = ptime
@@ -403,6 +422,8 @@ class ProcSteps:
                 note = "(skipped)"
             elif self.steps[step]['status'] == StepStatus.STEP_OFF:
                 note = "(off)"
+            elif self.steps[step]['status'] == StepStatus.STEP_CACHED:
+                note = "(cached)"
             else:
                 note = ''
             print(f"   {step:20s}          {_time:0.4f} sec {note}")
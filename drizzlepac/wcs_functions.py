@@ -26,6 +26,13 @@ DEFAULT_WCS_PARS = {'ra': None, 'dec': None, 'scale': None, 'rot': None,
                     'outnx': None, 'outny': None,
                     'crpix1': None, 'crpix2': None}
 
+# Adaptive WCS interpolation (stepsize='auto'): size of the coarsest cells
+# of the interpolation table and default maximum interpolation error
+# (in output pixels)
+AUTO_STEPSIZE = 'auto'
+AUTO_MAX_STEPSIZE = 64
+DEFAULT_WCS_TOLERANCE = 1.0e-4
+
 log = logutil.create_logger(__name__, level=logutil.logging.NOTSET)
 
 
@@ -87,6 +94,41 @@ class WCSMap:
         """
         return wcs.wcs_world2pix(ra, dec, 1)
 
+def is_auto_stepsize(stepsize):
+    """ Return `True` if ``stepsize`` requests adaptive WCS interpolation. """
+    return isinstance(stepsize, str) and stepsize.strip().lower() == AUTO_STEPSIZE
+
+
+def default_wcs_mapping(input, output, stepsize=10, tolerance=None):
+    """ Return the C-based mapping from ``input`` to ``output`` pixels.
+
+    Positions are interpolated in a table of positions transformed with
+    the WCS objects.  The nodes of the table are ``stepsize`` pixels
+    apart or, when ``stepsize`` is ``'auto'``, are placed adaptively so
+    that the interpolation error stays below ``tolerance`` output pixels
+    (`DEFAULT_WCS_TOLERANCE` when `None`).  A ``stepsize`` of 0 transforms
+    every position with the WCS.
+
+    """
+    from . import cdriz
+
+    nx, ny = input.pixel_shape
+    if is_auto_stepsize(stepsize):
+        if tolerance is None:
+            tolerance = DEFAULT_WCS_TOLERANCE
+        if tolerance <= 0:
+            raise ValueError("The WCS interpolation tolerance must be positive.")
+        mapping = cdriz.DefaultWCSMapping(input, output, nx, ny,
+                                          AUTO_MAX_STEPSIZE,
+                                          tolerance=tolerance)
+        log.info(f"Adaptive WCS interpolation: {mapping.nevaluations} WCS "
+                 f"evaluations, max. error {mapping.max_error:.3g} pixels "
+                 f"(tolerance {tolerance:g} pixels)")
+    else:
+        mapping = cdriz.DefaultWCSMapping(input, output, nx, ny, float(stepsize))
+    return mapping
+
+
 def get_pix_ratio_from_WCS(input, output):
     """ [Functional form of .get_pix_ratio() method of WCSMap]"""
     return output.pscale / input.pscale
@@ -1,5 +1,6 @@
 
 #include <Python.h>
+#include <structmember.h>
 
 #define _USE_MATH_DEFINES       /* needed for MS Windows to define M_PI */
 #include <math.h>
@@ -167,7 +168,9 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   PyObject *output_obj = NULL;
   int nx, ny;
   double factor;
+  double tolerance = 0.0;
   int status = -1;
+  static char *kwlist[] = {"", "", "", "", "", "tolerance", NULL};
 
   /* Other miscellaneous local variables */
   struct driz_error_t error;
@@ -176,8 +179,9 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   driz_error_init(&error);
 
   /* TODO: Make factor a kwarg */
-  if (! PyArg_ParseTuple(args, "OOiid:DefaultWCSMapping.__init__",
-                         &input_obj, &output_obj, &nx, &ny, &factor)){
+  if (! PyArg_ParseTupleAndKeywords(args, kwds, "OOiid|$d:DefaultWCSMapping.__init__",
+                                    kwlist, &input_obj, &output_obj, &nx, &ny,
+                                    &factor, &tolerance)){
     goto exit;
   }
 
@@ -185,7 +189,7 @@ PyWCSMap_init(PyWCSMap *self, PyObject *args, PyObject *kwds)
   istat = default_wcsmap_init(
       &self->m,
       &((Wcs*)input_obj)->x, &((Wcs*)output_obj)->x,
-      nx, ny, factor,
+      nx, ny, factor, tolerance,
       &error);
 
   if (istat || driz_error_is_set(&error)) {
@@ -281,6 +285,16 @@ PyWCSMap_call(PyWCSMap* self, PyObject* args, PyObject* kwargs)
   return result;
 }
 
+static PyMemberDef PyWCSMap_members[] = {
+  {"max_error", T_DOUBLE, offsetof(PyWCSMap, m.max_error), READONLY,
+   "Largest interpolation error (in output pixels) found while building "
+   "an adaptive interpolation table"},
+  {"nevaluations", T_INT, offsetof(PyWCSMap, m.nevaluations), READONLY,
+   "Number of positions transformed with the WCS to build the "
+   "interpolation table"},
+  {NULL}  /* Sentinel */
+};
+
 static PyTypeObject WCSMapType = {
   PyVarObject_HEAD_INIT(NULL, 0)
   (char *) "cdriz.DefaultWCSMapping",              /*tp_name*/
@@ -302,7 +316,7 @@ static PyTypeObject WCSMapType = {
   0,                                               /*tp_setattro*/
   0,                                               /*tp_as_buffer*/
   (long) Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE, /*tp_flags*/
-  (char *) "DefaultWCSMapping(input,output)",      /* tp_doc */
+  (char *) "DefaultWCSMapping(input, output, nx, ny, factor, *, tolerance=0.0)", /* tp_doc */
   0,                                               /* tp_traverse */
   0,                                               /* tp_clear */
   0,                                               /* tp_richcompare */
@@ -310,7 +324,7 @@ static PyTypeObject WCSMapType = {
   0,                                               /* tp_iter */
   0,                                               /* tp_iternext */
   0,                                               /* tp_methods */
-  0,                                               /* tp_members */
+  PyWCSMap_members,                                /* tp_members */
   0,                                               /* tp_getset */
   0,                                               /* tp_base */
   0,                                               /* tp_dict */
@@ -322,8 +336,65 @@ static PyTypeObject WCSMapType = {
   PyWCSMap_new,                                    /* tp_new */
 };
 
+/*
+ Set up the affine transformation fast path for the mapping in p.
+
+ affine_obj may be NULL or None (use the fast path when the mapping is
+ found to be affine over [xmin, xmax] x [ymin, ymax]), False (never use
+ it) or a 2x3 matrix giving the transformation explicitly, in which case
+ the mapping callback is not used at all.
+*/
+static int
+setup_affine_mapping(PyObject* affine_obj, struct driz_param_t* p,
+                     const double xmin, const double xmax,
+                     const double ymin, const double ymax,
+                     struct affine_param_t* affine,
+                     struct driz_error_t* error) {
+  PyArrayObject *matrix = NULL;
+  bool_t is_affine = FALSE;
+
+  if (affine_obj == NULL || affine_obj == Py_None || affine_obj == Py_False) {
+    if (p->mapping_callback == NULL) {
+      driz_error_set_message(error, "A mapping or an affine matrix is required");
+      return 1;
+    }
+    if (affine_obj == Py_False) {
+      return 0;
+    }
+    if (detect_affine_map(p, xmin, xmax, ymin, ymax, AFFINE_TOLERANCE,
+                          affine->matrix, &is_affine, error)) {
+      return 1;
+    }
+    if (!is_affine) {
+      return 0;
+    }
+    affine->mapping_callback = p->mapping_callback;
+    affine->mapping_callback_state = p->mapping_callback_state;
+  } else {
+    matrix = (PyArrayObject *)PyArray_ContiguousFromAny(affine_obj, NPY_FLOAT64, 2, 2);
+    if (!matrix || PyArray_DIMS(matrix)[0] != 2 || PyArray_DIMS(matrix)[1] != 3) {
+      Py_XDECREF(matrix);
+      PyErr_Clear();
+      driz_error_set_message(error, "Invalid affine matrix (must be a 2x3 array)");
+      return 1;
+    }
+    memcpy(affine->matrix, PyArray_DATA(matrix), 6 * sizeof(double));
+    Py_DECREF(matrix);
+    affine->mapping_callback = NULL;
+    affine->mapping_callback_state = NULL;
+  }
+
+  DRIZLOG("-Using affine transformation: [[%g, %g, %g], [%g, %g, %g]]\n",
+          affine->matrix[0], affine->matrix[1], affine->matrix[2],
+          affine->matrix[3], affine->matrix[4], affine->matrix[5]);
+
+  p->mapping_callback = affine_map;
+  p->mapping_callback_state = (void *)affine;
+  return 0;
+}
+
 static PyObject *
-tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
+tdriz(PyObject *obj UNUSED_PARAM, PyObject *args, PyObject *kwds)
 {
   /* Arguments in the order they appear */
   PyObject *oimg, *owei, *oout, *owht, *ocon;
@@ -336,6 +407,11 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   char *fillstr;
   integer_t nmiss, nskip, vflag;
   PyObject *callback_obj;
+  PyObject *affine_obj = NULL;
+  static char *kwlist[] = {"", "", "", "", "", "", "", "", "", "", "", "",
+                           "", "", "", "", "", "", "", "", "", "", "", "",
+                           "affine", "oversampling", NULL};
+  long oversampling = 0;
 
   /* Derived values */
   PyArrayObject *img = NULL, *wei = NULL, *out = NULL, *wht = NULL, *con = NULL;
@@ -346,11 +422,13 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   char *fillstr_end;
   bool_t do_fill;
   float fill_value;
+  double dh;
   mapping_callback_t callback = NULL;
   void* callback_state = NULL;
   int istat = 0;
   struct driz_error_t error;
   struct driz_param_t p;
+  struct affine_param_t affine;
 
   /* struct wcsmap_param_t* m = NULL; */
   /* clock_t start_t, end_t; */
@@ -358,12 +436,13 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
 
   driz_error_init(&error);
 
-  if (!PyArg_ParseTuple(args,"OOOOOllllldddsdssffsiiiO:tdriz",
+  if (!PyArg_ParseTupleAndKeywords(args, kwds,
+                        "OOOOOllllldddsdssffsiiiO|$Ol:tdriz", kwlist,
                         &oimg, &owei, &oout, &owht, &ocon, &uniqid, &ystart,
                         &xmin, &ymin, &dny, &scale, &xscale, &yscale,
                         &align_str, &pfract, &kernel_str, &inun_str,
                         &expin, &wtscl, &fillstr, &nmiss,&nskip, &vflag,
-                        &callback_obj)) {
+                        &callback_obj, &affine_obj, &oversampling)) {
     return PyErr_Format(gl_Error, "cdriz.tdriz: Invalid Parameters.");
   }
 
@@ -383,7 +462,11 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
     goto _exit;
   }
 
-  if (PyObject_TypeCheck(callback_obj, &WCSMapType)) {
+  if (callback_obj == Py_None) {
+    /* Only valid with an explicit affine matrix */
+    callback = NULL;
+    callback_state = NULL;
+  } else if (PyObject_TypeCheck(callback_obj, &WCSMapType)) {
     /* If we're using the default mapping, we can set things up to avoid
        the Python/C bridge */
     callback = default_wcsmap;
@@ -492,10 +575,22 @@ tdriz(PyObject *obj UNUSED_PARAM, PyObject *args)
   p.weight_scale = wtscl;
   p.mapping_callback = callback;
   p.mapping_callback_state = callback_state;
+  /* Oversampling of the kernel look-up-tables (0 for the default) */
+  p.lut_oversampling = (integer_t)oversampling;
 
   /* Setup reasonable defaults for drizzling */
   p.no_over = FALSE;
 
+  /* Use the affine fast path over the region covered by the (possibly
+     enlarged) input pixels */
+  dh = 0.5 * MAX(pfract, 1.0);
+  if (setup_affine_mapping(affine_obj, &p, 1.0 - dh, (double)nx + dh,
+                           (double)ystart + 1.0 - dh,
+                           (double)(ystart + dny) + dh,
+                           &affine, &error)) {
+    goto _exit;
+  }
+
   /*
   start_t = clock();
   */
@@ -623,7 +718,7 @@ twdriz(PyObject *obj, PyObject *args)
 
 
 static PyObject *
-tblot(PyObject *obj, PyObject *args)
+tblot(PyObject *obj, PyObject *args, PyObject *kwds)
 {
   /* Arguments in the order they appear */
   PyObject *oimg, *oout;
@@ -635,6 +730,9 @@ tblot(PyObject *obj, PyObject *args)
   float ef, misval, sinscl;
   long vflag;
   PyObject *callback_obj = NULL;
+  PyObject *affine_obj = NULL;
+  static char *kwlist[] = {"", "", "", "", "", "", "", "", "", "", "", "",
+                           "", "", "", "", "", "affine", NULL};
 
   PyArrayObject *img = NULL, *out = NULL;
   enum e_align_t align;
@@ -645,13 +743,15 @@ tblot(PyObject *obj, PyObject *args)
   int istat = 0;
   struct driz_error_t error;
   struct driz_param_t p;
+  struct affine_param_t affine;
 
   driz_error_init(&error);
 
-  if (!PyArg_ParseTuple(args,"OOlllldfddssffflO:tblot", &oimg, &oout, &xmin,
+  if (!PyArg_ParseTupleAndKeywords(args, kwds,
+                        "OOlllldfddssffflO|$O:tblot", kwlist, &oimg, &oout, &xmin,
                         &xmax, &ymin, &ymax, &scale, &kscale, &xscale,
                         &yscale, &align_str, &interp_str, &ef, &misval,
-                        &sinscl, &vflag, &callback_obj)){
+                        &sinscl, &vflag, &callback_obj, &affine_obj)){
     return PyErr_Format(gl_Error, "cdriz.tblot: Invalid Parameters.");
   }
 
@@ -666,8 +766,10 @@ tblot(PyObject *obj, PyObject *args)
     goto _exit;
   }
 
-  callback = py_mapping_callback;
-  callback_state = (void *)callback_obj;
+  if (callback_obj != Py_None) {
+    callback = py_mapping_callback;
+    callback_state = (void *)callback_obj;
+  }
 
   img = (PyArrayObject *)PyArray_ContiguousFromAny(oimg, NPY_FLOAT32, 2, 2);
   if (!img) {
@@ -715,6 +817,12 @@ tblot(PyObject *obj, PyObject *args)
   p.mapping_callback = callback;
   p.mapping_callback_state = callback_state;
 
+  /* Use the affine fast path over the blotted image */
+  if (setup_affine_mapping(affine_obj, &p, 1.0, (double)onx,
+                           1.0, (double)ony, &affine, &error)) {
+    goto _exit;
+  }
+
   istat = doblot(&p, &error);
 
  _exit:
@@ -1164,9 +1272,9 @@ arrxyzero(PyObject *obj, PyObject *args)
 
 static PyMethodDef cdriz_methods[] =
   {
-    {"tdriz",  tdriz, METH_VARARGS, "tdriz(image, weight, output, outweight, context, uniqid, ystart, xmin, ymin, dny, scale, xscale, yscale, align, pfrace, kernel, inun, expin, wtscl, fill, nmiss, nskip, vflag, callback)"},
+    {"tdriz",  (PyCFunction)(void(*)(void))tdriz, METH_VARARGS | METH_KEYWORDS, "tdriz(image, weight, output, outweight, context, uniqid, ystart, xmin, ymin, dny, scale, xscale, yscale, align, pfrace, kernel, inun, expin, wtscl, fill, nmiss, nskip, vflag, callback, *, affine=None, oversampling=0)"},
     /*{"twdriz",  tdriz, METH_VARARGS, "triz(image, weight, output, outweight, ystart, xmin, ymin, dny, wcsin, wcsout,pxg,pyg,pfract, kernel, coeffs, fillstr,nmiss,nskip,vflag)"},*/
-    {"tblot",  tblot, METH_VARARGS, "tblot(image, output, xmin, xmax, ymin, ymax, scale, kscale, xscale, yscale, align, interp, ef, misval, sinscl, vflag, callback)"},
+    {"tblot",  (PyCFunction)(void(*)(void))tblot, METH_VARARGS | METH_KEYWORDS, "tblot(image, output, xmin, xmax, ymin, ymax, scale, kscale, xscale, yscale, align, interp, ef, misval, sinscl, vflag, callback, *, affine=None)"},
     {"arrmoments", arrmoments, METH_VARARGS, "arrmoments(image, p, q)"},
     {"arrxyround", arrxyround, METH_VARARGS, "arrxyround(data,x0,y0,skymode,ker2d,xsigsq,ysigsq,datamin,datamax)"},
     {"arrxyzero", arrxyzero, METH_VARARGS, "arrxyzero(imgxy,refxy,searchrad,zpmat)"},
@@ -270,6 +270,20 @@ typedef int (interp_function)(const void*,
                               float*,
                               struct driz_error_t*);
 
+/**
+Signature for functions that perform blotting interpolation of a set of
+points (usually those of an output line falling on the input image) in
+a single call.
+ */
+typedef int (interp_row_function)(const void*,
+                                  const float*,
+                                  const integer_t, const integer_t,
+                                  const integer_t,
+                                  const float*, const float*,
+                                  /* Output parameters */
+                                  float*,
+                                  struct driz_error_t*);
+
 /**
 A standard set of asserts for all of the interpolation functions
 */
@@ -643,6 +657,114 @@ interpolate_poly5(const void* state UNUSED_PARAM,
   return 0;
 }
 
+/**
+Weights of the 6 samples around a point for quintic polynomial
+interpolation along one axis.  These are the weights implied by the
+central differences of \a ii_bipoly5.
+
+@param[in] s The fractional offset of the point from the sample just
+below it.
+
+@param[out] w The weights of the samples at offsets -2 to 3 from the
+sample just below the point.
+*/
+static inline_macro void
+poly5_weights(const float s, float* w /* [6] */) {
+  const float t = 1.0f - s;
+  float a, b, c, d;
+
+  a = s * (s * s - 1.0f);
+  b = a * (s * s - 4.0f) / 120.0f;
+  a /= 6.0f;
+  c = t * (t * t - 1.0f);
+  d = c * (t * t - 4.0f) / 120.0f;
+  c /= 6.0f;
+
+  w[0] = d;
+  w[1] = c - 4.0f * d + b;
+  w[2] = t - 2.0f * c + 6.0f * d + a - 4.0f * b;
+  w[3] = s + c - 4.0f * d - 2.0f * a + 6.0f * b;
+  w[4] = d + a - 4.0f * b;
+  w[5] = b;
+}
+
+/**
+Perform quintic polynomial interpolation of a set of points.
+
+Away from the edges of the data, the interpolation is separable: the 6
+X and 6 Y weights of each point are computed once and applied to the
+6x6 samples around it.  Points closer than 3 pixels to an edge, where
+samples are extrapolated, use \a interpolate_poly5.
+
+@param[in] state A pointer to any constant values specific to this
+interpolation type.  (For \a interpolate_poly5_row, it should be
+NULL).
+
+@param[in] data A 2D data array of shape [dny][dnx]
+
+@param[in] dnx The x dimension of data
+
+@param[in] dny The y dimension of data
+
+@param[in] npts The number of points
+
+@param[in] x The fractional x coordinates of the points
+
+@param[in] y The fractional y coordinates of the points
+
+@param[out] value The resulting values after interpolating the data
+
+@param[out] error
+
+@return Non-zero if an error occurred
+ */
+static int
+interpolate_poly5_row(const void* state,
+                      const float* data,
+                      const integer_t dnx, const integer_t dny,
+                      const integer_t npts,
+                      const float* x, const float* y,
+                      /* Output parameters */
+                      float* value,
+                      struct driz_error_t* error) {
+  integer_t nx, ny;
+  integer_t i, j, k;
+  float wx[6], wy[6];
+  float sum, rsum;
+  const float* row;
+
+  assert(state == NULL);
+
+  for (k = 0; k < npts; ++k) {
+    nx = (integer_t)x[k];
+    ny = (integer_t)y[k];
+
+    if (nx < 2 || nx + 3 >= dnx || ny < 2 || ny + 3 >= dny) {
+      if (interpolate_poly5(state, data, dnx, dny, x[k], y[k],
+                            &value[k], error)) {
+        return 1;
+      }
+      continue;
+    }
+
+    poly5_weights(x[k] - (float)nx, wx);
+    poly5_weights(y[k] - (float)ny, wy);
+
+    sum = 0.0f;
+    for (j = 0; j < 6; ++j) {
+      row = data + (ny - 2 + j) * dnx + nx - 2;
+      rsum = 0.0f;
+      for (i = 0; i < 6; ++i) {
+        rsum += wx[i] * row[i];
+      }
+      sum += wy[j] * rsum;
+    }
+    value[k] = sum;
+  }
+
+  return 0;
+}
+
 /**
 A structure to hold parameters for sinc interpolation.
 */
@@ -675,15 +797,14 @@ interpolate_sinc_(const float* data, const integer_t firstt,
   const float a4 = 0.03705f;
   float taper[INTERPOLATE_SINC_NCONV];
   float ac[INTERPOLATE_SINC_NCONV], ar[INTERPOLATE_SINC_NCONV];
+  integer_t cols[INTERPOLATE_SINC_NCONV];
   float sdx, dx, dy, dxn, dyn, dx2;
   float ax, ay, px, py;
   float sum, sumx, sumy;
   float tmp;
-  integer_t minj, maxj, offj;
-  integer_t mink, maxk, offk;
   integer_t nx, ny;
-  integer_t i, j, k, m, index;
-  integer_t indices[3][4];
+  integer_t i, j, k, row;
+  const float* line;
 
   assert(x);
   assert(y);
@@ -727,28 +848,25 @@ interpolate_sinc_(const float* data, const integer_t firstt,
     dy = (y[i] - (float)ny) * sinscl;
 
     if (fabsf(dx) < mindx && fabsf(dy) < mindy) {
-      index = firstt + (ny - 1) * len_coeff + nx - 1; /* TODO: Base check */
-      value[i] = data[index];
+      value[i] = data[firstt + ny * len_coeff + nx];
       continue;
     }
 
-    dxn = 1.0f + (float)nsinc + dx;
-    dyn = 1.0f + (float)nsinc + dy;
+    /* 1D weights of the samples at offsets -nsinc to nsinc */
+    dxn = (float)nsinc + dx;
+    dyn = (float)nsinc + dy;
     sumx = 0.0f;
     sumy = 0.0f;
     for (j = 0; j < nconv; ++j) {
-      /* TODO: These out of range indices also seem to be in Fortran... */
-      ax = dxn - (float)j - 1; /* TODO: Base check */
-      ay = dyn - (float)j - 1; /* TODO: Base check */
-      assert(ax != 0.0);
-      assert(ay != 0.0);
+      ax = dxn - (float)j;
+      ay = dyn - (float)j;
 
       if (ax == 0.0) {
         px = 1.0;
       } else if (dx == 0.0) {
         px = 0.0;
       } else {
-        px = taper[j - 1] / ax;
+        px = taper[j] / ax;
       }
 
       if (ay == 0.0) {
@@ -756,72 +874,29 @@ interpolate_sinc_(const float* data, const integer_t firstt,
       } else if (dy == 0.0) {
         py = 0.0;
       } else {
-        py = taper[j - 1] / ay;
+        py = taper[j] / ay;
       }
 
-      /* TODO: These out of range indices also seem to be in Fortran... */
-      ac[j - 1] = px;
-      ar[j - 1] = py;
+      ac[j] = px;
+      ar[j] = py;
       sumx += px;
       sumy += py;
-    }
-
-    /* Compute the limits of the convolution */
-    minj = MAX(0, ny - nsinc - 1); /* TODO: Bases check */
-    maxj = MIN(lenary, ny + nsinc); /* TODO: Bases check */
-    offj = nsinc - ny; /* TODO: Bases check */
 
-    mink = MAX(0, nx - nsinc - 1); /* TODO: Bases check */
-    maxk = MIN(len_coeff, nx + nsinc); /* TODO: Bases check */
-    offk = nsinc - nx; /* TODO: Bases check */
+      /* Samples beyond the edges are replicated from the edges */
+      cols[j] = CLAMP(nx - nsinc + j, 0, len_coeff - 1);
+    }
 
+    /* Do the convolution */
     value[i] = 0.0;
+    for (j = 0; j < nconv; ++j) {
+      row = CLAMP(ny - nsinc + j, 0, lenary - 1);
+      line = data + firstt + row * len_coeff;
 
-    indices[0][0] = ny - nsinc;
-    indices[0][1] = minj - 1;
-    indices[0][2] = firstt;
-    indices[0][3] = 0;
-
-    indices[1][0] = minj;
-    indices[1][1] = maxj;
-    indices[1][2] = firstt;
-    indices[1][3] = len_coeff;
-
-    indices[2][0] = maxj + 1;
-    indices[2][1] = ny + nsinc;
-    indices[2][2] = firstt + (lenary - 1) * len_coeff;
-    indices[2][3] = 0;
-
-    for (m = 0; m < 3; ++m) {
-      for (j = indices[m][0]; j <= indices[m][1]; ++j) {
-        sum = 0.0;
-        index = indices[m][2] + j * indices[m][3];
-        assert(index >= 0 && index < len_coeff*lenary - 1);
-        assert(index+len_coeff >= 0 && index+len_coeff < len_coeff*lenary);
-
-        for (k = nx - nsinc; k < mink - 1; ++k) { /* TODO: Bases check */
-          assert(k+offk >= 0 && k+offk < INTERPOLATE_SINC_NCONV);
-
-          sum += ac[k+offk] * data[index+1];
-        }
-
-        for (k = mink; k <= maxk; ++k) { /* TODO: Bases check */
-          assert(k+offk >= 0 && k+offk < INTERPOLATE_SINC_NCONV);
-          assert(index+k >= 0 && index+k < len_coeff*lenary);
-
-          sum += ac[k+offk] * data[index+k];
-        }
-
-        for (k = maxk + 1; k <= nx + nsinc; ++k) {
-          assert(k+offk >= 0 && k+offk < INTERPOLATE_SINC_NCONV);
-
-          sum += ac[k+offk] * data[index+len_coeff];
-        }
-
-        assert(j + offj >= 0 && j + offj < INTERPOLATE_SINC_NCONV);
-
-        value[i] += ar[j + offj] * sum;
+      sum = 0.0;
+      for (k = 0; k < nconv; ++k) {
+        sum += ac[k] * line[cols[k]];
       }
+      value[i] += ar[j] * sum;
     }
 
     assert(sumx != 0.0);
@@ -873,6 +948,51 @@ interpolate_sinc(const void* state,
                            0.001f, 0.001f, param->sinscl, value, error);
 }
 
+/**
+Perform sinc interpolation of a set of points.
+
+The taper of the sinc function is computed once for all the points and
+the 1D weights of each point once for all the samples around it.
+
+@param[in] state A pointer to any constant values specific to this
+interpolation type.  (For \a interpolate_sinc_row, it must be a pointer
+to a \a sinc_param_t object).
+
+@param[in] data A 2D data array of shape [dny][dnx]
+
+@param[in] dnx The x dimension of data
+
+@param[in] dny The y dimension of data
+
+@param[in] npts The number of points
+
+@param[in] x The fractional x coordinates of the points
+
+@param[in] y The fractional y coordinates of the points
+
+@param[out] value The resulting values after interpolating the data
+
+@param[out] error
+
+@return Non-zero if an error occurred
+*/
+static int
+interpolate_sinc_row(const void* state,
+                     const float* data,
+                     const integer_t dnx, const integer_t dny,
+                     const integer_t npts,
+                     const float* x, const float* y,
+                     /* Output parameters */
+                     float* value,
+                     struct driz_error_t* error) {
+  const struct sinc_param_t* param = (const struct sinc_param_t*)state;
+
+  assert(state);
+
+  return interpolate_sinc_(data, 0, npts, x, y, dnx, dny,
+                           0.001f, 0.001f, param->sinscl, value, error);
+}
+
 /**
 Perform Lanczos interpolation.
 
@@ -905,7 +1025,7 @@ interpolate_lanczos(const void* state,
                     float* value,
                     struct driz_error_t* error UNUSED_PARAM) {
   integer_t ixs, iys, ixe, iye;
-  integer_t xoff, yoff;
+  integer_t xoff, yoff, ilast;
   float luty, sum;
   integer_t nbox;
   integer_t i, j;
@@ -931,18 +1051,21 @@ interpolate_lanczos(const void* state,
   /* Don't divide-by-zero errors */
   assert(p->space != 0.0);
 
-  /* Loop over the box, which is assumed to be scaled appropriately */
+  /* Loop over the box, which is assumed to be scaled appropriately.
+     Offsets beyond the end of the table (where the function is 0) use
+     its last entry */
+  ilast = (integer_t)p->nlut - 1;
   sum = 0.0;
   for (j = iys; j <= iye; ++j) {
     yoff = (integer_t)(fabs((y - (float)j) / p->space));
-    assert(yoff >= 0 && yoff < p->nlut);
+    assert(yoff >= 0);
 
-    luty = p->lut[yoff];
+    luty = p->lut[MIN(yoff, ilast)];
     for (i = ixs; i <= ixe; ++i) {
       xoff = (integer_t)(fabs((x - (float)i) / p->space));
-      assert(xoff >= 0 && xoff < p->nlut);
+      assert(xoff >= 0);
 
-      sum += DATA_VALUE(i, j) * p->lut[xoff] * luty;
+      sum += DATA_VALUE(i, j) * p->lut[MIN(xoff, ilast)] * luty;
     }
   }
 
@@ -950,6 +1073,111 @@ interpolate_lanczos(const void* state,
   return 0;
 }
 
+/**
+Parameters for Lanczos interpolation of a set of points.
+*/
+struct lanczos_row_param_t {
+  /** The Lanczos look-up-table and box size */
+  const struct lanczos_param_t* lanczos;
+  /** Work buffer for the X factors of the weights [2 * nbox + 1] */
+  float* xweights;
+};
+
+/**
+Perform Lanczos interpolation of a set of points.
+
+The interpolation is separable: the X factors of the weights of each
+point are looked up once and reused for every line of the box around
+it.
+
+@param[in] state A pointer to any constant values specific to this
+interpolation type.  (For \a interpolate_lanczos_row, it must be a
+pointer to a \a lanczos_row_param_t object, already fully filled-in).
+
+@param[in] data A 2D data array of shape [dny][dnx]
+
+@param[in] dnx The x dimension of data
+
+@param[in] dny The y dimension of data
+
+@param[in] npts The number of points
+
+@param[in] x The fractional x coordinates of the points
+
+@param[in] y The fractional y coordinates of the points
+
+@param[out] value The resulting values after interpolating the data
+
+@param[out] error
+
+@return Non-zero if an error occurred
+*/
+static int
+interpolate_lanczos_row(const void* state,
+                        const float* data,
+                        const integer_t dnx, const integer_t dny,
+                        const integer_t npts,
+                        const float* x, const float* y,
+                        /* Output parameters */
+                        float* value,
+                        struct driz_error_t* error UNUSED_PARAM) {
+  integer_t ixs, iys, ixe, iye;
+  integer_t xoff, yoff, ilast;
+  float luty, sum;
+  integer_t nbox;
+  integer_t i, j, k;
+  const struct lanczos_row_param_t* param = (const struct lanczos_row_param_t*)state;
+  const struct lanczos_param_t* p;
+  const float* row;
+  float* lutx;
+
+  assert(state);
+  p = param->lanczos;
+  lutx = param->xweights;
+  nbox = p->nbox;
+  ilast = (integer_t)p->nlut - 1;
+
+  /* Don't divide-by-zero errors */
+  assert(p->space != 0.0);
+
+  for (k = 0; k < npts; ++k) {
+    /* First check for being close to the edge and, if so, return the
+       missing value */
+    ixs = (integer_t)(x[k]) - nbox;
+    ixe = (integer_t)(x[k]) + nbox;
+    iys = (integer_t)(y[k]) - nbox;
+    iye = (integer_t)(y[k]) + nbox;
+    if (ixs < 0 || ixe >= dnx ||
+        iys < 0 || iye >= dny) {
+      value[k] = p->misval;
+      continue;
+    }
+
+    /* X factors of the weights. Offsets beyond the end of the table
+       (where the function is 0) use its last entry. */
+    for (i = ixs; i <= ixe; ++i) {
+      xoff = (integer_t)(fabs((x[k] - (float)i) / p->space));
+      lutx[i - ixs] = p->lut[MIN(xoff, ilast)];
+    }
+
+    /* Loop over the box, which is assumed to be scaled appropriately */
+    sum = 0.0;
+    for (j = iys; j <= iye; ++j) {
+      yoff = (integer_t)(fabs((y[k] - (float)j) / p->space));
+      luty = p->lut[MIN(yoff, ilast)];
+
+      row = data + j * dnx;
+      for (i = ixs; i <= ixe; ++i) {
+        sum += row[i] * lutx[i - ixs] * luty;
+      }
+    }
+
+    value[k] = sum;
+  }
+
+  return 0;
+}
+
 /**
 A mapping from e_interp_t enumeration values to function pointers that actually
 perform the interpolation.  NULL elements will raise an "unimplemented" error.
@@ -966,12 +1194,27 @@ interp_function* interp_function_map[interp_LAST] = {
   &interpolate_lanczos
 };
 
+/**
+A mapping from e_interp_t enumeration values to function pointers that
+interpolate a whole output line at once.  NULL elements use the function
+of \a interp_function_map for each pixel.
+*/
+interp_row_function* interp_row_function_map[interp_LAST] = {
+  NULL,
+  NULL,
+  NULL,
+  &interpolate_poly5_row,
+  NULL,
+  &interpolate_sinc_row,
+  &interpolate_sinc_row,
+  &interpolate_lanczos_row,
+  &interpolate_lanczos_row
+};
+
 /* See header file for documentation */
 int
 doblot(struct driz_param_t* p,
        struct driz_error_t* error) {
-  const size_t nlut = 2048;
-  const float space = 0.01;
   double *xin = NULL;
   double *xtmp = NULL;
   double *xout = NULL;
@@ -983,14 +1226,17 @@ doblot(struct driz_param_t* p,
   double yv;
   float xo, yo, v;
   /*float nx, ny;*/
-  integer_t i, j;
+  integer_t i, j, k, npts;
   interp_function* interpolate;
+  interp_row_function* interpolate_row;
+  float *xrow = NULL, *yrow = NULL, *vrow = NULL;
+  integer_t *irow = NULL;
   struct sinc_param_t sinc;
+  struct lanczos_row_param_t lanczos;
   void* state = NULL;
 
   assert(p);
   assert(error);
-  assert(space != 0.0);
 
   /* Some initial settings */
   nmiss = 0;
@@ -998,6 +1244,8 @@ doblot(struct driz_param_t* p,
   /* Select interpolation function */
   assert(p->interpolation >= 0 && p->interpolation < interp_LAST);
   interpolate = interp_function_map[p->interpolation];
+  interpolate_row = interp_row_function_map[p->interpolation];
+  lanczos.xweights = NULL;
   if (interpolate == NULL) {
     driz_error_set_message(error, "Requested interpolation type not implemented.");
     goto doblot_exit_;
@@ -1007,18 +1255,23 @@ doblot(struct driz_param_t* p,
   if (p->interpolation == interp_lanczos3 || p->interpolation == interp_lanczos5) {
     assert(p->kscale != 0.0);
     assert(p->lanczos.lut == NULL);
-    if ((p->lanczos.lut = (float*)malloc(nlut * sizeof(float))) == NULL) {
-      driz_error_set_message(error, "Out of memory");
+    p->lanczos.lut = get_lanczos_lut(p->interpolation == interp_lanczos3 ? 3 : 5,
+                                     LANCZOS_LUT_OVERSAMPLING,
+                                     &p->lanczos.nlut, error);
+    if (p->lanczos.lut == NULL) {
       goto doblot_exit_;
     }
-    create_lanczos_lut(p->interpolation == interp_lanczos3 ? 3 : 5,
-                       nlut, space, p->lanczos.lut);
     p->lanczos.nbox = (integer_t)(3.0 / p->kscale);
     p->kscale2 = 1.0f / (p->kscale * p->kscale);
-    p->lanczos.nlut = nlut;
-    p->lanczos.space = space;
+    p->lanczos.space = 1.0f / (float)LANCZOS_LUT_OVERSAMPLING;
     p->lanczos.misval = p->misval;
-    state = &(p->lanczos);
+    lanczos.lanczos = &(p->lanczos);
+    lanczos.xweights = malloc((size_t)(2 * p->lanczos.nbox + 1) * sizeof(float));
+    if (lanczos.xweights == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto doblot_exit_;
+    }
+    state = &lanczos;
   } else if (p->interpolation == interp_sinc || p->interpolation == interp_lsinc) {
     sinc.sinscl = p->sinscl;
     state = &sinc;
@@ -1064,6 +1317,15 @@ doblot(struct driz_param_t* p,
       goto doblot_exit_;
   }
 
+  xrow = malloc((size_t)p->onx * 3 * sizeof(float));
+  irow = malloc((size_t)p->onx * sizeof(integer_t));
+  if (xrow == NULL || irow == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto doblot_exit_;
+  }
+  yrow = xrow + p->onx;
+  vrow = yrow + p->onx;
+
   /* In the WCS case, we can't use the scale to calculate the Jacobian,
      so we need to do it.
 
@@ -1108,7 +1370,9 @@ doblot(struct driz_param_t* p,
       goto doblot_exit_;
     }
 
-    /* Loop through the output positions and do the interpolation */
+    /* Loop through the output positions, collecting those on the input
+       image */
+    npts = 0;
     for (i = 0; i < p->onx; ++i) {
       xo = (float)(xout[i] - dx);
       yo = (float)(yout[i] - dy);
@@ -1116,15 +1380,10 @@ doblot(struct driz_param_t* p,
       /* Check it is on the input image */
       if (xo >= 0.0 && xo <= p->dnx &&
           yo >= 0.0 && yo <= p->dny) {
-
-        /* Check for look-up-table interpolation */
-        if (interpolate(state, p->data, p->dnx, p->dny, xo, yo, &v, error)) {
-          goto doblot_exit_;
-        }
-
-        /* TODO: This float cast makes it match Fortran, but technically
-           loses more precision */
-        *output_data_ptr(p, i, j) = v * p->ef / (float)p->scale2;
+        xrow[npts] = xo;
+        yrow[npts] = yo;
+        irow[npts] = i;
+        ++npts;
       } else {
         /* If there is nothing for us then set the output to missing C
            value flag */
@@ -1133,6 +1392,28 @@ doblot(struct driz_param_t* p,
         nmiss++;
       }
     }
+
+    /* Do the interpolation */
+    if (interpolate_row != NULL) {
+      if (interpolate_row(state, p->data, p->dnx, p->dny, npts,
+                          xrow, yrow, vrow, error)) {
+        goto doblot_exit_;
+      }
+    } else {
+      for (k = 0; k < npts; ++k) {
+        if (interpolate(state, p->data, p->dnx, p->dny, xrow[k], yrow[k],
+                        &v, error)) {
+          goto doblot_exit_;
+        }
+        vrow[k] = v;
+      }
+    }
+
+    for (k = 0; k < npts; ++k) {
+      /* TODO: This float cast makes it match Fortran, but technically
+         loses more precision */
+      *output_data_ptr(p, irow[k], j) = vrow[k] * p->ef / (float)p->scale2;
+    }
   }
 
   /* if (!p->use_wcs) { */
@@ -1141,7 +1422,11 @@ doblot(struct driz_param_t* p,
   /* } */
 
  doblot_exit_:
-  free(p->lanczos.lut); p->lanczos.lut = NULL;
+  /* The look-up-table is shared with other calls */
+  p->lanczos.lut = NULL;
+  free(lanczos.xweights); lanczos.xweights = NULL;
+  free(xrow); xrow = yrow = vrow = NULL;
+  free(irow); irow = NULL;
   free(xin); xin = NULL;
   free(xtmp); xtmp = NULL;
   free(xout); xout = NULL;
@@ -481,29 +481,39 @@ boxer(double is, double js,
 }
 
 /**
-Calculate overlap between an arbitrary rectangle, aligned with the
-axes, and a pixel.
+Fill the row buffers with the scaled input values and weights of
+pixels x1 to x2 (1-based) of input line yarr (0-based).
 
-This is a simplified version of the BOXER code.
-
-Used by do_kernel_turbo
+Values are stored from index 0 of each buffer.
 */
-static inline_macro double
-over(const integer_t i, const integer_t j,
-     const double xmin, const double xmax,
-     const double ymin, const double ymax) {
-  double dx, dy;
-
-  assert(xmin <= xmax);
-  assert(ymin <= ymax);
+static inline_macro void
+row_values(struct driz_param_t* p, const integer_t yarr,
+           const integer_t x1, const integer_t x2,
+           /* Output parameters */
+           float* d /*[x2 - x1 + 1]*/, float* w /*[x2 - x1 + 1]*/) {
+  const float scale2 = (float)p->scale2;
+  const float* data = data_ptr(p, x1 - 1, yarr);
+  const float* weights;
+  integer_t t, n;
 
-  dx = MIN(xmax, (double)(i) + 0.5) - MAX(xmin, (double)(i) - 0.5);
-  dy = MIN(ymax, (double)(j) + 0.5) - MAX(ymin, (double)(j) - 0.5);
+  n = x2 - x1 + 1;
 
-  if (dx > 0.0 && dy > 0.0)
-    return dx*dy;
+  /* Allow for stretching because of scale change */
+  for (t = 0; t < n; ++t) {
+    d[t] = data[t] * scale2;
+  }
 
-  return 0.0;
+  /* Scale the weighting mask by the scale factor */
+  if (p->weights) {
+    weights = weights_ptr(p, x1 - 1, yarr);
+    for (t = 0; t < n; ++t) {
+      w[t] = weights[t] * p->weight_scale;
+    }
+  } else {
+    for (t = 0; t < n; ++t) {
+      w[t] = 1.0f;
+    }
+  }
 }
 
 /***************************************************************************
@@ -656,6 +666,28 @@ do_kernel_tophat(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/**
+Value of the (1D) gaussian look-up-table at fractional index x, by
+linear interpolation.
+*/
+static inline_macro double
+gaussian_lut_value(const double* lut, const size_t nlut, const double x) {
+  size_t k;
+
+  if (x >= (double)(nlut - 1)) return 0.0;
+  k = (size_t)x;
+  return lut[k] + (x - (double)k) * (lut[k+1] - lut[k]);
+}
+
+/**
+The gaussian kernel: the weight of output pixel (ii, jj) is a scaled
+gaussian function of its distance to the transformed input pixel
+center.
+
+The function is separable, so the X factors of the weights of each
+input pixel are looked up once and reused for every affected output
+line.  See \a get_gaussian_lut for the accuracy of the look-up-table.
+*/
 static int
 do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
                    const integer_t x1, const integer_t x2,
@@ -665,11 +697,13 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
                    struct driz_error_t* error) {
   integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit;
   float vc, d, dow;
-  double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, ddx, ddy, r2, dover;
+  double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, gy, dover;
+  double* gx;
   integer_t xarr,yarr;
 
   dx = (double)(p->xmin);
   dy = (double)(p->ymin);
+  gx = p->row.overlap;
 
   for (i = x1; i <= x2; ++i) {
     xx = *mapping_ptr(p, xo, i) - dx;
@@ -703,17 +737,21 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
       w = 1.0;
     }
 
+    /* X factors of the weights */
+    for (ii = nxi; ii <= nxa; ++ii) {
+      gx[ii - nxi] = gaussian_lut_value(p->gaussian.lut, p->gaussian.nlut,
+                                        fabs(xx - (double)ii) * p->gaussian.sdp);
+    }
+
     /* Loop over output pixels which could be affected */
     for (jj = nyi; jj <= nya; ++jj) {
-      ddy = yy - (double)jj;
+      gy = p->gaussian.es *
+        gaussian_lut_value(p->gaussian.lut, p->gaussian.nlut,
+                           fabs(yy - (double)jj) * p->gaussian.sdp);
       for (ii = nxi; ii <= nxa; ++ii) {
-        ddx = xx - (double)ii;
-        /* Radial distance */
-        r2 = ddx*ddx + ddy*ddy;
-
         /* Weight is a scaled Gaussian function of radial
            distance */
-        dover = p->gaussian.es * exp(-r2 * p->gaussian.efac);
+        dover = gy * gx[ii - nxi];
 
         /* Count the hits */
         ++nhit;
@@ -738,6 +776,15 @@ do_kernel_gaussian(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/**
+The lanczos kernels: the weight of output pixel (ii, jj) is the product
+of the Lanczos functions of its X and Y offsets from the transformed
+input pixel center.
+
+The X factors of the weights of each input pixel are looked up once and
+reused for every affected output line.  See \a get_lanczos_lut for the
+accuracy of the look-up-table.
+*/
 static int
 do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
                   const integer_t x1, const integer_t x2,
@@ -745,13 +792,16 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
                   /* Input/output parameters */
                   integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
                   struct driz_error_t* error) {
-  integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit, ix, iy;
-  float vc, d, dow;
+  integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit, ix, iy, ilast;
+  float vc, d, dow, ly;
   double xx, yy, xxi, xxa, yyi, yya, w, dx, dy, dover;
+  double* lx;
   integer_t xarr,yarr;
 
   dx = (double)(p->xmin);
   dy = (double)(p->ymin);
+  lx = p->row.overlap;
+  ilast = (integer_t)p->lanczos.nlut - 1;
 
   for (i = x1; i <= x2; ++i) {
     xx = *mapping_ptr(p, xo, i) - dx;
@@ -785,21 +835,25 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
       w = 1.0;
     }
 
+    /* X factors of the weights. Offsets beyond the end of the table
+       (where the function is 0) use its last entry. */
+    for (ii = nxi; ii <= nxa; ++ii) {
+      ix = fortran_round(fabs(xx - (double)ii) * p->lanczos.sdp) + 1;
+      lx[ii - nxi] = p->lanczos.lut[MIN(ix, ilast)];
+    }
+
     /* Loop over output pixels which could be affected */
     for (jj = nyi; jj <= nya; ++jj) {
-      for (ii = nxi; ii <= nxa; ++ii) {
-        /* X and Y offsets */
-        ix = fortran_round(fabs(xx - (double)ii) * p->lanczos.sdp) + 1;
-        iy = fortran_round(fabs(yy - (double)jj) * p->lanczos.sdp) + 1;
+      iy = fortran_round(fabs(yy - (double)jj) * p->lanczos.sdp) + 1;
+      ly = p->lanczos.lut[MIN(iy, ilast)];
 
+      for (ii = nxi; ii <= nxa; ++ii) {
         /* Weight is product of Lanczos function values in X and Y */
-        dover = p->lanczos.lut[ix] * p->lanczos.lut[iy];
+        dover = (float)lx[ii - nxi] * ly;
 
         /* Count the hits */
         ++nhit;
 
-        /* VALGRIND REPORTS: Address is 1 bytes after a block of size
-           435 */
         vc = *output_counts_ptr(p, ii, jj);
         dow = (float)(dover * w);
 
@@ -820,6 +874,16 @@ do_kernel_lanczos(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/**
+The "turbo" kernel: the overlap of the (shrunken) input pixel, taken as
+a rectangle aligned with the output axes, with output pixel (ii, jj) is
+the product of the overlaps in X and Y.
+
+The kernel processes a whole row at a time: the extents and bounds of
+all input pixels are computed first, in loops the compiler can
+vectorize, and the X overlaps of each input pixel are then computed
+once and reused for all affected output lines.
+*/
 static int
 do_kernel_turbo(struct driz_param_t* p, const integer_t j,
                 const integer_t x1, const integer_t x2,
@@ -827,63 +891,79 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
                 /* Input/output parameters */
                 integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
                 struct driz_error_t* error) {
-  integer_t i, ii, jj, nxi, nxa, nyi, nya, nhit, iis, iie, jjs, jje;
-  float vc, d, dow;
-  double xxi, xxa, yyi, yya, w, dx, dy, dover,xoi,yoi;
-  integer_t xarr,yarr;
+  integer_t t, n, ii, jj, nhit, iis, iie;
+  float vc, dow;
+  double w, dx, dy, dover, ovy, fac;
+  double *xxi, *xxa, *yyi, *yya, *ovx;
+  integer_t *nxi, *nxa, *nyi, *nya;
+  float *d, *ww;
+  const double* xoi;
+  const double* yoi;
 
   dx = (double)(p->xmin);
   dy = (double)(p->ymin);
+  n = x2 - x1 + 1;
+  fac = p->scale2 * p->ac;
+
+  xxi = p->row.coords;
+  xxa = xxi + p->dnx;
+  yyi = xxa + p->dnx;
+  yya = yyi + p->dnx;
+  nxi = p->row.bounds;
+  nxa = nxi + p->dnx;
+  nyi = nxa + p->dnx;
+  nya = nyi + p->dnx;
+  d = p->row.values;
+  ww = d + p->dnx;
+  ovx = p->row.overlap;
 
-  nhit = 0;
-
-  for (i = x1; i <= x2; ++i) {
-    /* Offset within the subset */
-    xoi = *mapping_ptr(p, xo, i);
-    yoi = *mapping_ptr(p, yo, i);
-    xxi = xoi - dx - p->pfo;
-    xxa = xoi - dx + p->pfo;
-    yyi = yoi - dy - p->pfo;
-    yya = yoi - dy + p->pfo;
-
-    nxi = fortran_round(xxi);
-    nxa = fortran_round(xxa);
-    nyi = fortran_round(yyi);
-    nya = fortran_round(yya);
-    iis = MAX(nxi, 0);  /* Needed to be set to 0 to avoid edge effects */
-    iie = MIN(nxa, p->nsx - 1);
-    jjs = MAX(nyi, 0);  /* Needed to be set to 0 to avoid edge effects */
-    jje = MIN(nya, p->nsy - 1);
+  /* Offset within the subset */
+  xoi = mapping_ptr(p, xo, x1);
+  yoi = mapping_ptr(p, yo, x1);
+  for (t = 0; t < n; ++t) {
+    xxi[t] = xoi[t] - dx - p->pfo;
+    xxa[t] = xoi[t] - dx + p->pfo;
+    yyi[t] = yoi[t] - dy - p->pfo;
+    yya[t] = yoi[t] - dy + p->pfo;
+  }
 
-    nhit = 0;
+  /* Range of output pixels which could be affected. The lower bounds
+     need to be set to 0 to avoid edge effects */
+  for (t = 0; t < n; ++t) {
+    nxi[t] = MAX(fortran_round(xxi[t]), 0);
+    nxa[t] = MIN(fortran_round(xxa[t]), p->nsx - 1);
+    nyi[t] = MAX(fortran_round(yyi[t]), 0);
+    nya[t] = MIN(fortran_round(yya[t]), p->nsy - 1);
+  }
 
-    /* Convert i,j 1-based pixel positions into 0-based
-       indices for accessing data array. */
-    xarr = i-1;
-    yarr = j-1;
+  /* Convert i,j 1-based pixel positions into 0-based indices for
+     accessing data array.  Weights are scaled inversely by the
+     Jacobian (here, the pixfrac area factor) to ensure conservation
+     of weight in the output. */
+  row_values(p, j - 1, x1, x2, d, ww);
 
-    /* Allow for stretching because of scale change */
-    d = *data_ptr(p, xarr, yarr) * (float)p->scale2;
+  for (t = 0; t < n; ++t) {
+    nhit = 0;
+    iis = nxi[t];
+    iie = nxa[t];
+    w = ww[t];
 
-    /* Scale the weighting mask by the scale factor and inversely by
-       the Jacobian to ensure conservation of weight in the output. */
-    if (p->weights) {
-      w = *weights_ptr(p, xarr, yarr) * p->weight_scale;
-    } else {
-      w = 1.0;
+    /* Overlaps in X, using the simpler "aligned" box calculation */
+    for (ii = iis; ii <= iie; ++ii) {
+      ovx[ii - iis] = MIN(xxa[t], (double)(ii) + 0.5) - MAX(xxi[t], (double)(ii) - 0.5);
     }
 
-
     /* Loop over the output pixels which could be affected */
-    for (jj = jjs; jj <= jje; ++jj) {
+    for (jj = nyi[t]; jj <= nya[t]; ++jj) {
+      ovy = MIN(yya[t], (double)(jj) + 0.5) - MAX(yyi[t], (double)(jj) - 0.5);
+      if (ovy <= 0.0) continue;
+
       for (ii = iis; ii <= iie; ++ii) {
-        /* Calculate the overlap using the simpler "aligned" box
-           routine */
-        dover = over(ii, jj, xxi, xxa, yyi, yya);
+        if (ovx[ii - iis] > 0.0) {
+          dover = ovx[ii - iis] * ovy;
 
-        if (dover > 0.0) {
           /* Correct for the pixfrac area factor */
-          dover *= p->scale2 * p->ac;
+          dover *= fac;
 
           /* Count the hits */
           ++nhit;
@@ -897,7 +977,7 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
             return 1;
           }
 
-          update_data(p, ii, jj, d, vc, dow);
+          update_data(p, ii, jj, d[t], vc, dow);
         }
       }
     }
@@ -909,6 +989,16 @@ do_kernel_turbo(struct driz_param_t* p, const integer_t j,
   return 0;
 }
 
+/**
+The "classic" drizzle square kernel: the overlap of the quadrilateral
+given by the four transformed corners of the shrunken input pixel with
+each output pixel is computed exactly with boxer.
+
+The kernel processes a whole row at a time: the corners of all input
+pixels are transformed with a single call to the mapping per corner,
+and their offsets, Jacobians and bounds on the output are computed in
+loops the compiler can vectorize before the overlaps are accumulated.
+*/
 static int
 do_kernel_square(struct driz_param_t* p,
                  const integer_t j, double y,
@@ -920,10 +1010,15 @@ do_kernel_square(struct driz_param_t* p,
                  double* xo, double* yo,
                  integer_t* oldcon, integer_t* newcon, integer_t* nmiss,
                  struct driz_error_t* error) {
-  integer_t i, nhit, ii, jj, min_ii, max_ii, min_jj, max_jj, n;
-  float vc, d, dow;
-  double dh, jaco, tem, dover, dx, dy, w;
+  integer_t i, k, t, nhit, ii, jj, n;
+  float vc, dow;
+  double dh, jac, tem, dover, dx, dy, w, vmin, vmax;
   double xout[4], yout[4];
+  double *cx[4], *cy[4];
+  double *jaco;
+  integer_t *min_ii, *max_ii, *min_jj, *max_jj;
+  float *d, *ww;
+  bool_t flip;
 
   /* TODO: These are constant across calls -- perhaps cache??? */
   dh = 0.5 * p->pixel_fraction;
@@ -931,6 +1026,14 @@ do_kernel_square(struct driz_param_t* p,
   dy = (double)(p->ymin) - 1;
   n = x2 - x1 + 1;
 
+  jaco = p->row.coords;
+  min_ii = p->row.bounds;
+  max_ii = min_ii + p->dnx;
+  min_jj = max_ii + p->dnx;
+  max_jj = min_jj + p->dnx;
+  d = p->row.values;
+  ww = d + p->dnx;
+
   /* Next the "classic" drizzle square kernel...  this is different
      because we have to transform all four corners of the shrunken
      pixel */
@@ -952,64 +1055,86 @@ do_kernel_square(struct driz_param_t* p,
   *mapping_4_ptr(p, yi, x1+1, 3) = -dh;
 
   /* Transform onto the output grid */
-  for (i = 0; i < 4; ++i) {
+  for (k = 0; k < 4; ++k) {
     if (map_value(p, TRUE, n,
-                  mapping_4_ptr(p, xi, x1, i), mapping_4_ptr(p, yi, x1, i),
+                  mapping_4_ptr(p, xi, x1, k), mapping_4_ptr(p, yi, x1, k),
                   xtmp, ytmp,
-                  mapping_4_ptr(p, xo, x1, i), mapping_4_ptr(p, yo, x1, i),
+                  mapping_4_ptr(p, xo, x1, k), mapping_4_ptr(p, yo, x1, k),
                   error)) {
       return 1;
     }
+    cx[k] = mapping_4_ptr(p, xo, x1, k);
+    cy[k] = mapping_4_ptr(p, yo, x1, k);
   }
 
-  for (i = x1; i <= x2; ++i) {
-    /* Offset within the subset */
-    for (ii = 0; ii < 4; ++ii) {
-      /* The offset by 1 here is needed to match the alignment in the
-         output frame generated by the other kernels (such as turbo).
-      */
-      xout[ii] = *mapping_4_ptr(p, xo, i, ii) - dx - 1;
-      yout[ii] = *mapping_4_ptr(p, yo, i, ii) - dy - 1;
+  /* Offset within the subset. The offset by 1 here is needed to match
+     the alignment in the output frame generated by the other kernels
+     (such as turbo). */
+  for (k = 0; k < 4; ++k) {
+    for (t = 0; t < n; ++t) {
+      cx[k][t] = cx[k][t] - dx - 1;
+      cy[k][t] = cy[k][t] - dy - 1;
     }
+  }
+
+  /* Work out the area of the quadrilaterals on the output grid.
+     Note that this expression expects the points to be in clockwise
+     order: swap corners 1 and 3 otherwise */
+  for (t = 0; t < n; ++t) {
+    jac = 0.5f * ((cx[1][t] - cx[3][t]) * (cy[0][t] - cy[2][t]) -
+                  (cx[0][t] - cx[2][t]) * (cy[1][t] - cy[3][t]));
+    flip = (jac < 0.0);
+    jaco[t] = flip ? -jac : jac;
+    tem = cx[1][t];
+    cx[1][t] = flip ? cx[3][t] : tem;
+    cx[3][t] = flip ? tem : cx[3][t];
+    tem = cy[1][t];
+    cy[1][t] = flip ? cy[3][t] : tem;
+    cy[3][t] = flip ? tem : cy[3][t];
+  }
 
-    /* Work out the area of the quadrilateral on the output grid.
-       Note that this expression expects the points to be in clockwise
-       order */
-    jaco = 0.5f * ((xout[1] - xout[3]) * (yout[0] - yout[2]) -
-                   (xout[0] - xout[2]) * (yout[1] - yout[3]));
-    if (jaco < 0.0) {
-      jaco *= -1.0;
-      /* Swap */
-      tem = xout[1]; xout[1] = xout[3]; xout[3] = tem;
-      tem = yout[1]; yout[1] = yout[3]; yout[3] = tem;
+  /* Output pixels which could be affected */
+  for (t = 0; t < n; ++t) {
+    vmin = MAX_DOUBLE;
+    vmax = MIN_DOUBLE;
+    for (k = 0; k < 4; ++k) {
+      vmin = (cy[k][t] < vmin) ? cy[k][t] : vmin;
+      vmax = (cy[k][t] > vmax) ? cy[k][t] : vmax;
     }
-    nhit = 0;
+    min_jj[t] = MAX(fortran_round(vmin), 0);
+    max_jj[t] = MIN(fortran_round(vmax), p->nsy - 1);
+
+    vmin = MAX_DOUBLE;
+    vmax = MIN_DOUBLE;
+    for (k = 0; k < 4; ++k) {
+      vmin = (cx[k][t] < vmin) ? cx[k][t] : vmin;
+      vmax = (cx[k][t] > vmax) ? cx[k][t] : vmax;
+    }
+    min_ii[t] = MAX(fortran_round(vmin), 0);
+    max_ii[t] = MIN(fortran_round(vmax), p->nsx - 1);
+  }
 
-    /* Allow for stretching because of scale change */
-    d = *data_ptr(p, i-1, j) * (float)p->scale2;
+  /* Scale the weighting mask by the scale factor and inversely by
+     the Jacobian to ensure conservation of weight in the output */
+  row_values(p, j, x1, x2, d, ww);
 
-    /* Scale the weighting mask by the scale factor and inversely by
-       the Jacobian to ensure conservation of weight in the output */
-    if (p->weights) {
-      w = *weights_ptr(p, i-1, j) * p->weight_scale;
-    } else {
-      w = 1.0;
+  for (t = 0, i = x1; i <= x2; ++t, ++i) {
+    for (k = 0; k < 4; ++k) {
+      xout[k] = cx[k][t];
+      yout[k] = cy[k][t];
     }
+    nhit = 0;
+    w = ww[t];
 
     /* Loop over output pixels which could be affected */
-    min_jj = MAX(fortran_round(min_doubles(yout, 4)), 0);
-    max_jj = MIN(fortran_round(max_doubles(yout, 4)), p->nsy - 1);
-    min_ii = MAX(fortran_round(min_doubles(xout, 4)), 0);
-    max_ii = MIN(fortran_round(max_doubles(xout, 4)), p->nsx - 1);
-
-    for (jj = min_jj; jj <= max_jj; ++jj) {
-      for (ii = min_ii; ii <= max_ii; ++ii) {
+    for (jj = min_jj[t]; jj <= max_jj[t]; ++jj) {
+      for (ii = min_ii[t]; ii <= max_ii[t]; ++ii) {
         /* Call boxer to calculate overlap */
         dover = boxer((double)ii, (double)jj, xout, yout);
 
         if (dover > 0.0) {
           /* Re-normalise the area overlap using the Jacobian */
-          dover /= jaco;
+          dover /= jaco[t];
 
           /* Count the hits */
           ++nhit;
@@ -1023,7 +1148,7 @@ do_kernel_square(struct driz_param_t* p,
             return 1;
           }
 
-          update_data(p, ii, jj, d, vc, dow);
+          update_data(p, ii, jj, d[t], vc, dow);
         }
       }
     }
@@ -1063,8 +1188,7 @@ dobox(struct driz_param_t* p, const integer_t ystart,
       /* Output parameters */
       integer_t* nmiss, integer_t* nskip, struct driz_error_t* error) {
   const double nsig = 2.5;
-  const size_t nlut = 512;
-  const float del = 0.01;
+  float del;
   integer_t j, x1, x2, last_x1, last_x2;
   double y, dh, ofrac;
   kernel_handler_t kernel_handler = NULL;
@@ -1132,19 +1256,27 @@ dobox(struct driz_param_t* p, const integer_t ystart,
        divided by the scale so that there are never holes in the
        output */
     p->pfo = CLAMP_ABOVE(p->pfo, 1.2 / p->scale);
+    /* Look-up-table of exp(-u^2): the weight of an offset d (in output
+       pixels) along one axis is found at index d * sdp */
+    if (p->lut_oversampling <= 0) p->lut_oversampling = GAUSSIAN_LUT_OVERSAMPLING;
+    p->gaussian.lut = get_gaussian_lut(p->lut_oversampling, &p->gaussian.nlut, error);
+    if (p->gaussian.lut == NULL) {
+      goto dobox_exit_;
+    }
+    p->gaussian.sdp = sqrt(p->gaussian.efac) * (double)p->lut_oversampling;
     break;
   case kernel_lanczos2:
   case kernel_lanczos3:
     kernel_order = (p->kernel == kernel_lanczos2) ? 2 : 3;
-    p->lanczos.nlut = nlut;
-    assert(p->lanczos.lut == NULL);
-    if ((p->lanczos.lut = malloc(nlut * sizeof(float))) == NULL) {
-      driz_error_set_message(error, "Out of memory");
-      goto dobox_exit_;
-    }
     /* Set up a look-up-table for Lanczos-style interpolation
        kernels */
-    create_lanczos_lut(kernel_order, nlut, del, p->lanczos.lut);
+    if (p->lut_oversampling <= 0) p->lut_oversampling = LANCZOS_LUT_OVERSAMPLING;
+    del = 1.0f / (float)p->lut_oversampling;
+    p->lanczos.lut = get_lanczos_lut(kernel_order, p->lut_oversampling,
+                                     &p->lanczos.nlut, error);
+    if (p->lanczos.lut == NULL) {
+      goto dobox_exit_;
+    }
     p->pfo = (double)kernel_order * p->pixel_fraction / p->scale;
     p->lanczos.sdp = p->scale / del / p->pixel_fraction;
     break;
@@ -1201,6 +1333,18 @@ dobox(struct driz_param_t* p, const integer_t ystart,
     goto dobox_exit_;
   }
 
+  if (p->kernel != kernel_point && p->kernel != kernel_tophat) {
+    p->row.coords = malloc((size_t)p->dnx * 4 * sizeof(double));
+    p->row.bounds = malloc((size_t)p->dnx * 4 * sizeof(integer_t));
+    p->row.values = malloc((size_t)p->dnx * 2 * sizeof(float));
+    p->row.overlap = malloc((size_t)p->nsx * sizeof(double));
+    if (p->row.coords == NULL || p->row.bounds == NULL ||
+        p->row.values == NULL || p->row.overlap == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto dobox_exit_;
+    }
+  }
+
   if (p->kernel == kernel_square) {
     dh = 0.5 * p->pixel_fraction;
     *mapping_4_ptr(p, xi, 1, 0) = 1.0 - dh;
@@ -1308,8 +1452,14 @@ dobox(struct driz_param_t* p, const integer_t ystart,
   }
 
  dobox_exit_:
-  free(p->lanczos.lut); p->lanczos.lut = NULL;
+  /* Look-up-tables are shared with other calls */
+  p->lanczos.lut = NULL;
+  p->gaussian.lut = NULL;
   free(p->output_done); p->output_done = NULL;
+  free(p->row.coords); p->row.coords = NULL;
+  free(p->row.bounds); p->row.bounds = NULL;
+  free(p->row.values); p->row.values = NULL;
+  free(p->row.overlap); p->row.overlap = NULL;
   free(xi); xi = NULL;
   free(yi); yi = NULL;
   free(xo); xo = NULL;
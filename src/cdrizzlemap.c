@@ -246,6 +246,36 @@ map_value(struct driz_param_t* p,
   assert(ytmp != yout);
   assert(error);
 
+  if (regular && p->mapping_callback == affine_map) {
+    /* Step along the row: no need to transform each point */
+    struct affine_param_t* m = (struct affine_param_t*)p->mapping_callback_state;
+    const double* a = m->matrix;
+    double xe[2], ye[2], xoe[2], yoe[2];
+    double dxo, dyo;
+
+    if (m->mapping_callback) {
+      xe[0] = xin[0];
+      xe[1] = xin[0] + (double)(n - 1) * p->x_scale;
+      ye[0] = ye[1] = yin[0];
+      if (m->mapping_callback(m->mapping_callback_state, xin[0], yin[1], 2,
+                              xe, ye, xoe, yoe, error))
+        return 1;
+      dxo = (n > 1) ? (xoe[1] - xoe[0]) / (double)(n - 1) : 0.0;
+      dyo = (n > 1) ? (yoe[1] - yoe[0]) / (double)(n - 1) : 0.0;
+    } else {
+      xoe[0] = a[0] * xin[0] + a[1] * yin[0] + a[2];
+      yoe[0] = a[3] * xin[0] + a[4] * yin[0] + a[5];
+      dxo = a[0] * p->x_scale;
+      dyo = a[3] * p->x_scale;
+    }
+
+    for (i = 0; i < n; ++i) {
+      xout[i] = xoe[0] + (double)i * dxo;
+      yout[i] = yoe[0] + (double)i * dyo;
+    }
+    return 0;
+  }
+
   if (regular) {
     /* x = xin[0] - p->x_scale + 1.0; */
     /* y = yin[0] + yin[1] + 2.0; */
@@ -277,6 +307,97 @@ map_value(struct driz_param_t* p,
   return 0;
 }
 
+int
+affine_map(void* state,
+           const double xd, const double yd,
+           const integer_t n,
+           double* xin /*[n]*/, double* yin /*[n]*/,
+           /* Output parameters */
+           double* xout, double* yout,
+           struct driz_error_t* error) {
+  struct affine_param_t* m = (struct affine_param_t*)state;
+  const double* a = m->matrix;
+  integer_t i;
+
+  if (m->mapping_callback) {
+    return m->mapping_callback(m->mapping_callback_state, xd, yd, n,
+                               xin, yin, xout, yout, error);
+  }
+
+  for (i = 0; i < n; ++i) {
+    xout[i] = a[0] * xin[i] + a[1] * yin[i] + a[2];
+    yout[i] = a[3] * xin[i] + a[4] * yin[i] + a[5];
+  }
+
+  return 0;
+}
+
+int
+detect_affine_map(struct driz_param_t* p,
+                  const double xmin, const double xmax,
+                  const double ymin, const double ymax,
+                  const double tolerance,
+                  /* Output parameters */
+                  double* matrix /*[6]*/, bool_t* is_affine,
+                  struct driz_error_t* error) {
+  const integer_t ns = AFFINE_NSAMPLE;
+  const integer_t n = AFFINE_NSAMPLE * AFFINE_NSAMPLE;
+  double xin[AFFINE_NSAMPLE * AFFINE_NSAMPLE], yin[AFFINE_NSAMPLE * AFFINE_NSAMPLE];
+  double xtmp[AFFINE_NSAMPLE * AFFINE_NSAMPLE], ytmp[AFFINE_NSAMPLE * AFFINE_NSAMPLE];
+  double xout[AFFINE_NSAMPLE * AFFINE_NSAMPLE], yout[AFFINE_NSAMPLE * AFFINE_NSAMPLE];
+  double dx, dy, x, y;
+  integer_t i, j, k;
+
+  assert(p);
+  assert(p->mapping_callback);
+  assert(matrix);
+  assert(is_affine);
+  assert(error);
+
+  *is_affine = FALSE;
+
+  dx = xmax - xmin;
+  dy = ymax - ymin;
+  if (!(dx > 0.0 && dy > 0.0)) {
+    return 0;
+  }
+
+  for (j = 0, k = 0; j < ns; ++j) {
+    for (i = 0; i < ns; ++i, ++k) {
+      xin[k] = xmin + dx * (double)i / (double)(ns - 1);
+      yin[k] = ymin + dy * (double)j / (double)(ns - 1);
+    }
+  }
+
+  if (map_value(p, FALSE, n, xin, yin, xtmp, ytmp, xout, yout, error)) {
+    return 1;
+  }
+
+  /* Affine transformation through the corners (xmin, ymin),
+     (xmax, ymin) and (xmin, ymax) */
+  matrix[0] = (xout[ns - 1] - xout[0]) / dx;
+  matrix[1] = (xout[n - ns] - xout[0]) / dy;
+  matrix[2] = xout[0] - matrix[0] * xmin - matrix[1] * ymin;
+  matrix[3] = (yout[ns - 1] - yout[0]) / dx;
+  matrix[4] = (yout[n - ns] - yout[0]) / dy;
+  matrix[5] = yout[0] - matrix[3] * xmin - matrix[4] * ymin;
+
+  for (j = 0, k = 0; j < ns; ++j) {
+    y = ymin + dy * (double)j / (double)(ns - 1);
+    for (i = 0; i < ns; ++i, ++k) {
+      x = xmin + dx * (double)i / (double)(ns - 1);
+      /* Written so that NaN values are never considered affine */
+      if (!(fabs(matrix[0] * x + matrix[1] * y + matrix[2] - xout[k]) <= tolerance &&
+            fabs(matrix[3] * x + matrix[4] * y + matrix[5] - yout[k]) <= tolerance)) {
+        return 0;
+      }
+    }
+  }
+
+  *is_affine = TRUE;
+  return 0;
+}
+
 static int
 default_wcsmap_direct(struct wcsmap_param_t* m,
                       const double xd, const double yd,
@@ -443,6 +564,96 @@ default_wcsmap_interpolate(struct wcsmap_param_t* m,
 }
 
 
+/*
+ Bilinear interpolation in step (xi, yi) of the nodes of a cell of the
+ adaptive table, which has nk x nk steps.
+*/
+static inline void
+interpolate_cell(const double* table, const int nk,
+                 const int xi, const int yi, const double xf, const double yf,
+                 /* Output parameters */
+                 double* xout, double* yout) {
+  const double ixf = 1.0 - xf;
+  const double iyf = 1.0 - yf;
+  double  tabx00, tabx01, tabx10, tabx11;
+
+#define TABLE_X(x, y) (table[((y)*(nk + 1) + (x))*2])
+#define TABLE_Y(x, y) (table[((y)*(nk + 1) + (x))*2 + 1])
+
+  tabx00 = TABLE_X(xi, yi);
+  tabx10 = TABLE_X(xi+1, yi);
+  tabx01 = TABLE_X(xi, yi+1);
+  tabx11 = TABLE_X(xi+1, yi+1);
+
+  /* Account for interpolating across 360-0 boundary */
+  if ((tabx00 - tabx10) > 359) {
+    tabx00 -= 360.0;
+    tabx01 -= 360.0;
+  } else if ((tabx00 - tabx10) < -359) {
+    tabx10 -= 360.0;
+    tabx11 -= 360.0;
+  }
+
+  *xout =
+    tabx00 * ixf * iyf +
+    tabx10 * xf * iyf +
+    tabx01 * ixf * yf +
+    tabx11 * xf * yf;
+
+  *yout =
+    TABLE_Y(xi, yi)     * ixf * iyf +
+    TABLE_Y(xi+1, yi)   * xf * iyf +
+    TABLE_Y(xi, yi+1)   * ixf * yf +
+    TABLE_Y(xi+1, yi+1) * xf * yf;
+
+#undef TABLE_X
+#undef TABLE_Y
+}
+
+static int
+default_wcsmap_interpolate_adaptive(struct wcsmap_param_t* m,
+                                    const double xd, const double yd,
+                                    const integer_t n,
+                                    double* xin /*[n]*/, double* yin /*[n]*/,
+                                    /* Output parameters */
+                                    double* xout, double* yout,
+                                    struct driz_error_t* error) {
+
+  integer_t i;
+  const double scale = 1.0 / m->factor;
+  const double *table = NULL;
+  double  x, y;
+  int     k, nk = 0, cx, cy, xi, yi;
+  int     last_k = -1;
+
+  for (i = 0; i < n; ++i) {
+    /* Find the cell and the step of the cell (positions beyond the
+       table are extrapolated from the closest step). Consecutive
+       positions (along a row of the image) are usually in the same
+       cell. */
+    x = xin[i] * scale;
+    y = yin[i] * scale;
+    cx = CLAMP((int)floor(x), 0, m->ncx - 1);
+    cy = CLAMP((int)floor(y), 0, m->ncy - 1);
+    k = cy * m->ncx + cx;
+    if (k != last_k) {
+      nk = m->cell_n[k];
+      table = m->table + m->cell_offset[k];
+      last_k = k;
+    }
+
+    x = (x - (double)cx) * (double)nk;
+    y = (y - (double)cy) * (double)nk;
+    xi = CLAMP((int)floor(x), 0, nk - 1);
+    yi = CLAMP((int)floor(y), 0, nk - 1);
+
+    interpolate_cell(table, nk, xi, yi, x - (double)xi, y - (double)yi,
+                     xout + i, yout + i);
+  }
+
+  return 0;
+}
+
 
 /*
 
@@ -462,17 +673,355 @@ default_wcsmap(void* state,
 
   if (m->factor == 0) {
     return default_wcsmap_direct(m, xd, yd, n, xin, yin, xout, yout, error);
+  } else if (m->cell_n != NULL) {
+    return default_wcsmap_interpolate_adaptive(m, xd, yd, n, xin, yin,
+                                               xout, yout, error);
   } else {
     return default_wcsmap_interpolate(m, xd, yd, n, xin, yin, xout, yout, error);
   }
 }
 
+/*
+ Transform n pixel positions (x, y pairs) of the input WCS to pixel
+ positions of the output WCS.
+*/
+static int
+wcsmap_transform(pipeline_t* input, pipeline_t* output,
+                 const int n, double* pixcrd /*[n][2]*/,
+                 /* Output parameters */
+                 double* outcrd /*[n][2]*/,
+                 struct driz_error_t* error) {
+  double *tmp    = NULL;
+  double *phi    = NULL;
+  double *theta  = NULL;
+  double *imgcrd = NULL;
+  int    *stat   = NULL;
+  int     istat;
+  int     status = 1;
+
+  tmp = malloc((size_t)n * 2 * sizeof(double));
+  imgcrd = malloc((size_t)n * 2 * sizeof(double));
+  phi = malloc((size_t)n * sizeof(double));
+  theta = malloc((size_t)n * sizeof(double));
+  stat = malloc((size_t)n * sizeof(int));
+  if (tmp == NULL || imgcrd == NULL || phi == NULL || theta == NULL ||
+      stat == NULL) {
+    driz_error_set_message(error, "Out of memory");
+    goto exit;
+  }
+
+  wcsprm_python2c(input->wcs);
+  istat = pipeline_all_pixel2world(input, n, 2, pixcrd, tmp);
+  wcsprm_c2python(input->wcs);
+
+  if (istat) {
+    driz_error_set_message(error, wcslib_get_error_message(istat));
+    goto exit;
+  }
+
+  wcsprm_python2c(output->wcs);
+  istat = wcss2p(output->wcs, n, 2, tmp, phi, theta, imgcrd, outcrd, stat);
+  wcsprm_c2python(output->wcs);
+
+  if (istat) {
+    driz_error_set_message(error, wcslib_get_error_message(istat));
+    goto exit;
+  }
+
+  status = 0;
+
+ exit:
+  free(tmp);
+  free(imgcrd);
+  free(phi);
+  free(theta);
+  free(stat);
+
+  return status;
+}
+
+/*
+ Build the adaptive interpolation table of m (see default_wcsmap_init).
+
+ All the cells are refined together, one level at a time, so that the
+ new nodes of all the cells are transformed with a single call to the
+ WCS.
+*/
+static int
+default_wcsmap_init_adaptive(struct wcsmap_param_t* m,
+                             pipeline_t* input,
+                             pipeline_t* output,
+                             int nx, int ny,
+                             double factor, double tolerance,
+                             struct driz_error_t* error) {
+  const int ncx = (int)((double)nx / factor) + 1;
+  const int ncy = (int)((double)ny / factor) + 1;
+  const int ncell = ncx * ncy;
+  int     *cell_n = NULL;
+  size_t  *cell_offset = NULL;
+  double **nodes = NULL;
+  bool_t  *done = NULL;
+  double  *pixcrd = NULL;
+  double  *outcrd = NULL;
+  double  *refined = NULL;
+  double  *old, *node, *ptr;
+  double   h, dx, dy, err, cell_err;
+  int      k, i, j, n, n2, npts, nactive;
+  int      nmax, s, snx, sny, cx, cy, rx, ry, xi, yi;
+  size_t   total;
+  int      status = 1;
+
+  cell_n = malloc((size_t)ncell * sizeof(int));
+  cell_offset = malloc((size_t)ncell * sizeof(size_t));
+  nodes = calloc((size_t)ncell, sizeof(double*));
+  done = calloc((size_t)ncell, sizeof(bool_t));
+  pixcrd = malloc((size_t)(ncx + 1) * (ncy + 1) * 2 * sizeof(double));
+  outcrd = malloc((size_t)(ncx + 1) * (ncy + 1) * 2 * sizeof(double));
+  if (cell_n == NULL || cell_offset == NULL || nodes == NULL ||
+      done == NULL || pixcrd == NULL || outcrd == NULL) {
+    driz_error_set_message(error, "Out of memory");
+    goto exit;
+  }
+
+  /* Corners of the cells */
+  ptr = pixcrd;
+  for (j = 0; j <= ncy; ++j) {
+    for (i = 0; i <= ncx; ++i) {
+      *ptr++ = (double)i * factor;
+      *ptr++ = (double)j * factor;
+    }
+  }
+
+  npts = (ncx + 1) * (ncy + 1);
+  if (wcsmap_transform(input, output, npts, pixcrd, outcrd, error)) {
+    goto exit;
+  }
+  m->nevaluations = npts;
+
+#define CORNER(i, j) (outcrd + ((j) * (ncx + 1) + (i)) * 2)
+
+  for (k = 0; k < ncell; ++k) {
+    i = k % ncx;
+    j = k / ncx;
+    cell_n[k] = 1;
+    if ((nodes[k] = malloc(8 * sizeof(double))) == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto exit;
+    }
+    memcpy(nodes[k], CORNER(i, j), 2 * sizeof(double));
+    memcpy(nodes[k] + 2, CORNER(i + 1, j), 2 * sizeof(double));
+    memcpy(nodes[k] + 4, CORNER(i, j + 1), 2 * sizeof(double));
+    memcpy(nodes[k] + 6, CORNER(i + 1, j + 1), 2 * sizeof(double));
+  }
+
+#undef CORNER
+
+  /* Refine the cells until the interpolation error is small enough */
+  m->max_error = 0.0;
+  nactive = ncell;
+  while (nactive > 0) {
+    /* Collect the new nodes (centers and edge midpoints of the steps)
+       of all the cells being refined */
+    npts = 0;
+    for (k = 0; k < ncell; ++k) {
+      if (!done[k]) {
+        n2 = 2 * cell_n[k];
+        npts += (n2 + 1) * (n2 + 1) - (cell_n[k] + 1) * (cell_n[k] + 1);
+      }
+    }
+
+    free(pixcrd);
+    free(outcrd);
+    pixcrd = malloc((size_t)npts * 2 * sizeof(double));
+    outcrd = malloc((size_t)npts * 2 * sizeof(double));
+    if (pixcrd == NULL || outcrd == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto exit;
+    }
+
+    ptr = pixcrd;
+    for (k = 0; k < ncell; ++k) {
+      if (done[k]) continue;
+      n2 = 2 * cell_n[k];
+      h = factor / (double)n2;
+      for (j = 0; j <= n2; ++j) {
+        for (i = 0; i <= n2; ++i) {
+          if ((i | j) & 1) {
+            *ptr++ = (double)(k % ncx) * factor + (double)i * h;
+            *ptr++ = (double)(k / ncx) * factor + (double)j * h;
+          }
+        }
+      }
+    }
+
+    if (wcsmap_transform(input, output, npts, pixcrd, outcrd, error)) {
+      goto exit;
+    }
+    m->nevaluations += npts;
+
+    /* Compare the new nodes with the interpolation of the current ones */
+    ptr = outcrd;
+    for (k = 0; k < ncell; ++k) {
+      if (done[k]) continue;
+      n = cell_n[k];
+      n2 = 2 * n;
+      refined = malloc((size_t)(n2 + 1) * (n2 + 1) * 2 * sizeof(double));
+      if (refined == NULL) {
+        driz_error_set_message(error, "Out of memory");
+        goto exit;
+      }
+
+      old = nodes[k];
+      cell_err = 0.0;
+      for (j = 0; j <= n2; ++j) {
+        for (i = 0; i <= n2; ++i) {
+          node = refined + (j * (n2 + 1) + i) * 2;
+          if (((i | j) & 1) == 0) {
+            node[0] = old[((j/2) * (n + 1) + i/2) * 2];
+            node[1] = old[((j/2) * (n + 1) + i/2) * 2 + 1];
+            continue;
+          }
+
+          node[0] = *ptr++;
+          node[1] = *ptr++;
+
+          /* The new node is the midpoint of 2 (edges) or 4 (centers)
+             of the current nodes */
+#define OLD(ii, jj, c) (old[((jj) * (n + 1) + (ii)) * 2 + (c)])
+          if ((i & 1) && (j & 1)) {
+            dx = 0.25 * (OLD(i/2, j/2, 0) + OLD(i/2 + 1, j/2, 0) +
+                         OLD(i/2, j/2 + 1, 0) + OLD(i/2 + 1, j/2 + 1, 0));
+            dy = 0.25 * (OLD(i/2, j/2, 1) + OLD(i/2 + 1, j/2, 1) +
+                         OLD(i/2, j/2 + 1, 1) + OLD(i/2 + 1, j/2 + 1, 1));
+          } else if (i & 1) {
+            dx = 0.5 * (OLD(i/2, j/2, 0) + OLD(i/2 + 1, j/2, 0));
+            dy = 0.5 * (OLD(i/2, j/2, 1) + OLD(i/2 + 1, j/2, 1));
+          } else {
+            dx = 0.5 * (OLD(i/2, j/2, 0) + OLD(i/2, j/2 + 1, 0));
+            dy = 0.5 * (OLD(i/2, j/2, 1) + OLD(i/2, j/2 + 1, 1));
+          }
+#undef OLD
+          err = sqrt((node[0] - dx) * (node[0] - dx) +
+                     (node[1] - dy) * (node[1] - dy));
+          if (err > cell_err) cell_err = err;
+        }
+      }
+
+      /* The refined nodes are kept in any case: they are exact where
+         the error was measured and make the final table more accurate
+         than the measured error */
+      free(nodes[k]);
+      nodes[k] = refined;
+      cell_n[k] = n2;
+      refined = NULL;
+
+      if (cell_err <= tolerance || factor / (double)n2 <= WCSMAP_MIN_STEP) {
+        done[k] = TRUE;
+        --nactive;
+        if (cell_err > m->max_error) m->max_error = cell_err;
+      }
+    }
+  }
+
+  /* When it is small enough, resample the table on a regular grid with
+     the smallest step of the cells, so that positions are interpolated
+     as fast as with a fixed step. The steps of the cells are powers of 2
+     of the smallest one: each step of the regular grid is inside a
+     single step of a cell, where the bilinear interpolation is the same
+     as in the adaptive table. */
+  nmax = 1;
+  for (k = 0; k < ncell; ++k) {
+    if (cell_n[k] > nmax) nmax = cell_n[k];
+  }
+  h = factor / (double)nmax;
+  snx = (int)((double)nx / h) + 2;
+  sny = (int)((double)ny / h) + 2;
+
+  if ((size_t)snx * (size_t)sny <= WCSMAP_MAX_RESAMPLED) {
+    if ((m->table = malloc((size_t)snx * sny * 2 * sizeof(double))) == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      goto exit;
+    }
+
+    ptr = m->table;
+    for (j = 0; j < sny; ++j) {
+      /* Cell of the node and position of the node in the cell, in
+         smallest steps (the last node of the table may be on the upper
+         edge of the last cell) */
+      cy = MIN(j / nmax, ncy - 1);
+      ry = j - cy * nmax;
+      for (i = 0; i < snx; ++i) {
+        cx = MIN(i / nmax, ncx - 1);
+        rx = i - cx * nmax;
+        k = cy * ncx + cx;
+        n = cell_n[k];
+        s = nmax / n;
+        xi = MIN(rx / s, n - 1);
+        yi = MIN(ry / s, n - 1);
+        interpolate_cell(nodes[k], n, xi, yi,
+                         (double)(rx - xi * s) / (double)s,
+                         (double)(ry - yi * s) / (double)s,
+                         ptr, ptr + 1);
+        ptr += 2;
+      }
+    }
+
+    m->factor = h;
+    m->snx = snx;
+    m->sny = sny;
+    status = 0;
+    goto exit;
+  }
+
+  /* Otherwise, gather the nodes of all the cells in a single table */
+  total = 0;
+  for (k = 0; k < ncell; ++k) {
+    cell_offset[k] = total;
+    total += (size_t)(cell_n[k] + 1) * (cell_n[k] + 1) * 2;
+  }
+
+  if ((m->table = malloc(total * sizeof(double))) == NULL) {
+    driz_error_set_message(error, "Out of memory");
+    goto exit;
+  }
+
+  for (k = 0; k < ncell; ++k) {
+    memcpy(m->table + cell_offset[k], nodes[k],
+           (size_t)(cell_n[k] + 1) * (cell_n[k] + 1) * 2 * sizeof(double));
+  }
+
+  m->factor = factor;
+  m->snx = m->sny = 0;
+  m->ncx = ncx;
+  m->ncy = ncy;
+  m->cell_n = cell_n;
+  m->cell_offset = cell_offset;
+  cell_n = NULL;
+  cell_offset = NULL;
+  status = 0;
+
+ exit:
+  if (nodes != NULL) {
+    for (k = 0; k < ncell; ++k) {
+      free(nodes[k]);
+    }
+  }
+  free(nodes);
+  free(done);
+  free(cell_n);
+  free(cell_offset);
+  free(pixcrd);
+  free(outcrd);
+
+  return status;
+}
+
 int
 default_wcsmap_init(struct wcsmap_param_t* m,
                     pipeline_t* input,
                     pipeline_t* output,
                     int nx, int ny,
-                    double factor,
+                    double factor, double tolerance,
                     struct driz_error_t* error) {
   int     n;
   int     table_size;
@@ -496,7 +1045,20 @@ default_wcsmap_init(struct wcsmap_param_t* m,
   assert(m->output_wcs == NULL);
   assert(m->table == NULL);
 
-  if (factor > 0) {
+  m->tolerance = 0.0;
+  m->max_error = 0.0;
+  m->nevaluations = 0;
+
+  if (factor > 0 && tolerance > 0) {
+    if (default_wcsmap_init_adaptive(m, input, output, nx, ny,
+                                     factor, tolerance, error)) {
+      goto exit;
+    }
+    m->tolerance = tolerance;
+    factor = m->factor;
+    snx = m->snx;
+    sny = m->sny;
+  } else if (factor > 0) {
     snx = (int)((double)nx / factor) + 2;
     sny = (int)((double)ny / factor) + 2;
 
@@ -574,6 +1136,7 @@ default_wcsmap_init(struct wcsmap_param_t* m,
       driz_error_set_message(error, wcslib_get_error_message(istat));
       goto exit;
     }
+    m->nevaluations = n;
   } /* End if_then for factor > 0 */
 
   m->input_wcs = input;
@@ -611,6 +1174,8 @@ wcsmap_param_dump(struct wcsmap_param_t* m) {
 void
 wcsmap_param_free(struct wcsmap_param_t* m) {
   free(m->table);
+  free(m->cell_n);
+  free(m->cell_offset);
   wcsmap_param_init(m);
 }
 
@@ -622,6 +1187,12 @@ wcsmap_param_init(struct wcsmap_param_t* m) {
   m->input_wcs = NULL;
   m->output_wcs = NULL;
   m->table = NULL;
+  m->tolerance = 0.0;
+  m->cell_n = NULL;
+  m->cell_offset = NULL;
+  m->ncx = m->ncy = 0;
+  m->max_error = 0.0;
+  m->nevaluations = 0;
 }
 
 /*
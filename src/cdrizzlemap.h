@@ -18,8 +18,35 @@ struct wcsmap_param_t {
   int         nx, ny;
   int         snx, sny;
   double      factor;
+
+  /* Adaptive interpolation (tolerance > 0) when the table is not
+     resampled on a regular grid (cell_n is not NULL): the image is
+     covered by ncx x ncy square cells of size factor.  Cell k is
+     divided in cell_n[k] x cell_n[k] steps, the transformed positions
+     of its nodes starting at table + cell_offset[k]. */
+  double      tolerance;
+  int         ncx, ncy;
+  int*        cell_n;
+  size_t*     cell_offset;
+
+  /* Largest interpolation error (in output pixels) found when the
+     table was built, and number of positions transformed with the
+     WCS to build it */
+  double      max_error;
+  integer_t   nevaluations;
 };
 
+/**
+Smallest step of the adaptive interpolation table (in input pixels)
+*/
+#define WCSMAP_MIN_STEP 1.0
+
+/**
+Largest number of nodes of an adaptive interpolation table resampled on
+a regular grid (32 MB)
+*/
+#define WCSMAP_MAX_RESAMPLED (1 << 21)
+
 /**
 Initialize all of the members of the mapping_param_t to sane default
 values, mostly zeroes.  Note, these are not *meaningful* values, just
@@ -43,11 +70,34 @@ default_wcsmap(void* state,
                 /* Output parameters */
                 double* xout, double* yout,
                 struct driz_error_t* error);
+/**
+Initialize the WCS-based mapping.
+
+When \a factor is 0, every position is transformed with the WCS.
+Otherwise, positions are interpolated bilinearly in a table of
+transformed positions:
+
+  - when \a tolerance is 0, the nodes of the table are regularly
+    spaced by \a factor pixels;
+
+  - when \a tolerance is positive, the table is built adaptively: the
+    image is divided in cells of \a factor pixels which are split in
+    halves along each axis (down to a step of \a WCSMAP_MIN_STEP)
+    until the interpolation error at the centers and edge midpoints
+    of all of their steps is at most \a tolerance (in output pixels).
+    Those midpoints are then kept as nodes of the table, so that the
+    largest error found, stored in m->max_error, is an upper bound of
+    the actual error for smooth transformations.  Unless it would have
+    more than \a WCSMAP_MAX_RESAMPLED nodes, the table is then
+    resampled, without changing the interpolated positions, on a
+    regular grid with the smallest step of the cells (stored in
+    m->factor), which is faster to interpolate.
+*/
 int
 default_wcsmap_init(struct wcsmap_param_t* m,
                     pipeline_t* input,
                     pipeline_t* output,
-                    int nx, int ny, double factor,
+                    int nx, int ny, double factor, double tolerance,
                     /* Output parameters */
                     struct driz_error_t* error);
 
@@ -142,6 +192,64 @@ y_distortion_ptr(struct mapping_param_t* m, integer_t i0, integer_t i1) {
 
 /**
 
+Declarations for supporting affine transformations:
+
+  xout = matrix[0] * xin + matrix[1] * yin + matrix[2]
+  yout = matrix[3] * xin + matrix[4] * yin + matrix[5]
+
+When the mapping callback is \a affine_map, \a map_value computes
+regularly spaced rows of positions by incremental stepping instead of
+transforming each position.
+
+When \a mapping_callback is set, the mapping it defines has been found
+to be affine (see \a detect_affine_map): each row is then anchored on
+the positions of its end points given by that mapping, and all other
+positions are transformed with it, so that results only differ from
+those of the mapping itself by rounding errors.
+
+*/
+struct affine_param_t {
+  double matrix[6];
+  mapping_callback_t mapping_callback;
+  void* mapping_callback_state;
+};
+
+int
+affine_map(void* state,
+           const double xd, const double yd,
+           const integer_t n,
+           double* xin /*[n]*/, double* yin /*[n]*/,
+           /* Output parameters */
+           double* xout, double* yout,
+           struct driz_error_t* error);
+
+/**
+Check whether the mapping callback of \a p is an affine transformation
+over the region [xmin, xmax] x [ymin, ymax] of input coordinates.
+
+The callback is evaluated on a grid of AFFINE_NSAMPLE x AFFINE_NSAMPLE
+points. The mapping is considered affine when none of the points
+deviates by more than \a tolerance (in output pixels) from the affine
+transformation fitted through three corners of the region.  When it is,
+the coefficients of that transformation are returned in \a matrix.
+*/
+#define AFFINE_NSAMPLE 17
+
+/* Tolerance (in output pixels) used when the fast path is selected
+   automatically: well below the precision of float32 output. */
+#define AFFINE_TOLERANCE 1.0e-8
+
+int
+detect_affine_map(struct driz_param_t* p,
+                  const double xmin, const double xmax,
+                  const double ymin, const double ymax,
+                  const double tolerance,
+                  /* Output parameters */
+                  double* matrix /*[6]*/, bool_t* is_affine,
+                  struct driz_error_t* error);
+
+/**
+
 This function will be used by both the pixel-based and WCS-based
 mapping functions; namely, DefaultMapping and DefaultWCSMapping.
 
@@ -173,6 +173,14 @@ driz_param_init(struct driz_param_t* p) {
 
   p->lanczos.lut = NULL;
   p->lanczos.space = 1.0;
+  p->gaussian.lut = NULL;
+  p->gaussian.nlut = 0;
+  p->lut_oversampling = 0;
+
+  p->row.coords = NULL;
+  p->row.bounds = NULL;
+  p->row.values = NULL;
+  p->row.overlap = NULL;
 
   for (i = 0; i < MAXEN * MAXIM; ++i)
     p->intab[i] = 0;
@@ -372,6 +380,85 @@ create_lanczos_lut(const int kernel_order, const size_t npix,
   }
 }
 
+/* Look-up-tables shared by all drizzle and blot calls */
+struct lut_cache_t {
+  integer_t oversampling;
+  size_t nlut;
+  void* lut;
+};
+
+/* One lanczos table per kernel order */
+static struct lut_cache_t lanczos_lut_cache[LANCZOS_LUT_MAX_ORDER + 1];
+static struct lut_cache_t gaussian_lut_cache;
+
+const float*
+get_lanczos_lut(const int kernel_order, integer_t oversampling,
+                /* Output parameters */
+                size_t* nlut, struct driz_error_t* error) {
+  struct lut_cache_t* cache;
+  size_t n;
+  float* lut;
+
+  assert(kernel_order >= 1 && kernel_order <= LANCZOS_LUT_MAX_ORDER);
+  assert(nlut);
+
+  if (oversampling <= 0) oversampling = LANCZOS_LUT_OVERSAMPLING;
+
+  cache = &lanczos_lut_cache[kernel_order];
+  if (cache->lut == NULL || cache->oversampling != oversampling) {
+    n = (size_t)(kernel_order * oversampling) + 2;
+    if ((lut = malloc(n * sizeof(float))) == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      return NULL;
+    }
+    create_lanczos_lut(kernel_order, n, 1.0f / (float)oversampling, lut);
+    lut[n - 1] = 0.0;
+
+    free(cache->lut);
+    cache->lut = lut;
+    cache->nlut = n;
+    cache->oversampling = oversampling;
+  }
+
+  *nlut = cache->nlut;
+  return (const float*)cache->lut;
+}
+
+const double*
+get_gaussian_lut(integer_t oversampling,
+                 /* Output parameters */
+                 size_t* nlut, struct driz_error_t* error) {
+  size_t i, n;
+  double u;
+  double* lut;
+
+  assert(nlut);
+
+  if (oversampling <= 0) oversampling = GAUSSIAN_LUT_OVERSAMPLING;
+
+  if (gaussian_lut_cache.lut == NULL ||
+      gaussian_lut_cache.oversampling != oversampling) {
+    n = (size_t)(GAUSSIAN_LUT_MAX * oversampling) + 2;
+    if ((lut = malloc(n * sizeof(double))) == NULL) {
+      driz_error_set_message(error, "Out of memory");
+      return NULL;
+    }
+    for (i = 0; i < n - 1; ++i) {
+      u = (double)i / (double)oversampling;
+      lut[i] = exp(-u * u);
+    }
+    lut[n - 1] = 0.0;
+
+    free(gaussian_lut_cache.lut);
+    gaussian_lut_cache.lut = lut;
+    gaussian_lut_cache.nlut = n;
+    gaussian_lut_cache.oversampling = oversampling;
+  }
+
+  *nlut = gaussian_lut_cache.nlut;
+  return (const double*)gaussian_lut_cache.lut;
+}
+
 void
 put_fill(struct driz_param_t* p, const float fill_value) {
   integer_t i, j;
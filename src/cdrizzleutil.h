@@ -131,7 +131,7 @@ enum e_interp_t {
 /* Lanczos values */
 struct lanczos_param_t {
   size_t nlut;
-  float* lut;
+  const float* lut;
   double sdp;
   integer_t nbox;
   float space;
@@ -223,9 +223,26 @@ struct driz_param_t {
   struct {
     double efac;
     double es;
+    const double* lut;
+    size_t nlut;
+    double sdp;
   } gaussian;
   struct lanczos_param_t lanczos;
 
+  /* Samples per unit of the kernel argument in the look-up-tables of
+     the gaussian and lanczos kernels (0 for the default) */
+  integer_t lut_oversampling;
+
+  /* Work buffers of the row-batched square and turbo kernels, holding
+     one entry per input pixel of a row (or per output pixel of a row
+     for overlap) */
+  struct {
+    double* coords; /* [4][dnx] */
+    integer_t* bounds; /* [4][dnx] */
+    float* values; /* [2][dnx] */
+    double* overlap; /* [nsx] */
+  } row;
+
   /* Scaling */
   enum e_align_t align;
   double scale;
@@ -368,6 +385,51 @@ void
 create_lanczos_lut(const int kernel_order, const size_t npix,
                    const float del, float* lanczos_lut);
 
+/**
+Look-up-tables of the drizzle kernels and blot interpolants.
+
+Tables are sampled at \a oversampling points per unit of the (1D)
+kernel argument, built on first use and cached for the lifetime of the
+process, so that all the chips (and images) drizzled (or blotted) with
+the same kernel share the same table.  Lanczos tables are cached per
+order (1 to \a LANCZOS_LUT_MAX_ORDER).  A value of 0 for \a oversampling selects
+the default for the kernel.
+
+Lanczos: lut[i] = L(i / oversampling) where L(u) = sinc(u) sinc(u / n)
+for u < n and 0 otherwise (see \a create_lanczos_lut).  The last entry
+of the table is 0.  The drizzle kernel uses the nearest sample, shifted
+by one sample as in the original drizzle code, so the error on each
+1D factor of the kernel is at most 1.5 * max|L'| / oversampling, that
+is 2.1 / oversampling (0.021 with the default oversampling of 100).
+The lanczos blot interpolants use the sample just below the argument
+(error at most 1.4 / oversampling).
+
+Gaussian: lut[i] = exp(-u^2) with u = i / oversampling, up to u = 10
+(below float precision), followed by a 0 entry.  The drizzle kernel
+linearly interpolates the table, so the error on each 1D factor of the
+kernel is at most max|g''| / (8 oversampling^2) = 1 / (4 oversampling^2)
+relative to its peak value (2.4e-7 with the default oversampling of
+1024).
+
+@param oversampling the number of samples per unit of the argument
+@param[out] nlut the number of entries in the table
+@return the (shared) table or NULL if memory could not be allocated
+*/
+#define LANCZOS_LUT_OVERSAMPLING 100
+#define LANCZOS_LUT_MAX_ORDER 5
+#define GAUSSIAN_LUT_OVERSAMPLING 1024
+#define GAUSSIAN_LUT_MAX 10.0
+
+const float*
+get_lanczos_lut(const int kernel_order, integer_t oversampling,
+                /* Output parameters */
+                size_t* nlut, struct driz_error_t* error);
+
+const double*
+get_gaussian_lut(integer_t oversampling,
+                 /* Output parameters */
+                 size_t* nlut, struct driz_error_t* error);
+
 void
 put_fill(struct driz_param_t* p, const float fill_value);
 
@@ -51,9 +51,10 @@ class Get_Grid:
         self.insci = np.zeros(self.in_grid, dtype=np.float32)
 
 
-def cdriz_call(_set_kernel_pars, kernel):
+def cdriz_call(_set_kernel_pars, kernel, **kwargs):
     """
-    parameters explained in c code (arrdrizmodule.c)
+    parameters explained in c code (arrdrizmodule.c); keyword arguments
+    (e.g. ``oversampling``) are passed to ``cdriz.tdriz``
 
     _vers, nmiss, nskip = cdriz.tdriz(insci, inwht, outsci, outwht,
         outctx, uniqid, ystart, 1, 1, _dny,
@@ -87,6 +88,7 @@ def cdriz_call(_set_kernel_pars, kernel):
         0,  # nskip
         1,  # vflag; historical value only (not used)
         _set_kernel_pars.mapping,
+        **kwargs,
     )
 
 
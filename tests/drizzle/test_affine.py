@@ -0,0 +1,127 @@
+import numpy as np
+import pytest
+from astropy import wcs
+
+from drizzlepac import cdriz
+
+KERNELS = ["square", "point", "turbo", "tophat", "gaussian", "lanczos2", "lanczos3"]
+INTERPOLATIONS = ["nearest", "linear", "poly3", "poly5", "sinc", "lan3", "lan5"]
+
+
+def get_wcs(shape, pscale=0.04, rot=0.0, crval=(10.0, 10.0)):
+    w = wcs.WCS()
+    w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    w.wcs.crpix = [shape[1] / 2.0 + 0.3, shape[0] / 2.0 - 0.2]
+    w.wcs.crval = list(crval)
+    theta = np.deg2rad(rot)
+    w.wcs.cd = pscale / 3600.0 * np.array(
+        [[-np.cos(theta), np.sin(theta)], [np.sin(theta), np.cos(theta)]]
+    )
+    w.wcs.set()
+    w.pixel_shape = shape[::-1]
+    return w
+
+
+def fit_affine(mapping, shape):
+    """ Affine matrix fitted exactly through three points of a mapping. """
+    x = np.array([1.0, shape[1], 1.0])
+    y = np.array([1.0, 1.0, shape[0]])
+    xo, yo = mapping(x, y)
+    a = np.array([[x[1] - x[0], y[1] - y[0]], [x[2] - x[0], y[2] - y[0]]])
+    mx = np.linalg.solve(a, [xo[1] - xo[0], xo[2] - xo[0]])
+    my = np.linalg.solve(a, [yo[1] - yo[0], yo[2] - yo[0]])
+    return np.array([
+        [mx[0], mx[1], xo[0] - mx[0] * x[0] - mx[1] * y[0]],
+        [my[0], my[1], yo[0] - my[0] * x[0] - my[1] * y[0]],
+    ])
+
+
+def wcs_mapping(wcs_in, wcs_out):
+    def mapping(x, y):
+        ra, dec = wcs_in.all_pix2world(x, y, 1)
+        return wcs_out.wcs_world2pix(ra, dec, 1)
+    return mapping
+
+
+def drizzle(kernel, mapping, pixfrac=1.0, **kwargs):
+    in_shape, out_shape = (40, 50), (60, 55)
+    rng = np.random.default_rng(1)
+    insci = rng.normal(10.0, 1.0, in_shape).astype(np.float32)
+    insci[20, 21] = 1e4
+    inwht = np.ones(in_shape, dtype=np.float32)
+    outsci = np.zeros(out_shape, dtype=np.float32)
+    outwht = np.zeros(out_shape, dtype=np.float32)
+    outctx = np.zeros(out_shape, dtype=np.int32)
+
+    _vers, nmiss, nskip = cdriz.tdriz(
+        insci, inwht, outsci, outwht, outctx,
+        1, 0, 1, 1, in_shape[0], 1.2, 1.0, 1.0, "center", pixfrac,
+        kernel, "cps", 1.0, 1.0, "INDEF", 0, 0, 1, mapping, **kwargs
+    )
+    return outsci, outwht, outctx, nmiss, nskip
+
+
+@pytest.fixture
+def affine_wcs():
+    # Same tangent point: the pixel-to-pixel transformation is affine
+    return get_wcs((40, 50)), get_wcs((60, 55), pscale=0.048, rot=17.0)
+
+
+@pytest.mark.parametrize("kernel", KERNELS)
+def test_affine_drizzle_matches_generic(kernel, affine_wcs):
+    wcs_in, wcs_out = affine_wcs
+    mapping = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 50, 40, 1)
+    pixfrac = 0.8
+
+    generic = drizzle(kernel, mapping, pixfrac, affine=False)
+    detected = drizzle(kernel, mapping, pixfrac)
+    matrix = fit_affine(wcs_mapping(wcs_in, wcs_out), (40, 50))
+    explicit = drizzle(kernel, None, pixfrac, affine=matrix)
+
+    assert generic[0].sum() > 0
+    for result in [detected, explicit]:
+        np.testing.assert_allclose(result[0], generic[0], rtol=1e-5, atol=1e-4)
+        np.testing.assert_allclose(result[1], generic[1], rtol=1e-5, atol=1e-5)
+        np.testing.assert_array_equal(result[2], generic[2])
+        assert result[3:] == generic[3:]
+
+
+@pytest.mark.parametrize("interp", INTERPOLATIONS)
+def test_affine_blot_matches_generic(interp, affine_wcs):
+    wcs_out, wcs_in = affine_wcs
+    rng = np.random.default_rng(2)
+    source = rng.normal(10.0, 1.0, (60, 55)).astype(np.float32)
+    mapping = wcs_mapping(wcs_out, wcs_in)
+
+    def blot(**kwargs):
+        out = np.zeros((40, 50), dtype=np.float32)
+        cdriz.tblot(source, out, 1, 55, 1, 60, 1.2, 1.0, 1.0, 1.0, "center",
+                    interp, 1.0, 0.0, 1.0, 1, mapping, **kwargs)
+        return out
+
+    generic = blot(affine=False)
+    np.testing.assert_allclose(blot(), generic, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(
+        blot(affine=fit_affine(mapping, (40, 50))), generic, rtol=1e-5, atol=1e-5
+    )
+
+
+def test_non_affine_mapping_not_detected():
+    # Different tangent points: use the explicit matrix fitted to the mapping
+    # to check that automatic detection does not replace the mapping.
+    wcs_in = get_wcs((40, 50), pscale=50.0)
+    wcs_out = get_wcs((60, 55), pscale=50.0, rot=10.0, crval=(10.2, 9.8))
+    mapping = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 50, 40, 1)
+    matrix = fit_affine(wcs_mapping(wcs_in, wcs_out), (40, 50))
+
+    generic = drizzle("turbo", mapping, affine=False)[0]
+    assert np.array_equal(drizzle("turbo", mapping)[0], generic)
+    assert not np.allclose(drizzle("turbo", None, affine=matrix)[0], generic,
+                           rtol=1e-5, atol=1e-4)
+
+
+def test_invalid_affine_matrix():
+    with pytest.raises(Exception, match="affine matrix"):
+        drizzle("square", None, affine=np.eye(2))
+    with pytest.raises(Exception, match="affine matrix"):
+        drizzle("square", None)
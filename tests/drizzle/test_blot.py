@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from drizzlepac import cdriz
+
+SHAPE = (60, 70)
+
+
+def smooth_image(shape=SHAPE):
+    y, x = np.indices(shape, dtype=np.float64)
+    return 3.0 + np.sin(x / 6.0) + np.cos(y / 7.0)
+
+
+def blot(source, interp, dx=0.3, dy=-0.2, kscale=1.0):
+    ny, nx = source.shape
+
+    def mapping(x, y):
+        return x + dx, y + dy
+
+    out = np.zeros_like(source, dtype=np.float32)
+    cdriz.tblot(source.astype(np.float32), out, 1, nx, 1, ny, 1.0, kscale,
+                1.0, 1.0, "center", interp, 1.0, -99.0, 1.0, 1, mapping)
+    return out
+
+
+@pytest.mark.parametrize("interp,atol", [("poly5", 1e-5), ("sinc", 1e-3)])
+def test_blot_interpolation_accuracy(interp, atol):
+    source = smooth_image()
+    y, x = np.indices(SHAPE, dtype=np.float64)
+    expected = 3.0 + np.sin((x + 0.3) / 6.0) + np.cos((y - 0.2) / 7.0)
+
+    out = blot(source, interp)
+
+    inner = (slice(8, -8), slice(8, -8))
+    np.testing.assert_allclose(out[inner], expected[inner], rtol=0, atol=atol)
+    # results do not depend on the memory left by previous calls
+    np.testing.assert_array_equal(blot(source, interp), out)
+
+
+@pytest.mark.parametrize("interp", ["poly5", "sinc"])
+def test_blot_constant_image_edges(interp):
+    source = np.full(SHAPE, 5.0)
+
+    out = blot(source, interp, dy=0.2)
+
+    np.testing.assert_allclose(out, 5.0, rtol=1e-6)
+
+
+@pytest.mark.parametrize("interp", ["poly5", "sinc"])
+def test_blot_integer_offsets(interp):
+    source = smooth_image()
+
+    out = blot(source, interp, dx=2.0, dy=1.0)
+
+    np.testing.assert_allclose(out[:-1, :-2], source[1:, 2:], rtol=1e-6)
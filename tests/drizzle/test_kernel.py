@@ -149,3 +149,33 @@ def test_zero_input_weight(kernel, kernel_pars):
 
     # check that original bad pixel flux still coming through:
     assert np.sum(kernel_pars.outsci) > 1e8
+
+
+@pytest.mark.parametrize("kernel", ["gaussian", "lanczos2", "lanczos3"])
+def test_kernel_lut_oversampling(kernel, kernel_pars):
+    """Tests that finer kernel look-up-tables converge and that tables with
+    different oversampling factors do not interfere with each other."""
+
+    kernel_pars.insci[20, 21] = 1000
+    kernel_pars.insci[31, 12] = 500
+
+    results = {}
+    for oversampling in [0, 20, 4096, 0]:
+        kernel_pars.outsci[...] = 0
+        kernel_pars.outwht[...] = 0
+        kernel_pars.outctx[...] = 0
+        cdriz_setup.cdriz_call(kernel_pars, kernel, oversampling=oversampling)
+        results.setdefault(oversampling, []).append(kernel_pars.outsci.copy())
+
+    # the default tables are rebuilt identically
+    assert np.array_equal(*results[0])
+
+    # error bounds of the weights: 2.1 / oversampling (lanczos) and
+    # 1 / (4 oversampling^2) (gaussian, relative to the peak weight)
+    if kernel == "gaussian":
+        bound = 1.0 / 4 / 1024**2
+    else:
+        bound = 2.1 / 100
+    assert np.allclose(results[0][0], results[4096][0], rtol=0, atol=1000 * bound)
+    assert not np.array_equal(results[20][0], results[4096][0])
+    assert np.allclose(results[0][0].sum(), 1500, rtol=1e-2)
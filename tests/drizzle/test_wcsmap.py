@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from astropy import wcs
+
+from drizzlepac import cdriz, wcs_functions
+
+
+def get_wcs(shape, sip=True):
+    w = wcs.WCS(naxis=2)
+    if sip:
+        w.wcs.ctype = ["RA---TAN-SIP", "DEC--TAN-SIP"]
+    else:
+        w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    w.wcs.crpix = [shape[1] / 2.0, shape[0] / 2.0]
+    w.wcs.crval = [10.0, 10.0]
+    w.wcs.cd = 0.05 / 3600.0 * np.array([[-1.0, 0.1], [0.1, 1.0]])
+    if sip:
+        a = np.zeros((4, 4))
+        b = np.zeros((4, 4))
+        a[2, 0] = 2e-6
+        a[1, 1] = 1e-6
+        a[3, 0] = 3e-9
+        b[0, 2] = 2e-6
+        b[0, 3] = 2e-9
+        w.sip = wcs.Sip(a, b, None, None, w.wcs.crpix)
+    w.wcs.set()
+    w.pixel_shape = shape[::-1]
+    return w
+
+
+@pytest.fixture
+def distorted_wcs():
+    return get_wcs((512, 1024)), get_wcs((600, 1100), sip=False)
+
+
+@pytest.mark.parametrize("tolerance", [0.01, 0.001])
+def test_adaptive_wcsmap_error(tolerance, distorted_wcs):
+    wcs_in, wcs_out = distorted_wcs
+    direct = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 0.0)
+    fixed = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 4.0)
+    adaptive = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 64.0,
+                                       tolerance=tolerance)
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0.5, 1024.5, 20000)
+    y = rng.uniform(0.5, 512.5, 20000)
+    xt, yt = direct(x, y)
+    xa, ya = adaptive(x, y)
+
+    assert 0 < adaptive.max_error <= tolerance
+    assert np.hypot(xa - xt, ya - yt).max() <= adaptive.max_error
+    assert adaptive.nevaluations < fixed.nevaluations
+
+
+def test_adaptive_wcsmap_refines_locally(distorted_wcs):
+    wcs_in, wcs_out = distorted_wcs
+    # no distortion: the coarsest cells (17 x 9 cells of 64 pixels covering
+    # the image) only need their corners and one refinement test
+    linear = cdriz.DefaultWCSMapping(get_wcs((512, 1024), sip=False), wcs_out,
+                                     1024, 512, 64.0, tolerance=1e-4)
+    distorted = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 64.0,
+                                        tolerance=1e-4)
+    assert linear.nevaluations == 18 * 10 + 17 * 9 * 5
+    assert distorted.nevaluations > linear.nevaluations
+
+
+def test_adaptive_wcsmap_resampled(distorted_wcs):
+    # without distortion, all the cells are refined once: the resampled
+    # table is the regular table with half the step of the cells
+    wcs_in = get_wcs((512, 1024), sip=False)
+    wcs_out = distorted_wcs[1]
+    adaptive = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 64.0,
+                                       tolerance=1e-4)
+    fixed = cdriz.DefaultWCSMapping(wcs_in, wcs_out, 1024, 512, 32.0)
+
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0.5, 1024.5, 20000)
+    y = rng.uniform(0.5, 512.5, 20000)
+    xa, ya = adaptive(x, y)
+    xf, yf = fixed(x, y)
+    np.testing.assert_allclose(xa, xf, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(ya, yf, rtol=0, atol=1e-9)
+
+
+def test_default_wcs_mapping_stepsize(distorted_wcs):
+    wcs_in, wcs_out = distorted_wcs
+    mapping = wcs_functions.default_wcs_mapping(wcs_in, wcs_out, 'auto')
+    assert 0 < mapping.max_error <= wcs_functions.DEFAULT_WCS_TOLERANCE
+
+    mapping = wcs_functions.default_wcs_mapping(wcs_in, wcs_out, '10')
+    assert mapping.max_error == 0
+
+    with pytest.raises(ValueError):
+        wcs_functions.default_wcs_mapping(wcs_in, wcs_out, 'auto', tolerance=0)
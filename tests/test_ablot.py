@@ -0,0 +1,72 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+from astropy.io import fits
+
+from drizzlepac import ablot, util
+
+
+class FakeImage:
+    scienceExt = 'SCI'
+    inmemory = False
+
+    def __init__(self, name, median, nchips=2):
+        self._filename = name
+        self.outputNames = {'outMedian': median}
+        self.chips = [SimpleNamespace(_chip=k + 1, image_shape=(10, 10))
+                      for k in range(nchips)]
+
+    def returnAllChips(self, extname=None):
+        return self.chips
+
+    def getOutputName(self, name):
+        return self.outputNames[name]
+
+
+def _write_median(path):
+    data = np.arange(30, dtype='>f4').reshape(5, 6)
+    fits.PrimaryHDU(data).writeto(path)
+    return data
+
+
+def test_read_median_shared(tmp_path):
+    median = str(tmp_path / 'med.fits')
+    data = _write_median(median)
+
+    for shared in [False, True]:
+        arr = ablot._read_median(FakeImage('a.fits', median), shared=shared)
+        assert arr.dtype == np.dtype(np.float32)
+        assert arr.dtype.isnative
+        assert not arr.flags.writeable
+        np.testing.assert_array_equal(arr, data)
+
+
+def test_run_blot_parallel(tmp_path, monkeypatch):
+    median = str(tmp_path / 'med.fits')
+    data = _write_median(median)
+    images = [FakeImage(name, median) for name in ['a.fits', 'b.fits']]
+
+    nreads = []
+    read_median = ablot._read_median
+
+    def _counted_read_median(img, shared=False):
+        nreads.append(shared)
+        return read_median(img, shared=shared)
+
+    def _blot_chip(img, chip, median, output_wcs, paramDict, versions, wcsmap):
+        np.save(tmp_path / f'{img._filename}_{chip._chip}.npy',
+                [median.sum(), os.getpid()])
+
+    monkeypatch.setattr(util, 'get_pool_size', lambda n, ntasks: ntasks)
+    monkeypatch.setattr(ablot, '_read_median', _counted_read_median)
+    monkeypatch.setattr(ablot, '_blot_chip', _blot_chip)
+    ablot.run_blot(images, None, {'num_cores': 4, 'max_memory': None})
+
+    # The median shared by all images is read only once, in shared memory:
+    assert nreads == [True]
+    for img in images:
+        for chip in img.chips:
+            total, pid = np.load(tmp_path / f'{img._filename}_{chip._chip}.npy')
+            assert total == data.sum()
+            assert pid != os.getpid()
@@ -0,0 +1,172 @@
+import os
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from stwcs.wcsutil import HSTWCS
+
+from drizzlepac import adrizzle
+from drizzlepac.imageObject import baseImageObject
+
+SHAPE = (1024, 1024)
+NBYTES = 4 * SHAPE[0] * SHAPE[1]  # size of a float32 chip
+
+
+def _peak_allocated(func, *args, **kwargs):
+    """ Peak number of bytes allocated while calling ``func``. """
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = func(*args, **kwargs)
+        peak = tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(0)
+    img = baseImageObject.__new__(baseImageObject)
+    img.scienceExt = 'SCI'
+    img.errExt = 'ERR'
+    img.outputNames = {'ivmFile': None}
+    img._image = {('SCI', 1): SimpleNamespace(_exptime=500.0, _wtscl=1.0)}
+
+    img.err = rng.uniform(1.0, 2.0, SHAPE).astype('>f4')
+    img.flat = rng.uniform(0.9, 1.1, SHAPE).astype(np.float32)
+    img.getData = lambda exten: img.err
+    img.getflat = lambda chip: img.flat
+    img.getReadNoiseImage = lambda chip: np.full(SHAPE, 4.0, np.float32)
+    img.getdarkimg = lambda chip: np.full(SHAPE, 0.5, np.float32)
+    img.getskyimg = lambda chip: np.full(SHAPE, 30.0, np.float32)
+    return img
+
+
+@pytest.fixture
+def dqarr():
+    dqarr = np.ones(SHAPE, dtype=np.uint8)
+    dqarr[10:20, 30:40] = 0
+    return dqarr
+
+
+def test_weight_masks_written_to_buffer(image, dqarr):
+    expected = {
+        'EXP': (500.0 * dqarr).astype(np.float32),
+        'ERR': ((500.0 / image.err)**2 * dqarr).astype(np.float32),
+        'IVM': (image.flat**2 / (0.5 + 30.0 * image.flat + 16.0) *
+                dqarr).astype(np.float32),
+    }
+    buffers = adrizzle.InputBuffers()
+    out = buffers.get('wht', SHAPE)
+
+    def build_exp():
+        return image.buildEXPmask(1, dqarr, out=out)
+
+    def build_err():
+        return image.buildERRmask(1, dqarr, 1.0, out=out)
+
+    def build_ivm():
+        return image.buildIVMmask(1, dqarr, 1.0, out=out)
+
+    # the flat, dark, sky and read-noise images (4 arrays) used by the IVM
+    # mask are allocated by the image object itself
+    for wht_type, build, max_arrays in [('EXP', build_exp, 0),
+                                        ('ERR', build_err, 1),
+                                        ('IVM', build_ivm, 6)]:
+        wht, peak = _peak_allocated(build)
+        assert wht is out
+        assert buffers.get('wht', SHAPE) is out
+        np.testing.assert_allclose(wht, expected[wht_type], rtol=1e-6)
+        # Number of chip-sized temporary arrays
+        assert peak < (max_arrays + 0.5) * NBYTES
+
+    # A new array is returned when no buffer is provided:
+    wht = image.buildERRmask(1, dqarr, 1.0)
+    assert wht is not out and wht.dtype == np.float32
+    np.testing.assert_allclose(wht, expected['ERR'], rtol=1e-6)
+
+
+def test_as_native_float32():
+    native = np.ones(SHAPE, dtype=np.float32)
+    assert adrizzle._as_native_float32(native) is native
+
+    swapped = native.astype('>f4')
+    converted, peak = _peak_allocated(adrizzle._as_native_float32, swapped)
+    assert converted.dtype.isnative
+    np.testing.assert_array_equal(converted, native)
+    assert peak < 1.5 * NBYTES
+
+
+def test_merge_dq_array_in_place(dqarr):
+    mask = SimpleNamespace(data=np.ones(SHAPE, dtype=np.uint8))
+    mask.data[100:110, 100:110] = 0
+    merged = dqarr.copy()
+
+    _, peak = _peak_allocated(adrizzle.mergeDQarray, mask, merged)
+    assert peak < 0.5 * NBYTES
+    assert merged.dtype == np.uint8
+    np.testing.assert_array_equal(merged, dqarr & mask.data)
+
+
+def _hstwcs(shape, crpix, rot=0.0, pscale=0.05):
+    theta = np.deg2rad(rot)
+    cd = pscale / 3600.0 * np.array([[-np.cos(theta), np.sin(theta)],
+                                     [np.sin(theta), np.cos(theta)]])
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'], header['NAXIS2'] = shape[1], shape[0]
+    header['CTYPE1'], header['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+    header['CRPIX1'], header['CRPIX2'] = crpix
+    header['CRVAL1'], header['CRVAL2'] = 10.0, 10.0
+    header['CD1_1'], header['CD1_2'] = cd[0]
+    header['CD2_1'], header['CD2_2'] = cd[1]
+    hdu = fits.ImageHDU(np.zeros(shape, dtype=np.float32), header=header)
+    return HSTWCS(fits.HDUList([fits.PrimaryHDU(), hdu]), ext=1)
+
+
+def test_incremental_drizzle_matches_single_pass(tmp_path):
+    rng = np.random.default_rng(1)
+    output_wcs = _hstwcs((70, 80), (40.0, 35.0), pscale=0.06)
+    inputs = []
+    for k in range(3):
+        wcs = _hstwcs((40, 50), (25.0 + 3.3 * k, 20.0 - 2.1 * k), rot=5.0 * k)
+        sci = rng.normal(10.0, 1.0, (40, 50)).astype(np.float32)
+        inputs.append((sci, wcs, np.ones((40, 50), dtype=np.float32)))
+
+    def add(driz, images):
+        for sci, wcs, wht in images:
+            driz.add(sci, wcs, wht, wcslin_pscale=wcs.pscale)
+
+    full = adrizzle.IncrementalDrizzle(output_wcs, kernel='square',
+                                       pixfrac=0.8, fillval=-1)
+    add(full, inputs)
+
+    product = str(tmp_path / 'cell_drz.fits')
+    partial = adrizzle.IncrementalDrizzle(output_wcs, kernel='square',
+                                          pixfrac=0.8, fillval=-1)
+    add(partial, inputs[:2])
+    partial.save(product)
+    assert os.path.isfile(str(tmp_path / 'cell_drz_drzstate.json'))
+    with fits.open(product) as hdulist:
+        assert np.all(hdulist['SCI'].data[hdulist['WHT'].data == 0] == -1)
+
+    resumed = adrizzle.IncrementalDrizzle.load(product)
+    assert resumed.nimages == 2
+    assert resumed.kernel == 'square' and resumed.pixfrac == 0.8
+    add(resumed, inputs[2:])
+
+    assert np.any(full.outwht == 0)
+    np.testing.assert_array_equal(resumed.outsci, full.outsci)
+    np.testing.assert_array_equal(resumed.outwht, full.outwht)
+    np.testing.assert_array_equal(resumed.outctx, full.outctx)
+    assert np.all(full.outctx[0][full.outwht > 0] > 0)
+
+
+def test_incremental_drizzle_requires_state(tmp_path):
+    product = str(tmp_path / 'other_drz.fits')
+    fits.PrimaryHDU().writeto(product)
+    with pytest.raises(ValueError, match='incremental drizzle state'):
+        adrizzle.IncrementalDrizzle.load(product)
@@ -0,0 +1,79 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from drizzlepac import align
+
+
+class _FakeAlignmentTable:
+    """ Minimal stand-in for ``align_utils.AlignmentTable``. """
+    def __init__(self, delays=None):
+        self.reference_catalogs = {'GAIAedr3': [0] * 10, 'GAIADR2': [0] * 5}
+        self.delays = delays or {}
+        self.fit_dict = {}
+        self.imglist = []
+
+    def configure_fit(self):
+        self.imglist = [SimpleNamespace(wcs=None, meta={'group_id': k})
+                        for k in range(2)]
+
+    def reset_group_id(self, num_ref):
+        for image in self.imglist:
+            image.meta['num_ref_catalog'] = num_ref
+
+    def perform_fit(self, method_name, catalog_name, reference_catalog):
+        time.sleep(self.delays.get((catalog_name, method_name), 0))
+        if method_name == 'broken':
+            raise ValueError('fit failed')
+        for image in self.imglist:
+            image.meta['fit method'] = method_name
+            image.meta['catalog'] = catalog_name
+        self.fit_dict[(catalog_name, method_name)] = [
+            SimpleNamespace(meta=dict(image.meta)) for image in self.imglist
+        ]
+        return self.imglist
+
+
+GRID = [(catalog, method) for method in ['relative', 'broken', 'default']
+        for catalog in ['GAIAedr3', 'GAIADR2']]
+
+
+@pytest.mark.parametrize('num_cores', [1, 3])
+def test_fit_grid(num_cores):
+    table = _FakeAlignmentTable()
+    fit_grid = align._FitGrid(table, GRID, num_cores=num_cores)
+    # request the fits out of order:
+    for catalog, method in GRID[::-1]:
+        if method == 'broken':
+            with pytest.raises(ValueError, match='fit failed'):
+                fit_grid.result(catalog, method)
+            continue
+        imglist = fit_grid.result(catalog, method)
+        assert [im.meta['fit method'] for im in imglist] == [method] * 2
+        assert imglist[0].meta['num_ref_catalog'] == \
+            len(table.reference_catalogs[catalog])
+        fit = table.fit_dict[(catalog, method)]
+        assert fit[1].meta == imglist[1].meta
+    fit_grid.finish()
+    assert sorted(table.fit_dict) == sorted(c for c in GRID
+                                            if c[1] != 'broken')
+
+
+def test_fit_grid_cancel():
+    table = _FakeAlignmentTable(delays={('GAIADR2', 'default'): 60})
+    fit_grid = align._FitGrid(table, GRID, num_cores=len(GRID))
+    fit_grid.result('GAIAedr3', 'relative')
+    start = time.time()
+    fit_grid.finish(cancel=True)
+    assert time.time() - start < 30
+    assert list(table.fit_dict) == [('GAIAedr3', 'relative')]
+
+
+def test_fit_grid_complete():
+    table = _FakeAlignmentTable()
+    fit_grid = align._FitGrid(table, GRID, num_cores=2)
+    fit_grid.result('GAIAedr3', 'relative')
+    fit_grid.finish(cancel=False)
+    assert sorted(table.fit_dict) == sorted(c for c in GRID
+                                            if c[1] != 'broken')
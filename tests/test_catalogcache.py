@@ -0,0 +1,91 @@
+import numpy as np
+from astropy import units as u
+from astropy.table import QTable, Table
+
+from drizzlepac import catalogcache
+
+
+def test_catalog_key():
+    data = np.arange(12, dtype=np.float32).reshape(3, 4)
+    key = catalogcache.catalog_key(('SCI', 1), {'threshold': 4.0}, data, None)
+    assert key == catalogcache.catalog_key(('SCI', 1), {'threshold': 4.0},
+                                           data.copy(), None)
+    for args in [(('SCI', 2), {'threshold': 4.0}, data, None),
+                 (('SCI', 1), {'threshold': 5.0}, data, None),
+                 (('SCI', 1), {'threshold': 4.0}, data.astype(float), None),
+                 (('SCI', 1), {'threshold': 4.0}, data, data > 3)]:
+        assert catalogcache.catalog_key(*args) != key
+
+
+def test_cached_tables(tmp_path):
+    cache = catalogcache.CatalogCache(str(tmp_path / 'cache'))
+    assert cache.load('missing') is None
+
+    table = Table({'xcentroid': [1.5, 2.5], 'cat_id': [1, 2]})
+    table['flux'] = [10.0, 20.0]
+    table['flux'].unit = 'electron'
+    table['sky_centroid'] = np.array([None, None], dtype=object)
+    qtable = QTable({'xcentroid': [1.5, 2.5] * u.pix})
+
+    for key, tbl in [('table', table), ('qtable', qtable), ('none', None)]:
+        cache.save(key, **catalogcache.table_to_arrays(tbl))
+
+    restored = catalogcache.arrays_to_table(cache.load('table'))
+    assert restored.colnames == ['xcentroid', 'cat_id', 'flux']
+    assert restored['flux'].unit == u.electron
+    for name in restored.colnames:
+        np.testing.assert_array_equal(restored[name], table[name])
+
+    restored = catalogcache.arrays_to_table(cache.load('qtable'))
+    assert isinstance(restored, QTable)
+    assert np.all(restored['xcentroid'] == qtable['xcentroid'])
+
+    assert catalogcache.arrays_to_table(cache.load('none')) is None
+
+
+def test_unreadable_cache_entry(tmp_path):
+    cache = catalogcache.CatalogCache(str(tmp_path))
+    with open(cache.filename('bad'), 'w') as f:
+        f.write('not a catalog')
+    assert cache.load('bad') is None
+
+
+def test_hapimage_cache_writes_catalog(tmp_path, monkeypatch):
+    from astropy.io import fits
+    from drizzlepac.haputils import align_utils
+
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def extract_sources(sciarr, outroot=None, **kwargs):
+        calls.append(outroot)
+        return Table({'xcentroid': [1.5], 'ycentroid': [2.5],
+                      'flux': [10.0]}), None, None
+
+    monkeypatch.setattr(align_utils.amutils, 'extract_sources',
+                        extract_sources)
+
+    image = object.__new__(align_utils.HAPImage)
+    image.rootname = 'img'
+    image.num_sci = 1
+    image.kernel = np.ones((3, 3))
+    image.kernel_fwhm = 2.0
+    image.threshold = {1: np.ones((4, 4))}
+    image.build_dqmask = lambda chip: None
+    pars = {'centering_mode': 'starfind', 'MAX_SOURCES_PER_CHIP': 10,
+            'deblend': False}
+
+    for k in range(2):
+        image.imghdu = fits.HDUList([
+            fits.PrimaryHDU(),
+            fits.ImageHDU(np.zeros((4, 4), np.float32), name='SCI')
+        ])
+        image.catalog_table = {}
+        image.find_alignment_sources(output=(k == 1), catalog_cache='cache',
+                                     **pars)
+        assert image.catalog_table[1]['flux'][0] == 10.0
+
+    # the second call used the cached catalog and still wrote it out:
+    assert calls == [None]
+    written = Table.read('img_sci1_src.cat', format='ascii.commented_header')
+    np.testing.assert_array_equal(written['xcentroid'], [1.5])
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from drizzlepac import findobj
+
+FWHM = 2.5
+SKY = 100.0
+
+
+def _star_field(shape=(200, 220), nstars=60, seed=0):
+    rng = np.random.default_rng(seed)
+    img = rng.normal(SKY, 3.0, shape)
+    yy, xx = np.mgrid[0:shape[0], 0:shape[1]]
+    xy = np.column_stack([rng.uniform(12, shape[1] - 12, nstars),
+                          rng.uniform(12, shape[0] - 12, nstars)])
+    for x, y in xy:
+        img += rng.uniform(200, 2000) * np.exp(
+            -((xx - x)**2 + (yy - y)**2) / (2 * (FWHM / findobj.FWHM2SIG)**2)
+        )
+    return img.astype(np.float32), xy
+
+
+@pytest.fixture
+def cutouts():
+    img, xy = _star_field()
+    nx, ny, a, b, c, f = findobj.gausspars(FWHM)
+    y0 = np.round(xy[:, 1]).astype(int) - ny // 2
+    x0 = np.round(xy[:, 0]).astype(int) - nx // 2
+    data = np.array([img[j:j + ny, i:i + nx] for j, i in zip(y0, x0)])
+    # include a cutout of pure noise, which is rejected by xy_round:
+    data[0] = np.random.default_rng(1).normal(SKY, 3.0, (ny, nx))
+    yin, xin = np.mgrid[0:ny, 0:nx]
+    kernel = findobj.gaussian1(1.0, nx // 2, ny // 2, a, b, c)(xin, yin)
+    return data, kernel
+
+
+def test_batch_xy_round(cutouts):
+    data, kernel = cutouts
+    ny, nx = kernel.shape
+    sigsq = (FWHM / findobj.FWHM2SIG)**2
+    datamin = data.min(axis=(1, 2))
+    datamax = data.max(axis=(1, 2))
+
+    x, y, rnd = findobj.batch_xy_round(data, nx // 2, ny // 2, SKY, kernel,
+                                       sigsq, sigsq, datamin, datamax)
+    nvalid = 0
+    for k in range(data.shape[0]):
+        expected = findobj.xy_round(data[k], nx // 2, ny // 2, SKY, kernel,
+                                    sigsq, sigsq, datamin[k], datamax[k])
+        if expected[0] is None:
+            assert np.isnan(x[k]) and np.isnan(y[k]) and np.isnan(rnd[k])
+        else:
+            np.testing.assert_allclose((x[k], y[k], rnd[k]), expected,
+                                       rtol=1e-9, atol=1e-7)
+            nvalid += 1
+    assert 0 < nvalid < data.shape[0]
+
+
+def test_batch_sharp_round(cutouts):
+    data, kernel = cutouts
+    ny, nx = kernel.shape
+    xc, yc = nx // 2, ny // 2
+    s2m, s4m = findobj.precompute_sharp_round(nx, ny, xc, yc)
+    kskip = (kernel > 0.05).astype(np.int16)
+    density = data - SKY
+    datamin = data.min(axis=(1, 2))
+    datamax = data.max(axis=(1, 2))
+    # saturated center:
+    datamax[1] = data[1, yc, xc] - 1
+
+    satur, rnd, sharp = findobj.batch_sharp_round(
+        data, density, kskip, xc, yc, s2m, s4m, datamin, datamax
+    )
+    for k in range(data.shape[0]):
+        expected = findobj.sharp_round(data[k], density[k], kskip, xc, yc,
+                                       s2m, s4m, nx, ny,
+                                       datamin[k], datamax[k])
+        assert satur[k] == expected[0]
+        for value, ref in zip([rnd[k], sharp[k]], expected[1:]):
+            if ref is None:
+                assert np.isnan(value)
+            else:
+                np.testing.assert_allclose(value, ref, rtol=1e-6)
+    assert satur[1] and np.isnan(sharp[1])
+
+
+def test_batch_centroid():
+    rng = np.random.default_rng(2)
+    img = rng.uniform(0, 10, (50, 60)).astype(np.float32)
+    corners = np.array([[0, 0], [5, 7], [20, 31], [40, 2], [10, 10]])
+    shapes = np.array([[5, 6], [9, 9], [5, 6], [10, 58], [9, 9]])
+
+    xcen, ycen = findobj.batch_centroid(img, corners, shapes)
+    for k, ((y0, x0), (ny, nx)) in enumerate(zip(corners, shapes)):
+        expected = findobj.centroid(img[y0:y0 + ny, x0:x0 + nx])
+        np.testing.assert_allclose((xcen[k], ycen[k]), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('use_sharp_round', [False, True])
+def test_findstars(use_sharp_round):
+    img, xy = _star_field()
+    sources, fluxes = findobj.findstars(img, FWHM, 20.0, SKY,
+                                        use_sharp_round=use_sharp_round)
+    assert len(sources) == len(fluxes) > 0.8 * xy.shape[0]
+
+    dist = []
+    for x, y, sharp, round1, round2 in sources:
+        dist.append(np.hypot(xy[:, 0] - x, xy[:, 1] - y).min())
+        if use_sharp_round:
+            assert 0.2 <= sharp <= 1.0 and -1 <= round1 <= 1
+            assert -1 <= round2 <= 1
+        else:
+            assert np.isnan(sharp) and np.isnan(round1)
+    # blended stars aside, sources are found at the injected positions:
+    assert np.median(dist) < 0.1
@@ -1,6 +1,13 @@
 #!/usr/bin/env python
 
+import os
+from types import SimpleNamespace
+
+import numpy as np
 import pytest
+from astropy.io import fits
+from stsci.tools import fileutil
+
 from drizzlepac import imageObject
 
 #from http://blog.moertel.com/articles/2008/03/19/property-checking-with-pythons-nose-testing-framework
@@ -32,3 +39,70 @@ class TestimageObject():
         assert(image._naxis1 > 0)
         assert(image._naxis2 > 0)
         assert(image._instrument != '')
+
+
+def _flat_image(flat_file, shape=(20, 30)):
+    img = imageObject.baseImageObject.__new__(imageObject.baseImageObject)
+    img._filename = flat_file
+    img.scienceExt = 'SCI'
+    img.flatkey = 'PFLTFILE'
+    img._image = {
+        'PRIMARY': SimpleNamespace(header={'PFLTFILE': flat_file}),
+        ('SCI', 1): SimpleNamespace(image_shape=shape, ltv1=0, ltv2=0),
+        ('SCI', 2): SimpleNamespace(image_shape=shape, ltv1=0, ltv2=0),
+    }
+    return img
+
+
+def test_getflat_reads_file_once(tmp_path, monkeypatch):
+    flat_file = str(tmp_path / 'flat.fits')
+    hdus = [fits.PrimaryHDU()]
+    for chip in [1, 2]:
+        hdus.append(fits.ImageHDU(np.full((20, 30), chip, dtype='>f4'),
+                                  name='SCI', ver=chip))
+    fits.HDUList(hdus).writeto(flat_file)
+
+    nopen = []
+    open_image = fileutil.openImage
+
+    def _counted_open_image(*args, **kwargs):
+        nopen.append(args[0])
+        return open_image(*args, **kwargs)
+
+    monkeypatch.setattr(fileutil, 'openImage', _counted_open_image)
+    imageObject._flat_cache.clear()
+
+    # Two images sharing the same flat field file:
+    for img in [_flat_image(flat_file), _flat_image(flat_file)]:
+        for chip in [1, 2]:
+            flat = img.getflat(chip)
+            assert np.all(flat == chip)
+            assert not flat.flags.writeable
+    assert nopen == [flat_file]
+
+    # Updated reference files are read again:
+    fits.setval(flat_file, 'DUMMY', value=1)
+    os.utime(flat_file, ns=(0, 0))
+    _flat_image(flat_file).getflat(1)
+    assert len(nopen) == 2
+
+
+def test_array_cache_size_limit():
+    cache = imageObject._ArrayCache(250)
+    ncalls = []
+
+    def compute(value):
+        ncalls.append(value)
+        return np.full(10, value, dtype=np.float64)  # 80 bytes
+
+    for value in [1, 2, 3, 1, 4, 2]:
+        assert np.all(cache.get(value, lambda: compute(value)) == value)
+    # 3 arrays fit in the cache: 1 is reused but 2 was evicted by 4
+    assert ncalls == [1, 2, 3, 4, 2]
+
+
+def test_clear_caches():
+    imageObject._flat_cache.get('key', lambda: np.ones(10))
+    imageObject._clear_caches()
+    assert imageObject._flat_cache._nbytes == 0
+    assert not imageObject._flat_cache._entries
@@ -0,0 +1,204 @@
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from stwcs.wcsutil import HSTWCS
+
+from drizzlepac import imgclasses
+
+
+def _outer_2dhist(imgxy, refxy, r):
+    # Reference implementation using all pairs of sources
+    dx = np.subtract.outer(imgxy[:, 0], refxy[:, 0]).ravel()
+    dy = np.subtract.outer(imgxy[:, 1], refxy[:, 1]).ravel()
+    r = int(np.ceil(r))
+    idx = np.where((dx < r + 0.5) & (dx >= -r - 0.5) &
+                   (dy < r + 0.5) & (dy >= -r - 0.5))
+    h = np.histogram2d(dx[idx], dy[idx], 2 * r + 1,
+                       [[-r - 0.5, r + 0.5], [-r - 0.5, r + 0.5]])
+    return h[0].T
+
+
+def _catalogs(nimg, nref, shift=(2.3, -1.7), seed=0):
+    rng = np.random.default_rng(seed)
+    refxy = rng.uniform(0, 1000, (nref, 2))
+    imgxy = refxy[rng.choice(nref, nimg, replace=False)] + shift
+    imgxy += rng.normal(0, 0.1, imgxy.shape)
+    # sources on bin edges:
+    imgxy[:5] = refxy[:5] + [[3.5, 0], [-3.5, 0], [0, 3.5], [0, -3.5], [3, 3]]
+    return imgxy, refxy
+
+
+@pytest.mark.parametrize('max_pairs', [1, 100, imgclasses.XY_2DHIST_MAX_PAIRS])
+@pytest.mark.parametrize('searchrad', [1.0, 2.5, 3.0, 8.0])
+def test_xy_2dhist(searchrad, max_pairs):
+    imgxy, refxy = _catalogs(300, 2000)
+    h = imgclasses._xy_2dhist(imgxy, refxy, searchrad, max_pairs=max_pairs)
+    np.testing.assert_array_equal(h, _outer_2dhist(imgxy, refxy, searchrad))
+
+    empty = imgclasses._xy_2dhist(imgxy[:0], refxy, searchrad)
+    n = 2 * int(np.ceil(searchrad)) + 1
+    assert empty.shape == (n, n) and not empty.any()
+
+
+def test_estimate_2dhist_shift():
+    imgxy, refxy = _catalogs(500, 3000)
+    xp, yp, flux, zpqual, zpmat, ok = \
+        imgclasses._estimate_2dhist_shift(imgxy, refxy, searchrad=5.0)
+    assert ok
+    assert abs(xp - 2.3) < 0.5 and abs(yp + 1.7) < 0.5
+    np.testing.assert_array_equal(zpmat, _outer_2dhist(imgxy, refxy, 5.0))
+
+
+def test_xy_2dhist_memory():
+    imgxy, refxy = _catalogs(4000, 20000)
+    tracemalloc.start()
+    try:
+        imgclasses._xy_2dhist(imgxy, refxy, 3.0)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # all pairs would need 2 * 4000 * 20000 * 8 bytes = 1.28 GB:
+    assert peak < 50e6
+
+
+def test_kdtree_match_same_as_xyxymatch():
+    from stsci.stimage import xyxymatch
+
+    imgxy, refxy = _catalogs(400, 500)
+    imgxy = imgxy[5:]  # skip the sources on the bin edges
+    kwargs = dict(origin=(2.0, -2.0), tolerance=1.0, separation=0.5)
+    matches = imgclasses._kdtree_match(imgxy, refxy, **kwargs)
+    expected = xyxymatch(imgxy, refxy, **kwargs)
+
+    assert matches.dtype == expected.dtype
+    assert len(matches) == 395
+    expected = np.sort(expected, order='input_idx')
+    np.testing.assert_array_equal(matches, expected)
+
+
+def test_kdtree_match():
+    ref = np.array([[10.0, 10.0], [30.0, 10.0], [30.3, 10.0], [50.0, 50.0],
+                    [70.0, 20.0], [90.0, 90.0]])
+    # two image sources near the first reference source, one with no match:
+    img = ref[[0, 0, 1, 3, 4, 5]] + [0.9, 0.0]
+    img[1] += [0.25, 0.0]
+    img[4] += [0.2, 0.0]
+    img[5] += [5.0, 0.0]
+
+    m = imgclasses._kdtree_match(img, ref, tolerance=1.0, separation=0.0)
+    # the offset is refined from the initial matches, so that source 4,
+    # initially further away than the tolerance, is matched as well:
+    assert m['input_idx'].tolist() == [0, 2, 3, 4]
+    assert m['ref_idx'].tolist() == [0, 1, 3, 4]
+    np.testing.assert_array_equal(m['input_x'], img[[0, 2, 3, 4], 0])
+    np.testing.assert_array_equal(m['ref_y'], ref[[0, 1, 3, 4], 1])
+
+    # reference sources closer than the separation are removed:
+    m = imgclasses._kdtree_match(img, ref, tolerance=1.0, separation=0.5)
+    assert 1 in m['ref_idx'] and 2 not in m['ref_idx']
+    assert 1 not in m['input_idx']
+
+    empty = imgclasses._kdtree_match(img[:0], ref)
+    assert empty.dtype == m.dtype and len(empty) == 0
+
+
+def test_append_only_columns():
+    cols = imgclasses._AppendOnlyColumns([np.arange(3), np.zeros((3, 2))])
+    for k in range(1, 6):
+        cols.append([np.arange(k) + 0.5, np.ones((k, 2))])
+    ids, xy = cols.columns
+    assert cols.nrows == ids.shape[0] == xy.shape[0] == 18
+    assert ids.dtype == float and ids[3] == 0.5
+    np.testing.assert_array_equal(xy[3:], 1)
+    with pytest.raises(ValueError):
+        cols.append([np.arange(2), np.ones((3, 2))])
+
+
+def _ref_wcs():
+    header = fits.Header()
+    header['NAXIS'] = 2
+    header['NAXIS1'], header['NAXIS2'] = 1000, 1000
+    header['CTYPE1'], header['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+    header['CRPIX1'], header['CRPIX2'] = 500.0, 500.0
+    header['CRVAL1'], header['CRVAL2'] = 10.0, 10.0
+    header['CD1_1'], header['CD1_2'] = -0.05 / 3600, 0.0
+    header['CD2_1'], header['CD2_2'] = 0.0, 0.05 / 3600
+    hdu = fits.ImageHDU(np.zeros((10, 10), dtype=np.float32), header=header)
+    wcs = HSTWCS(fits.HDUList([fits.PrimaryHDU(), hdu]), ext=1)
+    wcs.filename = 'ref_drz.fits'
+    return wcs
+
+
+def _aligned_image(k, rng):
+    outxy = rng.uniform(-300, 1300, (200, 2)) + 400 * k
+    theta = np.deg2rad(0.01 * k)
+    return SimpleNamespace(
+        name=f'image{k}_flt.fits',
+        goodmatch=True,
+        identityfit=False,
+        matches={'input_idx': rng.choice(200, 50, replace=False)},
+        fit={'offset': rng.normal(0, 1, 2),
+             'fit_matrix': np.array([[np.cos(theta), -np.sin(theta)],
+                                     [np.sin(theta), np.cos(theta)]])},
+        outxy=outxy,
+        all_radec=[None, None, rng.uniform(1, 100, 200), np.arange(200)],
+        xy_catalog=[outxy[:, 0] + 1, outxy[:, 1] + 2,
+                    rng.uniform(1, 100, 200), np.arange(200),
+                    np.array(200 * [f'image{k}_flt.fits'], dtype=object)]
+    )
+
+
+def test_refimage_append_not_matched_sources():
+    wcs = _ref_wcs()
+    rng = np.random.default_rng(4)
+    radec = wcs.wcs_pix2world(rng.uniform(0, 1000, (100, 2)), 1)
+    refimage = imgclasses.RefImage(wcs, [radec[:, 0], radec[:, 1]])
+
+    outxy = [refimage.outxy.copy()]
+    xy_catalog = [[col.copy() for col in refimage.xy_catalog]]
+    for k in range(1, 5):
+        image = _aligned_image(k, rng)
+        refimage.append_not_matched_sources(image)
+        assert refimage.dirty
+
+        mask = np.ones(200, dtype=bool)
+        mask[image.matches['input_idx']] = False
+        crpix = wcs.wcs.crpix
+        outxy.append(np.dot(image.outxy[mask] - image.fit['offset'] - crpix,
+                            image.fit['fit_matrix'].T) + crpix)
+        xy_catalog.append([np.asarray(col)[mask]
+                           for col in image.xy_catalog])
+
+    outxy = np.concatenate(outxy)
+    nsrc = outxy.shape[0]
+    assert nsrc == 100 + 4 * 150
+    np.testing.assert_allclose(refimage.outxy, outxy, rtol=0, atol=1e-9)
+    np.testing.assert_allclose(
+        wcs.wcs_world2pix(refimage.all_radec[0], refimage.all_radec[1], 1),
+        outxy.T, rtol=0, atol=1e-6
+    )
+    np.testing.assert_array_equal(refimage.all_radec[3], np.arange(nsrc))
+    for i, col in enumerate(refimage.xy_catalog):
+        assert col.shape[0] == nsrc
+        expected = np.concatenate([cat[i] for cat in xy_catalog])
+        np.testing.assert_array_equal(col, expected)
+
+    # indices and bounding polygon are updated incrementally:
+    np.testing.assert_array_equal(
+        refimage.xorder, np.argsort(outxy[:, 0], kind='stable')
+    )
+    hull = imgclasses.convex_hull(list(map(tuple, outxy)))
+    np.testing.assert_allclose(refimage._hull, hull, rtol=0, atol=1e-9)
+    rdv = wcs.wcs_pix2world(outxy, 1)
+    assert all(refimage.skyline.contains_radec(ra, dec)
+               for ra, dec in rdv[::37])
+
+    imgxy = outxy[::3] + [2.3, -1.7]
+    np.testing.assert_array_equal(
+        imgclasses._xy_2dhist(imgxy, refimage.outxy, 3.0,
+                              ref_xorder=refimage.xorder),
+        imgclasses._xy_2dhist(imgxy, refimage.outxy, 3.0)
+    )
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+
+import pytest
+
+# Cumulative time (in microseconds) allowed for ``import drizzlepac`` as
+# reported by ``python -X importtime``. The package itself should only pull
+# in its version module; task modules are loaded on first attribute access.
+IMPORT_TIME_BUDGET = 500000
+
+HEAVY_MODULES = ['scipy', 'matplotlib', 'photutils', 'stwcs',
+                 'stsci.skypac', 'astropy.io.fits', 'drizzlepac.cdriz']
+
+
+def _run_python(code, *options):
+    result = subprocess.run([sys.executable, *options, '-c', code],
+                            capture_output=True, text=True, check=True)
+    return result
+
+
+def test_import_does_not_load_heavy_modules():
+    code = ("import sys, drizzlepac; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    loaded = _run_python(code).stdout.strip()
+    assert loaded == ''
+
+
+def test_import_time():
+    result = _run_python('import drizzlepac', '-X', 'importtime')
+    # Each line looks like: "import time:  self [us] | cumulative | name"
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].strip() == 'drizzlepac':
+            cumulative = int(fields[1])
+            break
+    else:
+        pytest.fail('drizzlepac not found in -X importtime output')
+
+    assert cumulative < IMPORT_TIME_BUDGET, (
+        f"'import drizzlepac' took {cumulative / 1e6:.3f}s "
+        f"(budget {IMPORT_TIME_BUDGET / 1e6:.3f}s)"
+    )
+
+
+@pytest.mark.parametrize('name', ['astrodrizzle', 'tweakreg', 'tweakback'])
+def test_lazy_submodule_access(name):
+    code = (f"import sys, drizzlepac; mod = drizzlepac.{name}; "
+            f"assert sys.modules['drizzlepac.{name}'] is mod")
+    _run_python(code)
+
+
+def test_unknown_attribute():
+    import drizzlepac
+    with pytest.raises(AttributeError):
+        drizzlepac.no_such_task
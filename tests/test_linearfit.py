@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+
+from drizzlepac import linearfit
+
+
+def _iter_fit_reference(xy, uv, mode, nclip, sigma):
+    """ Clipped fit of a single set of points with the per-set functions. """
+    center = uv.mean(axis=0)
+    xy = xy - center
+    uv = uv - center
+    fit = linearfit.fit_all(xy, uv, mode=mode, verbose=False)
+    npts = xy.shape[0]
+    npts0 = 0
+    for n in range(nclip):
+        resids = fit['resids']
+        whtfrac = npts / (npts - npts0 - 1.0)
+        goodpix = np.all(np.abs(resids) < sigma * fit['rms'] * whtfrac, axis=1)
+        if goodpix.sum() <= 2:
+            break
+        npts0 = npts - goodpix.shape[0]
+        xy = xy[goodpix]
+        uv = uv[goodpix]
+        fit = linearfit.fit_all(xy, uv, mode=mode, verbose=False)
+    fit['img_coords'] = xy
+    return fit
+
+
+def _matched_sets(nsets, seed=0):
+    rng = np.random.default_rng(seed)
+    xy, uv = [], []
+    for k in range(nsets):
+        n = rng.integers(5, 200)
+        ref = rng.uniform(0, 4096, (n, 2))
+        theta = np.deg2rad(rng.normal(0, 0.05))
+        scale = 1 + rng.normal(0, 1e-4)
+        m = scale * np.array([[np.cos(theta), -np.sin(theta)],
+                              [np.sin(theta), np.cos(theta)]])
+        if k % 3 == 2:
+            m[1] *= -1  # reflection
+        img = ref @ m + rng.normal(0, 5, 2) + rng.normal(0, 0.05, (n, 2))
+        # outliers:
+        img[:n // 10] += rng.uniform(-3, 3, (n // 10, 2))
+        xy.append(img)
+        uv.append(ref)
+    return xy, uv
+
+
+@pytest.mark.parametrize('mode', ['shift', 'rscale', 'general'])
+def test_fit_batch(mode):
+    xy, uv = _matched_sets(12)
+    fits = linearfit.fit_batch(xy, uv, mode=mode, nclip=3, sigma=3.0)
+    assert len(fits) == len(xy)
+    assert any(not np.all(fit['goodpix']) for fit in fits)
+
+    for k, fit in enumerate(fits):
+        expected = _iter_fit_reference(xy[k], uv[k], mode, 3, 3.0)
+        assert fit['proper'] == expected['proper']
+        np.testing.assert_allclose(fit['img_coords'], expected['img_coords'],
+                                   rtol=0, atol=1e-9)
+        np.testing.assert_allclose(fit['fit_matrix'], expected['fit_matrix'],
+                                   rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(fit['offset'], expected['offset'],
+                                   rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(fit['rms'], expected['rms'], rtol=1e-6)
+        np.testing.assert_allclose(fit['resids'], expected['resids'],
+                                   atol=1e-8)
+        assert fit['rot'] == pytest.approx(expected['rot'], abs=1e-9)
+        assert fit['goodpix'].sum() == fit['img_coords'].shape[0]
+        center = uv[k].mean(axis=0)
+        np.testing.assert_allclose(
+            (fit['fit_xy'] - center) @ fit['fit_matrix'] + fit['offset'],
+            fit['img_coords'], rtol=0, atol=1e-8
+        )
+
+
+def test_iter_fit_all():
+    xy, uv = _matched_sets(1, seed=3)
+    xy, uv = xy[0], uv[0]
+    idx = np.arange(xy.shape[0])
+    fit = linearfit.iter_fit_all(xy.copy(), uv.copy(), idx, idx + 100,
+                                 xyorig=xy, mode='rscale', nclip=3)
+    expected = _iter_fit_reference(xy, uv, 'rscale', 3, 3.0)
+    np.testing.assert_allclose(fit['img_coords'], expected['img_coords'],
+                               rtol=0, atol=1e-9)
+    np.testing.assert_array_equal(fit['img_indx'] + 100, fit['ref_indx'])
+    np.testing.assert_array_equal(fit['img_orig_xy'], xy[fit['img_indx']])
+    assert fit['ref_orig_xy'] is None
+
+
+@pytest.mark.parametrize('mode', ['rscale', 'general'])
+def test_fit_batch_failed_sets(mode):
+    xy, uv = _matched_sets(3, seed=5)
+    colinear = np.column_stack([np.arange(5.0), 2.0 * np.arange(5.0)])
+    empty = np.empty((0, 2))
+    fits = linearfit.fit_batch(xy + [colinear, empty], uv + [colinear, empty],
+                               mode=mode, nclip=3)
+    expected = linearfit.fit_batch(xy, uv, mode=mode, nclip=3)
+    if mode == 'general':
+        assert fits[3] is None
+    assert fits[4] is None
+    for fit, ref in zip(fits[:3], expected):
+        np.testing.assert_array_equal(fit['goodpix'], ref['goodpix'])
+        np.testing.assert_allclose(fit['fit_matrix'], ref['fit_matrix'],
+                                   rtol=1e-12)
+        np.testing.assert_allclose(fit['offset'], ref['offset'], rtol=1e-12)
+
+
+def test_iter_fit_all_singular():
+    xy = np.column_stack([np.arange(5.0), np.arange(5.0)])
+    idx = np.arange(5)
+    with pytest.raises(linearfit.SingularMatrixError):
+        linearfit.iter_fit_all(xy.copy(), xy.copy(), idx, idx,
+                               mode='general', nclip=0)
@@ -0,0 +1,67 @@
+import json
+import multiprocessing
+
+from drizzlepac import profiling, util
+
+
+def _worker():
+    with profiling.span('chip', chip=2):
+        pass
+
+
+def _run_steps(tmp_path):
+    proc_steps = util.ProcSteps()
+    proc_steps.profiler = profiling.open_session(str(tmp_path / 'prof.json'))
+    proc_steps.profiler.begin_run('test')
+
+    proc_steps.addStep('Step 1')
+    for k in range(3):
+        with open(tmp_path / f'file{k}.txt', 'w') as f:
+            f.write('x' * 1000)
+    with profiling.span('chip', chip=1):
+        sum(range(10000))
+    mp_ctx = multiprocessing.get_context('fork')
+    p = mp_ctx.Process(target=_worker)
+    p.start()
+    p.join()
+    proc_steps.endStep('Step 1')
+
+    proc_steps.addStep('Step 2')
+    proc_steps.endStep('Step 2', reason="off", delay_msg=True)
+    proc_steps.endStep('Step 2', reason="skipped")
+
+    profiling.close_session(proc_steps.profiler)
+    assert profiling.get_active() is None
+
+
+def test_profile_json(tmp_path):
+    _run_steps(tmp_path)
+    with open(tmp_path / 'prof.json') as f:
+        profile = json.load(f)
+
+    step1, step2 = profile['steps']
+    assert step1['name'] == 'Step 1' and step1['run'] == 'test'
+    assert step1['files_opened'] >= 3
+    assert step1['peak_rss'] > 0
+    assert step1['cpu_user'] >= 0
+    if step1['bytes_written'] is not None:
+        assert step1['bytes_written'] >= 3000
+    assert sorted(s['args']['chip'] for s in step1['spans']) == ['1', '2']
+    assert len({s['pid'] for s in step1['spans']}) == 2
+    assert step2['status'] == 'skipped' and step2['spans'] == []
+
+
+def test_chrome_trace_and_nested_sessions(tmp_path):
+    trace_name = str(tmp_path / 'prof' ) + profiling.CHROME_TRACE_SUFFIX
+    with profiling.session(trace_name) as profiler:
+        # Tasks run without a file name record into the active session
+        assert profiling.open_session('') is profiler
+        proc_steps = util.ProcSteps()
+        proc_steps.profiler = profiler
+        proc_steps.addStep('Step 1')
+        proc_steps.endStep('Step 1')
+
+    with open(trace_name) as f:
+        trace = json.load(f)
+    assert [e['name'] for e in trace['traceEvents']] == ['Step 1']
+    assert trace['traceEvents'][0]['ph'] == 'X'
@@ -0,0 +1,83 @@
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from drizzlepac import adrizzle, drizCR, imageObject, scheduler, util
+
+MB = 1024 * 1024
+
+
+class FakeImage:
+    scienceExt = 'SCI'
+
+    def __init__(self, shape, nchips=1):
+        self.chips = [SimpleNamespace(image_shape=shape)
+                      for _ in range(nchips)]
+
+    def returnAllChips(self, extname=None):
+        return self.chips
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+
+
+def test_memory_model_scales_with_inputs():
+    wcs = SimpleNamespace(array_shape=(1000, 1000))
+    small = scheduler.MemoryScheduler([FakeImage((100, 100))] * 2, wcs)
+    large = scheduler.MemoryScheduler([FakeImage((1000, 1000))] * 2, wcs)
+
+    for step in [adrizzle.PROCSTEPS_NAME_SINGLE, drizCR.PROCSTEPS_NAME]:
+        assert len(small.task_memory(step)) == 2
+        assert large.task_memory(step)[0] > small.task_memory(step)[0]
+
+    # the final drizzle step includes the flat field cache
+    final = adrizzle.PROCSTEPS_NAME_FINAL
+    cache_mem = imageObject._cache_memory(2 * 1000 * 1000)
+    assert cache_mem == 4 * 2 * 1000 * 1000
+    assert large.task_memory(final)[0] - small.task_memory(final)[0] >= \
+        cache_mem - imageObject._cache_memory(2 * 100 * 100)
+    assert imageObject._cache_memory(10**12) == imageObject.FLAT_CACHE_SIZE
+
+
+def test_pool_size_limited_by_budget(monkeypatch):
+    monkeypatch.setattr(util, 'get_pool_size', lambda n, ntasks: ntasks)
+    monkeypatch.setattr(scheduler, 'get_rss', lambda pid=None: 0)
+
+    images = [FakeImage((1000, 1000)) for _ in range(8)]
+    task_mem = scheduler._DRIZCR_CHIP_BYTES * 1000 * 1000
+    sched = scheduler.MemoryScheduler(images, None, num_cores=8,
+                                      max_memory=3.5 * task_mem / 1024**3)
+    assert sched.pool_size(drizCR.PROCSTEPS_NAME) == 3
+
+    # a budget smaller than one task must still allow serial processing
+    sched = scheduler.MemoryScheduler(images, None, num_cores=8,
+                                      max_memory=1e-6)
+    assert sched.pool_size(drizCR.PROCSTEPS_NAME) == 1
+
+
+def test_launch_and_wait_throttles(monkeypatch):
+    monkeypatch.setattr(scheduler, 'get_rss', lambda pid=None: 0)
+    sched = scheduler.MemoryScheduler([], None, max_memory=100 * MB / 1024**3)
+
+    mp_ctx = multiprocessing.get_context('fork')
+    procs = [mp_ctx.Process(target=_sleep, args=(0.3,)) for _ in range(3)]
+    start = time.time()
+    # Only one of these tasks fits in the memory budget at a time
+    sched.launch_and_wait(procs, [60 * MB] * 3, pool_size=3)
+    assert time.time() - start > 0.85
+    assert all(p.exitcode == 0 for p in procs)
+
+
+def test_step_peak_is_measured():
+    sched = scheduler.MemoryScheduler([FakeImage((10, 10))], None)
+    proc_steps = util.ProcSteps()
+    proc_steps.scheduler = sched
+
+    proc_steps.addStep(drizCR.PROCSTEPS_NAME)
+    proc_steps.endStep(drizCR.PROCSTEPS_NAME, reason="skipped")
+    proc_steps.endStep(drizCR.PROCSTEPS_NAME, reason="off")
+    assert sched._steps[drizCR.PROCSTEPS_NAME]['actual'] > 0
+    sched.report()
@@ -0,0 +1,142 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy import wcs
+from astropy.io import fits
+from stsci.tools import teal
+
+from drizzlepac import astrodrizzle, stepcache, util, sky, staticMask
+
+
+def _get_wcs(shape):
+    w = wcs.WCS(naxis=2)
+    w.wcs.ctype = ["RA---TAN", "DEC--TAN"]
+    w.wcs.crpix = [shape[1] / 2.0, shape[0] / 2.0]
+    w.wcs.crval = [10.0, 10.0]
+    w.wcs.cdelt = [-0.05 / 3600.0, 0.05 / 3600.0]
+    w.wcs.set()
+    return w
+
+
+class FakeImage:
+    """ Minimal stand-in for an imageObject with a single SCI chip. """
+    scienceExt = 'SCI'
+    inmemory = False
+
+    def __init__(self, path, data):
+        self._filename = str(path / 'j12345678q_flt.fits')
+        fits.HDUList([
+            fits.PrimaryHDU(),
+            fits.ImageHDU(data=data, name='SCI', ver=1),
+        ]).writeto(self._filename)
+
+        root = str(path / 'final')
+        self.outputNames = {
+            'outMedian': root + '_med.fits',
+            'crcorImage': root + '_crclean.fits',
+        }
+        chip_root = str(path / 'j12345678q_sci1')
+        self.chip = SimpleNamespace(
+            _chip=1, _effGain=1.0, _rdnoise=3.0, _exptime=100.0,
+            _conversionFactor=1.0, signature=('ACS/WFC', data.shape, 1),
+            wcs=_get_wcs(data.shape), subtractedSky=0.0, computedSky=None,
+            outputNames={
+                'staticMask': None,
+                'outSingle': chip_root + '_single_sci.fits',
+                'outSWeight': chip_root + '_single_wht.fits',
+                'blotImage': chip_root + '_blt.fits',
+                'crmaskImage': chip_root + '_crmask.fits',
+            },
+        )
+
+    def returnAllChips(self, extname=None):
+        return [self.chip]
+
+
+def _write(fname):
+    fits.PrimaryHDU(data=np.ones((4, 4), dtype=np.float32)).writeto(
+        fname, overwrite=True
+    )
+
+
+def _run_steps(img, configobj, path):
+    """ Emulate astrodrizzle.run(): return names of steps actually run. """
+    outwcs = SimpleNamespace(single_wcs=_get_wcs((10, 10)))
+    cache = stepcache.StepCache([img], outwcs, configobj)
+    proc_steps = util.ProcSteps()
+    executed = []
+
+    for step_name, spec in stepcache.STEP_SPECS.items():
+        if cache.restore(step_name, procSteps=proc_steps):
+            continue
+
+        proc_steps.addStep(step_name)
+        executed.append(step_name)
+        if step_name == staticMask.PROCSTEPS_NAME:
+            img.chip.outputNames['staticMask'] = str(path / 'static.fits')
+        elif step_name == sky.PROCSTEPS_NAME:
+            img.chip.subtractedSky = img.chip.computedSky = np.float32(5.5)
+        for name in spec['chip_outputs']:
+            _write(img.chip.outputNames[name])
+        for name in spec['image_outputs']:
+            _write(img.outputNames[name])
+        proc_steps.endStep(step_name)
+        cache.record(step_name, procSteps=proc_steps)
+
+    return executed, proc_steps
+
+
+@pytest.fixture
+def setup(tmp_path):
+    img = FakeImage(tmp_path, np.arange(100, dtype=np.float32).reshape(10, 10))
+    configobj = teal.load('astrodrizzle', defaults=True)
+    return img, configobj, tmp_path
+
+
+def test_rerun_uses_cache(setup):
+    img, configobj, path = setup
+    executed, _ = _run_steps(img, configobj, path)
+    assert executed == list(stepcache.STEP_SPECS)
+    assert os.path.isfile(str(path / 'final_stepcache.json'))
+
+    # Restoring must bring back the state of a new set of image objects
+    new_img = FakeImage.__new__(FakeImage)
+    new_img.__dict__.update(img.__dict__)
+    new_img.chip = SimpleNamespace(**vars(img.chip))
+    new_img.chip.outputNames = dict(img.chip.outputNames, staticMask=None)
+    new_img.chip.subtractedSky, new_img.chip.computedSky = 0.0, None
+
+    executed, proc_steps = _run_steps(new_img, configobj, path)
+    assert executed == []
+    assert new_img.chip.computedSky == pytest.approx(5.5)
+    assert new_img.chip.outputNames['staticMask'] == str(path / 'static.fits')
+    assert all(proc_steps.steps[s]['status'] is util.StepStatus.STEP_CACHED
+               for s in stepcache.STEP_SPECS)
+
+
+def test_changed_parameter_invalidates_later_steps(setup):
+    img, configobj, path = setup
+    _run_steps(img, configobj, path)
+
+    configobj[util.getSectionName(configobj, 4)]['combine_nhigh'] = 1
+    # Final drizzle parameters do not affect any cached step
+    configobj[util.getSectionName(configobj, 7)]['final_pixfrac'] = 0.5
+    executed, _ = _run_steps(img, configobj, path)
+    assert executed == list(stepcache.STEP_SPECS)[3:]
+
+
+def test_modified_input_or_product_invalidates(setup):
+    img, configobj, path = setup
+    _run_steps(img, configobj, path)
+
+    _write(img.chip.outputNames['blotImage'])
+    os.utime(img.chip.outputNames['blotImage'], ns=(0, 0))
+    executed, _ = _run_steps(img, configobj, path)
+    assert executed == list(stepcache.STEP_SPECS)[4:]
+
+    with fits.open(img._filename, mode='update') as hdul:
+        hdul['SCI', 1].data[0, 0] = -1.0
+    executed, _ = _run_steps(img, configobj, path)
+    assert executed == list(stepcache.STEP_SPECS)
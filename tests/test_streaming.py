@@ -0,0 +1,149 @@
+import glob
+import os
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy.io import fits
+
+from drizzlepac import astrodrizzle, scheduler, util
+
+
+class FakeImage:
+    scienceExt = 'SCI'
+
+    def __init__(self, name):
+        self._filename = name
+        self.chip = SimpleNamespace(_chip=1, image_shape=(10, 10),
+                                    computedSky=None)
+
+    def returnAllChips(self, extname=None):
+        return [self.chip]
+
+
+def _task(img, delay):
+    time.sleep(delay[img._filename])
+    if img._filename == 'bad.fits':
+        raise ValueError('bad input')
+    return {1: {'computedSky': len(img._filename)}}
+
+
+def _runner(images, delay):
+    sched = scheduler.MemoryScheduler(images, None, num_cores=len(images))
+    return astrodrizzle._ImageTaskRunner(
+        'test', images, _task, (delay,), sched, 'Test', [0] * len(images)
+    )
+
+
+def test_results_consumed_in_order():
+    images = [FakeImage(name) for name in ['a.fits', 'bb.fits', 'ccc.fits']]
+    # The first image finishes last
+    runner = _runner(images, {'a.fits': 0.3, 'bb.fits': 0.0, 'ccc.fits': 0.0})
+    for img in images:
+        runner.wait(img)
+        assert img.chip.computedSky == len(img._filename)
+    runner.wait_all()
+
+
+def test_task_failure_is_reported():
+    images = [FakeImage('a.fits'), FakeImage('bad.fits')]
+    runner = _runner(images, {'a.fits': 0.0, 'bad.fits': 0.0})
+    runner.wait(images[0])
+    with pytest.raises(RuntimeError, match='bad.fits'):
+        runner.wait(images[1])
+
+
+def _write_flt(fname, seed, shift, shape=(200, 220)):
+    """ Synthetic ACS/WFC subarray exposure with a few stars and cosmic rays.
+    """
+    rng = np.random.default_rng(seed)
+    ny, nx = shape
+    yy, xx = np.mgrid[:ny, :nx]
+    sci = 50.0 + rng.normal(0.0, 3.0, shape)
+    for x0, y0, flux in [(50, 60, 5000), (120, 90, 3000), (170, 150, 8000)]:
+        r2 = (xx - x0 - shift[0])**2 + (yy - y0 - shift[1])**2
+        sci += flux * np.exp(-r2 / 4.5)
+    for _ in range(30):
+        sci[rng.integers(5, ny - 5), rng.integers(5, nx - 5)] += \
+            rng.uniform(500, 3000)
+
+    phdr = fits.Header()
+    phdr['INSTRUME'], phdr['DETECTOR'], phdr['TELESCOP'] = 'ACS', 'WFC', 'HST'
+    phdr['ROOTNAME'] = fname[:9]
+    phdr['EXPTIME'] = 500.0
+    phdr['EXPSTART'], phdr['EXPEND'] = 55000.0 + seed, 55000.01 + seed
+    phdr['FILTER1'], phdr['FILTER2'] = 'F606W', 'CLEAR2L'
+    phdr['PFLTFILE'] = 'N/A'
+    phdr['SUBARRAY'] = True
+    for amp in 'ABCD':
+        phdr['ATODGN' + amp] = 2.0
+        phdr['READNSE' + amp] = 5.0
+
+    hdr = fits.Header()
+    hdr['CTYPE1'], hdr['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+    hdr['CRPIX1'], hdr['CRPIX2'] = 110.0 - shift[0], 100.0 - shift[1]
+    hdr['CRVAL1'], hdr['CRVAL2'] = 150.0, 2.0
+    hdr['CD1_1'], hdr['CD2_2'] = -0.05 / 3600, 0.05 / 3600
+    hdr['CD1_2'], hdr['CD2_1'] = 0.0, 0.0
+    hdr['WCSNAME'] = 'SYNTHETIC'
+    hdr['BUNIT'] = 'ELECTRONS'
+    hdr['EXPNAME'] = fname[:9]
+    hdr['CCDCHIP'] = 1
+    hdr['MEANDARK'] = 1.0
+    hdr['NGOODPIX'] = ny * nx
+    hdus = [fits.PrimaryHDU(header=phdr)]
+    for extname, data in [('SCI', sci.astype(np.float32)),
+                          ('ERR', np.sqrt(sci).astype(np.float32)),
+                          ('DQ', np.zeros(shape, dtype=np.int16))]:
+        hdus.append(fits.ImageHDU(data, header=hdr, name=extname, ver=1))
+    fits.HDUList(hdus).writeto(fname)
+
+
+def _run_astrodrizzle(path, stream):
+    os.mkdir(path)
+    os.chdir(path)
+    for k, shift in enumerate([(0.0, 0.0), (3.3, 1.7), (-2.1, 4.2)]):
+        _write_flt(f'jab0{k}0001_flt.fits', k, shift)
+    astrodrizzle.AstroDrizzle(
+        sorted(glob.glob('*_flt.fits')), output='final', updatewcs=False,
+        num_cores=3, stream_steps=stream, preserve=False, runfile='',
+        build=False, final_wht_type='EXP'
+    )
+
+
+def test_streamed_products_match(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    # the barrier path is run serially (as it would be by default):
+    _run_astrodrizzle(tmp_path / 'barrier', stream=False)
+
+    nstreamed = []
+    stream_final = astrodrizzle._stream_final
+
+    def _counted_stream_final(*args, **kwargs):
+        nstreamed.append(1)
+        return stream_final(*args, **kwargs)
+
+    monkeypatch.setattr(util, 'get_pool_size',
+                        lambda n, ntasks: 1 if ntasks is None else ntasks)
+    monkeypatch.setattr(astrodrizzle, '_stream_final', _counted_stream_final)
+    capsys.readouterr()
+    _run_astrodrizzle(tmp_path / 'stream', stream=True)
+    assert nstreamed == [1]
+
+    # steps are reported under their usual names:
+    report = capsys.readouterr().out.split('Elapsed time')[-1]
+    assert 'Separate Drizzle' in report and 'Final Drizzle' in report
+    assert '/' not in report
+
+    products = sorted(os.path.basename(f) for f in
+                      glob.glob(str(tmp_path / 'barrier' / '*.fits')))
+    assert 'final_drz_ctx.fits' in products
+    assert sum(f.endswith('_crmask.fits') for f in products) == 3
+    for fname in products:
+        with fits.open(tmp_path / 'barrier' / fname) as barrier, \
+                fits.open(tmp_path / 'stream' / fname) as stream:
+            for hdu1, hdu2 in zip(barrier, stream):
+                if hdu1.is_image and hdu1.data is not None:
+                    np.testing.assert_array_equal(hdu1.data, hdu2.data,
+                                                  err_msg=fname)
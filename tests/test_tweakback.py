@@ -0,0 +1,105 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from stwcs.wcsutil import altwcs
+
+from drizzlepac import tweakback
+
+
+def _wcs_header(shape, crpix, crval, rot=0.0, pscale=0.05):
+    theta = np.deg2rad(rot)
+    cd = pscale / 3600.0 * np.array([[-np.cos(theta), np.sin(theta)],
+                                     [np.sin(theta), np.cos(theta)]])
+    header = fits.Header()
+    header['CTYPE1'], header['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+    header['CRPIX1'], header['CRPIX2'] = crpix
+    header['CRVAL1'], header['CRVAL2'] = crval
+    header['CD1_1'], header['CD1_2'] = cd[0]
+    header['CD2_1'], header['CD2_2'] = cd[1]
+    return header
+
+
+def _write_flt(fname, crvals):
+    hdus = [fits.PrimaryHDU()]
+    for k, crval in enumerate(crvals):
+        header = _wcs_header((100, 120), (60.0, 50.0), crval, rot=2.0 * k)
+        header['EXTNAME'], header['EXTVER'] = 'SCI', k + 1
+        header['WCSNAME'] = 'IDC_TEST'
+        hdus.append(fits.ImageHDU(np.zeros((100, 120), np.float32),
+                                  header=header))
+    fits.HDUList(hdus).writeto(fname)
+
+
+def _write_drz(fname, inputs, crval, shift):
+    primary = fits.PrimaryHDU()
+    for k, name in enumerate(inputs):
+        primary.header[f'D{k + 1:03d}DATA'] = name
+    header = _wcs_header((300, 300), (150.0, 150.0), crval, pscale=0.06)
+    header['EXTNAME'], header['EXTVER'] = 'SCI', 1
+    header['WCSNAME'] = 'ORIG'
+    hdul = fits.HDUList([primary, fits.ImageHDU(np.zeros((300, 300),
+                                                         np.float32),
+                                                header=header)])
+    altwcs.archive_wcs(hdul, 1, wcskey='O', wcsname='ORIG')
+    hdul[1].header['CRVAL1'] += shift[0]
+    hdul[1].header['CRVAL2'] += shift[1]
+    hdul[1].header['CD1_1'] *= 1.0001
+    hdul[1].header['WCSNAME'] = 'TWEAKED'
+    hdul.writeto(fname)
+
+
+@pytest.fixture
+def products(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_flt('a_flt.fits', [(10.0, 20.0), (10.001, 20.002)])
+    _write_flt('b_flt.fits', [(10.002, 20.0), (10.003, 19.999)])
+    _write_flt('c_flt.fits', [(30.0, -5.0)])
+    _write_drz('p1_drz.fits', ['a_flt.fits[sci,1]', 'a_flt.fits[sci,2]',
+                               'b_flt.fits'], (10.0015, 20.0), (1e-5, -2e-5))
+    _write_drz('p2_drz.fits', ['c_flt.fits[sci,1]'], (30.0, -5.0),
+               (-3e-5, 1e-5))
+    return ['p1_drz.fits', 'p2_drz.fits']
+
+
+def _headers(fnames):
+    headers = []
+    for fname in fnames:
+        with fits.open(fname) as hdul:
+            for hdu in hdul[1:]:
+                header = hdu.header.copy()
+                header.remove('HISTORY', ignore_missing=True,
+                              remove_all=True)
+                headers.append(header)
+    return headers
+
+
+def test_apply_tweak_batch(products, tmp_path, monkeypatch):
+    flts = ['a_flt.fits', 'b_flt.fits', 'c_flt.fits']
+    os.mkdir('batch')
+    for fname in flts + products:
+        shutil.copy(fname, 'batch')
+
+    for drz in products:
+        tweakback.apply_tweak(drz, None, orig_wcs_key='O')
+    expected = _headers(flts)
+
+    monkeypatch.chdir(tmp_path / 'batch')
+    tweakback.apply_tweak_batch(products, None, orig_wcs_key='O')
+    headers = _headers(flts)
+
+    assert len(headers) == len(expected) == 5
+    for header, ref in zip(headers, expected):
+        assert header['WCSNAME'] == 'TWEAKED'
+        assert header['WCSNAMEA'] == 'IDC_TEST'
+        assert header['CRVAL1'] != 10.0
+        assert header.tostring() == ref.tostring()
+
+
+def test_apply_tweak_batch_shared_input(products):
+    _write_drz('p3_drz.fits', ['c_flt.fits[sci,1]'], (30.0, -5.0),
+               (1e-5, 1e-5))
+    with pytest.raises(ValueError, match='input image of both'):
+        tweakback.apply_tweak_batch(['p2_drz.fits', 'p3_drz.fits'], 'ORIG')
@@ -0,0 +1,151 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from astropy.io import fits
+from spherical_geometry.polygon import SphericalPolygon
+from stsci.tools import teal
+
+from drizzlepac import catalogs, imgclasses, tweakreg, tweakutils, util
+
+
+def _write_image(filename, seed):
+    rng = np.random.default_rng(seed)
+    data = rng.normal(10.0, 1.0, (150, 160)).astype(np.float32)
+    yy, xx = np.mgrid[0:150, 0:160]
+    for x, y in rng.uniform(15, 135, (30, 2)):
+        data += rng.uniform(100, 1000) * np.exp(
+            -((xx - x)**2 + (yy - y)**2) / (2 * 1.1**2)
+        )
+    hdr = fits.Header()
+    hdr['EXTNAME'], hdr['EXTVER'] = 'SCI', 1
+    hdr['CTYPE1'], hdr['CTYPE2'] = 'RA---TAN', 'DEC--TAN'
+    hdr['CRPIX1'], hdr['CRPIX2'] = 80.0, 75.0
+    hdr['CRVAL1'], hdr['CRVAL2'] = 10.0, 10.0
+    hdr['CD1_1'], hdr['CD1_2'] = -1.4e-5, 0.0
+    hdr['CD2_1'], hdr['CD2_2'] = 0.0, 1.4e-5
+    fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(data, hdr)]).writeto(filename)
+
+
+@pytest.fixture
+def image_pars():
+    kwargs = tweakutils.get_configobj_root(teal.load('tweakreg', defaults=True))
+    kwargs.update(tweakutils.get_configobj_root(
+        teal.load('imagefindpars', defaults=True)))
+    del kwargs['exclusions']
+    kwargs.update(xyunits='pixels', updatehdr=False, writecat=False,
+                  conv_width=2.5, threshold=4.0)
+    return kwargs
+
+
+def test_find_sources_parallel(tmp_path, monkeypatch, image_pars):
+    filenames = [str(tmp_path / f'im{k}_flt.fits') for k in range(3)]
+    for k, filename in enumerate(filenames):
+        _write_image(filename, k)
+    # the last image comes with a user catalog:
+    catdict = {f: None for f in filenames[:2]}
+    catdict[filenames[2]] = ['im2_sci1.coo']
+
+    monkeypatch.setattr(util, 'get_pool_size', lambda n, ntasks: 1)
+    assert tweakreg._find_sources(filenames, catdict, {}, 4, image_pars) == {}
+
+    monkeypatch.setattr(util, 'get_pool_size', lambda n, ntasks: ntasks)
+    found = tweakreg._find_sources(filenames, catdict, {}, 4, image_pars)
+    assert list(found) == filenames[:2]
+
+    expected = {f: imgclasses.Image(f, **image_pars) for f in filenames[:2]}
+
+    def _find_sources(self, **kwargs):
+        raise AssertionError('sources should not be found again')
+
+    monkeypatch.setattr(catalogs.ImageCatalog, 'find_sources', _find_sources)
+    for filename in filenames[:2]:
+        assert list(found[filename]) == [1]
+        img = imgclasses.Image(filename, found_sources=found[filename],
+                               **image_pars)
+        ref = expected[filename]
+        assert img.num_sources == ref.num_sources > 20
+        for arr, ref_arr in zip(img.xy_catalog, ref.xy_catalog):
+            np.testing.assert_array_equal(arr, ref_arr)
+        for arr, ref_arr in zip(img.all_radec, ref.all_radec):
+            np.testing.assert_array_equal(arr, ref_arr)
+        img.close()
+        ref.close()
+
+
+def test_catalog_cache(tmp_path, monkeypatch, image_pars):
+    filename = str(tmp_path / 'im0_flt.fits')
+    _write_image(filename, 0)
+    cache_dir = tmp_path / 'cache'
+    image_pars['catalog_cache'] = str(cache_dir)
+
+    ref = imgclasses.Image(filename, **image_pars)
+    assert len(list(cache_dir.glob('*.npz'))) == 1
+
+    nsearches = []
+    ndfind = tweakutils.ndfind
+    monkeypatch.setattr(tweakutils, 'ndfind',
+                        lambda *args, **kwargs: nsearches.append(1) or
+                        ndfind(*args, **kwargs))
+    img = imgclasses.Image(filename, **image_pars)
+    assert nsearches == []
+    assert img.num_sources == ref.num_sources > 20
+    for arr, ref_arr in zip(img.xy_catalog, ref.xy_catalog):
+        np.testing.assert_array_equal(arr, ref_arr)
+
+    # Different source finding parameters or pixel data are not cached:
+    imgclasses.Image(filename, **dict(image_pars, threshold=5.0))
+    assert nsearches == [1]
+    with fits.open(filename, mode='update') as hdulist:
+        hdulist['SCI'].data[0, 0] += 1
+    imgclasses.Image(filename, **image_pars)
+    assert nsearches == [1, 1]
+    assert len(list(cache_dir.glob('*.npz'))) == 3
+
+
+def _footprints(n, size=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    polygons = []
+    for ra, dec in rng.uniform([10, 10], [10.3, 10.3], (n, 2)):
+        polygons.append(SphericalPolygon.from_radec(
+            [ra, ra + size, ra + size, ra], [dec, dec, dec + size, dec + size]
+        ))
+    polygons.append(SphericalPolygon([]))
+    return polygons
+
+
+def test_overlap_matrix():
+    polygons = _footprints(40)
+    images = [SimpleNamespace(skyline=p) for p in polygons]
+    expected = np.zeros((len(images), len(images)))
+    for i, j in itertools.combinations(range(len(images)), 2):
+        area = np.fabs(polygons[i].intersection(polygons[j]).area())
+        expected[i, j] = expected[j, i] = area
+
+    overlaps = tweakreg._OverlapIndex()
+    m = tweakreg._overlap_matrix(images, overlaps)
+    np.testing.assert_allclose(m, expected, rtol=1e-12, atol=1e-14)
+    assert 0 < np.count_nonzero(m) < m.size // 4
+    assert len(overlaps.candidate_pairs(polygons)) < len(images)**2 // 4
+
+
+def test_ref_overlaps(monkeypatch):
+    polygons = _footprints(20)
+    overlaps = tweakreg._OverlapIndex()
+    for size in [0.1, 0.2, 0.4]:
+        # a growing reference footprint:
+        ref = SphericalPolygon.from_radec([10, 10 + size, 10 + size, 10],
+                                          [10, 10, 10 + size, 10 + size])
+        expected = [np.fabs(ref.intersection(p).area()) for p in polygons]
+        area = overlaps.ref_overlaps(ref, polygons)
+        np.testing.assert_allclose(area, expected, rtol=1e-8, atol=1e-14)
+
+    # footprints inside the reference footprint are not intersected again:
+    nintersections = []
+    intersection = SphericalPolygon.intersection
+    monkeypatch.setattr(SphericalPolygon, 'intersection',
+                        lambda *args: nintersections.append(1) or
+                        intersection(*args))
+    overlaps.ref_overlaps(ref, polygons)
+    assert nintersections == []